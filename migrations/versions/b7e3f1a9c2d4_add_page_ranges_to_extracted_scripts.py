@@ -0,0 +1,28 @@
+"""Add source PDF and page ranges to extracted_scripts
+
+Revision ID: b7e3f1a9c2d4
+Revises: 8f7191ad32f6
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e3f1a9c2d4'
+down_revision = '8f7191ad32f6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('extracted_scripts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('source_pdf_path', sa.String(length=512), nullable=True))
+        batch_op.add_column(sa.Column('page_ranges', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('extracted_scripts', schema=None) as batch_op:
+        batch_op.drop_column('page_ranges')
+        batch_op.drop_column('source_pdf_path')
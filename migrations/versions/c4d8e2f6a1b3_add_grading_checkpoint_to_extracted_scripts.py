@@ -0,0 +1,32 @@
+"""Add grading checkpoint columns to extracted_scripts
+
+Revision ID: c4d8e2f6a1b3
+Revises: b7e3f1a9c2d4
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d8e2f6a1b3'
+down_revision = 'b7e3f1a9c2d4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('extracted_scripts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('grading_status', sa.String(length=20), nullable=True))
+        batch_op.add_column(sa.Column('grading_error', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('grading_attempts', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('graded_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('extracted_scripts', schema=None) as batch_op:
+        batch_op.drop_column('graded_at')
+        batch_op.drop_column('grading_attempts')
+        batch_op.drop_column('grading_error')
+        batch_op.drop_column('grading_status')
@@ -0,0 +1,32 @@
+"""Add re-enqueue info and checkpoint to task_control
+
+Revision ID: d9a3c5e7b2f1
+Revises: c4d8e2f6a1b3
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9a3c5e7b2f1'
+down_revision = 'c4d8e2f6a1b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('task_control', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('task_name', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('task_args', sa.JSON(), nullable=True))
+        batch_op.add_column(sa.Column('checkpoint', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('task_control', schema=None) as batch_op:
+        batch_op.drop_column('checkpoint')
+        batch_op.drop_column('task_args')
+        batch_op.drop_column('task_name')
+        batch_op.drop_column('updated_at')
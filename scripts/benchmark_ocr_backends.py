@@ -0,0 +1,104 @@
+"""
+Benchmark the TrOCR inference backends (PyTorch fp32 vs. int8 ONNX Runtime).
+
+Usage:
+    python scripts/benchmark_ocr_backends.py <image_folder> [--batch-size 8] [--backends torch onnx]
+
+Every image in <image_folder> may have a sidecar <name>.txt with its ground-truth
+text; when present, the character error rate (CER) is reported as well.
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from PIL import Image
+
+from smartscripts.ai.model_registry import registry, _load_trocr
+from smartscripts.ai.ocr_engine import run_tr_ocr_batch
+
+IMAGE_SUFFIXES = (".png", ".jpg", ".jpeg")
+
+
+def _levenshtein(a: str, b: str) -> int:
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, start=1):
+        current = [i]
+        for j, cb in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def character_error_rate(predictions: List[str], references: List[Optional[str]]) -> Optional[float]:
+    pairs = [(p, r) for p, r in zip(predictions, references) if r is not None]
+    total_chars = sum(len(r) for _, r in pairs)
+    if not pairs or total_chars == 0:
+        return None
+    return sum(_levenshtein(p, r) for p, r in pairs) / total_chars
+
+
+def _loader_for(backend: str):
+    return lambda: _load_trocr(backend)
+
+
+def benchmark_backend(backend: str, images: List[Image.Image], references: List[Optional[str]],
+                      batch_size: int) -> Dict[str, object]:
+    registry.register("trocr", _loader_for(backend))
+    load_started = time.perf_counter()
+    registry.get("trocr")
+    load_seconds = time.perf_counter() - load_started
+
+    run_tr_ocr_batch(images[:1], batch_size=1)  # warm-up pass, not timed
+
+    latencies = []
+    for image in images:
+        started = time.perf_counter()
+        run_tr_ocr_batch([image], batch_size=1)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    predictions = run_tr_ocr_batch(images, batch_size=batch_size)
+    batch_seconds = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "backend": backend,
+        # Differs from `backend` when ONNX could not load and torch was used instead
+        "loaded_backend": registry.memory_report()["trocr"]["backend"],
+        "images": len(images),
+        "load_seconds": round(load_seconds, 2),
+        "latency_p50_ms": round(1000 * latencies[len(latencies) // 2], 1),
+        "latency_p95_ms": round(1000 * latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 1),
+        "throughput_images_per_s": round(len(images) / batch_seconds, 2),
+        "batch_size": batch_size,
+        "cer": character_error_rate(predictions, references),
+        "model": registry.memory_report()["trocr"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("image_folder")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx"], choices=["torch", "onnx"])
+    args = parser.parse_args()
+
+    paths = sorted(p for p in Path(args.image_folder).iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+    if not paths:
+        raise SystemExit(f"No images found in {args.image_folder}")
+
+    images = [Image.open(p).convert("RGB") for p in paths]
+    references = [
+        p.with_suffix(".txt").read_text(encoding="utf-8").strip() if p.with_suffix(".txt").exists() else None
+        for p in paths
+    ]
+
+    results = [benchmark_backend(b, images, references, args.batch_size) for b in args.backends]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
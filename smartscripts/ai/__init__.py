@@ -5,23 +5,29 @@ Initialization of AI-related utilities and shared models for OCR, text matching,
 rubric-based scoring, and question alignment.
 """
 
-from sentence_transformers import SentenceTransformer
-from transformers import TrOCRProcessor, VisionEncoderDecoderModel
-import torch
+from .model_registry import (
+    get_trocr,
+    get_embedding_model,
+    get_device,
+    warm_up_models,
+    model_memory_report,
+)
 
-# === Embedding Model for Text Matching ===
-embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
+# === Shared models (loaded lazily through the model registry) ===
+# `embedding_model`, `ocr_processor`, `ocr_model` and `device` are resolved on
+# first attribute access so importing this package never loads TrOCR or SBERT.
+_LAZY_MODELS = {
+    "embedding_model": lambda: get_embedding_model(),
+    "ocr_processor": lambda: get_trocr()[0],
+    "ocr_model": lambda: get_trocr()[1],
+    "device": lambda: get_device(),
+}
 
-# === TrOCR Model for OCR ===
-ocr_processor = TrOCRProcessor.from_pretrained("microsoft/trocr-base-handwritten")
-ocr_model = VisionEncoderDecoderModel.from_pretrained(
-    "microsoft/trocr-base-handwritten"
-)
 
-# Use GPU if available
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-ocr_model.to(device)
-embedding_model.to(device)  # Optional – SBERT works on CPU too
+def __getattr__(name):
+    if name in _LAZY_MODELS:
+        return _LAZY_MODELS[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # === Import utility functions and classes from submodules ===
 from .gpt_explainer import generate_explanation
@@ -37,6 +43,11 @@ __all__ = [
     "ocr_model",
     "ocr_processor",
     "device",
+    "get_trocr",
+    "get_embedding_model",
+    "get_device",
+    "warm_up_models",
+    "model_memory_report",
     "generate_explanation",
     "generate_socratic_prompt",
     "build_reasoning_trace",
@@ -0,0 +1,203 @@
+"""
+smartscripts/ai/class_list_cache.py
+-----------------------------------
+One parsed, normalized and indexed copy of each class-list file.
+
+Every class-list reader (text_matching.load_class_list, csv_helpers.read_class_list,
+the OCR and matching tasks) goes through `get_class_list(path)`. Entries are keyed by
+the SHA-1 of the file's bytes, so an edited roster is re-parsed and an unchanged one is
+not: a lookup hits process memory first, then a pickle under CLASS_LIST_CACHE_DIR, and
+only then parses the file. A (path, size, mtime) shortcut skips re-hashing a file that
+has not changed since the last lookup.
+"""
+
+import os
+import csv
+import io
+import pickle
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from smartscripts.ai.text_matching import ClassListIndex, get_class_list_index
+
+logger = logging.getLogger(__name__)
+
+CLASS_LIST_CACHE_DIR = Path(
+    os.getenv("CLASS_LIST_CACHE_DIR", Path(__file__).resolve().parents[2] / "instance" / "class_lists")
+)
+CLASS_LIST_CACHE_SIZE = int(os.getenv("CLASS_LIST_CACHE_SIZE", "16"))
+# Bump when parsing or normalization changes so stored pickles are ignored
+CLASS_LIST_FORMAT = 1
+
+ID_FIELDS = ["student_id", "student id", "id", "reg_no", "regno", "registration_number"]
+NAME_FIELDS = ["student_name", "name", "full_name", "student"]
+
+
+# ---------------------------
+# Parsing
+# ---------------------------
+
+def parse_class_list(data: bytes, suffix: str = ".csv",
+                     id_fields: Optional[List[str]] = None,
+                     name_fields: Optional[List[str]] = None) -> List[Dict[str, str]]:
+    """
+    Rows {"student_id", "student_name", ...other CSV columns} from a class-list file's bytes.
+    CSV headers are matched case-insensitively against the candidate lists (falling back
+    to the first two columns); TXT files hold one "name,student_id" per line.
+    """
+    text = data.decode("utf-8-sig", errors="replace")
+    students: List[Dict[str, str]] = []
+
+    if suffix.lower() == ".txt":
+        for line in text.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            name, _, student_id = line.partition(",")
+            students.append({"student_id": student_id.strip(), "student_name": name.strip()})
+        return students
+
+    id_fields = id_fields or ID_FIELDS
+    name_fields = name_fields or NAME_FIELDS
+    reader = csv.DictReader(io.StringIO(text, newline=""))
+    fieldnames = reader.fieldnames or []
+
+    id_field = next((h for h in fieldnames if h.strip().lower() in id_fields), None)
+    name_field = next((h for h in fieldnames if h.strip().lower() in name_fields and h != id_field), None)
+    if id_field is None and fieldnames:
+        id_field = fieldnames[0]
+    if name_field is None:
+        name_field = fieldnames[1] if len(fieldnames) > 1 else id_field
+
+    for row in reader:
+        student_id = (row.get(id_field) or "").strip()
+        student_name = (row.get(name_field) or "").strip()
+        if not student_id and not student_name:
+            continue
+        students.append({
+            "student_id": student_id,
+            "student_name": student_name,
+            **{k: (v or "") for k, v in row.items() if k not in (id_field, name_field) and k is not None},
+        })
+    return students
+
+
+def content_digest(data: bytes, suffix: str = ".csv") -> str:
+    digest = hashlib.sha1(f"{CLASS_LIST_FORMAT}:{suffix.lower()}:".encode())
+    digest.update(data)
+    return digest.hexdigest()
+
+
+# ---------------------------
+# Cached roster
+# ---------------------------
+
+class ClassList:
+    """A parsed roster and its matching index."""
+
+    def __init__(self, digest: str, students: List[Dict[str, str]],
+                 index: Optional[ClassListIndex] = None) -> None:
+        self.digest = digest
+        self.students = students
+        self.index = index or ClassListIndex(students)
+
+    def __len__(self) -> int:
+        return len(self.students)
+
+    @property
+    def ids(self) -> List[str]:
+        return self.index.ids
+
+    @property
+    def names(self) -> List[str]:
+        return self.index.names
+
+
+_memory: "OrderedDict[str, ClassList]" = OrderedDict()
+_stat_digests: Dict[Tuple[str, int, int], str] = {}
+_lock = threading.Lock()
+
+
+def _pickle_path(digest: str) -> Path:
+    return CLASS_LIST_CACHE_DIR / f"{digest}.pkl"
+
+
+def _load_pickle(digest: str) -> Optional[ClassList]:
+    try:
+        with open(_pickle_path(digest), "rb") as fh:
+            payload = pickle.load(fh)
+        if payload.get("format") != CLASS_LIST_FORMAT:
+            return None
+        return ClassList(digest, payload["students"], payload["index"])
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning("Ignoring unreadable class list cache %s: %s", digest, e)
+        return None
+
+
+def _save_pickle(roster: ClassList) -> None:
+    try:
+        CLASS_LIST_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = _pickle_path(roster.digest).with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "wb") as fh:
+            pickle.dump({"format": CLASS_LIST_FORMAT, "students": roster.students, "index": roster.index}, fh,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        tmp.replace(_pickle_path(roster.digest))
+    except Exception as e:
+        logger.warning("Could not store class list cache %s: %s", roster.digest, e)
+
+
+def _remember(stat_key: Tuple[str, int, int], roster: ClassList) -> ClassList:
+    # Share the index with text_matching callers that pass the same roster as a list
+    roster.index = get_class_list_index(roster.students, prepared=roster.index)
+    with _lock:
+        if len(_stat_digests) > 4 * CLASS_LIST_CACHE_SIZE:
+            _stat_digests.clear()
+        _stat_digests[stat_key] = roster.digest
+        _memory[roster.digest] = roster
+        _memory.move_to_end(roster.digest)
+        while len(_memory) > CLASS_LIST_CACHE_SIZE:
+            _memory.popitem(last=False)
+    return roster
+
+
+def get_class_list(path: Union[str, Path]) -> ClassList:
+    """The parsed roster for a class-list file (empty when the file is missing)."""
+    path = Path(path)
+    try:
+        stat = path.stat()
+    except OSError:
+        logger.warning("Class list file does not exist: %s", path)
+        return ClassList("", [])
+    stat_key = (str(path.resolve()), stat.st_size, stat.st_mtime_ns)
+
+    with _lock:
+        digest = _stat_digests.get(stat_key)
+        roster = _memory.get(digest) if digest else None
+        if roster is not None:
+            _memory.move_to_end(digest)
+            return roster
+
+    data = path.read_bytes()
+    digest = content_digest(data, path.suffix)
+    with _lock:
+        roster = _memory.get(digest)
+    if roster is None:
+        roster = _load_pickle(digest)
+    if roster is None:
+        roster = ClassList(digest, parse_class_list(data, path.suffix))
+        _save_pickle(roster)
+        logger.info("Parsed class list %s (%d students)", path, len(roster))
+    return _remember(stat_key, roster)
+
+
+def clear_memory() -> None:
+    """Drop the in-process entries (the pickles stay)."""
+    with _lock:
+        _memory.clear()
+        _stat_digests.clear()
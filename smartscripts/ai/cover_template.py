@@ -0,0 +1,262 @@
+"""
+smartscripts/ai/cover_template.py
+
+Responsibilities:
+- Register the blank cover page of a test as a template with its name / ID boxes
+- Align each detected front page to that template (ORB features + RANSAC homography)
+- Map the template's boxes onto the page so only those crops are rendered and OCR'd
+
+Templates live under COVER_TEMPLATE_DIR/<test_id>/ (template.png + fields.json).
+Pages that cannot be aligned fall back to whole-header OCR in the callers.
+"""
+
+import os
+import re
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+COVER_TEMPLATE_DIR = Path(
+    os.getenv("COVER_TEMPLATE_DIR", Path(__file__).resolve().parents[2] / "instance" / "cover_templates")
+)
+# Template and page are both resampled to this width before matching
+ALIGN_WIDTH = 600
+ORB_FEATURES = 1500
+MIN_INLIERS = int(os.getenv("COVER_TEMPLATE_MIN_INLIERS", "15"))
+# Extra margin around each mapped box, as a fraction of the page size
+FIELD_PADDING = 0.01
+
+# (x0, y0, x1, y1) as fractions of the page width / height
+Region = Tuple[float, float, float, float]
+FIELDS = ("name", "student_id")
+# Printed labels searched for when a template is registered without explicit boxes
+FIELD_LABELS = {
+    "name": ["student name", "name"],
+    "student_id": ["student id", "student number", "id number", "id"],
+}
+
+
+def _gray(image: Union[Image.Image, np.ndarray]) -> np.ndarray:
+    if isinstance(image, Image.Image):
+        return np.asarray(image.convert("L"))
+    return cv2.cvtColor(image, cv2.COLOR_RGB2GRAY) if image.ndim == 3 else image
+
+
+def _resize_to_width(gray: np.ndarray, width: int = ALIGN_WIDTH) -> np.ndarray:
+    h, w = gray.shape[:2]
+    return cv2.resize(gray, (width, max(1, round(h * width / w))), interpolation=cv2.INTER_AREA)
+
+
+# ---------------------------
+# Template
+# ---------------------------
+
+class CoverTemplate:
+    """Blank cover page (grayscale, ALIGN_WIDTH wide) plus page-relative field boxes."""
+
+    def __init__(self, image: np.ndarray, fields: Dict[str, Region], test_id: Optional[int] = None) -> None:
+        self.image = _resize_to_width(_gray(image))
+        self.fields = {name: tuple(float(v) for v in region) for name, region in fields.items()}
+        self.test_id = test_id
+        self._features: Optional[Tuple[List[cv2.KeyPoint], Optional[np.ndarray]]] = None
+
+    @property
+    def features(self) -> Tuple[List[cv2.KeyPoint], Optional[np.ndarray]]:
+        if self._features is None:
+            self._features = cv2.ORB_create(ORB_FEATURES).detectAndCompute(self.image, None)
+        return self._features
+
+    def save(self, directory: Union[str, Path]) -> Path:
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        cv2.imwrite(str(directory / "template.png"), self.image)
+        (directory / "fields.json").write_text(json.dumps({"test_id": self.test_id, "fields": self.fields}, indent=2))
+        return directory
+
+    @classmethod
+    def load(cls, directory: Union[str, Path]) -> "CoverTemplate":
+        directory = Path(directory)
+        image = cv2.imread(str(directory / "template.png"), cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            raise FileNotFoundError(directory / "template.png")
+        meta = json.loads((directory / "fields.json").read_text())
+        return cls(image, meta["fields"], meta.get("test_id"))
+
+
+def locate_fields(image: Union[Image.Image, np.ndarray]) -> Dict[str, Region]:
+    """
+    Find the name / ID boxes on a blank cover page from its printed labels: the box is
+    the band right of the label, one label height above and below it.
+    """
+    from smartscripts.ai.page_layout import get_page_layout
+
+    gray = _gray(image)
+    height, width = gray.shape[:2]
+    layout = get_page_layout(gray)
+    fields: Dict[str, Region] = {}
+    for field, labels in FIELD_LABELS.items():
+        for label in labels:
+            bbox = layout.find_bbox(label)
+            if bbox is None:
+                continue
+            x0 = (bbox["x"] + bbox["w"]) / width
+            y0 = max(0.0, (bbox["y"] - bbox["h"]) / height)
+            y1 = min(1.0, (bbox["y"] + 2 * bbox["h"]) / height)
+            fields[field] = (x0, y0, 0.97, y1)
+            break
+    return fields
+
+
+def template_dir(test_id: int) -> Path:
+    return COVER_TEMPLATE_DIR / str(test_id)
+
+
+def register_cover_template(
+    test_id: int, image: Union[Image.Image, np.ndarray], fields: Optional[Dict[str, Region]] = None
+) -> CoverTemplate:
+    """
+    Store `image` (a blank cover page, ideally at OCR resolution) as the test's template.
+    Missing field boxes are located from the printed labels.
+    """
+    fields = dict(fields or {})
+    missing = [f for f in FIELDS if f not in fields]
+    if missing:
+        located = locate_fields(image)
+        fields.update({f: located[f] for f in missing if f in located})
+    if not fields:
+        raise ValueError("No name / ID boxes given and none could be located on the template")
+
+    template = CoverTemplate(_gray(image), fields, test_id)
+    if len(template.features[0]) < MIN_INLIERS:
+        raise ValueError("Template has too little printed structure to align pages against")
+    template.save(template_dir(test_id))
+    with _templates_lock:
+        _templates.pop(test_id, None)
+    return template
+
+
+_templates: Dict[int, Tuple[float, CoverTemplate]] = {}
+_templates_lock = threading.Lock()
+
+
+def get_cover_template(test_id: Optional[int]) -> Optional[CoverTemplate]:
+    """Registered template for a test (reloaded when it changes), or None."""
+    if test_id is None:
+        return None
+    path = template_dir(test_id) / "fields.json"
+    try:
+        mtime = path.stat().st_mtime
+    except OSError:
+        return None
+    with _templates_lock:
+        cached = _templates.get(test_id)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        try:
+            template = CoverTemplate.load(path.parent)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Ignoring cover template for test %s: %s", test_id, e)
+            return None
+        _templates[test_id] = (mtime, template)
+        return template
+
+
+# ---------------------------
+# Alignment
+# ---------------------------
+
+def align_page(page: Union[Image.Image, np.ndarray], template: CoverTemplate) -> Optional[Dict[str, Any]]:
+    """
+    Homography from template pixels to page pixels (both at ALIGN_WIDTH), or None when
+    the page does not match the template well enough. Any page resolution works; the
+    low-dpi grayscale layout level is enough.
+    """
+    page_gray = _resize_to_width(_gray(page))
+    t_keypoints, t_descriptors = template.features
+    p_keypoints, p_descriptors = cv2.ORB_create(ORB_FEATURES).detectAndCompute(page_gray, None)
+    if t_descriptors is None or p_descriptors is None or len(p_keypoints) < MIN_INLIERS:
+        return None
+
+    pairs = cv2.BFMatcher(cv2.NORM_HAMMING).knnMatch(t_descriptors, p_descriptors, k=2)
+    good = [m[0] for m in pairs if len(m) == 2 and m[0].distance < 0.75 * m[1].distance]
+    if len(good) < MIN_INLIERS:
+        return None
+
+    src = np.float32([t_keypoints[m.queryIdx].pt for m in good]).reshape(-1, 1, 2)
+    dst = np.float32([p_keypoints[m.trainIdx].pt for m in good]).reshape(-1, 1, 2)
+    homography, mask = cv2.findHomography(src, dst, cv2.RANSAC, 5.0)
+    inliers = int(mask.sum()) if mask is not None else 0
+    if homography is None or inliers < MIN_INLIERS:
+        return None
+    return {"homography": homography, "inliers": inliers, "page_size": page_gray.shape[::-1]}
+
+
+def field_regions(page: Union[Image.Image, np.ndarray], template: CoverTemplate) -> Optional[Dict[str, Region]]:
+    """Template field boxes mapped onto the page, as page-relative regions (None if unaligned)."""
+    alignment = align_page(page, template)
+    if alignment is None:
+        return None
+    t_height, t_width = template.image.shape
+    p_width, p_height = alignment["page_size"]
+
+    regions: Dict[str, Region] = {}
+    for field, (x0, y0, x1, y1) in template.fields.items():
+        corners = np.float32([
+            [x0 * t_width, y0 * t_height], [x1 * t_width, y0 * t_height],
+            [x1 * t_width, y1 * t_height], [x0 * t_width, y1 * t_height],
+        ]).reshape(-1, 1, 2)
+        mapped = cv2.perspectiveTransform(corners, alignment["homography"]).reshape(-1, 2)
+        rx0, ry0 = mapped.min(axis=0) / (p_width, p_height) - FIELD_PADDING
+        rx1, ry1 = mapped.max(axis=0) / (p_width, p_height) + FIELD_PADDING
+        rx0, ry0, rx1, ry1 = (float(np.clip(v, 0.0, 1.0)) for v in (rx0, ry0, rx1, ry1))
+        if rx1 - rx0 > 0.01 and ry1 - ry0 > 0.005:
+            regions[field] = (rx0, ry0, rx1, ry1)
+    return regions or None
+
+
+def pyramid_field_crops(page: Any, template: CoverTemplate) -> Optional[Dict[str, Image.Image]]:
+    """
+    Align a PagePyramid on its layout level and render only the mapped field boxes at
+    OCR resolution. None when the page does not align.
+    """
+    from smartscripts.utils.page_pyramid import LAYOUT, FULL
+
+    regions = field_regions(page.array(LAYOUT), template)
+    if regions is None:
+        return None
+    return {field: page.get(FULL.crop_of(region)) for field, region in regions.items()}
+
+
+def image_field_crops(image: Image.Image, template: CoverTemplate) -> Optional[Dict[str, Image.Image]]:
+    """Field crops cut from an already-rendered page image. None when the page does not align."""
+    regions = field_regions(image, template)
+    if regions is None:
+        return None
+    w, h = image.size
+    return {
+        field: image.crop((int(x0 * w), int(y0 * h), int(x1 * w), int(y1 * h)))
+        for field, (x0, y0, x1, y1) in regions.items()
+    }
+
+
+# ---------------------------
+# Field text
+# ---------------------------
+
+_LABEL_PREFIX = re.compile(r"^\s*(?:student\s*)?(?:name|id|number|no\.?)(?:\s*[:.\-]\s*|\s+)", re.I)
+
+
+def clean_field_text(field: str, text: str) -> str:
+    """Strip a label the crop may have caught, and keep only ID-like characters for IDs."""
+    text = _LABEL_PREFIX.sub("", (text or "").strip())
+    if field == "student_id":
+        return re.sub(r"[^A-Za-z0-9\-/]", "", text)
+    return " ".join(re.sub(r"[^A-Za-z\-' ]", " ", text).split())
@@ -0,0 +1,245 @@
+"""
+smartscripts/ai/front_page_classifier.py
+
+Responsibilities:
+- Small scikit-learn model over the cheap page features of ai.front_page_detector
+- Trained from reviewer-confirmed PageReview.is_front_page labels (`flask models train-front-page`)
+- Decide front pages from the model alone, sending only unsure pages to the OCR-based
+  layout_detection.score_front_page
+
+Without a trained model file, the detector's rule-based score takes the model's place.
+"""
+
+import os
+import time
+import logging
+import threading
+from itertools import islice
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from smartscripts.ai.front_page_detector import FEATURE_NAMES, FRONT_PAGE_THRESHOLD, front_page_scores
+
+logger = logging.getLogger(__name__)
+
+FRONT_PAGE_MODEL_PATH = Path(
+    os.getenv("FRONT_PAGE_MODEL_PATH", Path(__file__).resolve().parents[2] / "instance" / "front_page_classifier.joblib")
+)
+# Pages whose probability is within this distance of the threshold are re-checked with OCR (0 disables)
+FRONT_PAGE_UNSURE_MARGIN = float(os.getenv("FRONT_PAGE_UNSURE_MARGIN", "0.15"))
+# score_front_page threshold used for the OCR re-check
+OCR_FRONT_PAGE_THRESHOLD = 0.5
+# Unsure pages rendered (at OCR resolution) and OCR'd together; bounds peak memory
+OCR_CHECK_BATCH_SIZE = int(os.getenv("OCR_CHECK_BATCH_SIZE", "8"))
+
+
+# ---------------------------
+# Model
+# ---------------------------
+
+class FrontPageClassifier:
+    """Standardised logistic regression on FEATURE_NAMES, with training metadata."""
+
+    def __init__(self, model=None, meta: Optional[Dict[str, Any]] = None) -> None:
+        self.model = model
+        self.meta = meta or {}
+
+    @staticmethod
+    def _new_model():
+        from sklearn.pipeline import make_pipeline
+        from sklearn.preprocessing import StandardScaler
+        from sklearn.linear_model import LogisticRegression
+
+        return make_pipeline(StandardScaler(), LogisticRegression(class_weight="balanced", max_iter=1000))
+
+    def fit(self, features: np.ndarray, labels: Sequence[bool]) -> "FrontPageClassifier":
+        labels = np.asarray(labels, dtype=int)
+        if features.shape[0] != labels.shape[0]:
+            raise ValueError("features and labels differ in length")
+        if len(set(labels.tolist())) < 2:
+            raise ValueError("Training needs both front pages and other pages")
+
+        self.model = self._new_model()
+        cv_accuracy = None
+        if min(np.bincount(labels)) >= 5:
+            from sklearn.model_selection import cross_val_score
+
+            cv_accuracy = round(float(cross_val_score(self._new_model(), features, labels, cv=5).mean()), 4)
+        self.model.fit(features, labels)
+        self.meta = {
+            "feature_names": list(FEATURE_NAMES),
+            "samples": int(labels.shape[0]),
+            "front_pages": int(labels.sum()),
+            "cv_accuracy": cv_accuracy,
+            "trained_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        return self
+
+    def predict_proba(self, features: np.ndarray) -> np.ndarray:
+        """Probability that each page is a cover sheet."""
+        if features.shape[0] == 0:
+            return np.zeros(0, dtype=np.float32)
+        return self.model.predict_proba(features)[:, 1].astype(np.float32)
+
+    def save(self, path: Optional[Path] = None) -> Path:
+        import joblib
+
+        path = Path(path or FRONT_PAGE_MODEL_PATH)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        joblib.dump({"model": self.model, "meta": self.meta}, path)
+        return path
+
+    @classmethod
+    def load(cls, path: Optional[Path] = None) -> "FrontPageClassifier":
+        import joblib
+
+        payload = joblib.load(Path(path or FRONT_PAGE_MODEL_PATH))
+        if payload["meta"].get("feature_names") != FEATURE_NAMES:
+            raise ValueError("Front-page model was trained on a different feature set; retrain it")
+        return cls(payload["model"], payload["meta"])
+
+
+_classifier: Optional[FrontPageClassifier] = None
+_classifier_mtime: Optional[float] = None
+_classifier_lock = threading.Lock()
+
+
+def get_front_page_classifier() -> Optional[FrontPageClassifier]:
+    """Process-wide trained model (reloaded when the file changes), or None when there is none."""
+    global _classifier, _classifier_mtime
+    try:
+        mtime = FRONT_PAGE_MODEL_PATH.stat().st_mtime
+    except OSError:
+        return None
+    with _classifier_lock:
+        if _classifier is None or mtime != _classifier_mtime:
+            try:
+                _classifier = FrontPageClassifier.load(FRONT_PAGE_MODEL_PATH)
+            except Exception as e:
+                logger.warning("Ignoring front-page model %s: %s", FRONT_PAGE_MODEL_PATH, e)
+                _classifier = None
+            _classifier_mtime = mtime
+    return _classifier
+
+
+# ---------------------------
+# Decisions
+# ---------------------------
+
+def front_page_probabilities(features: np.ndarray) -> np.ndarray:
+    """Trained-model probability per page, or the rule-based score when no model is available."""
+    classifier = get_front_page_classifier()
+    if classifier is None:
+        return front_page_scores(features)
+    return classifier.predict_proba(features)
+
+
+def unsure_pages(probabilities: np.ndarray, threshold: Optional[float] = None,
+                 margin: Optional[float] = None) -> List[int]:
+    threshold = FRONT_PAGE_THRESHOLD if threshold is None else threshold
+    margin = FRONT_PAGE_UNSURE_MARGIN if margin is None else margin
+    return np.flatnonzero(np.abs(probabilities - threshold) < margin).tolist()
+
+
+def ocr_front_page_votes(pages: Iterable[Any], batch_size: Optional[int] = None) -> List[Optional[bool]]:
+    """
+    OCR-based cover-sheet test (TrOCR + keywords + form lines) for PIL pages or arrays,
+    consumed and OCR'd `batch_size` pages at a time. Missing (None) pages get no vote.
+    """
+    import cv2
+    from PIL import Image
+    from smartscripts.analytics.layout_detection import run_trocr_batch, score_front_page
+
+    pages = iter(pages)
+    votes: List[Optional[bool]] = []
+    while True:
+        batch = list(islice(pages, batch_size or OCR_CHECK_BATCH_SIZE))
+        if not batch:
+            return votes
+        bgr = [
+            None if page is None else cv2.cvtColor(
+                np.asarray((page if isinstance(page, Image.Image) else Image.fromarray(page)).convert("RGB")),
+                cv2.COLOR_RGB2BGR,
+            )
+            for page in batch
+        ]
+        del batch
+        readable = [img for img in bgr if img is not None]
+        texts = iter(run_trocr_batch(readable)) if readable else iter(())
+        votes.extend(
+            None if img is None else score_front_page(img, ocr_text=next(texts))[0] >= OCR_FRONT_PAGE_THRESHOLD
+            for img in bgr
+        )
+
+
+def decide_front_pages(
+    features: np.ndarray,
+    render_page: Optional[Callable[[List[int]], Sequence[Any]]] = None,
+    threshold: Optional[float] = None,
+    margin: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Front-page decision for every page. `render_page(indices)` returns OCR-resolution
+    images (None for an unreadable page) for the unsure pages; it is called with
+    OCR_CHECK_BATCH_SIZE pages at a time, and each batch is released once voted on.
+    Without it (or with margin 0) the model decides alone, as it does for pages that
+    could not be rendered.
+
+    Returns {"front_pages", "probabilities", "ocr_checked"}.
+    """
+    threshold = FRONT_PAGE_THRESHOLD if threshold is None else threshold
+    probabilities = front_page_probabilities(features)
+    decisions = probabilities >= threshold
+
+    checked = unsure_pages(probabilities, threshold, margin) if render_page is not None else []
+    if checked:
+        logger.info("Re-checking %d of %d unsure pages with OCR", len(checked), len(probabilities))
+        for start in range(0, len(checked), OCR_CHECK_BATCH_SIZE):
+            batch = checked[start:start + OCR_CHECK_BATCH_SIZE]
+            for index, vote in zip(batch, ocr_front_page_votes(render_page(batch))):
+                if vote is not None:
+                    decisions[index] = vote
+
+    return {
+        "front_pages": np.flatnonzero(decisions).tolist(),
+        "probabilities": probabilities,
+        "ocr_checked": checked,
+    }
+
+
+# ---------------------------
+# Training
+# ---------------------------
+
+def training_set(labelled_pdfs: Dict[str, Dict[int, bool]]) -> Dict[str, np.ndarray]:
+    """
+    Features + labels from {pdf_path: {page_index (0-based): is_front_page}}.
+    Unreadable PDFs and out-of-range page numbers are skipped.
+    """
+    from smartscripts.ai.front_page_detector import pdf_page_features
+
+    rows, labels = [], []
+    for pdf_path, pages in labelled_pdfs.items():
+        try:
+            features = pdf_page_features(pdf_path)
+        except Exception as e:
+            logger.warning("Skipping %s for front-page training: %s", pdf_path, e)
+            continue
+        for index, label in pages.items():
+            if 0 <= index < features.shape[0]:
+                rows.append(features[index])
+                labels.append(bool(label))
+    if not rows:
+        return {"features": np.zeros((0, len(FEATURE_NAMES)), dtype=np.float32), "labels": np.zeros(0, dtype=bool)}
+    return {"features": np.stack(rows), "labels": np.asarray(labels)}
+
+
+def train_front_page_classifier(labelled_pdfs: Dict[str, Dict[int, bool]],
+                                path: Optional[Path] = None) -> Dict[str, Any]:
+    """Fit on labelled pages, save the model and return its metadata."""
+    data = training_set(labelled_pdfs)
+    classifier = FrontPageClassifier().fit(data["features"], data["labels"])
+    saved = classifier.save(path)
+    return dict(classifier.meta, path=str(saved))
@@ -0,0 +1,254 @@
+"""
+smartscripts/ai/front_page_detector.py
+
+Responsibilities:
+- Decide which pages of a combined upload are student cover sheets, without OCR
+- Work on stacks of small grayscale pages: every feature is one NumPy reduction
+  over the whole stack instead of a per-page contour search
+- Fan long PDFs out over a process pool, each worker rendering its own page range
+
+Features (FEATURE_NAMES) feed the learned classifier in ai.front_page_classifier; the
+rule-based `front_page_scores` stands in until a model has been trained.
+"""
+
+import os
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Sequence, Tuple, Union
+
+import cv2
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Every page is resampled to this (width, height) before features are computed (A4 aspect)
+STACK_SIZE = (256, 362)
+FRONT_PAGE_THRESHOLD = float(os.getenv("FRONT_PAGE_THRESHOLD", "0.5"))
+# Use a process pool only above this many pages; each worker scores at least this many
+FRONT_PAGE_POOL_MIN_PAGES = int(os.getenv("FRONT_PAGE_POOL_MIN_PAGES", "120"))
+FRONT_PAGE_WORKERS = int(os.getenv("FRONT_PAGE_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+# Pages rendered and stacked at once inside one worker
+STACK_CHUNK = 64
+
+FEATURE_NAMES = [
+    "ink_ratio",          # share of dark pixels
+    "top_ink_share",      # share of the ink in the top third
+    "h_line_density",     # rows crossed by a long horizontal stroke
+    "v_line_density",     # columns crossed by a long vertical stroke
+    "box_score",          # both directions present → ruled boxes / tables
+    "text_row_density",   # rows with some ink but no ruling line
+    "ink_bbox_fill",      # ink share inside the bounding box of all ink
+]
+
+
+# ---------------------------
+# Stacks
+# ---------------------------
+
+def _to_gray_array(page: Union[Image.Image, np.ndarray, None]) -> np.ndarray:
+    if page is None:  # unreadable page → blank
+        return np.full((STACK_SIZE[1], STACK_SIZE[0]), 255, dtype=np.uint8)
+    if isinstance(page, Image.Image):
+        return np.asarray(page.convert("L"))
+    if page.ndim == 3:
+        return cv2.cvtColor(page, cv2.COLOR_RGB2GRAY)
+    return page
+
+
+def page_stack(pages: Sequence[Union[Image.Image, np.ndarray]]) -> np.ndarray:
+    """(N, H, W) uint8 stack of pages resampled to STACK_SIZE."""
+    if not pages:
+        return np.zeros((0, STACK_SIZE[1], STACK_SIZE[0]), dtype=np.uint8)
+    return np.stack([
+        cv2.resize(_to_gray_array(p), STACK_SIZE, interpolation=cv2.INTER_AREA) for p in pages
+    ])
+
+
+# ---------------------------
+# Features + score
+# ---------------------------
+
+def _has_run(ink: np.ndarray, length: int, axis: int) -> np.ndarray:
+    """True where a run of at least `length` ink pixels along `axis` starts (cumsum windows)."""
+    csum = np.cumsum(ink, axis=axis, dtype=np.int32)
+    pad = [(0, 0)] * ink.ndim
+    pad[axis] = (1, 0)
+    csum = np.pad(csum, pad)
+    upper = np.take(csum, np.arange(length, csum.shape[axis]), axis=axis)
+    lower = np.take(csum, np.arange(0, csum.shape[axis] - length), axis=axis)
+    return (upper - lower) >= length
+
+
+def page_features(
+    stack: np.ndarray, h_line_fraction: float = 0.25, v_line_fraction: float = 0.04
+) -> np.ndarray:
+    """
+    (N, len(FEATURE_NAMES)) float32 features for a page stack, computed for all pages at once.
+    A ruling line is an unbroken ink run of at least the given fraction of the page width
+    (horizontal) or height (vertical).
+    """
+    n, height, width = stack.shape
+    if n == 0:
+        return np.zeros((0, len(FEATURE_NAMES)), dtype=np.float32)
+
+    # Paper level per page (robust to grey scans), ink = clearly darker than paper
+    paper = np.percentile(stack.reshape(n, -1), 90, axis=1).reshape(n, 1, 1)
+    ink = stack < (paper - 40)
+
+    ink_count = ink.sum(axis=(1, 2)).astype(np.float32)
+    ink_ratio = ink_count / (height * width)
+    top_ink_share = ink[:, : height // 3].sum(axis=(1, 2)) / np.maximum(ink_count, 1.0)
+
+    h_rows = _has_run(ink, max(2, int(width * h_line_fraction)), axis=2).any(axis=2)
+    v_cols = _has_run(ink, max(2, int(height * v_line_fraction)), axis=1).any(axis=1)
+    h_line_density = h_rows.mean(axis=1)
+    v_line_density = v_cols.mean(axis=1)
+    box_score = np.clip(h_line_density * 50, 0, 1) * np.clip(v_line_density * 50, 0, 1)
+    row_frac = ink.mean(axis=2)
+    text_row_density = ((row_frac > 0.01) & ~h_rows).mean(axis=1)
+
+    rows_any, cols_any = ink.any(axis=2), ink.any(axis=1)
+    bbox_h = np.where(rows_any.any(axis=1),
+                      height - rows_any[:, ::-1].argmax(axis=1) - rows_any.argmax(axis=1), 0)
+    bbox_w = np.where(cols_any.any(axis=1),
+                      width - cols_any[:, ::-1].argmax(axis=1) - cols_any.argmax(axis=1), 0)
+    ink_bbox_fill = ink_count / np.maximum(bbox_h * bbox_w, 1)
+
+    return np.stack([
+        ink_ratio, top_ink_share, h_line_density, v_line_density,
+        box_score, text_row_density, ink_bbox_fill,
+    ], axis=1).astype(np.float32)
+
+
+def front_page_scores(features: np.ndarray) -> np.ndarray:
+    """
+    Rule-based cover-sheet score in [0, 1]: ruled boxes, sparse ink overall,
+    and ink concentrated near the top (name / ID header).
+    """
+    if features.shape[0] == 0:
+        return np.zeros(0, dtype=np.float32)
+    ink_ratio, top_share, box_score = features[:, 0], features[:, 1], features[:, 4]
+    sparse = 1.0 - np.clip(ink_ratio / 0.12, 0, 1)
+    top = np.clip(top_share * 1.5, 0, 1)
+    has_ink = (ink_ratio > 0.002).astype(np.float32)
+    return (has_ink * (0.5 * box_score + 0.25 * sparse + 0.25 * top)).astype(np.float32)
+
+
+def score_pages(pages: Sequence[Union[Image.Image, np.ndarray]]) -> np.ndarray:
+    """Cover-sheet score for each page (any resolution; low-dpi grayscale is enough)."""
+    return front_page_scores(page_features(page_stack(pages)))
+
+
+def detect_front_pages(
+    pages: Sequence[Union[Image.Image, np.ndarray]], threshold: Optional[float] = None,
+    ocr_fallback: bool = True,
+) -> List[int]:
+    """
+    Indices (into `pages`) of cover sheets; unsure pages are re-checked with OCR unless
+    `ocr_fallback` is off.
+    """
+    from smartscripts.ai.front_page_classifier import decide_front_pages
+
+    render = (lambda indices: [pages[i] for i in indices]) if ocr_fallback else None
+    return decide_front_pages(page_features(page_stack(pages)), render, threshold)["front_pages"]
+
+
+# ---------------------------
+# Whole PDFs
+# ---------------------------
+
+def _pdf_range_features(pdf_path: str, start: int, stop: int) -> np.ndarray:
+    """Worker: render pages [start, stop) at the layout level and return their features."""
+    from smartscripts.utils.page_pyramid import iter_page_pyramids, LAYOUT
+
+    chunks, pending = [], []
+    for page in iter_page_pyramids(pdf_path, start=start, stop=stop):
+        pending.append(page.array(LAYOUT))
+        if len(pending) == STACK_CHUNK:
+            chunks.append(page_features(page_stack(pending)))
+            pending = []
+    if pending:
+        chunks.append(page_features(page_stack(pending)))
+    return np.concatenate(chunks) if chunks else np.zeros((0, len(FEATURE_NAMES)), dtype=np.float32)
+
+
+def pdf_page_features(pdf_path: str, workers: Optional[int] = None) -> np.ndarray:
+    """
+    Features for every page of a PDF. Long documents are split into contiguous page
+    ranges scored in parallel processes (not from inside daemonic workers, e.g. Celery
+    prefork children, which cannot start subprocesses).
+    """
+    from smartscripts.utils.pdf_helpers import pdf_page_count
+
+    total = pdf_page_count(pdf_path)
+    workers = max(1, workers or FRONT_PAGE_WORKERS)
+    can_fork = not multiprocessing.current_process().daemon
+    if total < FRONT_PAGE_POOL_MIN_PAGES or workers == 1 or not can_fork:
+        return _pdf_range_features(str(pdf_path), 0, total)
+
+    span = max(FRONT_PAGE_POOL_MIN_PAGES // 2, -(-total // workers))
+    ranges = [(start, min(start + span, total)) for start in range(0, total, span)]
+    logger.info("Scoring %d pages for front-page detection across %d processes", total, len(ranges))
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as pool:
+        parts = pool.map(_pdf_range_features, [str(pdf_path)] * len(ranges), *zip(*ranges))
+        return np.concatenate(list(parts))
+
+
+def _render_full_pages(pdf_path: str, indices: List[int]) -> Iterator[Image.Image]:
+    """Full-resolution renders of `indices`, one page at a time (the caller batches them)."""
+    from smartscripts.utils.page_pyramid import iter_page_pyramids, FULL
+
+    if not indices:
+        return
+    wanted = set(indices)
+    for page in iter_page_pyramids(pdf_path, start=min(indices), stop=max(indices) + 1):
+        if page.index in wanted:
+            yield page.get(FULL)
+
+
+def detect_front_pages_in_range(
+    pdf_path: str, start: int, stop: int, threshold: Optional[float] = None,
+    ocr_fallback: bool = True,
+) -> Tuple[List[int], np.ndarray]:
+    """
+    `detect_front_pages_in_pdf` for pages [start, stop) only, in this process (one chunk of
+    a fanned-out pipeline). Indices are page numbers in the whole document.
+    """
+    from smartscripts.ai.front_page_classifier import decide_front_pages
+
+    def render(indices):
+        return _render_full_pages(str(pdf_path), [start + i for i in indices])
+
+    features = _pdf_range_features(str(pdf_path), start, stop)
+    decision = decide_front_pages(features, render if ocr_fallback else None, threshold)
+    return [start + i for i in decision["front_pages"]], decision["probabilities"]
+
+
+def detect_front_pages_in_pdf(
+    pdf_path: str, threshold: Optional[float] = None, workers: Optional[int] = None,
+    ocr_fallback: bool = True,
+) -> Tuple[List[int], np.ndarray]:
+    """
+    (front-page indices, per-page probabilities) for a whole PDF. Only pages the
+    classifier is unsure about are rendered at OCR resolution and re-checked.
+    """
+    return detect_front_pages_from_features(
+        pdf_path, pdf_page_features(pdf_path, workers=workers), threshold, ocr_fallback
+    )
+
+
+def detect_front_pages_from_features(
+    pdf_path: str, features: np.ndarray, threshold: Optional[float] = None,
+    ocr_fallback: bool = True,
+) -> Tuple[List[int], np.ndarray]:
+    """
+    Decision step of `detect_front_pages_in_pdf` for features computed earlier (e.g. a
+    stored stage artifact).
+    """
+    from smartscripts.ai.front_page_classifier import decide_front_pages
+
+    render = (lambda indices: _render_full_pages(str(pdf_path), indices)) if ocr_fallback else None
+    decision = decide_front_pages(np.asarray(features, dtype=np.float32), render, threshold)
+    return decision["front_pages"], decision["probabilities"]
@@ -0,0 +1,251 @@
+"""
+smartscripts/ai/id_index.py
+---------------------------
+Student-ID lookup that knows how handwriting OCR goes wrong.
+
+IDs are compared with a weighted edit distance: inserting or deleting a character costs
+1, substituting costs 1 unless the pair is a known confusion (0/O, 1/I/L, 1/7, 5/S, ...),
+which costs less. The confusion costs start from a small prior and are sharpened from the
+old_id -> new_id corrections teachers record in OcrOverrideLog.
+
+`IdIndex` answers top-k queries without scanning the roster: IDs are first mapped to a
+canonical form (each group of cheap confusions collapsed to one character) and stored
+under all their deletions up to `max_edits` (SymSpell). A query only scores the IDs that
+share a deletion variant with it, then ranks them by the weighted distance.
+"""
+
+import os
+import time
+import hashlib
+import logging
+import threading
+from collections import Counter, OrderedDict, defaultdict
+from difflib import SequenceMatcher
+from itertools import combinations
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from smartscripts.ai.text_matching import normalize_id
+
+logger = logging.getLogger(__name__)
+
+# Edits (in canonical form) a candidate may be away from the query
+ID_INDEX_MAX_EDITS = int(os.getenv("ID_INDEX_MAX_EDITS", "2"))
+# How long learned confusion costs are reused before OcrOverrideLog is read again
+CONFUSION_REFRESH_SECONDS = float(os.getenv("CONFUSION_REFRESH_SECONDS", "600"))
+# Most recent corrections read from OcrOverrideLog
+CONFUSION_LOG_LIMIT = 5000
+
+# Handwriting confusions on normalized (lower-case) IDs; every pair in a group costs the prior
+DEFAULT_CONFUSIONS = ["0o", "1il", "17", "5s", "2z", "8b", "6g", "9g"]
+CONFUSION_PRIOR_COST = 0.3
+# Substitutions seen this often in corrections halve their cost; none drops below the floor
+CONFUSION_SMOOTHING = 5.0
+CONFUSION_MIN_COUNT = 2
+CONFUSION_MIN_COST = 0.1
+# Substitutions at or below this cost are treated as the same character when indexing
+CANONICAL_MAX_COST = 0.5
+
+Pair = Tuple[str, str]
+
+
+def _pair(a: str, b: str) -> Pair:
+    return (a, b) if a <= b else (b, a)
+
+
+# ---------------------------
+# Confusion costs
+# ---------------------------
+
+class ConfusionCosts:
+    """Symmetric character-substitution costs (1.0 for pairs not listed)."""
+
+    def __init__(self, costs: Optional[Dict[Pair, float]] = None) -> None:
+        self.costs = {_pair(a, b): float(c) for (a, b), c in (costs or {}).items() if a != b}
+        self.signature = hashlib.sha1(repr(sorted(self.costs.items())).encode()).hexdigest()[:16]
+
+    @classmethod
+    def default(cls) -> "ConfusionCosts":
+        return cls({_pair(a, b): CONFUSION_PRIOR_COST
+                    for group in DEFAULT_CONFUSIONS for a, b in combinations(group, 2)})
+
+    def substitution(self, a: str, b: str) -> float:
+        return 0.0 if a == b else self.costs.get(_pair(a, b), 1.0)
+
+    def canonical_map(self, max_cost: float = CANONICAL_MAX_COST) -> Dict[str, str]:
+        """Character -> representative of its group of cheap confusions (union-find)."""
+        parent: Dict[str, str] = {}
+
+        def find(c: str) -> str:
+            while parent.setdefault(c, c) != c:
+                parent[c] = parent[parent[c]]
+                c = parent[c]
+            return c
+
+        for (a, b), cost in self.costs.items():
+            if cost <= max_cost:
+                ra, rb = find(a), find(b)
+                if ra != rb:
+                    parent[max(ra, rb)] = min(ra, rb)
+        return {c: find(c) for c in parent}
+
+
+def learn_confusion_costs(corrections: Iterable[Tuple[Optional[str], Optional[str]]],
+                          prior: Optional[ConfusionCosts] = None) -> ConfusionCosts:
+    """
+    Costs sharpened by (wrong, right) ID corrections: every aligned one-for-one
+    substitution is counted, and pairs seen at least CONFUSION_MIN_COUNT times get
+    cheaper the more often they occur.
+    """
+    counts: Counter = Counter()
+    for wrong, right in corrections:
+        a, b = normalize_id(wrong), normalize_id(right)
+        if not a or not b or a == b:
+            continue
+        for tag, i1, i2, j1, j2 in SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+            if tag == "replace" and i2 - i1 == j2 - j1:
+                counts.update(_pair(x, y) for x, y in zip(a[i1:i2], b[j1:j2]) if x != y)
+
+    costs = dict((prior or ConfusionCosts.default()).costs)
+    for pair, n in counts.items():
+        if n >= CONFUSION_MIN_COUNT:
+            learned = costs.get(pair, 1.0) / (1.0 + n / CONFUSION_SMOOTHING)
+            costs[pair] = max(CONFUSION_MIN_COST, learned)
+    return ConfusionCosts(costs)
+
+
+_learned: Optional[ConfusionCosts] = None
+_learned_at = 0.0
+_learned_lock = threading.Lock()
+
+
+def confusion_costs() -> ConfusionCosts:
+    """
+    Costs learned from OcrOverrideLog (refreshed every CONFUSION_REFRESH_SECONDS),
+    or the prior.
+    """
+    global _learned, _learned_at
+    with _learned_lock:
+        if _learned is not None and time.monotonic() - _learned_at < CONFUSION_REFRESH_SECONDS:
+            return _learned
+        try:
+            from flask import has_app_context
+            from smartscripts.models.ocr_override import OcrOverrideLog
+
+            if not has_app_context():
+                return _learned or ConfusionCosts.default()
+            rows = (OcrOverrideLog.query
+                    .with_entities(OcrOverrideLog.old_id, OcrOverrideLog.new_id)
+                    .filter(OcrOverrideLog.old_id.isnot(None), OcrOverrideLog.new_id.isnot(None))
+                    .order_by(OcrOverrideLog.id.desc())
+                    .limit(CONFUSION_LOG_LIMIT)
+                    .all())
+            _learned = learn_confusion_costs(rows)
+        except Exception as e:
+            logger.debug("Using default OCR confusion costs: %s", e)
+            _learned = _learned or ConfusionCosts.default()
+        _learned_at = time.monotonic()
+        return _learned
+
+
+def weighted_distance(a: str, b: str, costs: ConfusionCosts) -> float:
+    """Edit distance with unit insert / delete and confusion-weighted substitution."""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = [float(j) for j in range(len(b) + 1)]
+    for i, ca in enumerate(a, start=1):
+        current = [float(i)]
+        for j, cb in enumerate(b, start=1):
+            current.append(min(previous[j] + 1.0, current[j - 1] + 1.0,
+                               previous[j - 1] + costs.substitution(ca, cb)))
+        previous = current
+    return previous[-1]
+
+
+# ---------------------------
+# Index
+# ---------------------------
+
+def _deletions(key: str, max_edits: int) -> Set[str]:
+    variants = {key}
+    frontier = {key}
+    for _ in range(max_edits):
+        frontier = {v[:i] + v[i + 1:] for v in frontier for i in range(len(v))}
+        variants |= frontier
+    return variants
+
+
+class IdIndex:
+    """Roster IDs prepared for sub-linear, confusion-aware top-k lookup."""
+
+    def __init__(self, ids: Sequence[str], costs: Optional[ConfusionCosts] = None,
+                 max_edits: int = ID_INDEX_MAX_EDITS) -> None:
+        self.ids = [i or "" for i in ids]
+        self.costs = costs or ConfusionCosts.default()
+        self.max_edits = max_edits
+        self._canonical = self.costs.canonical_map()
+        self.norm_ids = [normalize_id(i) for i in self.ids]
+        self._variants: Dict[str, List[int]] = defaultdict(list)
+        for j, norm in enumerate(self.norm_ids):
+            if norm:
+                for variant in _deletions(self.canonical(norm), max_edits):
+                    self._variants[variant].append(j)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def canonical(self, norm_id: str) -> str:
+        return "".join(self._canonical.get(c, c) for c in norm_id)
+
+    def candidates(self, ocr_id: Optional[str]) -> Set[int]:
+        norm = normalize_id(ocr_id)
+        found: Set[int] = set()
+        if norm:
+            for variant in _deletions(self.canonical(norm), self.max_edits):
+                found.update(self._variants.get(variant, ()))
+        return found
+
+    def query(self, ocr_id: Optional[str], k: int = 1) -> List[Tuple[int, float]]:
+        """Best `k` (roster position, similarity in [0,1]) for an OCR'd ID, best first."""
+        norm = normalize_id(ocr_id)
+        scored = []
+        for j in self.candidates(ocr_id):
+            other = self.norm_ids[j]
+            distance = weighted_distance(norm, other, self.costs)
+            scored.append((j, max(0.0, 1.0 - distance / max(len(norm), len(other)))))
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        return scored[:k]
+
+    def best(self, ocr_id: Optional[str]) -> Tuple[Optional[str], float]:
+        top = self.query(ocr_id, 1)
+        return (self.ids[top[0][0]], round(top[0][1], 4)) if top else (None, 0.0)
+
+
+_index_cache: "OrderedDict[str, IdIndex]" = OrderedDict()
+_index_lock = threading.Lock()
+_INDEX_CACHE_SIZE = 8
+
+
+def roster_digest(ids: Sequence[str]) -> str:
+    """Digest of a roster's IDs; callers that query one roster repeatedly compute it once."""
+    return hashlib.sha1("\x1f".join(i or "" for i in ids).encode()).hexdigest()
+
+
+def get_id_index(ids: Sequence[str], costs: Optional[ConfusionCosts] = None,
+                 digest: Optional[str] = None) -> IdIndex:
+    """
+    IdIndex for a roster's IDs under the current confusion costs, shared between calls.
+    Pass the roster's `digest` (see roster_digest) to skip hashing the IDs again.
+    """
+    costs = costs or confusion_costs()
+    digest = f"{digest or roster_digest(ids)}:{costs.signature}"
+    with _index_lock:
+        index = _index_cache.get(digest)
+        if index is not None:
+            _index_cache.move_to_end(digest)
+            return index
+    index = IdIndex(ids, costs)
+    with _index_lock:
+        _index_cache[digest] = index
+        while len(_index_cache) > _INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return index
@@ -0,0 +1,123 @@
+"""
+smartscripts/ai/line_segmentation.py
+
+Responsibilities:
+- Binarize scanned pages (same adaptive threshold as layout detection)
+- Strip ruled form lines so they are not mistaken for text
+- Find text lines with a horizontal ink projection, skipping empty bands
+- Split wide lines into regions at large horizontal gaps ("Name: ...   ID: ...")
+- Return tight line crops ready to be batched through TrOCR (a single-line recognizer)
+"""
+
+import logging
+from typing import List, Tuple, Union
+
+import cv2
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# (x, y, w, h) in page pixel coordinates
+Box = Tuple[int, int, int, int]
+
+
+# ---------------------------
+# Binarization helpers
+# ---------------------------
+
+def to_gray(image: Union[Image.Image, np.ndarray]) -> np.ndarray:
+    """PIL image (RGB/L) or OpenCV array (BGR/gray) → uint8 grayscale array."""
+    if isinstance(image, Image.Image):
+        return np.array(image.convert("L"))
+    if image.ndim == 3:
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return image
+
+
+def binarize(gray: np.ndarray) -> np.ndarray:
+    """Inverted adaptive threshold: ink is 255, paper is 0."""
+    return cv2.adaptiveThreshold(
+        gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, 15, 10
+    )
+
+
+def form_line_mask(thresh: np.ndarray, kernel_length: int = 40) -> np.ndarray:
+    """Long horizontal and vertical strokes (table borders, answer rules) in a binarized page."""
+    horizontal_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (kernel_length, 1))
+    vertical_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, kernel_length))
+    horizontal_lines = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, horizontal_kernel)
+    vertical_lines = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, vertical_kernel)
+    return cv2.add(horizontal_lines, vertical_lines)
+
+
+def text_ink(thresh: np.ndarray) -> np.ndarray:
+    """Binarized page with form lines and speckle noise removed."""
+    ink = cv2.subtract(thresh, form_line_mask(thresh))
+    return cv2.medianBlur(ink, 3)
+
+
+# ---------------------------
+# Segmentation
+# ---------------------------
+
+def _runs(mask: np.ndarray, max_gap: int) -> List[Tuple[int, int]]:
+    """[start, end) runs of True values in a 1-D mask, bridging gaps up to `max_gap`."""
+    runs: List[Tuple[int, int]] = []
+    idx = np.flatnonzero(mask)
+    if idx.size == 0:
+        return runs
+    breaks = np.flatnonzero(np.diff(idx) > max_gap + 1)
+    starts = np.concatenate(([idx[0]], idx[breaks + 1]))
+    ends = np.concatenate((idx[breaks], [idx[-1]])) + 1
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+def segment_lines(
+    image: Union[Image.Image, np.ndarray],
+    min_line_height: int = 10,
+    min_ink_fraction: float = 0.003,
+    line_gap: int = 4,
+    region_gap_factor: float = 3.0,
+    padding: int = 4,
+) -> List[Box]:
+    """
+    Detect text lines (and regions within a line) on a page.
+
+    Rows whose ink count is below `min_ink_fraction` of the page width are treated
+    as blank. Bands shorter than `min_line_height` are dropped as noise. Inside a
+    band, horizontal gaps wider than `region_gap_factor` × band height start a new
+    region. Boxes are returned top-to-bottom, left-to-right.
+    """
+    gray = to_gray(image)
+    if gray.size == 0:
+        return []
+    height, width = gray.shape[:2]
+    ink = text_ink(binarize(gray)) > 0
+
+    row_ink = ink.sum(axis=1)
+    text_rows = row_ink > max(1, int(min_ink_fraction * width))
+
+    boxes: List[Box] = []
+    for y0, y1 in _runs(text_rows, max_gap=line_gap):
+        if y1 - y0 < min_line_height:
+            continue
+        band_height = y1 - y0
+        col_ink = ink[y0:y1].any(axis=0)
+        region_gap = max(line_gap, int(region_gap_factor * band_height))
+        for x0, x1 in _runs(col_ink, max_gap=region_gap):
+            if x1 - x0 < min_line_height:
+                continue
+            bx0, by0 = max(0, x0 - padding), max(0, y0 - padding)
+            bx1, by1 = min(width, x1 + padding), min(height, y1 + padding)
+            boxes.append((bx0, by0, bx1 - bx0, by1 - by0))
+    return boxes
+
+
+def crop_text_lines(image: Union[Image.Image, np.ndarray], **kwargs) -> List[Image.Image]:
+    """Tight RGB crops of every detected line/region, in reading order."""
+    if isinstance(image, np.ndarray):
+        rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB) if image.ndim == 3 else image
+        image = Image.fromarray(rgb)
+    image = image.convert("RGB")
+    return [image.crop((x, y, x + w, y + h)) for x, y, w, h in segment_lines(image, **kwargs)]
@@ -2,6 +2,7 @@
 
 from smartscripts.models import StudentSubmission
 from smartscripts.ai.marking_pipeline import mark_batch_submissions, mark_single_submission
+from smartscripts.ai.ocr_cascade import CascadeBudget
 import logging
 
 logger = logging.getLogger(__name__)
@@ -36,10 +37,14 @@ def start_ai_marking(test_id: int, student_id: str = None):
         logger.warning(f"No submissions found for test_id={test_id}")
         return {"error": "No submissions found for this test"}
 
-    results = mark_batch_submissions(submissions, test_id)
+    budget = CascadeBudget()
+    results = mark_batch_submissions(submissions, test_id, budget=budget)
     for submission, result in zip(submissions, results):
         if save_marked_image:
             save_marked_image(submission, result)
 
     logger.info(f"AI marking completed for {len(submissions)} submissions for test {test_id}")
-    return {"message": f"✅ AI marking completed for {len(submissions)} submissions"}
+    return {
+        "message": f"✅ AI marking completed for {len(submissions)} submissions",
+        "ocr_cascade": budget.report(),
+    }
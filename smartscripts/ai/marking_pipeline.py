@@ -4,20 +4,15 @@ import cv2
 from celery import shared_task
 from flask import current_app, flash
 from sqlalchemy.exc import SQLAlchemyError
-from sentence_transformers import SentenceTransformer, util
+from sentence_transformers import util
 
-from smartscripts.ai.ocr_engine import (
-    extract_text_from_image,
-    trocr_extract_with_confidence,
-)
+from smartscripts.ai.model_registry import get_embedding_model
+from smartscripts.ai.ocr_engine import extract_text_with_confidence
+from smartscripts.ai.ocr_cascade import CascadeBudget
 from smartscripts.utils.text_cleaner import clean_text
 from smartscripts.models import StudentSubmission
 from smartscripts.extensions import db
 
-# Load embedding model once globally
-model = SentenceTransformer("all-MiniLM-L6-v2")
-
-
 def fetch_expected_text_from_guide(test_id: int) -> str:
     guide_path = os.path.join("uploads", "guides", str(test_id), "guide.txt")
     if os.path.isfile(guide_path):
@@ -29,6 +24,7 @@ def fetch_expected_text_from_guide(test_id: int) -> str:
 
 
 def compute_similarity(text1: str, text2: str) -> float:
+    model = get_embedding_model()
     embedding1 = model.encode(text1, convert_to_tensor=True)
     embedding2 = model.encode(text2, convert_to_tensor=True)
     return util.pytorch_cos_sim(embedding1, embedding2).item()
@@ -75,7 +71,8 @@ def update_marked_submission(
 
 
 def mark_submission(
-    file_path: str, test_id: int, student_id: int, threshold: float = 0.75
+    file_path: str, test_id: int, student_id: int, threshold: float = 0.75,
+    budget: CascadeBudget = None,
 ):
     try:
         if not os.path.isfile(file_path):
@@ -85,14 +82,11 @@ def mark_submission(
         if not expected_text or len(expected_text.strip()) < 10:
             raise ValueError("Expected text is invalid or too short.")
 
-        # === Try TrOCR first, fall back to pytesseract ===
-        raw_text, conf = trocr_extract_with_confidence(file_path, crop_region=False)
-        if not raw_text or len(raw_text.strip()) < 10:
-            print("⚠️ TrOCR produced little text. Falling back to pytesseract.")
-            raw_text = extract_text_from_image(file_path)
+        # === OCR cascade (TrOCR, then the fallbacks the test's budget allows) ===
+        raw_text, conf = extract_text_with_confidence(file_path, budget=budget)
 
         if not raw_text or len(raw_text.strip()) < 10:
-            raise ValueError("OCR text too short or failed (TrOCR + pytesseract).")
+            raise ValueError("OCR text too short or failed (OCR cascade).")
 
         student_text = clean_text(raw_text)
         if not student_text:
@@ -175,7 +169,9 @@ def mark_submission_async(submission_id):
             current_app.logger.error(f"Async marking error: {e}")
 
 
-def mark_batch_submissions(submissions: list):
+def mark_batch_submissions(submissions: list, test_id: int = None, budget: CascadeBudget = None):
+    """Mark a test's submissions; they share one OCR cascade budget (pass one to read its report)."""
+    budget = budget or CascadeBudget()
     results = []
     for submission in submissions:
         try:
@@ -183,6 +179,7 @@ def mark_batch_submissions(submissions: list):
                 file_path=submission.file_path,
                 test_id=submission.test_id,
                 student_id=submission.student_id,
+                budget=budget,
             )
             results.append(result)
         except Exception as e:
@@ -190,6 +187,8 @@ def mark_batch_submissions(submissions: list):
             print(error_msg)
             if current_app:
                 current_app.logger.error(error_msg)
+    if current_app:
+        current_app.logger.info(f"OCR cascade for test {test_id}: {budget.report()}")
     return results
 
 
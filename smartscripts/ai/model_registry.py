@@ -0,0 +1,216 @@
+"""
+smartscripts/ai/model_registry.py
+
+Responsibilities:
+- Hold one process-wide instance of each heavy model (TrOCR, sentence embedder)
+- Load every model lazily, on first use, and exactly once per process
+- Provide an explicit warm-up hook for web and worker start-up
+- Report load time, resident size and backend of each loaded model
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TROCR_MODEL_NAME = os.getenv("TROCR_MODEL", "microsoft/trocr-base-handwritten")
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+# "torch" (eager fp32) or "onnx" (int8-quantized ONNX Runtime, CPU only)
+OCR_BACKEND = os.getenv("OCR_BACKEND", "torch").lower()
+
+
+# ---------------------------
+# Registry
+# ---------------------------
+
+class Loaded(NamedTuple):
+    """What a loader returns to say which backend it actually loaded (e.g. after a fallback)."""
+    model: Any
+    backend: str
+
+
+class ModelRegistry:
+    """
+    Lazily loads named models and caches them for the lifetime of the process.
+
+    Loaders are plain callables returning the model object (or a tuple of objects),
+    optionally wrapped in `Loaded` to record the backend. Each name is loaded at most
+    once, even when several threads ask for it together.
+    """
+
+    def __init__(self) -> None:
+        self._loaders: Dict[str, Callable[[], Any]] = {}
+        self._models: Dict[str, Any] = {}
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._registry_lock = threading.Lock()
+
+    def register(self, name: str, loader: Callable[[], Any]) -> None:
+        """Register (or replace) the loader for a model name. Drops any loaded instance."""
+        with self._registry_lock:
+            self._loaders[name] = loader
+            self._locks.setdefault(name, threading.Lock())
+            self._models.pop(name, None)
+            self._stats.pop(name, None)
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    def get(self, name: str) -> Any:
+        """Return the model registered under `name`, loading it on first access."""
+        if name in self._models:
+            return self._models[name]
+        if name not in self._loaders:
+            raise KeyError(f"No model registered under '{name}'")
+
+        with self._locks[name]:
+            if name in self._models:
+                return self._models[name]
+            logger.info("Loading model '%s'...", name)
+            started = time.perf_counter()
+            model = self._loaders[name]()
+            elapsed = time.perf_counter() - started
+            backend = None
+            if isinstance(model, Loaded):
+                model, backend = model
+            self._models[name] = model
+            self._stats[name] = {
+                "backend": backend,
+                "load_seconds": round(elapsed, 3),
+                "param_bytes": _estimate_model_bytes(model),
+            }
+            logger.info(
+                "Loaded model '%s' (%s) in %.1fs (%.1f MB)",
+                name, backend or "unknown backend", elapsed, self._stats[name]["param_bytes"] / (1024 * 1024),
+            )
+            return model
+
+    def warm_up(self, names: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """Eagerly load the given models (all registered models by default)."""
+        for name in list(names or self._loaders.keys()):
+            try:
+                self.get(name)
+            except Exception as e:
+                logger.error("Warm-up failed for model '%s': %s", name, e)
+        return self.memory_report()
+
+    def unload(self, name: str) -> None:
+        """Drop a loaded model so the next `get` reloads it."""
+        with self._locks.get(name, self._registry_lock):
+            self._models.pop(name, None)
+            self._stats.pop(name, None)
+
+    def memory_report(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Per-model report: {name: {loaded, backend, load_seconds, param_bytes, param_mb}}.
+        `backend` is the one the model was loaded with (None until loaded, or when the
+        loader did not say). Models that were registered but never used show loaded=False.
+        """
+        report: Dict[str, Dict[str, Any]] = {}
+        for name in self._loaders:
+            stats = self._stats.get(name, {})
+            param_bytes = int(stats.get("param_bytes", 0))
+            report[name] = {
+                "loaded": name in self._models,
+                "backend": stats.get("backend"),
+                "load_seconds": stats.get("load_seconds"),
+                "param_bytes": param_bytes,
+                "param_mb": round(param_bytes / (1024 * 1024), 1),
+            }
+        return report
+
+
+def _estimate_model_bytes(obj: Any) -> int:
+    """Sum parameter and buffer sizes of every torch module found in `obj`."""
+    if isinstance(obj, (tuple, list)):
+        return sum(_estimate_model_bytes(o) for o in obj)
+    total = 0
+    try:
+        params = list(obj.parameters()) + list(obj.buffers())
+    except Exception:
+        # ONNX Runtime models expose no parameters; use the size of their graphs on disk
+        save_dir = getattr(obj, "model_save_dir", None)
+        if save_dir and os.path.isdir(save_dir):
+            for root, _, files in os.walk(save_dir):
+                total += sum(os.path.getsize(os.path.join(root, f)) for f in files if f.endswith(".onnx"))
+        return total
+    for t in params:
+        try:
+            total += t.numel() * t.element_size()
+        except Exception:
+            continue
+    return total
+
+
+# ---------------------------
+# Built-in model loaders
+# ---------------------------
+
+def get_device():
+    """Torch device used by every registry-loaded model."""
+    import torch
+    return torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+
+def _load_trocr(backend: Optional[str] = None) -> Loaded:
+    """(processor, model, device) on the configured backend; ONNX falls back to torch if it cannot load."""
+    if (backend or OCR_BACKEND) == "onnx":
+        try:
+            from smartscripts.ai.onnx_backend import load_trocr_onnx
+            return Loaded(load_trocr_onnx(TROCR_MODEL_NAME), "onnx")
+        except Exception as e:
+            logger.warning("ONNX TrOCR unavailable (%s); falling back to torch", e)
+
+    from transformers import TrOCRProcessor, VisionEncoderDecoderModel
+
+    device = get_device()
+    processor = TrOCRProcessor.from_pretrained(TROCR_MODEL_NAME)
+    model = VisionEncoderDecoderModel.from_pretrained(TROCR_MODEL_NAME)
+    model.to(device)
+    model.eval()
+    return Loaded((processor, model, device), "torch")
+
+
+def _load_embedder(backend: Optional[str] = None) -> Loaded:
+    """SentenceTransformer on the configured backend; ONNX falls back to torch if it cannot load."""
+    if (backend or OCR_BACKEND) == "onnx":
+        try:
+            from smartscripts.ai.onnx_backend import load_embedder_onnx
+            return Loaded(load_embedder_onnx(EMBEDDING_MODEL_NAME), "onnx")
+        except Exception as e:
+            logger.warning("ONNX embedder unavailable (%s); falling back to torch", e)
+
+    from sentence_transformers import SentenceTransformer
+
+    return Loaded(SentenceTransformer(EMBEDDING_MODEL_NAME, device=str(get_device())), "torch")
+
+
+registry = ModelRegistry()
+registry.register("trocr", _load_trocr)
+registry.register("embedder", _load_embedder)
+
+
+# ---------------------------
+# Convenience accessors
+# ---------------------------
+
+def get_trocr() -> Tuple[Any, Any, Any]:
+    """Return (processor, model, device) for TrOCR."""
+    return registry.get("trocr")
+
+
+def get_embedding_model() -> Any:
+    """Return the shared SentenceTransformer."""
+    return registry.get("embedder")
+
+
+def warm_up_models(names: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+    """Load the given models now instead of on first request. Returns the memory report."""
+    return registry.warm_up(names)
+
+
+def model_memory_report() -> Dict[str, Dict[str, Any]]:
+    return registry.memory_report()
@@ -0,0 +1,221 @@
+"""
+smartscripts/ai/ocr_cache.py
+
+Responsibilities:
+- Persistent, content-addressed cache for OCR results (TrOCR, Tesseract, GPT cascade)
+- Keys are a hash of the page/crop pixels + engine name + engine parameters,
+  so re-rendering the same PDF page hits the cache regardless of file name
+- SQLite store shared by web and worker processes, with LRU eviction by total size
+"""
+
+import os
+import io
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+OCR_CACHE_ENABLED = os.getenv("OCR_CACHE_ENABLED", "True").lower() in ["true", "1", "yes"]
+OCR_CACHE_PATH = Path(
+    os.getenv("OCR_CACHE_PATH", Path(__file__).resolve().parents[2] / "instance" / "ocr_cache.sqlite3")
+)
+OCR_CACHE_MAX_MB = int(os.getenv("OCR_CACHE_MAX_MB", "512"))
+
+
+# ---------------------------
+# Keys
+# ---------------------------
+
+def image_fingerprint(image: Union[str, Path, io.BytesIO, Image.Image]) -> str:
+    """Hash of decoded pixels (mode, size, raw bytes) — independent of file name or encoding."""
+    if hasattr(image, "shape") and hasattr(image, "dtype"):  # OpenCV / numpy array
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(f"{image.dtype}:{'x'.join(map(str, image.shape))}:".encode())
+        digest.update(image.tobytes())
+        return digest.hexdigest()
+    if isinstance(image, (str, Path)):
+        with Image.open(str(image)) as img:
+            return image_fingerprint(img.copy())
+    if not isinstance(image, Image.Image):
+        position = image.tell()
+        image.seek(0)
+        img = Image.open(image)
+        img.load()
+        image.seek(position)
+        image = img
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"{image.mode}:{image.size[0]}x{image.size[1]}:".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def make_key(fingerprint: str, engine: str, params: Optional[Dict[str, Any]] = None) -> str:
+    payload = json.dumps({"px": fingerprint, "engine": engine, "params": params or {}}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+# ---------------------------
+# Store
+# ---------------------------
+
+class OCRCache:
+    """
+    SQLite-backed key → JSON value store with size-bounded LRU eviction.
+    Safe to share between threads; several processes may open the same file.
+    """
+
+    def __init__(self, path: Union[str, Path], max_bytes: int) -> None:
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS ocr_cache ("
+                " key TEXT PRIMARY KEY, engine TEXT NOT NULL, value TEXT NOT NULL,"
+                " size INTEGER NOT NULL, created_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_ocr_cache_access ON ocr_cache(last_access)")
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT value FROM ocr_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE ocr_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def set(self, key: str, engine: str, value: Any) -> None:
+        encoded = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ocr_cache (key, engine, value, size, created_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, engine, encoded, len(encoded.encode("utf-8")), now, now),
+            )
+            self._evict()
+
+    def _evict(self) -> None:
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM ocr_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Drop least-recently-used entries until we are 10% under the limit
+        target = int(self.max_bytes * 0.9)
+        freed = 0
+        stale: List[str] = []
+        for key, size in self._conn.execute("SELECT key, size FROM ocr_cache ORDER BY last_access"):
+            if total - freed <= target:
+                break
+            stale.append(key)
+            freed += size
+        self._conn.executemany("DELETE FROM ocr_cache WHERE key = ?", [(k,) for k in stale])
+        logger.info("OCR cache evicted %d entries (%d bytes)", len(stale), freed)
+
+    def clear(self, engine: Optional[str] = None) -> None:
+        with self._lock, self._conn:
+            if engine:
+                self._conn.execute("DELETE FROM ocr_cache WHERE engine = ?", (engine,))
+            else:
+                self._conn.execute("DELETE FROM ocr_cache")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT engine, COUNT(*), COALESCE(SUM(size), 0) FROM ocr_cache GROUP BY engine"
+            ).fetchall()
+        return {
+            "path": str(self.path),
+            "max_bytes": self.max_bytes,
+            "engines": {engine: {"entries": n, "bytes": size} for engine, n, size in rows},
+        }
+
+
+_cache: Optional[OCRCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_ocr_cache() -> Optional[OCRCache]:
+    """Process-wide cache instance, or None when OCR_CACHE_ENABLED is off or the store is unusable."""
+    global _cache, OCR_CACHE_ENABLED
+    if not OCR_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                try:
+                    _cache = OCRCache(OCR_CACHE_PATH, OCR_CACHE_MAX_MB * 1024 * 1024)
+                except (sqlite3.Error, OSError) as e:
+                    logger.warning("OCR cache disabled, cannot open %s: %s", OCR_CACHE_PATH, e)
+                    OCR_CACHE_ENABLED = False
+                    return None
+    return _cache
+
+
+# ---------------------------
+# Helpers for OCR call sites
+# ---------------------------
+
+def cached_ocr(engine: str, image: Any, params: Optional[Dict[str, Any]], compute: Callable[[], Any],
+               store_if: Optional[Callable[[Any], bool]] = None) -> Any:
+    """
+    Return the cached result for (image pixels, engine, params) or compute and store it.
+    `store_if` can veto storing a computed value (e.g. a result cut short by a budget).
+    """
+    cache = get_ocr_cache()
+    if cache is None:
+        return compute()
+    try:
+        key = make_key(image_fingerprint(image), engine, params)
+        hit = cache.get(key)
+    except Exception as e:
+        logger.debug("OCR cache lookup failed (%s); computing directly", e)
+        return compute()
+    if hit is not None:
+        return hit
+    value = compute()
+    if store_if is not None and not store_if(value):
+        return value
+    try:
+        cache.set(key, engine, value)
+    except sqlite3.Error as e:
+        logger.debug("OCR cache write failed: %s", e)
+    return value
+
+
+def cached_ocr_batch(engine: str, images: Sequence[Any], params: Optional[Dict[str, Any]],
+                     compute_batch: Callable[[List[Any]], List[Any]],
+                     store_if: Optional[Callable[[Any], bool]] = None) -> List[Any]:
+    """Batched `cached_ocr`: only cache misses are passed to `compute_batch`, results keep input order."""
+    cache = get_ocr_cache()
+    if cache is None or not images:
+        return compute_batch(list(images))
+    try:
+        keys = [make_key(image_fingerprint(img), engine, params) for img in images]
+        results = [cache.get(k) for k in keys]
+    except Exception as e:
+        logger.debug("OCR cache lookup failed (%s); computing directly", e)
+        return compute_batch(list(images))
+
+    missing = [i for i, r in enumerate(results) if r is None]
+    if missing:
+        computed = compute_batch([images[i] for i in missing])
+        for i, value in zip(missing, computed):
+            results[i] = value
+            if store_if is not None and not store_if(value):
+                continue
+            try:
+                cache.set(keys[i], engine, value)
+            except sqlite3.Error as e:
+                logger.debug("OCR cache write failed: %s", e)
+    return results
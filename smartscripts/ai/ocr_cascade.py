@@ -0,0 +1,245 @@
+"""
+smartscripts/ai/ocr_cascade.py
+
+Responsibilities:
+- Decide, per page, which OCR tiers run after TrOCR (Tesseract, GPT-4 vision, GPT-4 refine)
+- Enforce per-page and per-test budgets on wall time and external (OpenAI) calls
+- Record how often each tier ran or was skipped, and how long it took
+
+Policies are plain objects: subclass CascadePolicy (or register a preset) to change
+the decisions; pass a CascadeBudget shared by all pages of one test to cap its cost.
+"""
+
+import os
+import math
+import time
+import logging
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+TIERS = ("trocr", "tesseract", "vision", "refine")
+EXTERNAL_TIERS = ("vision", "refine")
+
+
+def _env_float(name: str) -> Optional[float]:
+    value = os.getenv(name, "").strip()
+    return float(value) if value else None
+
+
+def _env_int(name: str) -> Optional[int]:
+    value = os.getenv(name, "").strip()
+    return int(value) if value else None
+
+
+# ---------------------------
+# Policy
+# ---------------------------
+
+class CascadePolicy:
+    """
+    Thresholds and limits for the OCR cascade. `None` limits are unlimited.
+
+    - tesseract_below: run Tesseract when TrOCR's page confidence is under this
+    - vision_min_chars: ask GPT-4 vision when the best text is shorter than this
+    - refine_below: GPT-4 refine only pages under this confidence (None = every page)
+    """
+
+    def __init__(
+        self,
+        name: str = "custom",
+        tesseract_below: float = 0.7,
+        allow_tesseract: bool = True,
+        vision_min_chars: int = 5,
+        allow_vision: bool = True,
+        allow_refine: bool = True,
+        refine_below: Optional[float] = None,
+        page_max_seconds: Optional[float] = None,
+        page_max_external_calls: Optional[int] = None,
+        test_max_seconds: Optional[float] = None,
+        test_max_external_calls: Optional[int] = None,
+    ) -> None:
+        self.name = name
+        self.tesseract_below = tesseract_below
+        self.allow_tesseract = allow_tesseract
+        self.vision_min_chars = vision_min_chars
+        self.allow_vision = allow_vision
+        self.allow_refine = allow_refine
+        self.refine_below = refine_below
+        self.page_max_seconds = page_max_seconds
+        self.page_max_external_calls = page_max_external_calls
+        self.test_max_seconds = test_max_seconds
+        self.test_max_external_calls = test_max_external_calls
+
+    def replace(self, **changes) -> "CascadePolicy":
+        """Copy of this policy with some settings changed."""
+        settings = dict(vars(self))
+        settings.update(changes)
+        return self.__class__(**settings)
+
+    def wants_tesseract(self, text: str, confidence: float) -> bool:
+        return self.allow_tesseract and (not text.strip() or confidence < self.tesseract_below)
+
+    def wants_vision(self, text: str, confidence: float) -> bool:
+        return self.allow_vision and len(text.strip()) < self.vision_min_chars
+
+    def wants_refine(self, text: str, confidence: float) -> bool:
+        if not self.allow_refine or not text.strip():
+            return False
+        return self.refine_below is None or confidence < self.refine_below
+
+    def cache_params(self) -> Dict[str, Any]:
+        """Decision settings that change OCR output. Budgets are left out: budget-limited results are not cached."""
+        return {
+            "policy": self.name,
+            "tesseract_below": self.tesseract_below,
+            "allow_tesseract": self.allow_tesseract,
+            "vision_min_chars": self.vision_min_chars,
+            "allow_vision": self.allow_vision,
+            "allow_refine": self.allow_refine,
+            "refine_below": self.refine_below,
+        }
+
+
+# Presets trade accuracy for throughput; pick one with OCR_CASCADE_POLICY
+POLICY_PRESETS: Dict[str, Dict[str, Any]] = {
+    # Previous behaviour: every page is refined, no budgets
+    "accurate": {"refine_below": None},
+    # Refine only uncertain pages, cap external calls per page
+    "balanced": {"refine_below": 0.85, "page_max_external_calls": 2},
+    # Local engines only
+    "fast": {"allow_vision": False, "allow_refine": False, "tesseract_below": 0.5},
+}
+
+
+def get_policy(name: Optional[str] = None, **overrides) -> CascadePolicy:
+    """
+    Build a policy from a preset (default OCR_CASCADE_POLICY) plus OCR_* env budgets,
+    then explicit keyword overrides.
+    """
+    name = (name or os.getenv("OCR_CASCADE_POLICY", "balanced")).lower()
+    if name not in POLICY_PRESETS:
+        logger.warning("Unknown OCR cascade policy '%s'; using 'balanced'", name)
+        name = "balanced"
+    settings: Dict[str, Any] = dict(POLICY_PRESETS[name])
+    env_settings = {
+        "refine_below": _env_float("OCR_REFINE_BELOW"),
+        "page_max_seconds": _env_float("OCR_PAGE_MAX_SECONDS"),
+        "page_max_external_calls": _env_int("OCR_PAGE_MAX_EXTERNAL_CALLS"),
+        "test_max_seconds": _env_float("OCR_TEST_MAX_SECONDS"),
+        "test_max_external_calls": _env_int("OCR_TEST_MAX_EXTERNAL_CALLS"),
+    }
+    settings.update({k: v for k, v in env_settings.items() if v is not None})
+    settings.update(overrides)
+    return CascadePolicy(name=name, **settings)
+
+
+# ---------------------------
+# Budget + statistics
+# ---------------------------
+
+class CascadeBudget:
+    """
+    Running cost of one test (or any group of pages) under a policy.
+    Thread-safe; share one instance across every page of the test.
+    """
+
+    def __init__(self, policy: Optional[CascadePolicy] = None) -> None:
+        self.policy = policy or get_policy()
+        self.started = time.perf_counter()
+        self.external_calls = 0
+        self.pages = 0
+        self.stats: Dict[str, Dict[str, float]] = {
+            tier: {"runs": 0, "seconds": 0.0, "skipped_budget": 0} for tier in TIERS
+        }
+        self._lock = threading.Lock()
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def share(self, fraction: float) -> "CascadeBudget":
+        """
+        Budget for one part of the test run elsewhere (e.g. a page-range chunk on another
+        worker): the per-test limits scaled to `fraction` of the pages.
+        """
+        policy = self.policy
+        changes: Dict[str, Any] = {}
+        if policy.test_max_seconds is not None:
+            changes["test_max_seconds"] = policy.test_max_seconds * fraction
+        if policy.test_max_external_calls is not None:
+            changes["test_max_external_calls"] = int(math.ceil(policy.test_max_external_calls * fraction))
+        return CascadeBudget(policy.replace(**changes) if changes else policy)
+
+    def allows(self, tier: str, page_seconds: float, page_external_calls: int) -> bool:
+        """Whether `tier` may still run for a page that has used the given time / calls."""
+        policy = self.policy
+        if policy.page_max_seconds is not None and page_seconds >= policy.page_max_seconds:
+            return False
+        if policy.test_max_seconds is not None and self.elapsed() >= policy.test_max_seconds:
+            return False
+        if tier in EXTERNAL_TIERS:
+            if policy.page_max_external_calls is not None and page_external_calls >= policy.page_max_external_calls:
+                return False
+            with self._lock:
+                if policy.test_max_external_calls is not None and self.external_calls >= policy.test_max_external_calls:
+                    return False
+        return True
+
+    def record(self, tier: str, seconds: float) -> None:
+        with self._lock:
+            self.stats[tier]["runs"] += 1
+            self.stats[tier]["seconds"] += seconds
+            if tier in EXTERNAL_TIERS:
+                self.external_calls += 1
+
+    def skip(self, tier: str) -> None:
+        with self._lock:
+            self.stats[tier]["skipped_budget"] += 1
+
+    def page_done(self) -> None:
+        with self._lock:
+            self.pages += 1
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            tiers = {
+                tier: {
+                    "runs": int(s["runs"]),
+                    "skipped_budget": int(s["skipped_budget"]),
+                    "seconds": round(s["seconds"], 3),
+                    "mean_seconds": round(s["seconds"] / s["runs"], 3) if s["runs"] else 0.0,
+                }
+                for tier, s in self.stats.items()
+            }
+            return {
+                "policy": self.policy.name,
+                "pages": self.pages,
+                "external_calls": self.external_calls,
+                "elapsed_seconds": round(self.elapsed(), 3),
+                "tiers": tiers,
+            }
+
+
+def merge_reports(reports: Iterable[Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+    """One report for a test from the reports of the budgets its parts ran under."""
+    reports = [r for r in reports if r]
+    if not reports:
+        return {}
+    tiers: Dict[str, Dict[str, Any]] = {}
+    for tier in TIERS:
+        runs = sum(r["tiers"][tier]["runs"] for r in reports)
+        seconds = sum(r["tiers"][tier]["seconds"] for r in reports)
+        tiers[tier] = {
+            "runs": runs,
+            "skipped_budget": sum(r["tiers"][tier]["skipped_budget"] for r in reports),
+            "seconds": round(seconds, 3),
+            "mean_seconds": round(seconds / runs, 3) if runs else 0.0,
+        }
+    return {
+        "policy": reports[0]["policy"],
+        "pages": sum(r["pages"] for r in reports),
+        "external_calls": sum(r["external_calls"] for r in reports),
+        "elapsed_seconds": max(r["elapsed_seconds"] for r in reports),
+        "tiers": tiers,
+    }
@@ -0,0 +1,113 @@
+"""
+smartscripts/ai/ocr_confidence.py
+
+Responsibilities:
+- Turn TrOCR token log-probabilities into a per-line / per-page confidence
+- Turn Tesseract per-word confidences into the same [0, 1] scale
+- Calibrate both (Platt scaling, per engine) and combine them into one page score
+
+The OCR cascade in ocr_engine escalates (Tesseract → GPT-4 vision) only when
+this score says the cheaper engine is not good enough.
+"""
+
+import os
+import math
+from difflib import SequenceMatcher
+from typing import Sequence, Tuple
+
+
+def _parse_calibration(value: str) -> Tuple[float, float]:
+    """"slope,intercept" → floats; identity (1, 0) if unset or malformed."""
+    try:
+        slope, intercept = (float(v) for v in value.split(","))
+        return slope, intercept
+    except (AttributeError, ValueError):
+        return 1.0, 0.0
+
+
+# Platt parameters fitted on labelled pages: calibrated = sigmoid(slope * logit(p) + intercept)
+TROCR_CONF_CALIBRATION = _parse_calibration(os.getenv("TROCR_CONF_CALIBRATION", "1,0"))
+TESSERACT_CONF_CALIBRATION = _parse_calibration(os.getenv("TESSERACT_CONF_CALIBRATION", "1,0"))
+
+_EPS = 1e-6
+
+
+# ---------------------------
+# Calibration
+# ---------------------------
+
+def calibrate(probability: float, params: Tuple[float, float]) -> float:
+    slope, intercept = params
+    if slope == 1.0 and intercept == 0.0:
+        return min(max(probability, 0.0), 1.0)
+    p = min(max(probability, _EPS), 1.0 - _EPS)
+    logit = math.log(p / (1.0 - p))
+    return 1.0 / (1.0 + math.exp(-(slope * logit + intercept)))
+
+
+# ---------------------------
+# Per-engine scores
+# ---------------------------
+
+def sequence_confidence(token_logprobs: Sequence[float]) -> float:
+    """Geometric-mean token probability of one decoded sequence (0.0 when nothing was decoded)."""
+    values = [float(v) for v in token_logprobs if math.isfinite(float(v))]
+    if not values:
+        return 0.0
+    return math.exp(sum(values) / len(values))
+
+
+def page_confidence(texts: Sequence[str], confidences: Sequence[float]) -> float:
+    """Character-weighted mean of line confidences, so one noisy short crop does not sink a page."""
+    weights = [len(t.strip()) for t in texts]
+    total = sum(weights)
+    if total == 0:
+        return 0.0
+    return sum(w * c for w, c in zip(weights, confidences)) / total
+
+
+def trocr_page_confidence(texts: Sequence[str], confidences: Sequence[float]) -> float:
+    return round(calibrate(page_confidence(texts, confidences), TROCR_CONF_CALIBRATION), 4)
+
+
+def tesseract_page_confidence(word_confidences: Sequence[float]) -> float:
+    """Tesseract word confs are 0-100, with -1 for non-words."""
+    valid = [c for c in word_confidences if c >= 0]
+    if not valid:
+        return 0.0
+    return round(calibrate(sum(valid) / len(valid) / 100.0, TESSERACT_CONF_CALIBRATION), 4)
+
+
+# ---------------------------
+# Combining engines
+# ---------------------------
+
+def text_agreement(a: str, b: str) -> float:
+    """Similarity of two transcriptions, ignoring case and whitespace layout."""
+    a, b = " ".join(a.lower().split()), " ".join(b.lower().split())
+    if not a or not b:
+        return 0.0
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def combine_confidences(trocr_conf: float, tesseract_conf: float, agreement: float) -> float:
+    """
+    Page score when both engines ran: the better engine's confidence, raised towards 1
+    when the two independent transcriptions agree.
+    """
+    best, other = max(trocr_conf, tesseract_conf), min(trocr_conf, tesseract_conf)
+    return round(best + (1.0 - best) * other * agreement, 4)
+
+
+def choose_transcription(
+    trocr_text: str, trocr_conf: float, tesseract_text: str, tesseract_conf: float
+) -> Tuple[str, float]:
+    """Keep the more confident engine's text; returns (text, combined page confidence)."""
+    if not tesseract_text.strip():
+        return trocr_text, trocr_conf
+    if not trocr_text.strip():
+        return tesseract_text.strip(), tesseract_conf
+    combined = combine_confidences(trocr_conf, tesseract_conf, text_agreement(trocr_text, tesseract_text))
+    if tesseract_conf > trocr_conf:
+        return tesseract_text.strip(), combined
+    return trocr_text, combined
@@ -1,15 +1,26 @@
 ﻿import os
 import re
 import io
+import time
 import base64
-import multiprocessing
+import logging
 from pathlib import Path
-from typing import List, Tuple, Optional, Union
+from typing import List, Tuple, Optional, Union, Sequence
 
 import torch
 from PIL import Image, ImageOps, ImageChops
-from transformers import TrOCRProcessor, VisionEncoderDecoderModel
-from pdf2image import convert_from_path
+
+from smartscripts.ai.model_registry import get_trocr, TROCR_MODEL_NAME, OCR_BACKEND
+from smartscripts.ai.line_segmentation import crop_text_lines
+from smartscripts.ai.ocr_cache import cached_ocr, cached_ocr_batch
+from smartscripts.ai.page_layout import get_page_layout
+from smartscripts.ai.ocr_confidence import (
+    sequence_confidence, trocr_page_confidence, tesseract_page_confidence, choose_transcription
+)
+from smartscripts.ai.ocr_cascade import CascadePolicy, CascadeBudget
+from smartscripts.ai.cover_template import image_field_crops, clean_field_text
+
+logger = logging.getLogger(__name__)
 
 # === Tesseract ===
 try:
@@ -25,13 +36,12 @@ except ImportError:
     openai = None
     print("⚠️ OpenAI not installed. GPT-based features will be disabled.")
 
-# === Device & Model Setup ===
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-processor = TrOCRProcessor.from_pretrained("microsoft/trocr-base-handwritten")
-model = VisionEncoderDecoderModel.from_pretrained("microsoft/trocr-base-handwritten").to(device)
-model.eval()
-
 # === Constants ===
+# Images per processor/generate call; tune per host (CPU cores / GPU memory)
+TROCR_BATCH_SIZE = int(os.getenv("TROCR_BATCH_SIZE", "8"))
+# TrOCR reads one text line; split pages into line crops before recognition
+TROCR_SEGMENT_LINES = os.getenv("TROCR_SEGMENT_LINES", "True").lower() in ["true", "1", "yes"]
+
 KEYWORDS = [
     "name", "student name", "full name",
     "id", "student id", "reg no", "registration number"
@@ -42,15 +52,15 @@ KEYWORDS = [
 # =====================================================
 
 def run_ocr_on_test(pdf_path: str) -> dict:
-    images = convert_from_path(str(pdf_path), dpi=300)
-    if not images:
+    # Imported here: smartscripts.utils pulls in the app package, which imports this module
+    from smartscripts.utils.pdf_helpers import iter_pdf_pages
+
+    # Only the cover page is needed; render nothing else
+    first_page = next(iter_pdf_pages(pdf_path, dpi=300, stop=1), None)
+    if first_page is None:
         return {"name": "", "id": "", "confidence": 0.0, "matched": None}
 
-    first_page_img = images[0]
-    with io.BytesIO() as buf:
-        first_page_img.save(buf, format="PNG")
-        buf.seek(0)
-        text = extract_text_from_image(buf)
+    text, confidence = extract_text_with_confidence(first_page[1])
 
     lines = [line.strip() for line in text.split("\n") if line.strip()]
 
@@ -63,14 +73,23 @@ def run_ocr_on_test(pdf_path: str) -> dict:
         if name and student_id:
             break
 
-    confidence = estimate_ocr_confidence(text)
     return {"name": name, "id": student_id, "confidence": confidence, "matched": None}
 
 
-def extract_text_from_pdf(pdf_path: str, output_text_path: Optional[str] = None) -> str:
-    images = convert_from_path(str(pdf_path), dpi=300)
-    with multiprocessing.Pool() as pool:
-        results = pool.starmap(_ocr_page, [(i, img) for i, img in enumerate(images)])
+def extract_text_from_pdf(
+    pdf_path: str, output_text_path: Optional[str] = None, budget: Optional[CascadeBudget] = None
+) -> str:
+    from smartscripts.utils.pdf_helpers import iter_pdf_page_chunks
+
+    budget = budget or CascadeBudget()
+    results = []
+    # Render and OCR one batch of pages at a time so memory does not grow with page count
+    for chunk in iter_pdf_page_chunks(pdf_path, chunk_size=TROCR_BATCH_SIZE, dpi=300):
+        page_texts = extract_text_from_images([image for _, image in chunk], budget=budget)
+        results.extend(
+            f"--- Page {index + 1} ---\n{text}" for (index, _), text in zip(chunk, page_texts)
+        )
+    logger.info("OCR cascade for %s: %s", pdf_path, budget.report())
 
     joined_text = "\n\n".join(results)
     if output_text_path:
@@ -80,33 +99,174 @@ def extract_text_from_pdf(pdf_path: str, output_text_path: Optional[str] = None)
 
 
 def extract_text_from_image(
-    image_input: Union[str, Path, io.BytesIO],
-    confidence_threshold: float = 0.7,
+    image_input: Union[str, Path, io.BytesIO, Image.Image],
+    confidence_threshold: Optional[float] = None,
     do_fallback: bool = True,
-    do_refine: bool = True
+    do_refine: bool = True,
+    policy: Optional[CascadePolicy] = None,
+    budget: Optional[CascadeBudget] = None
 ) -> str:
-    if isinstance(image_input, (str, Path)):
-        image = Image.open(str(image_input))
-    else:
-        image = Image.open(image_input)
+    return extract_text_with_confidence(
+        image_input, confidence_threshold, do_fallback, do_refine, policy=policy, budget=budget
+    )[0]
 
-    trocr_text, confidence = trocr_extract_with_confidence(image)
-    final_text = trocr_text
 
-    if do_fallback and (not trocr_text or confidence < confidence_threshold) and pytesseract:
-        tess_text = pytesseract.image_to_string(image)
-        if tess_text.strip():
-            final_text = tess_text.strip()
-
-    if do_fallback and (not final_text or len(final_text) < 5):
+def extract_text_with_confidence(
+    image_input: Union[str, Path, io.BytesIO, Image.Image],
+    confidence_threshold: Optional[float] = None,
+    do_fallback: bool = True,
+    do_refine: bool = True,
+    policy: Optional[CascadePolicy] = None,
+    budget: Optional[CascadeBudget] = None
+) -> Tuple[str, float]:
+    """Cascade OCR for one page; returns (text, calibrated page confidence in [0, 1])."""
+    return extract_text_with_confidence_batch(
+        [image_input], confidence_threshold, do_fallback, do_refine, batch_size=1,
+        policy=policy, budget=budget,
+    )[0]
+
+
+def extract_text_from_images(
+    images: Sequence[Union[str, Path, io.BytesIO, Image.Image]],
+    confidence_threshold: Optional[float] = None,
+    do_fallback: bool = True,
+    do_refine: bool = True,
+    batch_size: Optional[int] = None,
+    policy: Optional[CascadePolicy] = None,
+    budget: Optional[CascadeBudget] = None
+) -> List[str]:
+    """Batched `extract_text_from_image`: one TrOCR pass over the uncached images, in order."""
+    return [text for text, _ in extract_text_with_confidence_batch(
+        images, confidence_threshold, do_fallback, do_refine, batch_size,
+        policy=policy, budget=budget,
+    )]
+
+
+def extract_text_with_confidence_batch(
+    images: Sequence[Union[str, Path, io.BytesIO, Image.Image]],
+    confidence_threshold: Optional[float] = None,
+    do_fallback: bool = True,
+    do_refine: bool = True,
+    batch_size: Optional[int] = None,
+    policy: Optional[CascadePolicy] = None,
+    budget: Optional[CascadeBudget] = None
+) -> List[Tuple[str, float]]:
+    """
+    Batched cascade OCR. `policy` decides which tiers run (default: OCR_CASCADE_POLICY);
+    pass one `budget` for all pages of a test to cap its time and external calls.
+    `confidence_threshold` / `do_fallback` / `do_refine` override the policy.
+    """
+    opened = [_open_image(img) for img in images]
+    budget = budget or CascadeBudget(policy)
+    policy = _apply_overrides(policy or budget.policy, confidence_threshold, do_fallback, do_refine)
+    params = trocr_cache_params(**policy.cache_params())
+
+    def _compute(batch: List[Image.Image]) -> List[dict]:
+        started = time.perf_counter()
+        trocr_results = trocr_extract_batch_with_confidence(batch, batch_size=batch_size)
+        trocr_seconds = (time.perf_counter() - started) / max(len(batch), 1)
+        return [
+            _resolve_ocr_text(image, text, confidence, policy, budget, trocr_seconds)
+            for image, (text, confidence) in zip(batch, trocr_results)
+        ]
+
+    results = cached_ocr_batch(
+        "extract_text_cascade", opened, params, _compute, store_if=lambda r: not r["degraded"]
+    )
+    return [(r["text"], r["confidence"]) for r in results]
+
+
+def _apply_overrides(
+    policy: CascadePolicy, confidence_threshold: Optional[float], do_fallback: bool, do_refine: bool
+) -> CascadePolicy:
+    changes = {}
+    if confidence_threshold is not None:
+        changes["tesseract_below"] = confidence_threshold
+    if not do_fallback:
+        changes.update(allow_tesseract=False, allow_vision=False)
+    if not do_refine:
+        changes["allow_refine"] = False
+    return policy.replace(**changes) if changes else policy
+
+
+def trocr_cache_params(**extra) -> dict:
+    """Everything besides the pixels that changes TrOCR output; part of every OCR cache key."""
+    return {"model": TROCR_MODEL_NAME, "backend": OCR_BACKEND, "segment_lines": TROCR_SEGMENT_LINES,
+            **extra}
+
+
+def _open_image(image_input: Union[str, Path, io.BytesIO, Image.Image]) -> Image.Image:
+    if isinstance(image_input, Image.Image):
+        return image_input
+    if isinstance(image_input, (str, Path)):
+        return Image.open(str(image_input))
+    return Image.open(image_input)
+
+
+def _resolve_ocr_text(
+    image: Image.Image,
+    trocr_text: str,
+    confidence: float,
+    policy: CascadePolicy,
+    budget: CascadeBudget,
+    trocr_seconds: float = 0.0
+) -> dict:
+    """
+    Apply the Tesseract / GPT-4 fallback cascade on top of a TrOCR result.
+    `confidence` is TrOCR's calibrated page score; the policy decides which tiers are
+    worth running and the budget whether they still may. Returns
+    {text, confidence, tiers, degraded}, where `degraded` marks a page that skipped a
+    wanted tier because a budget ran out.
+    """
+    final_text, final_confidence = trocr_text, confidence
+    tiers, degraded = ["trocr"], False
+    page_seconds, page_calls = trocr_seconds, 0
+    budget.record("trocr", trocr_seconds)
+
+    def _allowed(tier: str) -> bool:
+        nonlocal degraded
+        if budget.allows(tier, page_seconds, page_calls):
+            return True
+        budget.skip(tier)
+        degraded = True
+        return False
+
+    if (pytesseract and policy.wants_tesseract(final_text, final_confidence)
+            and _allowed("tesseract")):
+        started = time.perf_counter()
+        layout = get_page_layout(image)
+        tess_confidence = tesseract_page_confidence([w["conf"] for w in layout.words])
+        final_text, final_confidence = choose_transcription(
+            trocr_text, confidence, layout.text, tess_confidence,
+        )
+        elapsed = time.perf_counter() - started
+        budget.record("tesseract", elapsed)
+        page_seconds += elapsed
+        tiers.append("tesseract")
+
+    if (_openai_available() and policy.wants_vision(final_text, final_confidence)
+            and _allowed("vision")):
+        started = time.perf_counter()
         vision_text = gpt4_vision_extract(image)
+        elapsed = time.perf_counter() - started
+        budget.record("vision", elapsed)
+        page_seconds, page_calls = page_seconds + elapsed, page_calls + 1
+        tiers.append("vision")
         if vision_text:
             final_text = vision_text
 
-    if do_refine and final_text:
+    if (_openai_available() and policy.wants_refine(final_text, final_confidence)
+            and _allowed("refine")):
+        started = time.perf_counter()
         final_text = gpt4_chat_refine(final_text)
+        elapsed = time.perf_counter() - started
+        budget.record("refine", elapsed)
+        page_seconds, page_calls = page_seconds + elapsed, page_calls + 1
+        tiers.append("refine")
 
-    return final_text
+    budget.page_done()
+    return {"text": final_text, "confidence": final_confidence, "tiers": tiers,
+            "degraded": degraded}
 
 # =====================================================
 # =============== OCR HELPER FUNCTIONS ================
@@ -130,22 +290,105 @@ def estimate_ocr_confidence(text: str) -> float:
     return max(confidence, 0.0)
 
 def run_tr_ocr(image: Image.Image) -> str:
-    pixel_values = processor(images=image, return_tensors="pt").pixel_values.to(device)
-    with torch.no_grad():
-        generated_ids = model.generate(pixel_values)
-        predicted_texts = processor.batch_decode(generated_ids, skip_special_tokens=True)
-    return predicted_texts[0].strip() if predicted_texts else ""
-
-def trocr_extract_with_confidence(image: Image.Image) -> Tuple[str, float]:
-    processed = preprocess_image(image)
-    text = run_tr_ocr(processed)
-    confidence = estimate_ocr_confidence(text)
-    return text, confidence
+    texts = run_tr_ocr_batch([image], batch_size=1)
+    return texts[0] if texts else ""
+
+def run_tr_ocr_batch(images: Sequence[Image.Image], batch_size: Optional[int] = None) -> List[str]:
+    return [text for text, _ in run_tr_ocr_batch_scored(images, batch_size=batch_size)]
+
+def run_tr_ocr_batch_scored(
+    images: Sequence[Image.Image], batch_size: Optional[int] = None
+) -> List[Tuple[str, float]]:
+    """
+    Run TrOCR over many images (pages or crops) in micro-batches.
+    The processor resizes every image to the encoder size, and generate pads each
+    micro-batch only to its longest decoded sequence. Results keep input order.
+
+    Each text comes with the geometric-mean probability of its generated tokens,
+    read from the same generate call (output_scores), so scoring costs no extra pass.
+    """
+    if not images:
+        return []
+    processor, model, device = get_trocr()
+    batch_size = max(1, batch_size or TROCR_BATCH_SIZE)
+    pad_token_id = processor.tokenizer.pad_token_id
+
+    results: List[Tuple[str, float]] = []
+    for start in range(0, len(images), batch_size):
+        chunk = [img.convert("RGB") for img in images[start:start + batch_size]]
+        pixel_values = processor(images=chunk, return_tensors="pt").pixel_values.to(device)
+        with torch.no_grad():
+            outputs = model.generate(pixel_values, output_scores=True, return_dict_in_generate=True)
+            token_logprobs = model.compute_transition_scores(
+                outputs.sequences, outputs.scores,
+                beam_indices=getattr(outputs, "beam_indices", None), normalize_logits=True,
+            )
+        decoded = processor.batch_decode(outputs.sequences, skip_special_tokens=True)
+        # Scores align with the generated tokens, i.e. sequences minus the decoder start token
+        generated = outputs.sequences[:, -token_logprobs.shape[1]:]
+        for text, tokens, logprobs in zip(decoded, generated.tolist(), token_logprobs.tolist()):
+            kept = [lp for tok, lp in zip(tokens, logprobs) if tok != pad_token_id]
+            results.append((text.strip(), sequence_confidence(kept) if text.strip() else 0.0))
+    return results
+
+def run_tr_ocr_pages(images: Sequence[Image.Image], batch_size: Optional[int] = None) -> List[str]:
+    return [text for text, _ in run_tr_ocr_pages_scored(images, batch_size=batch_size)]
+
+def run_tr_ocr_pages_scored(
+    images: Sequence[Image.Image], batch_size: Optional[int] = None
+) -> List[Tuple[str, float]]:
+    """
+    OCR whole pages: segment each page into line crops, recognise every crop of every
+    page in one batched pass, then join each page's lines. Blank pages return ("", 0.0).
+    Page confidence is the calibrated, length-weighted mean of its line confidences.
+    """
+    if not TROCR_SEGMENT_LINES:
+        return [
+            (text, trocr_page_confidence([text], [conf]))
+            for text, conf in run_tr_ocr_batch_scored(images, batch_size=batch_size)
+        ]
+
+    crops: List[Image.Image] = []
+    owners: List[int] = []
+    for page_index, image in enumerate(images):
+        for crop in crop_text_lines(image):
+            crops.append(crop)
+            owners.append(page_index)
+
+    page_lines: List[List[Tuple[str, float]]] = [[] for _ in images]
+    for owner, (text, conf) in zip(owners, run_tr_ocr_batch_scored(crops, batch_size=batch_size)):
+        if text:
+            page_lines[owner].append((text, conf))
+    return [
+        (
+            "\n".join(text for text, _ in lines),
+            trocr_page_confidence([text for text, _ in lines], [conf for _, conf in lines]),
+        )
+        for lines in page_lines
+    ]
+
+def trocr_extract_with_confidence(
+    image: Union[str, Path, io.BytesIO, Image.Image], crop_region: bool = True
+) -> Tuple[str, float]:
+    return trocr_extract_batch_with_confidence([_open_image(image)], crop_region=crop_region)[0]
+
+def trocr_extract_batch_with_confidence(
+    images: Sequence[Image.Image], batch_size: Optional[int] = None, crop_region: bool = True
+) -> List[Tuple[str, float]]:
+    """(text, model confidence) per page; `crop_region` trims the uniform scan border first."""
+    if crop_region:
+        processed = [preprocess_image(img) for img in images]
+    else:
+        processed = [ImageOps.exif_transpose(img).convert("RGB") for img in images]
+    return run_tr_ocr_pages_scored(processed, batch_size=batch_size)
 
 # =====================================================
 # =============== GPT-4 INTEGRATION ==================
 # =====================================================
 
+def _openai_available() -> bool:
+    return bool(openai and os.getenv("OPENAI_API_KEY"))
+
 def gpt4_vision_extract(image: Image.Image) -> str:
     if not openai or not os.getenv("OPENAI_API_KEY"):
         return ""
@@ -225,25 +468,69 @@ def detect_keywords_with_positions(
     lines: List[str], image: Optional[Image.Image] = None
 ) -> List[dict]:
     matches = []
+    # One Tesseract pass per page, shared by every keyword lookup below
+    layout = get_page_layout(image) if image is not None and pytesseract else None
     for i, line in enumerate(lines):
         for keyword in KEYWORDS:
             if re.search(rf"\b{keyword}\b", line.lower()):
                 entry = {"line": i, "keyword": keyword}
-                if image and pytesseract:
-                    data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
-                    for j, word in enumerate(data["text"]):
-                        if keyword in word.lower():
-                            entry["bbox"] = {
-                                "x": data["left"][j],
-                                "y": data["top"][j],
-                                "w": data["width"][j],
-                                "h": data["height"][j]
-                            }
-                            break
+                if layout is not None:
+                    bbox = layout.find_bbox(keyword)
+                    if bbox:
+                        entry["bbox"] = bbox
                 matches.append(entry)
     return matches
 
-def extract_name_id_from_image(image_path: str) -> Tuple[str, str]:
+def extract_name_id_from_image(image_path: str, template=None) -> Tuple[str, str]:
+    """
+    Name and student ID from a cover page. With a registered CoverTemplate the page is
+    aligned to it and only the name / ID boxes are OCR'd; otherwise (or when the page
+    does not align) the whole page is OCR'd and the lines are parsed.
+    """
+    if template is not None:
+        with Image.open(str(image_path)) as img:
+            crops = image_field_crops(img.convert("RGB"), template)
+        if crops:
+            name, student_id, _ = extract_name_id_from_fields([crops])[0]
+            return name, student_id
+    name, student_id = cached_ocr(
+        "name_id", image_path, trocr_cache_params(), lambda: _extract_name_id(image_path)
+    )
+    return name, student_id
+
+def extract_name_id_from_fields(
+    field_crops: Sequence[dict], batch_size: Optional[int] = None
+) -> List[Tuple[str, str, float]]:
+    """
+    (name, student_id, confidence) per cover page from template-aligned field crops
+    ({"name": img, "student_id": img}); every crop of every page goes through one
+    batched TrOCR pass. The confidence is the mean TrOCR confidence of the fields read.
+    """
+    flat = [(page_no, field, crop)
+            for page_no, crops in enumerate(field_crops) for field, crop in crops.items()]
+    scored = cached_ocr_batch(
+        "trocr_field",
+        [crop for _, _, crop in flat],
+        trocr_cache_params(crop_region=False),
+        lambda crops: [list(r) for r in trocr_extract_batch_with_confidence(
+            crops, batch_size, crop_region=False,
+        )],
+    )
+    fields: List[dict] = [{} for _ in field_crops]
+    for (page_no, field, _), (text, conf) in zip(flat, scored):
+        fields[page_no][field] = (clean_field_text(field, text), conf)
+
+    results = []
+    for values in fields:
+        confs = [conf for text, conf in values.values() if text]
+        results.append((
+            values.get("name", ("", 0.0))[0],
+            values.get("student_id", ("", 0.0))[0],
+            round(sum(confs) / len(confs), 3) if confs else 0.0,
+        ))
+    return results
+
+def _extract_name_id(image_path: str) -> Tuple[str, str]:
     full_text = extract_text_from_image(image_path)
     lines = [line.strip() for line in full_text.split("\n") if line.strip()]
 
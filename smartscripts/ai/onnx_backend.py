@@ -0,0 +1,144 @@
+"""
+smartscripts/ai/onnx_backend.py
+
+Responsibilities:
+- Export TrOCR (VisionEncoderDecoderModel) and the sentence embedder to ONNX
+- Apply int8 dynamic quantization to every exported graph
+- Load the quantized graphs into tuned ONNX Runtime CPU sessions
+
+Selected per deployment with OCR_BACKEND=onnx (see model_registry). Requires the
+optional `optimum[onnxruntime]` package; the default PyTorch path does not.
+"""
+
+import os
+import logging
+from pathlib import Path
+from typing import Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ONNX_MODEL_DIR = Path(
+    os.getenv("ONNX_MODEL_DIR", Path(__file__).resolve().parents[2] / "instance" / "onnx_models")
+)
+ORT_INTRA_OP_THREADS = int(os.getenv("ORT_INTRA_OP_THREADS", "0"))  # 0 = let ORT decide
+ORT_INTER_OP_THREADS = int(os.getenv("ORT_INTER_OP_THREADS", "1"))
+
+
+def _require_onnxruntime():
+    try:
+        import onnxruntime  # noqa: F401
+        import optimum.onnxruntime  # noqa: F401
+    except ImportError as e:
+        raise RuntimeError(
+            "OCR_BACKEND=onnx requires 'optimum[onnxruntime]'. Install it or use OCR_BACKEND=torch."
+        ) from e
+
+
+# ---------------------------
+# Session tuning
+# ---------------------------
+
+def make_session_options():
+    """CPU session options: full graph optimisation, bounded thread pools."""
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    options.intra_op_num_threads = ORT_INTRA_OP_THREADS
+    options.inter_op_num_threads = ORT_INTER_OP_THREADS
+    return options
+
+
+# ---------------------------
+# Export + quantization
+# ---------------------------
+
+def quantize_onnx_dir(model_dir: Path) -> None:
+    """Replace every *.onnx graph in `model_dir` (recursively) by its int8 dynamic-quantized version."""
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    for onnx_path in sorted(Path(model_dir).rglob("*.onnx")):
+        tmp_path = onnx_path.with_suffix(".int8.onnx")
+        quantize_dynamic(str(onnx_path), str(tmp_path), weight_type=QuantType.QInt8)
+        tmp_path.replace(onnx_path)
+        logger.info("Quantized %s to int8", onnx_path)
+
+
+def trocr_onnx_dir(model_name: str) -> Path:
+    return ONNX_MODEL_DIR / model_name.replace("/", "__")
+
+
+def embedder_onnx_dir(model_name: str) -> Path:
+    return ONNX_MODEL_DIR / f"embedder__{model_name.replace('/', '__')}"
+
+
+def export_trocr_onnx(model_name: str, output_dir: Optional[Path] = None, quantize: bool = True) -> Path:
+    """Export TrOCR encoder/decoder graphs plus its processor to `output_dir`."""
+    _require_onnxruntime()
+    from optimum.onnxruntime import ORTModelForVision2Seq
+    from transformers import TrOCRProcessor
+
+    output_dir = Path(output_dir or trocr_onnx_dir(model_name))
+    output_dir.mkdir(parents=True, exist_ok=True)
+    ORTModelForVision2Seq.from_pretrained(model_name, export=True).save_pretrained(output_dir)
+    TrOCRProcessor.from_pretrained(model_name).save_pretrained(output_dir)
+    if quantize:
+        quantize_onnx_dir(output_dir)
+    logger.info("Exported TrOCR '%s' to %s", model_name, output_dir)
+    return output_dir
+
+
+def export_embedder_onnx(model_name: str, output_dir: Optional[Path] = None, quantize: bool = True) -> Path:
+    """Export the SentenceTransformer (ONNX backend) to `output_dir`."""
+    _require_onnxruntime()
+    from sentence_transformers import SentenceTransformer
+
+    output_dir = Path(output_dir or embedder_onnx_dir(model_name))
+    output_dir.mkdir(parents=True, exist_ok=True)
+    SentenceTransformer(model_name, backend="onnx", device="cpu").save(str(output_dir))
+    if quantize:
+        quantize_onnx_dir(output_dir)
+    logger.info("Exported embedder '%s' to %s", model_name, output_dir)
+    return output_dir
+
+
+# ---------------------------
+# Loaders used by the model registry
+# ---------------------------
+
+def load_trocr_onnx(model_name: str) -> Tuple[Any, Any, Any]:
+    """Return (processor, ORT model, cpu device); exports on first use if needed."""
+    _require_onnxruntime()
+    import torch
+    from optimum.onnxruntime import ORTModelForVision2Seq
+    from transformers import TrOCRProcessor
+
+    model_dir = trocr_onnx_dir(model_name)
+    if not any(model_dir.glob("*.onnx")):
+        logger.warning("No ONNX export for '%s' found; exporting to %s", model_name, model_dir)
+        export_trocr_onnx(model_name, model_dir)
+
+    processor = TrOCRProcessor.from_pretrained(model_dir)
+    model = ORTModelForVision2Seq.from_pretrained(
+        model_dir, provider="CPUExecutionProvider", session_options=make_session_options()
+    )
+    return processor, model, torch.device("cpu")
+
+
+def load_embedder_onnx(model_name: str) -> Any:
+    """Return a SentenceTransformer running on the quantized ONNX graph."""
+    _require_onnxruntime()
+    from sentence_transformers import SentenceTransformer
+
+    model_dir = embedder_onnx_dir(model_name)
+    if not any(model_dir.rglob("*.onnx")):
+        logger.warning("No ONNX export for '%s' found; exporting to %s", model_name, model_dir)
+        export_embedder_onnx(model_name, model_dir)
+
+    return SentenceTransformer(
+        str(model_dir),
+        backend="onnx",
+        device="cpu",
+        model_kwargs={"provider": "CPUExecutionProvider", "session_options": make_session_options()},
+    )
@@ -0,0 +1,192 @@
+"""
+smartscripts/ai/page_layout.py
+
+Responsibilities:
+- Run Tesseract ONCE per page (image_to_data) and keep words, boxes, confidences and lines
+- Share that result with every keyword, bounding-box, scoring and fallback helper
+- Memoise layouts in-process and persist them through the content-addressed OCR cache
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from smartscripts.ai.ocr_cache import cached_ocr, image_fingerprint
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pytesseract  # type: ignore
+except ImportError:
+    pytesseract = None
+
+LAYOUT_MEMO_SIZE = 32
+
+
+# ---------------------------
+# Layout object
+# ---------------------------
+
+class PageLayout:
+    """
+    Words recognised on one page, grouped into lines.
+
+    Each word is a dict: {text, x, y, w, h, conf, line}, where `line` indexes `lines`.
+    Each line is a dict: {text, bbox: {x, y, w, h}, conf, words: [word indices]}.
+    """
+
+    def __init__(self, words: List[Dict[str, Any]]) -> None:
+        self.words = words
+        self.lines: List[Dict[str, Any]] = []
+        by_line: "OrderedDict[int, List[int]]" = OrderedDict()
+        for i, word in enumerate(words):
+            by_line.setdefault(word["line"], []).append(i)
+        for line_no, indices in by_line.items():
+            line_words = [words[i] for i in indices]
+            self.lines.append({
+                "text": " ".join(w["text"] for w in line_words),
+                "bbox": _union_bbox(line_words),
+                "conf": _mean([w["conf"] for w in line_words]),
+                "words": indices,
+            })
+
+    @classmethod
+    def from_tesseract_data(cls, data: Dict[str, List[Any]]) -> "PageLayout":
+        """Build from pytesseract.image_to_data(..., output_type=DICT)."""
+        words: List[Dict[str, Any]] = []
+        line_ids: Dict[tuple, int] = {}
+        texts = data.get("text", []) or []
+        for i, text in enumerate(texts):
+            if not text or not str(text).strip():
+                continue
+            try:
+                conf = float(data["conf"][i])
+            except (KeyError, IndexError, TypeError, ValueError):
+                conf = -1.0
+            line_key = (
+                _at(data, "page_num", i), _at(data, "block_num", i),
+                _at(data, "par_num", i), _at(data, "line_num", i),
+            )
+            words.append({
+                "text": str(text).strip(),
+                "x": int(_at(data, "left", i)),
+                "y": int(_at(data, "top", i)),
+                "w": int(_at(data, "width", i)),
+                "h": int(_at(data, "height", i)),
+                "conf": conf,
+                "line": line_ids.setdefault(line_key, len(line_ids)),
+            })
+        return cls(words)
+
+    @property
+    def text(self) -> str:
+        return "\n".join(line["text"] for line in self.lines)
+
+    @property
+    def line_texts(self) -> List[str]:
+        return [line["text"] for line in self.lines]
+
+    @property
+    def mean_confidence(self) -> float:
+        """Mean Tesseract word confidence in [0, 1]; 0.0 for an empty page."""
+        return _mean([w["conf"] for w in self.words]) / 100.0 if self.words else 0.0
+
+    def find(self, keyword: str) -> List[Dict[str, Any]]:
+        """
+        Occurrences of `keyword` (case-insensitive, may span several words on one line).
+        Returns [{keyword, text, bbox: {x, y, w, h}, line, conf}] in reading order.
+        """
+        tokens = keyword.lower().split()
+        if not tokens:
+            return []
+        hits: List[Dict[str, Any]] = []
+        for line_no, line in enumerate(self.lines):
+            line_words = [self.words[i] for i in line["words"]]
+            for start in range(len(line_words) - len(tokens) + 1):
+                span = line_words[start:start + len(tokens)]
+                if all(tok in w["text"].lower() for tok, w in zip(tokens, span)):
+                    hits.append({
+                        "keyword": keyword,
+                        "text": " ".join(w["text"] for w in span),
+                        "bbox": _union_bbox(span),
+                        "line": line_no,
+                        "conf": _mean([w["conf"] for w in span]),
+                    })
+        return hits
+
+    def find_bbox(self, keyword: str) -> Optional[Dict[str, int]]:
+        hits = self.find(keyword)
+        return hits[0]["bbox"] if hits else None
+
+
+def _at(data: Dict[str, List[Any]], field: str, i: int) -> Any:
+    values = data.get(field) or []
+    return values[i] if i < len(values) else 0
+
+
+def _mean(values: List[float]) -> float:
+    valid = [v for v in values if v >= 0]
+    return sum(valid) / len(valid) if valid else 0.0
+
+
+def _union_bbox(words: List[Dict[str, Any]]) -> Dict[str, int]:
+    x0 = min(w["x"] for w in words)
+    y0 = min(w["y"] for w in words)
+    x1 = max(w["x"] + w["w"] for w in words)
+    y1 = max(w["y"] + w["h"] for w in words)
+    return {"x": x0, "y": y0, "w": x1 - x0, "h": y1 - y0}
+
+
+# ---------------------------
+# Per-page memo
+# ---------------------------
+
+_memo: "OrderedDict[str, PageLayout]" = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+def get_page_layout(image: Any, config: str = "") -> PageLayout:
+    """
+    Tesseract layout for a page (PIL image, path, or OpenCV/numpy array).
+    Tesseract runs at most once per distinct page pixels + config.
+    """
+    if pytesseract is None:
+        logger.warning("pytesseract not installed; returning empty page layout.")
+        return PageLayout([])
+
+    try:
+        memo_key = f"{image_fingerprint(image)}:{config}"
+    except Exception as e:
+        logger.debug("Could not fingerprint page (%s); layout will not be memoised", e)
+        memo_key = None
+
+    if memo_key is not None:
+        with _memo_lock:
+            if memo_key in _memo:
+                _memo.move_to_end(memo_key)
+                return _memo[memo_key]
+
+    data = cached_ocr(
+        "tesseract_layout", image, {"config": config},
+        lambda: pytesseract.image_to_data(_as_pil(image), config=config, output_type=pytesseract.Output.DICT),
+    )
+    layout = PageLayout.from_tesseract_data(data)
+
+    if memo_key is not None:
+        with _memo_lock:
+            _memo[memo_key] = layout
+            while len(_memo) > LAYOUT_MEMO_SIZE:
+                _memo.popitem(last=False)
+    return layout
+
+
+def _as_pil(image: Any) -> Any:
+    from PIL import Image
+
+    if isinstance(image, Image.Image):
+        return image
+    if hasattr(image, "shape"):  # OpenCV BGR / gray array
+        import cv2
+        return Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB) if image.ndim == 3 else image)
+    return Image.open(str(image)) if not hasattr(image, "read") else Image.open(image)
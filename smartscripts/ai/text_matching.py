@@ -12,39 +12,68 @@ Responsibilities:
 """
 
 import os
+import re
 import csv
 import io
 import json
+import hashlib
 import zipfile
 import logging
-from typing import List, Dict, Tuple, Optional, Any
+import threading
+import unicodedata
+from typing import List, Dict, Tuple, Optional, Any, Sequence
 from difflib import SequenceMatcher
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 from pathlib import Path
 
+import numpy as np
+
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
-# Optional embedding-based similarity
-_EMBED_MODEL = None
+# Optional embedding-based similarity (model comes from the shared registry)
 _util = None
 try:
-    from sentence_transformers import SentenceTransformer, util as _sentence_util  # type: ignore
-    _EMBED_MODEL = SentenceTransformer("all-MiniLM-L6-v2")
+    from sentence_transformers import util as _sentence_util  # type: ignore
+    from smartscripts.ai.model_registry import get_embedding_model
     _util = _sentence_util
 except Exception:
-    _EMBED_MODEL = None
+    get_embedding_model = None
     _util = None
+_EMBED_FAILED = False
+
+
+def _get_embed_model():
+    """Shared SentenceTransformer, or None if it is unavailable in this process."""
+    global _EMBED_FAILED
+    if _util is None or get_embedding_model is None or _EMBED_FAILED:
+        return None
+    try:
+        return get_embedding_model()
+    except Exception as e:
+        logger.warning("Embedding model unavailable, using string similarity only: %s", e)
+        _EMBED_FAILED = True
+        return None
+
+# rapidfuzz scores a query against the whole roster in one call (SequenceMatcher loop otherwise)
+try:
+    from rapidfuzz import fuzz as _rf_fuzz, process as _rf_process  # type: ignore
+except Exception:
+    _rf_fuzz = None
+    _rf_process = None
+
+# Roster entries reranked with embeddings after the string prefilter
+CLASS_INDEX_TOP_K = int(os.getenv("CLASS_INDEX_TOP_K", "10"))
 
-# PDF utilities
-PdfReader = None
-PdfWriter = None
+# One-to-one page → student assignment (greedy fallback without scipy)
 try:
-    # PyPDF2 has different APIs across versions; these names should exist in modern releases
-    from PyPDF2 import PdfReader, PdfWriter  # type: ignore
+    from scipy.optimize import linear_sum_assignment  # type: ignore
 except Exception:
-    PdfReader = None
-    PdfWriter = None
+    linear_sum_assignment = None
+# Assignments closer than this to the runner-up (other student, or other page) go to review
+ASSIGNMENT_MIN_MARGIN = float(os.getenv("ASSIGNMENT_MIN_MARGIN", "0.05"))
+# Solver weight of pairs below min_score
+_INELIGIBLE = -1e6
 
 # PIL / pytesseract for bounding boxes
 Image = None
@@ -52,6 +81,7 @@ pytesseract = None
 try:
     from PIL import Image  # type: ignore
     import pytesseract  # type: ignore
+    from smartscripts.ai.page_layout import get_page_layout
 except Exception:
     Image = None
     pytesseract = None
@@ -74,44 +104,20 @@ def load_class_list(csv_path: str,
     """
     Load a class list CSV and normalize to list of dicts:
     [{ "student_id": "...", "student_name": "...", ... }, ...]
-    Accepts different header names by checking candidate lists.
+    Accepts different header names by checking candidate lists. With the default
+    candidates the parsed roster comes from the shared class-list cache.
     """
-    id_field_candidates = id_field_candidates or ["student_id", "id", "reg_no", "regno", "registration_number"]
-    name_field_candidates = name_field_candidates or ["student_name", "name", "full_name", "student"]
+    from smartscripts.ai.class_list_cache import get_class_list, parse_class_list
 
-    class_list: List[Dict[str, str]] = []
     if not csv_path or not os.path.exists(csv_path):
         logger.warning("Class list CSV path missing or does not exist: %s", csv_path)
-        return class_list
-
-    with open(csv_path, newline="", encoding="utf-8") as fh:
-        reader = csv.DictReader(fh)
-        # defensively guard against missing headers
-        fieldnames = reader.fieldnames or []
-        headers = [h.lower() for h in fieldnames]
-
-        id_field = None
-        name_field = None
-        for h in fieldnames:
-            if id_field is None and h.lower() in id_field_candidates:
-                id_field = h
-            if name_field is None and h.lower() in name_field_candidates:
-                name_field = h
-
-        # fallback to first two columns
-        if id_field is None and fieldnames:
-            id_field = fieldnames[0]
-        if name_field is None and len(fieldnames) > 1:
-            name_field = fieldnames[1]
-        elif name_field is None:
-            name_field = id_field
-
-        for row in reader:
-            class_list.append({
-                "student_id": (row.get(id_field) or "").strip(),
-                "student_name": (row.get(name_field) or "").strip(),
-                **{k: (v or "") for k, v in row.items() if k not in (id_field, name_field)}
-            })
+        return []
+
+    if id_field_candidates or name_field_candidates:
+        class_list = parse_class_list(Path(csv_path).read_bytes(), Path(csv_path).suffix,
+                                      id_field_candidates, name_field_candidates)
+    else:
+        class_list = [dict(s) for s in get_class_list(csv_path).students]
 
     logger.info("Loaded %d class list entries from %s", len(class_list), csv_path)
     return class_list
@@ -133,20 +139,34 @@ def string_similarity(a: Optional[str], b: Optional[str]) -> float:
         return 0.0
 
 
+_embed_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+_EMBED_CACHE_SIZE = 4096
+
+
+def _embed_text(embed_model: Any, text: str) -> np.ndarray:
+    vector = _embed_cache.get(text)
+    if vector is None:
+        encoded = embed_model.encode([text], normalize_embeddings=True, convert_to_numpy=True)
+        vector = np.asarray(encoded[0], dtype=np.float32)
+        _embed_cache[text] = vector
+        if len(_embed_cache) > _EMBED_CACHE_SIZE:
+            _embed_cache.popitem(last=False)
+    return vector
+
+
 def embedding_similarity(a: Optional[str], b: Optional[str]) -> float:
     """
     Compute embedding cosine similarity if embedding model available, otherwise fallback to string similarity.
     """
     if not a or not b:
         return 0.0
-    if _EMBED_MODEL is None or _util is None:
+    embed_model = _get_embed_model()
+    if embed_model is None:
         return string_similarity(a, b)
 
     try:
-        # encode and compute cosine similarity
-        emb = _EMBED_MODEL.encode([a, b], convert_to_tensor=True)
-        sim = _util.pytorch_cos_sim(emb[0], emb[1]).item()
-        return float(sim)
+        # cosine of cached unit vectors: each distinct string is encoded once
+        return float(_embed_text(embed_model, a) @ _embed_text(embed_model, b))
     except Exception as e:
         logger.debug("Embedding similarity failed, falling back to string similarity: %s", e)
         return string_similarity(a, b)
@@ -157,7 +177,7 @@ def combined_similarity(a: Optional[str], b: Optional[str], method_prefer: str =
     Try embedding similarity if available, fallback to string similarity.
     Returns a score in [0,1]
     """
-    if method_prefer == "embed" and _EMBED_MODEL is not None:
+    if method_prefer == "embed" and _get_embed_model() is not None:
         s = embedding_similarity(a, b)
         # if embedding returns a meaningful score (>0) use it
         if s and s > 0:
@@ -165,32 +185,282 @@ def combined_similarity(a: Optional[str], b: Optional[str], method_prefer: str =
     return string_similarity(a, b)
 
 
+# ---------------------------
+# Class list index
+# ---------------------------
+
+def normalize_name(name: Optional[str]) -> str:
+    """Lower-case, accents and punctuation stripped, single spaces."""
+    text = unicodedata.normalize("NFKD", name or "")
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    return " ".join(re.sub(r"[^\w\s]", " ", text).split())
+
+
+def normalize_id(student_id: Optional[str]) -> str:
+    """Lower-case with spaces and separators (- / . _) removed."""
+    return re.sub(r"[\s\-/._]", "", (student_id or "").lower())
+
+
+def _name_key(name: Optional[str]) -> str:
+    """Normalized name with its words sorted, so "Okello Bob" scores like "Bob Okello"."""
+    return " ".join(sorted(normalize_name(name).split()))
+
+
+def _similarity_matrix(queries: Sequence[str], choices: Sequence[str]) -> np.ndarray:
+    """(len(queries), len(choices)) string similarity in [0,1]; rows of empty queries are 0."""
+    matrix = np.zeros((len(queries), len(choices)), dtype=np.float32)
+    if not len(queries) or not len(choices):
+        return matrix
+    if _rf_process is not None:
+        ratios = _rf_process.cdist(queries, choices, scorer=_rf_fuzz.ratio, dtype=np.float32)
+        matrix[:] = ratios / 100.0
+    else:
+        for i, q in enumerate(queries):
+            matrix[i] = [SequenceMatcher(None, q, c).ratio() if q and c else 0.0 for c in choices]
+    for i, q in enumerate(queries):
+        if not q:
+            matrix[i] = 0.0
+    for j, c in enumerate(choices):
+        if not c:
+            matrix[:, j] = 0.0
+    return matrix
+
+
+class ClassListIndex:
+    """
+    A class list prepared once for matching: normalized IDs and names, and (lazily) a
+    unit-norm embedding matrix of the names. Queries are scored against the whole roster
+    with one vectorized string-similarity call; when embeddings are available only the
+    `top_k` best string candidates per query are re-scored with them. Other candidates
+    keep their string score, capped below the reranked ones so they cannot overtake them.
+    """
+
+    def __init__(self, class_list: List[Dict[str, str]], top_k: int = CLASS_INDEX_TOP_K) -> None:
+        self.students = list(class_list or [])
+        self.top_k = max(1, top_k)
+        self.ids = [s.get("student_id", "") or "" for s in self.students]
+        self.names = [s.get("student_name", "") or "" for s in self.students]
+        self.norm_ids = [normalize_id(i) for i in self.ids]
+        self.norm_names = [_name_key(n) for n in self.names]
+        self._name_embeddings: Optional[np.ndarray] = None
+        self._ids_digest: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.students)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Pickled by the class-list cache; the lock is per process
+        state = dict(self.__dict__)
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    # ---- Embeddings ----
+    def _encode(self, texts: Sequence[str]) -> Optional[np.ndarray]:
+        model = _get_embed_model()
+        if model is None or not len(texts):
+            return None
+        try:
+            encoded = model.encode(list(texts), normalize_embeddings=True, convert_to_numpy=True)
+            return np.asarray(encoded, dtype=np.float32)
+        except Exception as e:
+            logger.debug("Embedding failed, using string similarity only: %s", e)
+            return None
+
+    def name_embeddings(self) -> Optional[np.ndarray]:
+        """(students, dim) unit vectors of the roster names, encoded once."""
+        with self._lock:
+            if self._name_embeddings is None:
+                self._name_embeddings = self._encode(self.names)
+            return self._name_embeddings
+
+    def id_index(self):
+        """The shared OCR-confusion-aware IdIndex of the roster IDs (see id_index)."""
+        from smartscripts.ai.id_index import get_id_index, roster_digest
+
+        # Older pickles predate the digest
+        if getattr(self, "_ids_digest", None) is None:
+            self._ids_digest = roster_digest(self.ids)
+        return get_id_index(self.ids, digest=self._ids_digest)
+
+    # ---- Score matrices ----
+    def id_scores(self, ocr_ids: Sequence[Optional[str]]) -> np.ndarray:
+        """
+        (queries, students) ID similarity: string ratio, raised where the OCR-confusion
+        aware ID index (see id_index) scores a candidate higher, e.g. "2O23-0S1" vs "2023-051".
+        """
+        scores = _similarity_matrix([normalize_id(i) for i in ocr_ids], self.norm_ids)
+        if not len(self):
+            return scores
+        id_index = self.id_index()
+        for i, ocr_id in enumerate(ocr_ids):
+            for j, score in id_index.query(ocr_id, self.top_k):
+                scores[i, j] = max(scores[i, j], score)
+        return scores
+
+    def name_scores(self, ocr_names: Sequence[Optional[str]],
+                    prefilter: Optional[np.ndarray] = None, rerank: bool = True) -> np.ndarray:
+        """
+        (queries, students) name similarity: word-order-insensitive string scores, with the
+        top_k candidates per query (by `prefilter`, default the string scores) re-scored by
+        embedding cosine unless `rerank` is False.
+        """
+        scores = _similarity_matrix([_name_key(n) for n in ocr_names], self.norm_names)
+        roster = self.name_embeddings() if rerank and len(self) else None
+        rows = [i for i, n in enumerate(ocr_names) if n and n.strip()]
+        if roster is None or not rows:
+            return scores
+        queries = self._encode([ocr_names[i] for i in rows])
+        if queries is None:
+            return scores
+
+        ranking = scores if prefilter is None else prefilter
+        k = min(self.top_k, len(self))
+        for q, i in zip(queries, rows):
+            top = np.argpartition(-ranking[i], k - 1)[:k]
+            cosine = roster[top] @ q
+            keep = cosine > 0  # a non-positive cosine carries no signal; keep the string score
+            if not keep.any():
+                continue
+            floor = float(cosine[keep].min())
+            rest = np.ones(len(self), dtype=bool)
+            rest[top[keep]] = False
+            scores[i, rest] = np.minimum(scores[i, rest], floor)
+            scores[i, top[keep]] = cosine[keep]
+        return scores
+
+    def pair_scores(self, ocr_pairs: Sequence[Tuple[Optional[str], Optional[str]]],
+                    id_weight: float = 0.7, name_weight: float = 0.3) -> np.ndarray:
+        """(pairs, students) weighted ID + name score for (ocr_id, ocr_name) pairs."""
+        id_scores = self.id_scores([p[0] for p in ocr_pairs])
+        name_strings = _similarity_matrix([_name_key(p[1]) for p in ocr_pairs], self.norm_names)
+        # Candidates for the embedding rerank come from the combined string score
+        prefilter = id_weight * id_scores + name_weight * name_strings
+        names = self.name_scores([p[1] for p in ocr_pairs], prefilter)
+        return id_weight * id_scores + name_weight * names
+
+    # ---- Single queries ----
+    def match_id(self, ocr_id: Optional[str], threshold: float = 0.85) -> Tuple[str, float]:
+        """Best roster ID from the ID index (no roster scan)."""
+        if not ocr_id or not len(self):
+            return ("", 0.0)
+        matched, score = self.id_index().best(ocr_id)
+        return (matched, score) if matched is not None and score >= threshold else ("", 0.0)
+
+    def match_name(self, ocr_name: Optional[str], threshold: float = 0.8) -> Tuple[str, float]:
+        if not ocr_name or not len(self):
+            return ("", 0.0)
+        row = self.name_scores([ocr_name])[0]
+        j = int(row.argmax())
+        return (self.names[j], float(row[j])) if row[j] >= threshold else ("", 0.0)
+
+    def match_pair(self, ocr_id: Optional[str], ocr_name: Optional[str], id_weight: float = 0.7,
+                   name_weight: float = 0.3) -> Tuple[Optional[Dict[str, str]], float]:
+        if not len(self):
+            return None, 0.0
+        row = self.pair_scores([(ocr_id, ocr_name)], id_weight, name_weight)[0]
+        j = int(row.argmax())
+        return (self.students[j], float(row[j])) if row[j] > 0 else (None, 0.0)
+
+
+_index_cache: "OrderedDict[str, ClassListIndex]" = OrderedDict()
+_index_lock = threading.Lock()
+_INDEX_CACHE_SIZE = 8
+
+
+def get_class_list_index(class_list: List[Dict[str, str]],
+                         prepared: Optional[ClassListIndex] = None) -> ClassListIndex:
+    """
+    ClassListIndex for a class list, shared by every call with the same IDs and names.
+    `prepared` (an index already built for this list, e.g. unpickled) is adopted when
+    none is cached yet.
+    """
+    digest = hashlib.sha1("\x1f".join(
+        f"{s.get('student_id', '')}\x1e{s.get('student_name', '')}" for s in class_list or []
+    ).encode()).hexdigest()
+    with _index_lock:
+        index = _index_cache.get(digest)
+        if index is not None:
+            _index_cache.move_to_end(digest)
+            return index
+        index = prepared or ClassListIndex(class_list)
+        _index_cache[digest] = index
+        while len(_index_cache) > _INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+        return index
+
+
+# ---------------------------
+# Global assignment
+# ---------------------------
+
+def assign_one_to_one(scores: np.ndarray, min_score: float = 0.0,
+                      min_margin: float = ASSIGNMENT_MIN_MARGIN) -> List[Dict[str, Any]]:
+    """
+    Assign each row (page) at most one column (student), and each student at most one
+    page, maximising the total score. Returns one dict per row:
+    {"index": column or None, "score", "margin", "ambiguous"}.
+
+    Pairs below `min_score` are excluded before solving, so they can neither be assigned
+    nor displace an eligible pair. `margin` is how far the assigned score is above the
+    best eligible alternative for the same page (another student) or for the same student
+    (another page); pages with margin < `min_margin` are ambiguous.
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    rows, cols = scores.shape if scores.ndim == 2 else (0, 0)
+    out = [
+        {"index": None, "score": float(scores[i].max()) if cols else 0.0, "margin": 0.0,
+         "ambiguous": True}
+        for i in range(rows)
+    ]
+    if not rows or not cols:
+        return out
+
+    eligible = scores >= min_score
+    if linear_sum_assignment is not None:
+        # Ineligible pairs cost far more than any eligible total, so the solver only uses
+        # them for rows that cannot be matched at all (and those are dropped below)
+        weights = np.where(eligible, scores, _INELIGIBLE)
+        row_ind, col_ind = linear_sum_assignment(weights, maximize=True)
+    else:
+        row_ind, col_ind, taken_r, taken_c = [], [], set(), set()
+        for flat in np.argsort(-scores, axis=None):
+            i, j = divmod(int(flat), cols)
+            if eligible[i, j] and i not in taken_r and j not in taken_c:
+                taken_r.add(i)
+                taken_c.add(j)
+                row_ind.append(i)
+                col_ind.append(j)
+
+    for i, j in zip(row_ind, col_ind):
+        if not eligible[i, j]:
+            continue
+        score = float(scores[i, j])
+        # Runner-up among the eligible alternatives only (0 when there is none)
+        other_students = np.where(eligible[i], scores[i], 0.0)
+        other_pages = np.where(eligible[:, j], scores[:, j], 0.0)
+        other_students[j] = other_pages[i] = 0.0
+        runner_up = max(other_students.max(), other_pages.max())
+        margin = score - float(runner_up)
+        out[i] = {"index": int(j), "score": score, "margin": round(margin, 4),
+                  "ambiguous": margin < min_margin}
+    return out
+
+
 # ---------------------------
 # Fuzzy matching logic
 # ---------------------------
 
 def fuzzy_match_id(ocr_id: Optional[str], class_list: List[Dict[str, str]], threshold: float = 0.85) -> Tuple[str, float]:
-    best: Tuple[str, float] = ("", 0.0)
-    if not ocr_id:
-        return ("", 0.0)
-    for student in class_list:
-        cid = student.get("student_id", "") or ""
-        score = string_similarity(ocr_id, cid)
-        if score > best[1]:
-            best = (cid, score)
-    return best if best[1] >= threshold else ("", 0.0)
+    return get_class_list_index(class_list).match_id(ocr_id, threshold)
 
 
 def fuzzy_match_name(ocr_name: Optional[str], class_list: List[Dict[str, str]], threshold: float = 0.8) -> Tuple[str, float]:
-    best: Tuple[str, float] = ("", 0.0)
-    if not ocr_name:
-        return ("", 0.0)
-    for student in class_list:
-        cname = student.get("student_name", "") or ""
-        score = combined_similarity(ocr_name, cname)
-        if score > best[1]:
-            best = (cname, float(score))
-    return best if best[1] >= threshold else ("", 0.0)
+    return get_class_list_index(class_list).match_name(ocr_name, threshold)
 
 
 def match_ocr_pair_to_class(ocr_id: Optional[str], ocr_name: Optional[str], class_list: List[Dict[str, str]],
@@ -201,18 +471,9 @@ def match_ocr_pair_to_class(ocr_id: Optional[str], ocr_name: Optional[str], clas
     For a single OCR pair, return (best_student_dict or None, combined_score).
     Combined score is a weighted blend of ID and name similarity.
     """
-    best_student: Optional[Dict[str, str]] = None
-    best_score: float = 0.0
-
-    for student in class_list:
-        sid = student.get("student_id", "") or ""
-        sname = student.get("student_name", "") or ""
-        id_score = string_similarity(ocr_id or "", sid)
-        name_score = combined_similarity(ocr_name or "", sname)
-        combined_score = (id_weight * id_score) + (name_weight * name_score)
-        if combined_score > best_score:
-            best_score = combined_score
-            best_student = student
+    best_student, best_score = get_class_list_index(class_list).match_pair(
+        ocr_id, ocr_name, id_weight, name_weight,
+    )
 
     # Quick thresholding: ensure at least one of id/name passes minimal threshold
     if best_score < min(id_threshold, name_threshold):
@@ -234,26 +495,33 @@ def ingest_ocr_results(ocr_results: List[Dict[str, Any]],
     """
     ocr_results: list of dicts per page containing at least:
         { "page_index": int, "text": str, "name": str, "id": str, "confidence": float }
+    Pages are assigned to students one-to-one over the whole batch (see assign_one_to_one).
     Returns:
       - presence_rows: list of presence table rows (one per detected OCR item)
       - assignment_rows: low-level per-page assignments (page_index -> matched_id or UNMATCHED) as list of tuples
     """
     presence_rows: List[Dict[str, Any]] = []
     assignment_rows: List[Tuple[int, str, float]] = []
-
-    for entry in ocr_results or []:
+    entries = list(ocr_results or [])
+    if not entries:
+        return presence_rows, assignment_rows
+
+    # One score matrix of pages × students, solved globally: no two pages claim one student
+    index = get_class_list_index(class_list)
+    pairs = [((e.get("id") or "").strip(), (e.get("name") or "").strip()) for e in entries]
+    scores = index.pair_scores(pairs, id_weight=id_weight, name_weight=name_weight)
+    # Weakest pairing still reported as a candidate (was min(id_threshold, name_threshold))
+    assignments = assign_one_to_one(scores, min_score=0.5)
+
+    for entry, (ocr_id, ocr_name), assigned in zip(entries, pairs, assignments):
         pid = int(entry.get("page_index") or -1)
-        ocr_name = (entry.get("name") or "").strip()
-        ocr_id = (entry.get("id") or "").strip()
         try:
             confidence = float(entry.get("confidence") or 0.0)
         except Exception:
             confidence = 0.0
 
-        student, match_score = match_ocr_pair_to_class(ocr_id, ocr_name, class_list,
-                                                       id_weight=id_weight, name_weight=name_weight,
-                                                       id_threshold=0.6, name_threshold=0.5)
-
+        student = index.students[assigned["index"]] if assigned["index"] is not None else None
+        match_score = round(assigned["score"], 4)
         matched = bool(student and match_score >= min_match_score)
         matched_student_id = student["student_id"] if student else ""
         matched_student_name = student["student_name"] if student else ""
@@ -266,7 +534,9 @@ def ingest_ocr_results(ocr_results: List[Dict[str, Any]],
             "matched": matched,
             "matched_id": matched_student_id,
             "matched_name": matched_student_name,
-            "match_score": match_score
+            "match_score": match_score,
+            "match_margin": assigned["margin"],
+            "ambiguous": bool(student) and assigned["ambiguous"],
         })
 
         assignment_rows.append((pid, matched_student_id if matched else "UNMATCHED", match_score))
@@ -293,12 +563,11 @@ def split_pdf_to_student_pdfs(input_pdf_path: str,
                               page_mapping: Optional[Dict[str, List[int]]],
                               output_dir: str) -> List[Dict[str, Any]]:
     """
-    Splits input PDF into per-student PDFs.
-    Returns list of dicts: [{student_id, pages, output_path}, ...]
-    Requires PyPDF2 installed.
+    Splits input PDF into per-student PDFs (one open of the source, files written in parallel).
+    Returns list of dicts: [{student_id, pages, output_path, bytes, seconds}, ...]
     """
-    if PdfReader is None or PdfWriter is None:
-        raise RuntimeError("PyPDF2 not available. Install pyPDF2 to enable PDF splitting.")
+    # Imported here: smartscripts.utils pulls in the app package, which imports this module
+    from smartscripts.utils.pdf_helpers import split_pdf_pages
 
     if not os.path.exists(input_pdf_path):
         raise FileNotFoundError(f"Input PDF not found: {input_pdf_path}")
@@ -307,42 +576,23 @@ def split_pdf_to_student_pdfs(input_pdf_path: str,
     page_mapping = page_mapping or {}
     os.makedirs(output_dir, exist_ok=True)
 
-    reader = PdfReader(input_pdf_path)
-    results: List[Dict[str, Any]] = []
-
-    total_pages = len(getattr(reader, "pages", []))
-
+    jobs: List[Dict[str, Any]] = []
     for student_id, pages in page_mapping.items():
         if student_id == "UNMATCHED":
             fname = "UNMATCHED.pdf"
         elif student_id:
             fname = f"{student_id}.pdf"
         else:
-            fname = f"unknown_{len(results)+1}.pdf"
-
-        writer = PdfWriter()
-        for p in sorted(pages):
-            if p < 0 or p >= total_pages:
-                continue
-            try:
-                writer.add_page(reader.pages[p])
-            except Exception:
-                # compatibility fallback in case of differing PyPDF2 API
-                try:
-                    writer.addPage(reader.pages[p])  # older name
-                except Exception:
-                    logger.debug("Failed to add page %s for student %s", p, student_id)
-
-        out_path = os.path.join(output_dir, fname)
-        with open(out_path, "wb") as out_fh:
-            try:
-                writer.write(out_fh)
-            except Exception as e:
-                logger.error("Failed to write PDF %s: %s", out_path, e)
-                continue
-
-        results.append({"student_id": student_id, "pages": sorted(pages), "output_path": out_path})
+            fname = f"unknown_{len(jobs)+1}.pdf"
+        jobs.append({"student_id": student_id, "pages": pages,
+                     "output_path": os.path.join(output_dir, fname)})
 
+    results: List[Dict[str, Any]] = []
+    for job in split_pdf_pages(input_pdf_path, jobs):
+        if job["output_path"] is None:
+            logger.debug("No pages in range for student %s", job["student_id"])
+            continue
+        results.append(dict(job, output_path=str(job["output_path"])))
     return results
 
 
@@ -405,7 +655,8 @@ def sanitize_filename(name: Optional[str]) -> str:
 # ---------------------------
 
 def export_presence_table(presence_rows: List[Dict[str, Any]], csv_path: str) -> None:
-    headers = ["page_index", "detected_id", "detected_name", "confidence", "matched", "matched_id", "matched_name", "match_score"]
+    headers = ["page_index", "detected_id", "detected_name", "confidence", "matched", "matched_id",
+               "matched_name", "match_score", "match_margin", "ambiguous"]
     with open(csv_path, "w", newline="", encoding="utf-8") as fh:
         writer = csv.DictWriter(fh, fieldnames=headers)
         writer.writeheader()
@@ -419,14 +670,17 @@ def export_presence_table(presence_rows: List[Dict[str, Any]], csv_path: str) ->
 
 def mark_uncertain_pages(presence_rows: List[Dict[str, Any]], threshold: float = 0.6) -> List[Dict[str, Any]]:
     """
-    Returns rows annotated with 'uncertain' flag when confidence < threshold.
+    Returns rows annotated with 'uncertain' flag when confidence < threshold, or the
+    page is unmatched or its assignment was a close call.
     """
     for r in presence_rows or []:
         try:
             conf = float(r.get("confidence", 0.0) or 0.0)
         except Exception:
             conf = 0.0
-        r["uncertain"] = (conf < threshold) or (not bool(r.get("matched", False)))
+        r["uncertain"] = (
+            (conf < threshold) or (not bool(r.get("matched", False))) or bool(r.get("ambiguous"))
+        )
     return presence_rows
 
 
@@ -436,7 +690,7 @@ def mark_uncertain_pages(presence_rows: List[Dict[str, Any]], threshold: float =
 
 def detect_keyword_bboxes_from_image(image_path_or_pil: Any, keywords: Optional[List[str]] = None) -> List[Dict[str, Any]]:
     """
-    Return list of { keyword, bbox: {x,y,w,h}, text } using pytesseract image_to_data.
+    Return list of { keyword, bbox: {x,y,w,h}, text } from the shared per-page Tesseract layout.
     image_path_or_pil may be a file path or a PIL.Image
     """
     keywords = keywords or ["name", "id", "student", "registration"]
@@ -455,38 +709,20 @@ def detect_keyword_bboxes_from_image(image_path_or_pil: Any, keywords: Optional[
         return []
 
     try:
-        data = pytesseract.image_to_data(img, output_type=pytesseract.Output.DICT)
+        layout = get_page_layout(img)
     except Exception as e:
         logger.warning("pytesseract.image_to_data failed: %s", e)
         return []
 
     results: List[Dict[str, Any]] = []
-    text_list = data.get("text", []) or []
-    lefts = data.get("left", []) or []
-    tops = data.get("top", []) or []
-    widths = data.get("width", []) or []
-    heights = data.get("height", []) or []
-
-    for i, txt in enumerate(text_list):
-        if not txt or txt.strip() == "":
-            continue
-        lower = txt.strip().lower()
+    for word in layout.words:
+        lower = word["text"].lower()
         for kw in keywords:
             if kw in lower:
-                # guard index lookups
-                try:
-                    bbox = {
-                        "x": int(lefts[i]) if i < len(lefts) else 0,
-                        "y": int(tops[i]) if i < len(tops) else 0,
-                        "w": int(widths[i]) if i < len(widths) else 0,
-                        "h": int(heights[i]) if i < len(heights) else 0
-                    }
-                except Exception:
-                    bbox = {"x": 0, "y": 0, "w": 0, "h": 0}
                 results.append({
                     "keyword": kw,
-                    "text": txt,
-                    "bbox": bbox
+                    "text": word["text"],
+                    "bbox": {k: word[k] for k in ("x", "y", "w", "h")}
                 })
                 break
     return results
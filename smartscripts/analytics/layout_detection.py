@@ -5,18 +5,16 @@ import cv2
 import pandas as pd
 from PIL import Image
 import numpy as np
-import torch
-from transformers import TrOCRProcessor, VisionEncoderDecoderModel
-import pytesseract
-from typing import List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, Optional
 
 # ---------------------------
-# 1️⃣ Load TrOCR model
+# 1️⃣ TrOCR model (shared, lazily loaded)
 # ---------------------------
-processor = TrOCRProcessor.from_pretrained("microsoft/trocr-base-handwritten")
-model = VisionEncoderDecoderModel.from_pretrained("microsoft/trocr-base-handwritten")
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-model.to(device)
+from smartscripts.ai.ocr_engine import run_tr_ocr_pages, TROCR_BATCH_SIZE
+from smartscripts.ai.line_segmentation import binarize, form_line_mask
+from smartscripts.ai.page_layout import get_page_layout
+from smartscripts.ai.front_page_detector import page_stack, page_features, STACK_CHUNK
+from smartscripts.ai.front_page_classifier import decide_front_pages
 
 KEYWORDS = ["name", "id", "student", "signature", "date", "index", "admission", "reg"]
 
@@ -26,42 +24,50 @@ KEYWORDS = ["name", "id", "student", "signature", "date", "index", "admission",
 def run_trocr(image: np.ndarray) -> str:
     if image is None:
         return ""
-    pil_img = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
-    pixel_values = processor(images=pil_img, return_tensors="pt").pixel_values.to(device)
-    with torch.no_grad():
-        generated_ids = model.generate(pixel_values)
-    text = processor.batch_decode(generated_ids, skip_special_tokens=True)[0]
-    return text.lower().strip()
+    return run_trocr_batch([image])[0]
+
+
+def run_trocr_batch(images: List[np.ndarray]) -> List[str]:
+    """Line-segmented, batched TrOCR over BGR pages; one lower-cased text per page, in order."""
+    valid = [i for i, img in enumerate(images) if img is not None]
+    pil_images = [Image.fromarray(cv2.cvtColor(images[i], cv2.COLOR_BGR2RGB)) for i in valid]
+    texts = run_tr_ocr_pages(pil_images)
+    results = [""] * len(images)
+    for i, text in zip(valid, texts):
+        results[i] = text.lower().strip()
+    return results
 
 
 def run_tesseract(image: np.ndarray) -> str:
     if image is None:
         return ""
-    return pytesseract.image_to_string(image).lower().strip()
+    return get_page_layout(image).text.lower().strip()
+
+
+def read_rgb(path: Path) -> Optional[np.ndarray]:
+    """RGB page image, or None when the file cannot be read (the page is then skipped)."""
+    image = cv2.imread(str(path))
+    return None if image is None else cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
 
 
 # ---------------------------
 # 3️⃣ Layout Detection
 # ---------------------------
 def detect_form_lines(thresh_image: np.ndarray) -> int:
-    horizontal_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (40, 1))
-    vertical_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, 40))
-    horizontal_lines = cv2.morphologyEx(thresh_image, cv2.MORPH_OPEN, horizontal_kernel)
-    vertical_lines = cv2.morphologyEx(thresh_image, cv2.MORPH_OPEN, vertical_kernel)
-    combined = cv2.add(horizontal_lines, vertical_lines)
+    combined = form_line_mask(thresh_image)
     contours, _ = cv2.findContours(combined, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     return len(contours)
 
 
-def score_front_page(image: np.ndarray) -> Tuple[float, str]:
+def score_front_page(image: np.ndarray, ocr_text: Optional[str] = None) -> Tuple[float, str]:
+    """Score a page as a cover sheet. Pass `ocr_text` when TrOCR already ran (e.g. batched)."""
     if image is None:
         return 0.0, ""
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    thresh = cv2.adaptiveThreshold(
-        gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, 15, 10
-    )
+    thresh = binarize(gray)
 
-    ocr_text = run_trocr(image)
+    if ocr_text is None:
+        ocr_text = run_trocr(image)
     if not ocr_text.strip():
         ocr_text = run_tesseract(image)
 
@@ -115,16 +121,35 @@ def detect_and_split(
         raise RuntimeError("No pre-extracted images found. Convert PDF to images first.")
 
     results = []
-    front_page_indices = []
 
-    for idx, image_path in enumerate(image_paths):
-        image = cv2.imread(str(image_path))
+    # Classify every page from cheap features (reduced grayscale reads, one stack per
+    # chunk); only pages the classifier is unsure about are OCR-scored
+    features = np.concatenate([
+        page_features(page_stack([
+            cv2.imread(str(p), cv2.IMREAD_REDUCED_GRAYSCALE_4) for p in image_paths[start:start + STACK_CHUNK]
+        ]))
+        for start in range(0, len(image_paths), STACK_CHUNK)
+    ])
+    decision = decide_front_pages(
+        features,
+        render_page=lambda indices: [read_rgb(image_paths[i]) for i in indices],
+        threshold=threshold,
+    )
+    front_page_indices = decision["front_pages"]
+
+    def _front_pages_ocr():
+        # Read and OCR one micro-batch of cover sheets at a time
+        for start in range(0, len(front_page_indices), TROCR_BATCH_SIZE):
+            indices = front_page_indices[start:start + TROCR_BATCH_SIZE]
+            chunk = [cv2.imread(str(image_paths[i])) for i in indices]
+            yield from zip(indices, chunk, run_trocr_batch(chunk))
+
+    for idx, image, ocr_text in _front_pages_ocr():
         if image is None:
             continue
-
-        score, ocr_text = score_front_page(image)
-        if score >= threshold:
-            front_page_indices.append(idx)
+        if not ocr_text.strip():
+            ocr_text = run_tesseract(image)
+        score = round(float(decision["probabilities"][idx]), 3)
 
         student_id = None
         id_match = re.search(r"\b\d{4,}\b", ocr_text)
@@ -165,6 +165,15 @@ def create_app(config_name: str = "default"):
     def inject_current_year():
         return {"current_year": datetime.utcnow().year}
 
+    # ─── CLI commands ───────────────────────────────────────
+    from smartscripts.cli.models import models_cli
+    app.cli.add_command(models_cli)
+
+    # ─── Model warm-up (optional) ───────────────────────────
+    if app.config.get("MODEL_WARMUP"):
+        from smartscripts.ai.model_registry import warm_up_models
+        app.logger.info(f"Model warm-up report: {warm_up_models()}")
+
     # ─── Shell context ──────────────────────────────────────
     @app.shell_context_processor
     def make_shell_context():
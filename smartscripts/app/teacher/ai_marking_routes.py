@@ -20,6 +20,7 @@ from smartscripts.ai.marking_pipeline import (
     mark_batch_submissions,
     mark_single_submission,
 )
+from smartscripts.ai.ocr_cascade import CascadeBudget
 from smartscripts.tasks.grade_tasks import async_mark_submission
 from smartscripts.app.teacher.utils import get_file_path
 
@@ -90,12 +91,16 @@ def start_ai_marking_batch(test_id):
                 404,
             )
 
-        results = mark_batch_submissions(submissions, test_id)
+        budget = CascadeBudget()
+        results = mark_batch_submissions(submissions, test_id, budget=budget)
         for submission, result in zip(submissions, results):
             save_marked_image(submission, result)
 
         return jsonify(
-            {"message": f"✅ AI marking completed for {len(submissions)} submissions."}
+            {
+                "message": f"✅ AI marking completed for {len(submissions)} submissions.",
+                "ocr_cascade": budget.report(),
+            }
         )
     except Exception as e:
         current_app.logger.error(
@@ -183,7 +188,7 @@ def start_ai_grading_async(test_id):
 def reprocess_ocr(test_id, record_id):
     """Re-run OCR on a single attendance record."""
     # ✅ Local import to break circular dependency
-    from smartscripts.tasks.ocr_tasks import run_student_script_ocr_pipeline
+    from smartscripts.tasks.tasks_control import rerun_pipeline
 
     record = AttendanceRecord.query.get_or_404(record_id)
 
@@ -197,8 +202,11 @@ def reprocess_ocr(test_id, record_id):
         return redirect(url_for("review.review_test", test_id=test_id))
 
     try:
-        result = run_student_script_ocr_pipeline.delay(test_id)
-        record.ocr_task_id = result.id
+        # OCR and everything after it, with the parameters of the test's last pipeline launch
+        result = rerun_pipeline(test_id, "ocr")
+        if result["status"] != "STARTED":
+            raise RuntimeError(result.get("error"))
+        record.ocr_task_id = result["task_id"]
         db.session.commit()
         flash("OCR reprocessing task launched successfully.", "success")
     except Exception as e:
@@ -3,6 +3,8 @@ from pathlib import Path
 from flask import Blueprint, current_app, send_file, abort, flash, redirect, url_for
 from flask_login import login_required, current_user
 from smartscripts.models import Test
+from smartscripts.models.extracted_student_script import ExtractedStudentScript
+from smartscripts.utils.virtual_pdf import send_student_pdf
 
 download_bp = Blueprint("download_bp", __name__, url_prefix="/download")
 
@@ -83,6 +85,24 @@ def download_combined_scripts(test_id):
     return _secure_send_file(test.combined_scripts_path)
 
 
+@download_bp.route("/student_script/<int:script_id>")
+@login_required
+def download_student_script(script_id):
+    """
+    Download one student's script: built from its page range of the combined upload
+    for virtual scripts, otherwise the split file.
+    """
+    script = ExtractedStudentScript.query.get_or_404(script_id)
+    _check_test_ownership(script.test)
+    download_name = f"{script.ocr_student_id or script.id}.pdf"
+    if script.is_virtual:
+        response = send_student_pdf(script, download_name=download_name, as_attachment=True)
+        if response is None:
+            abort(404)
+        return response
+    return _secure_send_file(script.extracted_pdf_path)
+
+
 @download_bp.route("/student_list/<int:test_id>")
 @login_required
 def download_student_list(test_id):
@@ -8,6 +8,8 @@ from smartscripts.extensions import db
 from smartscripts.models import Test
 from smartscripts.models.extracted_student_script import ExtractedStudentScript
 from smartscripts.utils.file_helpers import get_uploaded_file_path, get_student_script_pdf_path
+from smartscripts.utils.pdf_helpers import pdf_page_count
+from smartscripts.utils.virtual_pdf import ranges_to_pages, source_pdf_file, student_pdf_bytes
 
 file_bp = Blueprint("file_bp", __name__)
 
@@ -31,7 +33,7 @@ def uploaded_file(filename):
 @file_bp.route("/start-ocr/<int:test_id>", methods=["POST"])
 def start_ocr(test_id: int):
     # Lazy import to avoid circular dependency
-    from smartscripts.tasks.ocr_tasks import run_student_script_ocr_pipeline
+    from smartscripts.tasks.tasks_control import start_ocr_stages
 
     test = Test.query.get_or_404(test_id)
     required_files = ["marking_guide_path", "question_paper_path", "combined_scripts_path", "class_list_path"]
@@ -39,7 +41,7 @@ def start_ocr(test_id: int):
     if missing:
         return jsonify({"error": f"Missing required files: {', '.join(missing)}"}), 400
 
-    task = run_student_script_ocr_pipeline.delay(
+    task = start_ocr_stages(
         test.id,
         str(get_uploaded_file_path(test.combined_scripts_path)),
         str(get_uploaded_file_path(test.class_list_path))
@@ -108,10 +110,15 @@ def export_zip(test_id: int):
 
     with zipfile.ZipFile(memory_file, "w") as zf:
         for script in scripts:
-            pdf_path = get_student_script_pdf_path(test_id, script.ocr_student_id)
-            if pdf_path:
-                arcname = f"{script.ocr_student_id or 'Unknown'}-{script.ocr_name or 'Unknown'}.pdf"
-                zf.write(pdf_path, arcname=arcname)
+            arcname = f"{script.ocr_student_id or 'Unknown'}-{script.ocr_name or 'Unknown'}.pdf"
+            if script.is_virtual:
+                built = student_pdf_bytes(script)
+                if built:
+                    zf.writestr(arcname, built[0])
+            else:
+                pdf_path = get_student_script_pdf_path(test_id, script.ocr_student_id)
+                if pdf_path:
+                    zf.write(pdf_path, arcname=arcname)
             rows.append({
                 "script_id": script.id,
                 "ocr_name": script.ocr_name,
@@ -139,6 +146,29 @@ def override_script(script_id: int):
     script = ExtractedStudentScript.query.get_or_404(script_id)
     data = request.get_json(force=True)
 
+    # Virtual scripts: moving pages between students only changes the manifest
+    if "page_ranges" in data and script.source_pdf_path:
+        source = source_pdf_file(script)
+        if source is None:
+            return jsonify({"error": "The combined PDF of this script is missing"}), 400
+        others = (
+            ExtractedStudentScript.query
+            .filter(ExtractedStudentScript.test_id == script.test_id,
+                    ExtractedStudentScript.source_pdf_path == script.source_pdf_path,
+                    ExtractedStudentScript.id != script.id)
+            .all()
+        )
+        try:
+            script.set_page_ranges(
+                data["page_ranges"],
+                source_page_count=pdf_page_count(source),
+                taken=[page for other in others for page in ranges_to_pages(other.page_ranges)],
+            )
+        except TypeError:
+            return jsonify({"error": "page_ranges must be [[first, last], ...]"}), 400
+        except ValueError as e:
+            return jsonify({"error": f"Invalid page_ranges: {e}"}), 400
+
     script.ocr_name = data.get("ocr_name", script.ocr_name)
     script.ocr_student_id = data.get("ocr_student_id", script.ocr_student_id)
     script.matched_id = data.get("matched_id", script.matched_id)
@@ -16,7 +16,8 @@ from smartscripts.app.forms import (
     UploadFileForm, DeleteFileForm, PreprocessingForm, TestForm
 )
 from smartscripts.utils.file_helpers import save_file, get_uploaded_file_path
-from smartscripts.tasks.ocr_tasks import run_student_script_ocr_pipeline
+from smartscripts.tasks.tasks_control import start_ocr_stages
+from smartscripts.tasks import control_channel
 
 manage_bp = Blueprint("manage_bp", __name__, url_prefix="/manage")
 logger = logging.getLogger(__name__)
@@ -231,12 +232,10 @@ def start_preprocessing(test_id: int):
         return redirect(url_for("manage_bp.manage_test_files", test_id=test.id))
 
     try:
-        task = run_student_script_ocr_pipeline.apply_async(
-            args=[
-                test.id,
-                str(get_uploaded_file_path(test.combined_scripts_path)),
-                str(get_uploaded_file_path(test.class_list_path))
-            ]
+        task = start_ocr_stages(
+            test.id,
+            str(get_uploaded_file_path(test.combined_scripts_path)),
+            str(get_uploaded_file_path(test.class_list_path))
         )
 
         test.ocr_task_id = task.id
@@ -290,20 +289,28 @@ def task_status(task_id):
 @manage_bp.route("/pause_task/<task_id>", methods=["POST"])
 @login_required
 def pause_task(task_id):
-    flash("Pause not implemented yet.", "warning")
+    result = control_channel.pause_task(task_id)
+    if result["status"] == "PAUSED":
+        flash("Task paused; it will stop after the current item.", "warning")
+    else:
+        flash(result["error"], "danger")
     return redirect(request.referrer or url_for("manage_bp.list_tests"))
 
 
 @manage_bp.route("/resume_task/<task_id>", methods=["POST"])
 @login_required
 def resume_task(task_id):
-    flash("Resume not implemented yet.", "info")
+    result = control_channel.resume_task(task_id)
+    if result["status"] == "RUNNING":
+        flash("Task resumed.", "info")
+    else:
+        flash(result["error"], "danger")
     return redirect(request.referrer or url_for("manage_bp.list_tests"))
 
 
 @manage_bp.route("/cancel_task/<task_id>", methods=["POST"])
 @login_required
 def cancel_task(task_id):
-    celery.control.revoke(task_id, terminate=True)
+    control_channel.cancel_task(task_id)
     flash("Task canceled.", "danger")
     return redirect(request.referrer or url_for("manage_bp.list_tests"))
@@ -15,6 +15,7 @@ from .utils import file_url, is_teacher_or_admin, get_urls_for_guide
 
 # ✅ Corrected imports: use the ocr_pipeline functions
 from smartscripts.services.ocr_pipeline import generate_presence_csv, generate_review_zip
+from smartscripts.utils.virtual_pdf import send_student_pdf
 
 
 
@@ -32,9 +33,10 @@ def review_test(test_id: int):
     student_scripts = ExtractedStudentScript.query.filter_by(test_id=test.id).all()
     urls = get_urls_for_guide(guide)
 
-    # attach file URLs to each script
+    # attach file URLs to each script (virtual scripts are built by review_student_pdf)
     for s in student_scripts:
-        s.file_url = file_url(s.extracted_pdf_path)
+        s.file_url = (url_for('teacher_bp.review_bp.review_student_pdf', script_id=s.id)
+                      if s.is_virtual else file_url(s.extracted_pdf_path))
 
     sections = [
         {'title': '📄 Marking Guide', 'uploaded': bool(urls.get("guide")), 'review_url': urls.get("guide")},
@@ -104,8 +106,15 @@ def review_student_pdf(script_id: int):
     if not test or not is_teacher_or_admin(test):
         abort(403)
 
+    if script.is_virtual:
+        response = send_student_pdf(script, download_name=f"script_{script.id}.pdf")
+        if response is None:
+            flash(f"Combined PDF not found: {script.source_pdf_path}", "warning")
+            return redirect(url_for('teacher_bp.review_bp.review_test', test_id=test.id))
+        return response
+
     full_path = Path(current_app.root_path) / 'static' / 'uploads' / script.extracted_pdf_path
-    if not full_path.exists():
+    if not script.extracted_pdf_path or not full_path.exists():
         flash(f"File not found: {script.extracted_pdf_path}", "warning")
         return redirect(url_for('teacher_bp.review_bp.review_test', test_id=test.id))
 
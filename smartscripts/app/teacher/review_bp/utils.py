@@ -2,29 +2,21 @@
 import re
 from pathlib import Path
 from typing import List, Optional, Tuple, Dict
-from io import BytesIO
 
-import cv2
-import numpy as np
 from PIL import Image
-import pytesseract
-import torch
-from transformers import TrOCRProcessor, VisionEncoderDecoderModel
 from flask import url_for, current_app
 from flask_login import current_user
 
 # type: ignore for optional library fixes
 try:
     import pandas as pd  # type: ignore
-    from thefuzz import process  # type: ignore
 except ImportError:
-    current_app.logger.warning("pandas or thefuzz not installed; fuzzy matching will fail.")
-
-from PyPDF2 import PdfReader, PdfWriter
-from pdf2image import convert_from_path
+    current_app.logger.warning("pandas not installed; class list matching will fail.")
 
 from smartscripts.extensions import db
 from smartscripts.models import Test, OCRSubmission, AuditLog
+from smartscripts.ai.ocr_engine import run_tr_ocr_pages
+from smartscripts.ai.page_layout import get_page_layout
 
 AUDIT_FIELD_OCR_NAME = "OCR_NAME"
 AUDIT_FIELD_OCR_ID = "OCR_ID"
@@ -101,36 +93,18 @@ def apply_ocr_override(sub: OCRSubmission, name: str, stud_id: str) -> bool:
 # Front Page Detection
 # -----------------------------
 def detect_front_page(image: Image.Image) -> Image.Image:
-    try:
-        img = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        _, thresh = cv2.threshold(gray, 200, 255, cv2.THRESH_BINARY_INV)
-        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        if not contours:
-            return image
-        largest = max(contours, key=cv2.contourArea)
-        x, y, w, h = cv2.boundingRect(largest)
-        cropped = img[y:y+h, x:x+w]
-        return Image.fromarray(cv2.cvtColor(cropped, cv2.COLOR_BGR2RGB))
-    except Exception as e:
-        current_app.logger.warning(f"[detect_front_page] Failed: {e}")
-        return image
+    """Crop the printed block of a cover sheet (shared with the OCR task)."""
+    from smartscripts.tasks.ocr_tasks import detect_front_page as crop_front_page
+
+    return crop_front_page(image)
 
 
 # -----------------------------
 # OCR Helpers
 # -----------------------------
-processor = TrOCRProcessor.from_pretrained("microsoft/trocr-base-handwritten")
-trocr_model = VisionEncoderDecoderModel.from_pretrained("microsoft/trocr-base-handwritten")
-device: torch.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-trocr_model.to(device)  # type: ignore
-
-
 def ocr_trocr(image: Image.Image) -> str:
     try:
-        pixel_values = processor(images=image, return_tensors="pt").pixel_values.to(device)  # type: ignore
-        generated_ids = trocr_model.generate(pixel_values)  # type: ignore
-        return processor.batch_decode(generated_ids, skip_special_tokens=True)[0]
+        return run_tr_ocr_pages([image])[0]
     except Exception as e:
         current_app.logger.warning(f"[ocr_trocr] Failed: {e}")
         return ""
@@ -138,7 +112,7 @@ def ocr_trocr(image: Image.Image) -> str:
 
 def ocr_tesseract(image: Image.Image) -> str:
     try:
-        return pytesseract.image_to_string(image)
+        return get_page_layout(image).text
     except Exception as e:
         current_app.logger.warning(f"[ocr_tesseract] Failed: {e}")
         return ""
@@ -148,29 +122,27 @@ def ocr_tesseract(image: Image.Image) -> str:
 # Fuzzy Matching
 # -----------------------------
 def fuzzy_match_student_id(extracted_id: str, class_list_df: "pd.DataFrame") -> Tuple[str, float]:
-    choices = class_list_df['student_id'].tolist()
-    match, score = process.extractOne(extracted_id, choices)
-    return match, score / 100.0
+    from smartscripts.ai.id_index import get_id_index
+
+    choices = class_list_df['student_id'].astype(str).tolist()
+    match, score = get_id_index(choices).best(extracted_id)
+    return match or "", score
 
 
 # -----------------------------
 # PDF Split / Organization
 # -----------------------------
 def split_pdf_per_student(pdf_path: Path, output_dir: Path, mapping: Dict[int, Tuple[str, str]]) -> None:
+    """Copy each mapped page (as-is, not re-rendered) into <student_id>-<name>.pdf."""
+    from smartscripts.utils.pdf_helpers import split_pdf_pages
+
     try:
         output_dir.mkdir(parents=True, exist_ok=True)
-        pages = convert_from_path(str(pdf_path), dpi=300)
-        for page_num, (student_id, name) in mapping.items():
-            pil_image = pages[page_num]
-            pdf_bytes = BytesIO()
-            pil_image.save(pdf_bytes, format="PDF")
-            pdf_bytes.seek(0)
-            reader = PdfReader(pdf_bytes)
-            writer = PdfWriter()
-            writer.add_page(reader.pages[0])
-            out_file = output_dir / f"{student_id}-{name}.pdf"
-            with open(out_file, "wb") as f:
-                writer.write(f)
+        jobs = [
+            {"output_path": output_dir / f"{student_id}-{name}.pdf", "pages": [page_num]}
+            for page_num, (student_id, name) in mapping.items()
+        ]
+        split_pdf_pages(pdf_path, jobs)
     except Exception as e:
         current_app.logger.error(f"[split_pdf_per_student] Failed: {e}")
 
@@ -206,10 +178,17 @@ def preprocess_test_pdf(pdf_path: Path, class_list_df: "pd.DataFrame", output_di
     page_mapping: Dict[int, Tuple[str, str]] = {}
     ocr_logs: List[Dict] = []
 
+    from smartscripts.utils.page_pyramid import iter_page_pyramids, region_from_box, LAYOUT, FULL
+    from smartscripts.tasks.ocr_tasks import front_page_box
+
     try:
-        pages = convert_from_path(str(pdf_path), dpi=300)
-        for i, pil_image in enumerate(pages):
-            front_img = detect_front_page(pil_image)
+        for page in iter_page_pyramids(pdf_path):
+            i = page.index
+            # Locate the printed block on the low-dpi level, then render just that block for OCR
+            layout = page.array(LAYOUT)
+            box, _ = front_page_box(layout)
+            region = region_from_box(box, (layout.shape[1], layout.shape[0])) if box else None
+            front_img = page.get(FULL.crop_of(region) if region else FULL)
             text = ocr_trocr(front_img)
             if not text.strip():
                 text = ocr_tesseract(front_img)
@@ -87,7 +87,11 @@ def parse_class_list(file_path: str) -> list[dict]:
         return students
 
     ext = file_path.rsplit(".", 1)[1].lower()
-    delimiter = "," if ext == "csv" else "\t"
+    if ext == "csv":
+        from smartscripts.ai.class_list_cache import get_class_list
+
+        return [{"name": s["student_name"], "student_id": s["student_id"]} for s in get_class_list(file_path).students]
+    delimiter = "\t"
 
     with open(file_path, newline="", encoding="utf-8") as f:
         reader = csv.DictReader(f, delimiter=delimiter)
@@ -4,6 +4,8 @@ Entry point for running Celery workers on Windows.
 Ensures Celery shares Flask app context and full configuration.
 """
 
+from celery.signals import worker_process_init
+
 from smartscripts.app import create_app
 from smartscripts.extensions import celery, make_celery
 
@@ -16,3 +18,11 @@ make_celery(flask_app)
 # Debug confirmation
 print("✅ Celery configured with broker:", celery.conf.broker_url)
 print("✅ Celery result backend:", celery.conf.result_backend)
+
+
+@worker_process_init.connect
+def warm_up_worker_models(**kwargs):
+    """Load OCR / embedding models once per worker process, before the first task."""
+    if flask_app.config.get("MODEL_WARMUP"):
+        from smartscripts.ai.model_registry import warm_up_models
+        print("✅ Model warm-up:", warm_up_models())
@@ -0,0 +1,126 @@
+# cli/models.py
+import json
+
+import click
+from flask.cli import AppGroup
+
+from smartscripts.ai.model_registry import (
+    warm_up_models,
+    model_memory_report,
+    TROCR_MODEL_NAME,
+    EMBEDDING_MODEL_NAME,
+)
+
+models_cli = AppGroup("models", help="Manage the shared OCR / embedding models.")
+
+
+@models_cli.command("warmup")
+@click.argument("names", nargs=-1)
+def warmup(names):
+    """Load models now (all registered models when no NAMES are given)."""
+    report = warm_up_models(list(names) or None)
+    click.echo(json.dumps(report, indent=2))
+
+
+@models_cli.command("report")
+def report():
+    """Show which models are loaded in this process and their size."""
+    click.echo(json.dumps(model_memory_report(), indent=2))
+
+
+@models_cli.command("export-onnx")
+@click.option("--no-quantize", is_flag=True, help="Keep fp32 graphs instead of int8.")
+def export_onnx(no_quantize):
+    """Export TrOCR and the embedder to ONNX for OCR_BACKEND=onnx."""
+    from smartscripts.ai.onnx_backend import export_trocr_onnx, export_embedder_onnx
+
+    click.echo(f"TrOCR → {export_trocr_onnx(TROCR_MODEL_NAME, quantize=not no_quantize)}")
+    click.echo(f"Embedder → {export_embedder_onnx(EMBEDDING_MODEL_NAME, quantize=not no_quantize)}")
+
+
+@models_cli.command("ocr-cache")
+@click.option("--clear", is_flag=True, help="Delete every cached OCR result.")
+@click.option("--engine", default=None, help="Limit --clear to one engine (e.g. tesseract).")
+def ocr_cache(clear, engine):
+    """Show (or clear) the content-addressed OCR result cache."""
+    from smartscripts.ai.ocr_cache import get_ocr_cache
+
+    cache = get_ocr_cache()
+    if cache is None:
+        click.echo("OCR cache is disabled.")
+        return
+    if clear:
+        cache.clear(engine)
+    click.echo(json.dumps(cache.stats(), indent=2))
+
+
+@models_cli.command("train-front-page")
+@click.option("--test-id", "test_ids", type=int, multiple=True, help="Only use reviews from these tests.")
+@click.option("--min-samples", default=20, show_default=True, help="Refuse to train on fewer labelled pages.")
+@click.option("--output", default=None, help="Model file (default FRONT_PAGE_MODEL_PATH).")
+def train_front_page(test_ids, min_samples, output):
+    """Retrain the front-page classifier from reviewer-confirmed PageReview labels."""
+    from smartscripts.models import Test, PageReview
+    from smartscripts.utils.file_helpers import get_uploaded_file_path
+    from smartscripts.ai.front_page_classifier import train_front_page_classifier
+
+    query = PageReview.query.join(Test, PageReview.test_id == Test.id).filter(
+        PageReview.reviewer_id.isnot(None), Test.combined_scripts_path.isnot(None)
+    )
+    if test_ids:
+        query = query.filter(PageReview.test_id.in_(test_ids))
+
+    # {combined PDF: {0-based page index: is_front_page}}; review page numbers are 1-based
+    labelled: dict = {}
+    for review, path in query.with_entities(PageReview, Test.combined_scripts_path):
+        pdf_path = str(get_uploaded_file_path(path))
+        labelled.setdefault(pdf_path, {})[review.page_number - 1] = bool(review.is_front_page)
+
+    total = sum(len(pages) for pages in labelled.values())
+    if total < min_samples:
+        raise click.ClickException(f"Only {total} labelled pages found (need {min_samples}).")
+    click.echo(f"Training on {total} labelled pages from {len(labelled)} uploads…")
+    try:
+        report = train_front_page_classifier(labelled, path=output)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(json.dumps(report, indent=2))
+
+
+def _parse_box(value):
+    if not value:
+        return None
+    try:
+        x0, y0, x1, y1 = (float(v) for v in value.split(","))
+    except ValueError:
+        raise click.BadParameter("expected x0,y0,x1,y1 as page fractions")
+    return x0, y0, x1, y1
+
+
+@models_cli.command("register-cover")
+@click.option("--test-id", type=int, required=True)
+@click.argument("source", type=click.Path(exists=True, dir_okay=False))
+@click.option("--page", default=1, show_default=True, help="1-based page of SOURCE when it is a PDF.")
+@click.option("--name-box", default=None, help="Name box as x0,y0,x1,y1 page fractions (located from labels if omitted).")
+@click.option("--id-box", default=None, help="Student ID box as x0,y0,x1,y1 page fractions.")
+def register_cover(test_id, source, page, name_box, id_box):
+    """Register a blank cover page (PDF page or image) as the name / ID template of a test."""
+    from PIL import Image
+    from smartscripts.ai.cover_template import register_cover_template
+
+    if source.lower().endswith(".pdf"):
+        from smartscripts.utils.page_pyramid import iter_page_pyramids, FULL
+
+        pyramid = next(iter_page_pyramids(source, start=page - 1, stop=page), None)
+        if pyramid is None:
+            raise click.ClickException(f"{source} has no page {page}.")
+        image = pyramid.get(FULL)
+    else:
+        image = Image.open(source).convert("RGB")
+
+    fields = {k: v for k, v in (("name", _parse_box(name_box)), ("student_id", _parse_box(id_box))) if v}
+    try:
+        template = register_cover_template(test_id, image, fields)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(json.dumps({"test_id": test_id, "fields": template.fields}, indent=2))
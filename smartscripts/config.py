@@ -61,6 +61,12 @@ class BaseConfig:
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
     HUGGINGFACE_API_KEY = os.getenv("HUGGINGFACE_API_KEY")
     TROCR_MODEL = os.getenv("TROCR_MODEL", "microsoft/trocr-base-handwritten")
+    # Load OCR / embedding models at start-up instead of on first request
+    MODEL_WARMUP = os.getenv("MODEL_WARMUP", "False").lower() in ["true", "1", "yes"]
+    # Keep only the combined upload + per-script page ranges; build student PDFs on request
+    VIRTUAL_STUDENT_PDFS = os.getenv("VIRTUAL_STUDENT_PDFS", "False").lower() in ["true", "1", "yes"]
+    # Model, OCR, pipeline and task tuning is read from the environment by the modules that
+    # use it, at import, so the web app and the workers agree
     GPT_MODEL = os.getenv("GPT_MODEL", "gpt-4")
 
     # ─── Database (Common) ───────────────────────────────────────────────────
@@ -54,6 +54,7 @@ def make_celery(app):
             "smartscripts.tasks.grade_tasks",
             "smartscripts.tasks.matching_tasks",
             "smartscripts.tasks.review_tasks",
+            "smartscripts.tasks.pipeline_stages",
             "smartscripts.tasks.tasks_control",
         ],
     )
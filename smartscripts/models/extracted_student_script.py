@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean, Float, Index
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean, Float, Index, Text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from smartscripts.extensions import db
@@ -25,6 +25,14 @@ class ExtractedStudentScript(db.Model):
     ocr_student_id = Column(String(50), nullable=True)
     ocr_confidence = Column(Float, nullable=True)
     page_count = Column(Integer, default=1)
+    # Virtual scripts: pages of the combined upload instead of a split file
+    source_pdf_path = Column(String(512), nullable=True)
+    page_ranges = Column(db.JSON, nullable=True)  # [[first, last], ...] 0-based, inclusive
+    # Grading checkpoint: None (pending) / "GRADED" / "FAILED"; retries resume at the first unfinished script
+    grading_status = Column(String(20), nullable=True)
+    grading_error = Column(Text, nullable=True)
+    grading_attempts = Column(Integer, default=0)
+    graded_at = Column(DateTime, nullable=True)
     is_confirmed = Column(Boolean, default=False)
     is_absent = Column(Boolean, default=False)
     extracted_at = Column(DateTime, default=datetime.utcnow)
@@ -52,3 +60,57 @@ class ExtractedStudentScript(db.Model):
     def absolute_pdf_path(self):
         from flask import current_app
         return current_app.root_path / self.extracted_pdf_path
+
+    @property
+    def is_virtual(self) -> bool:
+        """True when the PDF is built on request from page_ranges of source_pdf_path."""
+        return bool(self.source_pdf_path and self.page_ranges)
+
+    def set_page_ranges(self, ranges, source_page_count=None, taken=()):
+        """
+        Re-assign this script's pages of the combined upload; served PDFs follow at once.
+        Raises ValueError (nothing is changed) for empty, reversed or negative ranges,
+        pages past `source_page_count`, and pages that overlap each other or `taken`
+        (the pages other scripts of the same upload hold).
+        """
+        parsed = [[int(first), int(last)] for first, last in ranges]
+        if not parsed:
+            raise ValueError("at least one page range is required")
+        taken = set(taken)
+        pages = set()
+        for first, last in parsed:
+            if first < 0 or first > last:
+                raise ValueError(f"[{first}, {last}] is not a range of 0-based page indices")
+            if source_page_count is not None and last >= source_page_count:
+                raise ValueError(f"page {last} is past the end of the upload "
+                                 f"({source_page_count} pages)")
+            span = set(range(first, last + 1))
+            if span & pages:
+                raise ValueError(f"[{first}, {last}] overlaps another range of this script")
+            if span & taken:
+                raise ValueError(f"[{first}, {last}] overlaps pages of another script")
+            pages |= span
+        self.page_ranges = parsed
+        self.page_count = len(pages)
+
+    @property
+    def is_graded(self) -> bool:
+        return self.grading_status == "GRADED"
+
+    def mark_graded(self):
+        """Record a successful grade write (committed together with it)."""
+        self.grading_status = "GRADED"
+        self.grading_error = None
+        self.grading_attempts = (self.grading_attempts or 0) + 1
+        self.graded_at = datetime.utcnow()
+
+    def mark_grading_failed(self, error):
+        """Record a failed grading attempt; the script stays unfinished and is retried."""
+        self.grading_status = "FAILED"
+        self.grading_error = str(error)[:2000]
+        self.grading_attempts = (self.grading_attempts or 0) + 1
+
+    def reset_grading(self):
+        self.grading_status = None
+        self.grading_error = None
+        self.graded_at = None
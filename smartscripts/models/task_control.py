@@ -8,6 +8,7 @@ class TaskControl(db.Model):
     """
     Stores the control state of a long-running Celery task.
     Used for pause, resume, cancel, and tracking OCR preprocessing.
+    Paused tasks store a checkpoint here and are re-enqueued on resume (see tasks.control_channel).
     """
 
     __tablename__ = "task_control"
@@ -16,6 +17,12 @@ class TaskControl(db.Model):
     task_id = db.Column(db.String(128), unique=True, nullable=False, index=True)
     status = db.Column(db.String(20), default="RUNNING", nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # How to re-enqueue the task on resume, and where a paused task stopped
+    task_name = db.Column(db.String(255), nullable=True)
+    task_args = db.Column(db.JSON, nullable=True)
+    checkpoint = db.Column(db.JSON, nullable=True)
 
     # ✅ Correct Foreign Key: matches __tablename__ = "tests"
     test_id = db.Column(db.Integer, db.ForeignKey("tests.id"), nullable=False)
@@ -15,7 +15,7 @@ from smartscripts.services.ocr_helpers import (
     detect_student_front_pages,
     pdf_to_images,
     safe_extract_name_id,
-    split_pdf_by_page_ranges,
+    split_pdf_pages,
 )
 
 logger = logging.getLogger(__name__)
@@ -215,6 +215,7 @@ def split_pdf_by_student(
     upload_dir.mkdir(parents=True, exist_ok=True)
 
     student_scripts: List[Dict[str, str]] = []
+    split_jobs: List[Dict] = []
 
     for start, end in page_ranges:
         front_image = images[start]
@@ -222,29 +223,25 @@ def split_pdf_by_student(
         student_id = student_id or "unknown"
         name = name or "unknown"
 
-        split_paths = split_pdf_by_page_ranges(
-            pdf_path=str(pdf_path),
-            ranges=[(start, end)],
-            output_dir=str(upload_dir),
-        )
-        extracted_pdf_path: Optional[Path] = split_paths[0] if split_paths else None
-
-        if extracted_pdf_path:
-            new_filename = f"{student_id}-{name.replace(' ', '_')}.pdf"
-            new_path = upload_dir / new_filename
-            extracted_pdf_path.rename(new_path)
-            extracted_pdf_path = new_path
-
-        student_scripts.append({
+        script = {
             "ocr_student_id": student_id,
             "ocr_name": name,
             "ocr_confidence": str(confidence),
-            "extracted_pdf_path": (
-                str(extracted_pdf_path.relative_to(get_upload_root()))
-                if extracted_pdf_path else ""
-            ),
+            "extracted_pdf_path": "",
+        }
+        student_scripts.append(script)
+        split_jobs.append({
+            "output_path": upload_dir / f"{student_id}-{name.replace(' ', '_')}.pdf",
+            "pages": list(range(start, end + 1)),
+            "script": script,
         })
 
+    # All students split from one open of the combined PDF
+    for job in split_pdf_pages(pdf_path, split_jobs):
+        extracted_pdf_path: Optional[Path] = job["output_path"]
+        if extracted_pdf_path:
+            job["script"]["extracted_pdf_path"] = str(extracted_pdf_path.relative_to(get_upload_root()))
+
     if class_list:
         for script in student_scripts:
             matched = [
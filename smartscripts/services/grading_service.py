@@ -4,7 +4,7 @@ from pathlib import Path
 from typing import List, Dict, Optional, Any, Union
 
 from flask import current_app
-from smartscripts.models import StudentSubmission as Submission, db
+from smartscripts.models import StudentSubmission as Submission, MarkingGuide, db
 from smartscripts.services.student_preprocessing import preprocess_student_submissions
 from smartscripts.utils.file_helpers import get_submission_dir
 from smartscripts.services.analytics_service import generate_review_zip  # ZIP generation logic
@@ -106,6 +106,36 @@ class GradingService:
         logger.info("Graded submission %s: %s", submission_id, result["grade"])
         return result
 
+    def grade_student_script(self, script: Any) -> Dict[str, Optional[str]]:
+        """
+        Grade one ExtractedStudentScript into its test's submission for that student.
+        Idempotent: a re-run updates the same StudentSubmission instead of adding one.
+        Flushes but does not commit, so the caller commits the grade together with
+        the script's grading checkpoint.
+        """
+        if not script.student_id:
+            raise ValueError(f"Script {script.id} is not linked to a student")
+        guide = MarkingGuide.query.filter_by(test_id=script.test_id).first()
+        if not guide:
+            raise ValueError(f"Test {script.test_id} has no marking guide")
+
+        submission = Submission.query.filter_by(test_id=script.test_id, student_id=script.student_id).first()
+        if submission is None:
+            submission = Submission(
+                test_id=script.test_id,
+                student_id=script.student_id,
+                guide_id=guide.id,
+                filename=Path(script.extracted_pdf_path or f"script_{script.id}.pdf").name,
+            )
+            db.session.add(submission)
+
+        result = self.run_ai_marking(submission)
+        submission.grade = result.get("grade")
+        submission.feedback = result.get("feedback")
+        submission.status = "graded"
+        db.session.flush()
+        return result
+
     def batch_grade_scripts(self, submission_ids: List[int]) -> int:
         """Batch grade multiple submissions."""
         submissions = Submission.query.filter(Submission.id.in_(submission_ids)).all()
@@ -167,6 +197,10 @@ def grade_script(submission_id: int) -> Dict[str, Optional[str]]:
     return _service.grade_script(submission_id)
 
 
+def grade_student_script(script: Any) -> Dict[str, Optional[str]]:
+    return _service.grade_student_script(script)
+
+
 def batch_grade_scripts(submission_ids: List[int]) -> int:
     return _service.batch_grade_scripts(submission_ids)
 
@@ -6,7 +6,7 @@ from werkzeug.utils import secure_filename
 
 from smartscripts.utils.pdf_helpers import (
     convert_pdf_to_images,
-    split_pdf_by_page_ranges,
+    split_pdf_pages,
     is_front_page,
 )
 from smartscripts.ai.ocr_engine import extract_name_id_from_image
@@ -91,29 +91,17 @@ def split_pdf_for_student(
     output_dir: Path
 ) -> Path:
     """
-    Split the main PDF into a single student script PDF.
+    Split the main PDF into a single student script PDF (0-based inclusive page range,
+    as returned by detect_student_front_pages).
     Returns the path of the created student PDF.
     """
-    output_dir.mkdir(parents=True, exist_ok=True)
-
-    # Split PDF by page ranges
-    split_paths = split_pdf_by_page_ranges(
-        str(pdf_path),
-        ranges=[(start_page, end_page)],
-        output_dir=str(output_dir)
-    )
-    if not split_paths:
-        raise RuntimeError(f"Failed to split PDF for {student_id}-{student_name}")
-
-    output_path = Path(split_paths[0])
-
-    # Optionally rename to safe student ID + name
     safe_name = secure_filename(student_name or "unknown")
     safe_id = secure_filename(student_id or "unknown")
-    renamed_path = output_dir / f"{safe_id}-{safe_name}.pdf"
-    output_path.rename(renamed_path)
-
-    return renamed_path
+    job = {"output_path": output_dir / f"{safe_id}-{safe_name}.pdf", "pages": list(range(start_page, end_page + 1))}
+    output_path = split_pdf_pages(pdf_path, [job])[0]["output_path"]
+    if output_path is None:
+        raise RuntimeError(f"Failed to split PDF for {student_id}-{student_name}")
+    return output_path
 
 
 def rename_student_pdfs(
@@ -6,28 +6,30 @@ from uuid import uuid4
 from difflib import SequenceMatcher
 from tempfile import NamedTemporaryFile
 
-import fitz  # PyMuPDF
 from werkzeug.utils import secure_filename
 from PIL import Image
 from flask import current_app
 
 from smartscripts.models.extracted_student_script import ExtractedStudentScript
-from smartscripts.ai.ocr_engine import extract_name_id_from_image
+from smartscripts.ai.ocr_engine import extract_name_id_from_image, extract_name_id_from_fields
+from smartscripts.ai.cover_template import get_cover_template, pyramid_field_crops
 from smartscripts.ai.text_matching import fuzzy_match_id
-from smartscripts.tasks.ocr_tasks import detect_front_pages_opencv
+from smartscripts.tasks.ocr_tasks import front_page_ranges, detect_front_pages_in_pdf
 from smartscripts.services.ocr_utils import generate_review_zip  # Canonical ZIP function
-from smartscripts.utils.file_helpers import get_uploaded_file_path
+from smartscripts.utils.page_pyramid import iter_page_pyramids, HEADER
+from smartscripts.utils.pdf_helpers import split_pdf_pages
+from smartscripts.utils.virtual_pdf import VIRTUAL_STUDENT_PDFS, student_pdf_bytes
 
 
 # -------------------------------
 # OCR Extraction & Student Matching
 # -------------------------------
-def ocr_extract_student_info(page_image: Image.Image) -> Tuple[str, str, float]:
-    """Extract student name and ID from a single PIL Image using OCR."""
+def ocr_extract_student_info(page_image: Image.Image, template=None) -> Tuple[str, str, float]:
+    """Extract student name and ID from a single PIL Image using OCR (aligned to `template` when given)."""
     with NamedTemporaryFile(suffix=".png") as tmp:
         page_image.save(tmp.name)
         try:
-            result = extract_name_id_from_image(tmp.name)
+            result = extract_name_id_from_image(tmp.name, template=template)
             if not isinstance(result, (list, tuple)):
                 result = ("", "", 0.0)
         except Exception:
@@ -67,21 +69,19 @@ def fuzzy_match_student(student_id: str, name: str, class_list: List[Dict[str, A
 # -------------------------------
 # PDF Handling
 # -------------------------------
+def student_pdf_path(output_dir: Path, student_name: str, student_id: str) -> Path:
+    safe_name = secure_filename(student_name or "unknown")
+    safe_id = secure_filename(student_id or "unknown")
+    return output_dir / f"{uuid4().hex}_{safe_id}-{safe_name}.pdf"
+
+
 def split_pdf_for_student(pdf_path: Path, start_page: int, end_page: int,
                           student_name: str, student_id: str,
                           output_dir: Path) -> Path:
     """Extract a range of pages from the combined PDF and save per student."""
-    pdf = fitz.open(pdf_path)
-    student_pdf = fitz.open()
-    for p in range(start_page, end_page + 1):
-        student_pdf.insert_pdf(pdf, from_page=p, to_page=p)
-
-    safe_name = secure_filename(student_name or "unknown")
-    safe_id = secure_filename(student_id or "unknown")
-    filename = f"{uuid4().hex}_{safe_id}-{safe_name}.pdf"
-    output_path = output_dir / filename
-    student_pdf.save(str(output_path))
-    return output_path
+    job = {"output_path": student_pdf_path(output_dir, student_name, student_id),
+           "pages": list(range(start_page, end_page + 1))}
+    return split_pdf_pages(pdf_path, [job])[0]["output_path"]
 
 
 # -------------------------------
@@ -119,16 +119,32 @@ def run_full_preprocessing(combined_pdf_path: Path, test_id: int,
     upload_dir = Path(app.root_path) / "static" / "uploads" / str(test_id)
     upload_dir.mkdir(parents=True, exist_ok=True)
 
-    from pdf2image import convert_from_path
-    images = convert_from_path(str(combined_pdf_path), dpi=300)
-    front_pages = detect_front_pages_opencv(images)
+    # Classify all pages as low-dpi grayscale stacks. Cover sheets that align to the
+    # test's registered template have only their name / ID boxes rendered and OCR'd
+    # (in one batch); the rest fall back to OCR of the whole header.
+    front_indices, scores = detect_front_pages_in_pdf(combined_pdf_path)
+    wanted = set(front_indices)
+    template = get_cover_template(test_id)
+    front_info: Dict[int, Tuple[str, str, float]] = {}
+    field_pages: List[Tuple[int, Dict[str, Image.Image]]] = []
+    for page in iter_page_pyramids(combined_pdf_path):
+        if page.index not in wanted:
+            continue
+        crops = pyramid_field_crops(page, template) if template else None
+        if crops:
+            field_pages.append((page.index, crops))
+        else:
+            front_info[page.index] = ocr_extract_student_info(page.get(HEADER))
+    for (index, _), info in zip(field_pages, extract_name_id_from_fields([c for _, c in field_pages])):
+        front_info[index] = info
+    front_pages = front_page_ranges(sorted(front_info), len(scores))
 
     extracted_student_scripts: List[ExtractedStudentScript] = []
+    split_jobs: List[Dict[str, Any]] = []
     attendance = {"present": [], "absent": []}
 
     for start, end in front_pages:
-        page_image = images[start]
-        name, student_id, confidence = ocr_extract_student_info(page_image)
+        name, student_id, confidence = front_info[start]
         matched = fuzzy_match_student(student_id, name, class_list)
 
         if matched:
@@ -144,18 +160,8 @@ def run_full_preprocessing(combined_pdf_path: Path, test_id: int,
                 "confidence": confidence
             })
 
-        student_pdf_path = split_pdf_for_student(
-            pdf_path=combined_pdf_path,
-            start_page=start,
-            end_page=end,
-            student_name=matched["name"] if matched else name,
-            student_id=matched["id"] if matched else student_id,
-            output_dir=upload_dir
-        )
-
         # Assign ORM fields
         student_script = ExtractedStudentScript()
-        student_script.extracted_pdf_path = str(student_pdf_path.relative_to(upload_dir.parent.parent))
         student_script.ocr_name = name
         student_script.ocr_student_id = student_id
         student_script.confidence = confidence
@@ -165,6 +171,38 @@ def run_full_preprocessing(combined_pdf_path: Path, test_id: int,
         student_script.page_count = end - start + 1
 
         extracted_student_scripts.append(student_script)
+        split_jobs.append({
+            "output_path": student_pdf_path(upload_dir, student_script.student_name, student_script.matched_id),
+            "pages": list(range(start, end + 1)),
+            "script": student_script,
+        })
+
+    split_stats = []
+    student_files: List[Dict[str, Any]] = []
+    if app.config.get("VIRTUAL_STUDENT_PDFS", VIRTUAL_STUDENT_PDFS):
+        # Nothing written: each script keeps its page range of the combined PDF and is
+        # built on request by the review / download routes
+        source = Path(combined_pdf_path).resolve()
+        uploads_root = upload_dir.parent.resolve()
+        source_rel = str(source.relative_to(uploads_root)) if source.is_relative_to(uploads_root) else str(source)
+        for job in split_jobs:
+            script = job["script"]
+            script.extracted_pdf_path = ""
+            script.source_pdf_path = source_rel
+            script.set_page_ranges([[job["pages"][0], job["pages"][-1]]])
+            # The review ZIP gets the same per-student PDFs the download routes build
+            built = student_pdf_bytes(script)
+            if built:
+                student_files.append({"arcname": job["output_path"].name, "data": built[0]})
+    else:
+        # Every student's pages copied from one open of the combined PDF, written in parallel
+        for job in split_pdf_pages(combined_pdf_path, split_jobs):
+            script = job["script"]
+            if job["output_path"]:
+                script.extracted_pdf_path = str(job["output_path"].relative_to(upload_dir.parent.parent))
+                student_files.append({"output_path": str(job["output_path"])})
+            split_stats.append({"id": script.matched_id, "pages": len(job["pages"]),
+                                "bytes": job["bytes"], "seconds": job["seconds"]})
 
     presence_csv = generate_presence_csv(attendance["present"], attendance["absent"], test_id, upload_dir)
 
@@ -172,15 +210,7 @@ def run_full_preprocessing(combined_pdf_path: Path, test_id: int,
     # FIXED: Corrected call to generate_review_zip
     # -------------------------------
     review_zip_path = generate_review_zip(
-        per_student_files=[
-            {
-                "pdf_path": get_uploaded_file_path(s.extracted_pdf_path),
-                "name": s.student_name,
-                "id": s.matched_id,
-                "confidence": s.confidence
-            }
-            for s in extracted_student_scripts if s.extracted_pdf_path
-        ],
+        per_student_files=student_files,
         presence_rows=[{**s} for s in attendance["present"] + attendance["absent"]],
         zip_path=str(upload_dir / f"review_test_{test_id}.zip")
     )
@@ -188,5 +218,6 @@ def run_full_preprocessing(combined_pdf_path: Path, test_id: int,
     return {
         "attendance": attendance,
         "review_zip": str(review_zip_path),
-        "extracted_student_scripts": extracted_student_scripts
+        "extracted_student_scripts": extracted_student_scripts,
+        "split_stats": split_stats
     }
@@ -27,7 +27,8 @@ def generate_review_zip(
     - Optional extra files
 
     Args:
-        per_student_files: list of dicts with {"output_path": <path-to-pdf>}
+        per_student_files: list of dicts with {"output_path": <path-to-pdf>}, or
+            {"arcname": <name>, "data": <pdf-bytes>} for PDFs built in memory
         presence_rows: list of dicts containing OCR/match data
         zip_path: path where the ZIP will be written
         extra_files: optional list of additional file paths to include
@@ -43,7 +44,9 @@ def generate_review_zip(
         # Add student PDFs
         for info in per_student_files:
             out_path = info.get("output_path")
-            if out_path and os.path.exists(out_path):
+            if info.get("data") is not None:
+                zf.writestr(info["arcname"], info["data"])
+            elif out_path and os.path.exists(out_path):
                 zf.write(out_path, arcname=os.path.basename(out_path))
 
         # Generate presence CSV content
@@ -12,6 +12,7 @@ from . import ocr_tasks
 from . import grade_tasks
 from . import matching_tasks
 from . import review_tasks
+from . import pipeline_stages
 from . import tasks_control
 
 __all__ = ["celery"]
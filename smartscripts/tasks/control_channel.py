@@ -0,0 +1,225 @@
+"""
+smartscripts/tasks/control_channel.py
+-------------------------------------
+Cheap pause / resume / cancel signalling for long-running tasks.
+
+Control requests are written to the TaskControl row *and* published as a short key
+on the Redis broker (`smartscripts:task_control:<task_id>`). Task loops read the key
+once per item, which costs a broker GET instead of a database refresh; without Redis
+they fall back to re-reading the row at most every TASK_CONTROL_POLL_SECONDS.
+
+A paused task does not sleep in its worker slot: it saves a checkpoint on its
+TaskControl row, leaves its result in the PAUSED state and stops (celery Ignore, so
+it is not recorded as SUCCESS). `resume_task` re-enqueues it under the same task id
+with the recorded arguments, and the task picks up from the checkpoint.
+"""
+
+import os
+import time
+import logging
+from typing import Any, Dict, NoReturn, Optional
+
+from celery.exceptions import Ignore
+
+from smartscripts.extensions import celery, db
+
+logger = logging.getLogger(__name__)
+
+CONTROL_KEY_PREFIX = "smartscripts:task_control:"
+CONTROL_KEY_TTL = 7 * 24 * 3600
+# Database re-read interval when no broker key is available
+TASK_CONTROL_POLL_SECONDS = float(os.getenv("TASK_CONTROL_POLL_SECONDS", "2"))
+# After a failed broker connect, use the database for this long before trying again
+REDIS_RETRY_SECONDS = 30.0
+
+_redis_client = None
+_redis_retry_at = 0.0
+
+
+def _redis():
+    """Redis client on the Celery broker, or None when the broker is not Redis / unreachable."""
+    global _redis_client, _redis_retry_at
+    if _redis_client is not None:
+        return _redis_client
+    url = str(celery.conf.broker_url or "")
+    if not url.startswith(("redis://", "rediss://")) or time.monotonic() < _redis_retry_at:
+        return None
+    try:
+        import redis  # type: ignore
+
+        client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        client.ping()
+        _redis_client = client
+    except Exception as e:
+        _redis_retry_at = time.monotonic() + REDIS_RETRY_SECONDS
+        logger.warning("Task control channel falling back to the database: %s", e)
+    return _redis_client
+
+
+def publish_status(task_id: str, status: str) -> None:
+    client = _redis()
+    if client is not None:
+        try:
+            client.set(CONTROL_KEY_PREFIX + task_id, status, ex=CONTROL_KEY_TTL)
+        except Exception as e:
+            logger.warning("Could not publish %s for task %s: %s", status, task_id, e)
+
+
+def published_status(task_id: str) -> Optional[str]:
+    """Status from the broker key, or None (no Redis / no key) to fall back to the row."""
+    client = _redis()
+    if client is None:
+        return None
+    try:
+        value = client.get(CONTROL_KEY_PREFIX + task_id)
+    except Exception:
+        return None
+    if value is None:
+        return None
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+# ---------------------------
+# Task side
+# ---------------------------
+
+class ControlChannel:
+    """Per-item control check for one running task."""
+
+    def __init__(self, task, db_state, poll_seconds: float = TASK_CONTROL_POLL_SECONDS,
+                 checkpoint: Optional[Dict[str, Any]] = None) -> None:
+        self.task = task
+        self.db_state = db_state
+        self._checkpoint = checkpoint
+        self.poll_seconds = poll_seconds
+        self._last_poll = time.monotonic()
+
+    @classmethod
+    def attach(cls, task, test_id: int, args=(), kwargs=None) -> "ControlChannel":
+        """
+        Get or create the TaskControl row for the running task (retries and resumes reuse
+        it) and record how to re-enqueue it. A parked task's checkpoint moves from the row
+        to the channel, so the row only holds one while the task is parked and a later
+        resume re-enqueues the task only if it parked again.
+        """
+        from smartscripts.models.task_control import TaskControl
+
+        task_id = task.request.id
+        db_state = TaskControl.query.filter_by(task_id=task_id).first()
+        if db_state is None:
+            # A pause / cancel may have been published before the row existed
+            requested = published_status(task_id)
+            status = requested if requested in ("PAUSED", "CANCELLED") else "RUNNING"
+            db_state = TaskControl(task_id=task_id, test_id=test_id, status=status)
+            db.session.add(db_state)
+        elif db_state.status not in ("PAUSED", "CANCELLED"):
+            db_state.status = "RUNNING"
+        checkpoint = db_state.checkpoint
+        db_state.checkpoint = None
+        db_state.task_name = task.name
+        db_state.task_args = {"args": list(args), "kwargs": dict(kwargs or {})}
+        db.session.commit()
+        publish_status(task_id, db_state.status)
+        return cls(task, db_state, checkpoint=checkpoint)
+
+    @property
+    def checkpoint(self) -> Dict[str, Any]:
+        return dict(self._checkpoint or {})
+
+    def status(self) -> str:
+        published = published_status(self.db_state.task_id)
+        if published is not None:
+            return published
+        now = time.monotonic()
+        if now - self._last_poll >= self.poll_seconds:
+            db.session.refresh(self.db_state)
+            self._last_poll = now
+        return self.db_state.status
+
+    def park(self, checkpoint: Dict[str, Any], **meta) -> NoReturn:
+        """
+        Save the checkpoint, leave the task's result in the PAUSED state and stop it
+        (raises Ignore, so the worker does not overwrite the state with SUCCESS).
+        """
+        self.db_state.status = "PAUSED"
+        self.db_state.checkpoint = checkpoint
+        db.session.commit()
+        self.task.update_state(state="PAUSED", meta={
+            "status": "PAUSED", "task_id": self.db_state.task_id, "test_id": self.db_state.test_id,
+            "checkpoint": checkpoint, **meta,
+        })
+        logger.info("Task %s paused at %s", self.db_state.task_id, checkpoint)
+        raise Ignore()
+
+    def finish(self, status: str) -> None:
+        _close_row(self.db_state, status)
+
+
+def _close_row(row, status: str) -> None:
+    row.status = status
+    row.checkpoint = None
+    db.session.commit()
+    publish_status(row.task_id, status)
+
+
+def finish_task(task_id: str, status: str) -> None:
+    """Close the TaskControl row of a task that ended (if it has one); a cancel is kept."""
+    from smartscripts.models.task_control import TaskControl
+
+    row = TaskControl.query.filter_by(task_id=task_id).first()
+    if row is not None and row.status != "CANCELLED":
+        _close_row(row, status)
+
+
+# ---------------------------
+# Request side (routes)
+# ---------------------------
+
+def _control_row(task_id: str):
+    from smartscripts.models.task_control import TaskControl
+
+    return TaskControl.query.filter_by(task_id=task_id).first()
+
+
+def pause_task(task_id: str) -> Dict[str, Any]:
+    row = _control_row(task_id)
+    if row is None or row.status != "RUNNING":
+        return {"status": "FAILED", "error": f"Task {task_id} is not running"}
+    row.status = "PAUSED"
+    db.session.commit()
+    publish_status(task_id, "PAUSED")
+    return {"status": "PAUSED", "task_id": task_id}
+
+
+def resume_task(task_id: str) -> Dict[str, Any]:
+    """
+    Clear a pause; a task that parked (its row holds a checkpoint until the re-enqueued
+    run attaches) is re-enqueued from its checkpoint.
+    """
+    row = _control_row(task_id)
+    if row is None or row.status != "PAUSED":
+        return {"status": "FAILED", "error": f"Task {task_id} is not paused"}
+
+    parked = row.checkpoint is not None
+    row.status = "RUNNING"
+    db.session.commit()
+    publish_status(task_id, "RUNNING")
+    if parked:
+        if not row.task_name:
+            return {"status": "FAILED", "error": f"Task {task_id} cannot be re-enqueued"}
+        saved = row.task_args or {}
+        celery.send_task(row.task_name, args=saved.get("args", []), kwargs=saved.get("kwargs", {}),
+                         task_id=task_id)
+        logger.info("Re-enqueued paused task %s (%s)", task_id, row.task_name)
+    return {"status": "RUNNING", "task_id": task_id, "requeued": parked}
+
+
+def cancel_task(task_id: str) -> Dict[str, Any]:
+    row = _control_row(task_id)
+    if row is not None:
+        row.status = "CANCELLED"
+        db.session.commit()
+    publish_status(task_id, "CANCELLED")
+    # Drops the task if it is still queued; a running loop stops at its next check
+    celery.control.revoke(task_id)
+    return {"status": "CANCELLED", "task_id": task_id}
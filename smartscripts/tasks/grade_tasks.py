@@ -4,16 +4,21 @@ smartscripts/tasks/grading_tasks.py
 Asynchronous Grading Tasks
  - Single-student grading wrapper
  - Batch grading with Celery
- - Pause / Resume / Cancel support via TaskControl
+ - Pause / Resume / Cancel support via TaskControl (see control_channel)
+ - Per-script grading checkpoints (retries resume where they stopped)
 """
 
 import time
 import traceback
 import logging
+from typing import Any, Dict
 from sqlalchemy.exc import SQLAlchemyError
+from celery.exceptions import Ignore, Retry
 from flask import current_app, has_app_context
 
 from smartscripts.extensions import celery, db
+from smartscripts.tasks.control_channel import ControlChannel
+from smartscripts.tasks.progress import ProgressReporter
 
 logger = logging.getLogger(__name__)
 
@@ -63,113 +68,88 @@ def _run_mark_submission(file_path, guide_id, student_id, test_id, threshold):
 # ------------------------------------------------------
 @celery.task(bind=True, max_retries=3, default_retry_delay=10,
              name="smartscripts.tasks.grading_tasks.async_grade_all_students")
-def async_grade_all_students(self, test_id: int):
+def async_grade_all_students(self, test_id: int, regrade: bool = False):
     """
     Celery task to grade all student scripts for a given test.
-    Supports pause / resume / cancel via TaskControl table.
-    Retries failed student scripts automatically.
+    Supports pause / resume / cancel via TaskControl table; a paused task stops in
+    the PAUSED state and is re-enqueued on resume.
+    Progress is checkpointed per ExtractedStudentScript, so retries and relaunches
+    resume at the first unfinished script; `regrade=True` starts over.
     """
     from smartscripts.app import create_app
-    from smartscripts.models.task_control import TaskControl
-    from smartscripts.models import Test  # type: ignore
+    from smartscripts.models import ExtractedStudentScript  # type: ignore
     from smartscripts.services.grading_service import grade_student_script  # type: ignore
 
     if not has_app_context():
         app = create_app("production")
         with app.app_context():
-            return _run_grade_task(self, test_id, TaskControl, Test, grade_student_script)
+            return _run_grade_task(self, test_id, ExtractedStudentScript, grade_student_script, regrade)
     else:
-        return _run_grade_task(self, test_id, TaskControl, Test, grade_student_script)
+        return _run_grade_task(self, test_id, ExtractedStudentScript, grade_student_script, regrade)
 
 
-def _run_grade_task(self, test_id, TaskControl, Test, grade_student_script):
+def _run_grade_task(self, test_id, ExtractedStudentScript, grade_student_script, regrade=False):
     task_id = self.request.id
     start_time = time.time()
 
-    # Create TaskControl record
-    db_state = TaskControl(task_id=task_id, test_id=test_id, status="RUNNING")
-    db.session.add(db_state)
-    db.session.commit()
+    # Retries and resumes run under the same id and reuse the TaskControl row;
+    # a resume never regrades, it continues from the per-script checkpoints
+    control = ControlChannel.attach(self, test_id, args=[test_id])
+    db_state = control.db_state
 
     try:
-        test = Test.query.get(test_id)
-        if not test:
-            current_app.logger.error(f"❌ Test with ID {test_id} not found.")
-            db_state.status = "FAILED"
+        scripts = (
+            ExtractedStudentScript.query
+            .filter_by(test_id=test_id, is_absent=False)
+            .order_by(ExtractedStudentScript.id)
+            .all()
+        )
+        if not scripts:
+            current_app.logger.error(f"❌ No student scripts found for test {test_id}.")
+            control.finish("FAILED")
+            return {"status": "FAILED", "message": f"No student scripts for test {test_id}."}
+
+        if regrade:
+            for script in scripts:
+                script.reset_grading()
             db.session.commit()
-            return {"status": "FAILED", "message": f"Test {test_id} not found."}
-
-        total_scripts = len(test.student_scripts)
-        graded_count = 0
-        failed_scripts = []
-
-        for i, script in enumerate(test.student_scripts, start=1):
-            db.session.refresh(db_state)
 
-            # Cancel check
-            if db_state.status == "CANCELLED":
-                self.update_state(state="REVOKED")
-                current_app.logger.warning(f"🚨 Task {task_id} cancelled at {i}/{total_scripts}")
-                db_state.status = "CANCELLED"
-                db.session.commit()
-                return {
-                    "status": "CANCELLED",
-                    "task_id": task_id,
-                    "test_id": test_id,
-                    "current": i,
-                    "total": total_scripts,
-                    "percent": int(i / total_scripts * 100),
-                    "duration": time.time() - start_time,
-                    "message": "Task cancelled by user.",
-                }
-
-            # Pause check
-            while db_state.status == "PAUSED":
-                current_app.logger.info(f"⏸️ Task {task_id} paused at {i}/{total_scripts}")
-                time.sleep(2)
-                db.session.refresh(db_state)
-
-            # Grade student script
-            try:
-                grade_student_script(script)
-                graded_count += 1
-            except Exception as e:
-                current_app.logger.error(
-                    f"⚠️ Error grading script {script.id} (student={script.student_id}) "
-                    f"for test {test_id}: {e}"
+        graded = grade_scripts(self, control, scripts, grade_student_script, test_id)
+        graded_count, failed_scripts = graded["graded"], graded["failed"]
+        total_scripts, already_graded = graded["total"], graded["resumed_from"]
+
+        # Cancel check
+        if graded["cancelled_at"] is not None:
+            i = graded["cancelled_at"]
+            self.update_state(state="REVOKED")
+            current_app.logger.warning(f"🚨 Task {task_id} cancelled at {i}/{total_scripts}")
+            control.finish("CANCELLED")
+            return {
+                "status": "CANCELLED",
+                "task_id": task_id,
+                "test_id": test_id,
+                "current": i,
+                "total": total_scripts,
+                "percent": int(i / total_scripts * 100),
+                "duration": time.time() - start_time,
+                "message": "Task cancelled by user.",
+            }
+
+        # Retry only the scripts that failed; graded ones are skipped on the next run
+        if failed_scripts:
+            if self.request.retries < self.max_retries:
+                current_app.logger.warning(
+                    f"🔁 Retrying {len(failed_scripts)} failed script(s) for test {test_id}"
                 )
-                failed_scripts.append(script.id)
-                try:
-                    raise self.retry(exc=e, countdown=15)
-                except self.MaxRetriesExceededError:
-                    current_app.logger.critical(
-                        f"🚨 Max retries reached for script {script.id} in test {test_id}"
-                    )
-
-            # Progress update
-            percent = int(i / total_scripts * 100)
-            elapsed = time.time() - start_time
-            avg_time = elapsed / i if i > 0 else 1
-            remaining = (total_scripts - i) * avg_time
-
-            self.update_state(
-                state="PROGRESS",
-                meta={
-                    "status": "PROGRESS",
-                    "task_id": task_id,
-                    "test_id": test_id,
-                    "current": i,
-                    "total": total_scripts,
-                    "percent": percent,
-                    "eta_seconds": int(remaining),
-                    "graded": graded_count,
-                    "failed": failed_scripts,  # ✅ Correctly terminated
-                },
+                db_state.status = "RETRYING"
+                db.session.commit()
+                raise self.retry(countdown=15)
+            current_app.logger.critical(
+                f"🚨 Max retries reached for test {test_id}; failed scripts: {failed_scripts}"
             )
 
         # Completion
-        db_state.status = "COMPLETED"
-        db.session.commit()
+        control.finish("COMPLETED")
         duration = time.time() - start_time
         current_app.logger.info(
             f"✅ Grading completed for test={test_id}. Success: {graded_count}/{total_scripts}, "
@@ -182,22 +162,90 @@ def _run_grade_task(self, test_id, TaskControl, Test, grade_student_script):
             "test_id": test_id,
             "graded_scripts": graded_count,
             "failed_scripts": failed_scripts,
+            "resumed_from": already_graded,
             "total_scripts": total_scripts,
             "duration": duration,
             "eta_seconds": 0,
             "message": "Grading completed successfully.",
         }
 
+    except (Retry, Ignore):
+        raise
+
     except SQLAlchemyError as db_err:
         db.session.rollback()
-        db_state.status = "FAILED"
-        db.session.commit()
+        control.finish("FAILED")
         current_app.logger.exception(f"❌ Database error during grading test {test_id}: {db_err}")
         return {"status": "FAILED", "message": "Database error"}
 
     except Exception as e:
         db.session.rollback()
-        db_state.status = "FAILED"
-        db.session.commit()
+        control.finish("FAILED")
         current_app.logger.exception(f"❌ Unexpected error in async_grade_all_students: {e}")
         return {"status": "FAILED", "message": str(e)}
+
+
+# ------------------------------------------------------
+# Checkpointed grading loop (shared with the pipeline's grade stage)
+# ------------------------------------------------------
+def grade_scripts(task, control, scripts, grade_student_script, test_id: int) -> Dict[str, Any]:
+    """
+    Grade the unfinished `scripts` in order, committing each grade together with its
+    checkpoint. `control` is checked before every script: a pause parks the task
+    (raises Ignore) and a cancel stops the loop with `cancelled_at` set to the
+    1-based position reached. Returns {"graded", "failed", "resumed_from", "total",
+    "cancelled_at"}; failed scripts are recorded on their rows and listed by id.
+    """
+    task_id = task.request.id
+    total_scripts = len(scripts)
+    pending = [s for s in scripts if not s.is_graded]
+    already_graded = total_scripts - len(pending)
+    if already_graded:
+        current_app.logger.info(
+            f"↪️ Resuming grading of test {test_id}: "
+            f"{already_graded}/{total_scripts} already graded"
+        )
+
+    graded_count = already_graded
+    failed_scripts = []
+    progress = ProgressReporter(task, test_id=test_id)
+    progress.stage("grade", total=total_scripts, graded=graded_count, failed=failed_scripts)
+    summary = {"total": total_scripts, "resumed_from": already_graded, "cancelled_at": None}
+
+    for n, script in enumerate(pending, start=1):
+        i = already_graded + n
+        status = control.status()
+
+        if status == "CANCELLED":
+            summary["cancelled_at"] = i
+            break
+
+        # Pause check: release the worker; graded scripts are already checkpointed
+        if status == "PAUSED":
+            current_app.logger.info(f"⏸️ Task {task_id} paused at {i}/{total_scripts}")
+            control.park(
+                {"graded": graded_count, "next_script_id": script.id},
+                test_id=test_id, current=i - 1, total=total_scripts,
+                percent=int((i - 1) / total_scripts * 100),
+            )
+
+        # Grade student script; the grade and its checkpoint commit together
+        try:
+            grade_student_script(script)
+            script.mark_graded()
+            db.session.commit()
+            graded_count += 1
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(
+                f"⚠️ Error grading script {script.id} (student={script.student_id}) "
+                f"for test {test_id}: {e}"
+            )
+            script.mark_grading_failed(e)
+            db.session.commit()
+            failed_scripts.append(script.id)
+
+        # Progress update (coalesced)
+        progress.update(i, graded=graded_count, failed=failed_scripts)
+
+    return dict(summary, graded=graded_count, failed=failed_scripts)
@@ -2,23 +2,60 @@
 smartscripts/tasks/matching_tasks.py
 ------------------------------------
 Fuzzy Matching Tasks
- - Match OCR IDs/names against class_list.csv
- - Updates OCRSubmission objects
+ - Match OCR IDs/names against class_list.csv (one-to-one over all pages)
+ - Updates OCRSubmission objects in bulk (one IN query, batched UPDATEs / commits)
  - Generates presence table CSV
- - Supports pause/resume/cancel via TaskControl
+ - Supports pause/resume/cancel via TaskControl (see control_channel)
 """
 
+import os
 import logging
-import time
 from pathlib import Path
+from typing import Any, Dict, List, Set
+import numpy as np
 import pandas as pd
-from rapidfuzz import process, fuzz
+from celery.exceptions import Ignore
 from flask import current_app, has_app_context
 
 from smartscripts.extensions import celery, db
+from smartscripts.ai.text_matching import assign_one_to_one
+from smartscripts.ai.class_list_cache import get_class_list
+from smartscripts.tasks.control_channel import ControlChannel
+from smartscripts.tasks.progress import ProgressReporter
 
 logger = logging.getLogger(__name__)
 
+# Lowest ID / name similarity accepted as a match
+MATCH_MIN_SCORE = 0.8
+# OCRSubmission updates written per bulk UPDATE + commit
+MATCH_COMMIT_BATCH = int(os.getenv("MATCH_COMMIT_BATCH", "200"))
+# IN-list size for the submission lookup (stays under SQLite's bound-parameter limit)
+MATCH_LOOKUP_CHUNK = 900
+
+
+def _existing_submission_ids(OCRSubmission, ocr_results: List[Dict[str, Any]]) -> Set[int]:
+    """IDs of the OCRSubmission rows referenced by `ocr_results`, in one IN query per chunk."""
+    wanted = set()
+    for res in ocr_results:
+        try:
+            wanted.add(int(res.get("submission_id")))
+        except (TypeError, ValueError):
+            continue
+    wanted = sorted(wanted)
+    found: Set[int] = set()
+    for start in range(0, len(wanted), MATCH_LOOKUP_CHUNK):
+        chunk = wanted[start:start + MATCH_LOOKUP_CHUNK]
+        found.update(sid for (sid,) in db.session.query(OCRSubmission.id).filter(OCRSubmission.id.in_(chunk)))
+    return found
+
+
+def _flush_submission_updates(OCRSubmission, pending: List[Dict[str, Any]]) -> None:
+    """Write the queued OCRSubmission updates as one bulk UPDATE and commit."""
+    if pending:
+        db.session.bulk_update_mappings(OCRSubmission, pending)
+        pending.clear()
+    db.session.commit()
+
 # ------------------------------------------------------
 # Fuzzy Matching Task
 # ------------------------------------------------------
@@ -27,7 +64,8 @@ def fuzzy_match_class_list(self, ocr_output: dict, test_id: int, class_list_path
     """
     Step 3: Match OCR IDs/names against class_list.csv using fuzzy string matching.
     Updates OCRSubmission + returns presence table.
-    Supports pause/resume/cancel via TaskControl.
+    Supports pause/resume/cancel via TaskControl; a paused task checkpoints the
+    rows matched so far and is re-enqueued from there on resume.
     """
     if not has_app_context():
         from smartscripts.app import create_app
@@ -41,36 +79,48 @@ def fuzzy_match_class_list(self, ocr_output: dict, test_id: int, class_list_path
 def _run_matching_task(self, ocr_output: dict, test_id: int, class_list_path: str):
     from smartscripts.models.ocr_submission import OCRSubmission
     from smartscripts.models.submission_manifest import SubmissionManifest
-    from smartscripts.models.task_control import TaskControl
 
     task_id = self.request.id
     current_app.logger.info(f"[Matching] Task {task_id} started for test {test_id}")
 
-    # Create or get TaskControl record
-    db_state = TaskControl.query.filter_by(task_id=task_id).first()
-    if not db_state:
-        db_state = TaskControl(task_id=task_id, test_id=test_id, status="RUNNING")
-        db.session.add(db_state)
-        db.session.commit()
-
-    results = []
+    # Create or get TaskControl record (a resumed task reuses it and its checkpoint)
+    control = ControlChannel.attach(self, test_id, args=[ocr_output, test_id, class_list_path])
+    checkpoint = control.checkpoint
+    resume_at = int(checkpoint.get("index", 0))
+    results = list(checkpoint.get("results", []))
+    if resume_at:
+        current_app.logger.info(f"[Matching] Task {task_id} resuming at row {resume_at + 1}")
 
     try:
-        class_df = pd.read_csv(class_list_path)
         ocr_results = ocr_output.get("ocr_results", [])
         total = len(ocr_results)
 
-        for i, res in enumerate(ocr_results, start=1):
-            db.session.refresh(db_state)
+        # One pages × students matrix (ID or name may carry the match) solved one-to-one,
+        # so no two scripts claim the same student; recomputed identically on resume
+        # (the roster is parsed and indexed once per file version, shared with other tasks)
+        index = get_class_list(class_list_path).index
+        ocr_ids = [str(res.get("ocr_id", "")).strip() for res in ocr_results]
+        ocr_names = [str(res.get("ocr_name", "")).strip() for res in ocr_results]
+        scores = np.maximum(index.id_scores(ocr_ids), index.name_scores(ocr_names, rerank=False))
+        assignments = assign_one_to_one(scores, min_score=MATCH_MIN_SCORE)
+        # Submission rows are looked up once; updates are queued and written in batches
+        submission_ids = _existing_submission_ids(OCRSubmission, ocr_results[resume_at:])
+        pending: List[Dict[str, Any]] = []
+        progress = ProgressReporter(self, test_id=test_id)
+        progress.stage("match", total=total)
+        progress.update(resume_at)
+
+        for i, res in enumerate(ocr_results[resume_at:], start=resume_at + 1):
+            status = control.status()
 
             # -------------------
             # Cancel check
             # -------------------
-            if db_state.status == "CANCELLED":
+            if status == "CANCELLED":
                 self.update_state(state="REVOKED")
                 current_app.logger.warning(f"[Matching] Task {task_id} cancelled at {i}/{total}")
-                db_state.status = "CANCELLED"
-                db.session.commit()
+                _flush_submission_updates(OCRSubmission, pending)
+                control.finish("CANCELLED")
                 return {
                     "status": "CANCELLED",
                     "task_id": task_id,
@@ -82,44 +132,25 @@ def _run_matching_task(self, ocr_output: dict, test_id: int, class_list_path: st
                 }
 
             # -------------------
-            # Pause check
+            # Pause check: keep the rows updated so far and release the worker
             # -------------------
-            while db_state.status == "PAUSED":
+            if status == "PAUSED":
                 current_app.logger.info(f"[Matching] Task {task_id} paused at {i}/{total}")
-                time.sleep(2)
-                db.session.refresh(db_state)
+                _flush_submission_updates(OCRSubmission, pending)
+                control.park(
+                    {"index": i - 1, "results": results},
+                    test_id=test_id, current=i - 1, total=total, percent=int((i - 1) / total * 100),
+                )
 
             # -------------------
-            # Fuzzy match ID and name
+            # Assigned student (solved for all pages up front)
             # -------------------
-            ocr_id = str(res.get("ocr_id", "")).strip()
-            ocr_name = str(res.get("ocr_name", "")).strip()
-
-            best_match_id = process.extractOne(
-                ocr_id, class_df["student_id"], scorer=fuzz.ratio
-            )
-            best_match_name = process.extractOne(
-                ocr_name, class_df["name"], scorer=fuzz.token_sort_ratio
-            )
-
-            matched = False
-            matched_id = None
-            matched_name = None
-            confidence = 0
-
-            if best_match_id and best_match_id[1] > 80:
-                matched = True
-                matched_id = best_match_id[0]
-                confidence = best_match_id[1]
-                matched_row = class_df[class_df["student_id"] == matched_id].iloc[0]
-                matched_name = matched_row["name"]
-
-            elif best_match_name and best_match_name[1] > 80:
-                matched = True
-                matched_name = best_match_name[0]
-                confidence = best_match_name[1]
-                matched_row = class_df[class_df["name"] == matched_name].iloc[0]
-                matched_id = matched_row["student_id"]
+            ocr_id, ocr_name = ocr_ids[i - 1], ocr_names[i - 1]
+            assigned = assignments[i - 1]
+            matched = assigned["index"] is not None
+            matched_id = index.ids[assigned["index"]] if matched else None
+            matched_name = index.names[assigned["index"]] if matched else None
+            confidence = round(assigned["score"] * 100, 1) if matched else 0
 
             results.append({
                 "ocr_id": ocr_id,
@@ -128,38 +159,37 @@ def _run_matching_task(self, ocr_output: dict, test_id: int, class_list_path: st
                 "matched_name": matched_name,
                 "confidence": confidence,
                 "matched": matched,
+                "margin": assigned["margin"],
+                "ambiguous": matched and assigned["ambiguous"],
             })
 
             # -------------------
-            # Update OCRSubmission
+            # Queue OCRSubmission update
             # -------------------
-            sub = OCRSubmission.query.filter_by(id=res.get("submission_id")).first()
-            if sub:
-                sub.corrected_id = matched_id
-                sub.corrected_name = matched_name
-                sub.confidence = confidence
-                sub.needs_human_review = not matched or confidence < 85
-                db.session.add(sub)
+            try:
+                submission_id = int(res.get("submission_id"))
+            except (TypeError, ValueError):
+                submission_id = None
+            if submission_id in submission_ids:
+                pending.append({
+                    "id": submission_id,
+                    "corrected_id": matched_id,
+                    "corrected_name": matched_name,
+                    "confidence": confidence,
+                    "needs_human_review": not matched or confidence < 85 or assigned["ambiguous"],
+                })
+                if len(pending) >= MATCH_COMMIT_BATCH:
+                    _flush_submission_updates(OCRSubmission, pending)
 
             # -------------------
-            # Progress update
+            # Progress update (coalesced)
             # -------------------
-            percent = int(i / total * 100)
-            self.update_state(
-                state="PROGRESS",
-                meta={
-                    "current": i,
-                    "total": total,
-                    "percent": percent,
-                    "test_id": test_id,
-                    "task_id": task_id,
-                },
-            )
+            progress.update(i)
 
         # -------------------
         # Commit DB & generate presence table CSV
         # -------------------
-        db.session.commit()
+        _flush_submission_updates(OCRSubmission, pending)
 
         manifest = SubmissionManifest.query.filter_by(test_id=test_id).first()
         if manifest:
@@ -168,15 +198,15 @@ def _run_matching_task(self, ocr_output: dict, test_id: int, class_list_path: st
             pd.DataFrame(results).to_csv(manifest.presence_table_path, index=False)
             db.session.commit()
 
-        db_state.status = "COMPLETED"
-        db.session.commit()
+        control.finish("COMPLETED")
 
         current_app.logger.info(f"[Matching] ✅ Completed fuzzy match for test {test_id}")
         return {"status": "COMPLETED", "test_id": test_id, "presence_table": results}
 
+    except Ignore:
+        raise
     except Exception as e:
         db.session.rollback()
-        db_state.status = "FAILED"
-        db.session.commit()
+        control.finish("FAILED")
         current_app.logger.exception(f"[Matching] ❌ Failed for test {test_id}: {e}")
         return {"status": "FAILED", "test_id": test_id, "error": str(e)}
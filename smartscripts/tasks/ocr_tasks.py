@@ -11,26 +11,48 @@ Handles:
 """
 
 import io
-import csv
 import re
 from pathlib import Path
-from typing import Dict, List, Tuple, Union, Any
+import os
+from typing import Callable, Dict, List, Tuple, Union, Any, Optional
 
 from PyPDF2 import PdfReader, PdfWriter
-from pdf2image import convert_from_bytes, convert_from_path
+from pdf2image import convert_from_bytes
 from PIL import Image
-import pytesseract
 import numpy as np
 import cv2
 import torch
 from transformers import TrOCRProcessor, VisionEncoderDecoderModel, logging as transformers_logging
-from thefuzz import process
 from flask import current_app, has_app_context
-from celery import current_task
+from celery import chord, group
 from celery.exceptions import Ignore
+from celery.result import AsyncResult
 
 # ✅ Import global Celery instance
 from smartscripts.extensions import celery
+from smartscripts.ai.model_registry import get_trocr
+from smartscripts.ai.ocr_engine import (
+    run_tr_ocr_pages, trocr_cache_params, extract_name_id_from_fields, extract_text_from_images,
+    TROCR_BATCH_SIZE,
+)
+from smartscripts.ai.ocr_cascade import CascadeBudget, CascadePolicy, get_policy, merge_reports
+from smartscripts.ai.ocr_cache import cached_ocr_batch
+from smartscripts.ai.page_layout import get_page_layout
+from smartscripts.ai.front_page_detector import (
+    FRONT_PAGE_THRESHOLD, page_stack, page_features, detect_front_pages, detect_front_pages_in_pdf,
+    detect_front_pages_in_range,
+)
+from smartscripts.ai.front_page_classifier import front_page_probabilities
+from smartscripts.ai.cover_template import get_cover_template, pyramid_field_crops
+from smartscripts.tasks.progress import ProgressReporter
+
+# Pages per chunk task when a long PDF is fanned out across workers (0 = one task for everything)
+OCR_CHUNK_PAGES = int(os.getenv("OCR_CHUNK_PAGES", "100"))
+# Share of the parent task's percent covered by the chunk tasks
+CHUNK_PERCENT = (10, 90)
+# Progress weight of each step of the single-task pipeline, and of a chunk task
+OCR_STAGES = [("load_class_list", 10), ("detect", 20), ("ocr", 40), ("match", 30)]
+CHUNK_STAGES = [("detect", 30), ("ocr", 70)]
 
 # ───────────────────────────────────────────────────────────────
 # Suppress HuggingFace warnings
@@ -38,46 +60,35 @@ from smartscripts.extensions import celery
 transformers_logging.set_verbosity_error()
 
 # ───────────────────────────────────────────────────────────────
-# Lazy-loaded TrOCR
+# Lazy-loaded TrOCR (shared process-wide model registry)
 # ───────────────────────────────────────────────────────────────
-_trocr: Dict[str, Union[None, TrOCRProcessor, VisionEncoderDecoderModel, torch.device]] = {
-    "processor": None,
-    "model": None,
-    "device": None
-}
-
 def _load_trocr() -> Tuple[TrOCRProcessor, VisionEncoderDecoderModel, torch.device]:
-    """Lazy-load TrOCR model and processor."""
-    if _trocr["model"] is None or _trocr["processor"] is None:
-        processor = TrOCRProcessor.from_pretrained("microsoft/trocr-base-handwritten")
-        model = VisionEncoderDecoderModel.from_pretrained(
-            "microsoft/trocr-base-handwritten",
-            ignore_mismatched_sizes=True
-        )
-        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        model.to(device)
-        _trocr.update({"processor": processor, "model": model, "device": device})
-    return _trocr["processor"], _trocr["model"], _trocr["device"]
+    """Return the shared TrOCR processor, model and device."""
+    return get_trocr()
 
 # ───────────────────────────────────────────────────────────────
 # OCR Functions
 # ───────────────────────────────────────────────────────────────
 def ocr_trocr(image: Image.Image) -> str:
     """Run TrOCR on an image."""
-    processor, model, device = _load_trocr()
+    return ocr_trocr_batch([image])[0]
+
+def ocr_trocr_batch(images: List[Image.Image], batch_size: Optional[int] = None) -> List[str]:
+    """Run line-segmented TrOCR on many pages in micro-batches; one text per page, in order."""
     try:
-        pixel_values = processor(images=[image], return_tensors="pt").pixel_values.to(device)
-        generated_ids = model.generate(pixel_values)
-        return processor.batch_decode(generated_ids, skip_special_tokens=True)[0]
+        return cached_ocr_batch(
+            "trocr_page", images, trocr_cache_params(),
+            lambda batch: run_tr_ocr_pages(batch, batch_size=batch_size),
+        )
     except Exception as e:
         if has_app_context():
-            current_app.logger.warning(f"[ocr_trocr] Failed: {e}")
-        return ""
+            current_app.logger.warning(f"[ocr_trocr_batch] Failed: {e}")
+        return [""] * len(images)
 
 def ocr_tesseract(image: Image.Image) -> str:
     """Fallback OCR using Tesseract."""
     try:
-        return pytesseract.image_to_string(image)
+        return get_page_layout(image).text
     except Exception as e:
         if has_app_context():
             current_app.logger.warning(f"[ocr_tesseract] Failed: {e}")
@@ -88,19 +99,15 @@ def ocr_tesseract(image: Image.Image) -> str:
 # ───────────────────────────────────────────────────────────────
 def fuzzy_match_student_id(extracted_id: str, class_list: List[str]) -> Tuple[Union[str, None], float]:
     """
-    Fuzzy match a student ID against a class list.
+    Fuzzy match a student ID against a class list (OCR-confusion aware, see id_index).
     Returns a tuple: (matched_id, score)
     If no match is found, returns (None, 0.0)
     """
-    if not extracted_id or not class_list:
-        return None, 0.0
+    from smartscripts.ai.id_index import get_id_index
 
-    result = process.extractOne(extracted_id, class_list)
-    if result is None:
+    if not extracted_id or not class_list:
         return None, 0.0
-
-    match, score = result
-    return match, score / 100.0  # normalize score to 0–1
+    return get_id_index(class_list).best(extracted_id)
 
 # ───────────────────────────────────────────────────────────────
 # PDF Helpers
@@ -130,44 +137,92 @@ def save_student_pdf(original_pdf_path: Path, page_number: int, student_id: str,
 # ───────────────────────────────────────────────────────────────
 # Front-page Detection
 # ───────────────────────────────────────────────────────────────
+def front_page_box(gray: np.ndarray) -> Tuple[Optional[Tuple[int, int, int, int]], float]:
+    """
+    Bounding box (x, y, w, h) of the largest printed block on a grayscale page, and the
+    share of non-black pixels inside it. Used to crop cover sheets once they have been
+    detected; page classification itself is batched in ai.front_page_detector.
+    """
+    _, thresh = cv2.threshold(gray, 200, 255, cv2.THRESH_BINARY_INV)
+    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return None, 0.0
+    largest = max(contours, key=cv2.contourArea)
+    x, y, w, h = cv2.boundingRect(largest)
+    confidence = cv2.countNonZero(gray[y:y + h, x:x + w]) / float(w * h)
+    return (x, y, w, h), confidence
+
 def detect_front_page(image: Image.Image, return_confidence: bool = False) -> Union[Image.Image, Tuple[Image.Image, float]]:
-    """Detect and crop the front page area."""
+    """Crop the front page area; the confidence is the page's front-page score."""
     try:
         img = np.array(image.convert("RGB"))
         gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
-        _, thresh = cv2.threshold(gray, 200, 255, cv2.THRESH_BINARY_INV)
-        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        if not contours:
-            return (image, 0.0) if return_confidence else image
-
-        largest = max(contours, key=cv2.contourArea)
-        x, y, w, h = cv2.boundingRect(largest)
-        cropped = img[y:y + h, x:x + w]
-        non_zero = cv2.countNonZero(cv2.cvtColor(cropped, cv2.COLOR_RGB2GRAY))
-        confidence = non_zero / (cropped.shape[0] * cropped.shape[1])
-        cropped_image = Image.fromarray(cropped)
+        box, _ = front_page_box(gray)
+        confidence = 0.0
+        if return_confidence:
+            confidence = float(front_page_probabilities(page_features(page_stack([gray])))[0])
+        if box is None:
+            return (image, confidence) if return_confidence else image
+
+        x, y, w, h = box
+        cropped_image = Image.fromarray(img[y:y + h, x:x + w])
         return (cropped_image, confidence) if return_confidence else cropped_image
     except Exception as e:
         if has_app_context():
             current_app.logger.warning(f"[detect_front_page] Failed: {e}")
         return (image, 0.0) if return_confidence else image
 
-def detect_front_pages_opencv(images: List[Image.Image]) -> List[Tuple[int, int]]:
-    """Detect front pages across all images."""
-    front_pages = []
-    for idx, img in enumerate(images):
-        _, conf = detect_front_page(img, return_confidence=True)
-        if conf > 0.3:  # slightly higher threshold for reliability
-            front_pages.append(idx)
+def is_front_page_image(image: Union[Image.Image, np.ndarray]) -> bool:
+    """Front-page test for one page (model only, no OCR); prefer detect_front_pages for many."""
+    probability = front_page_probabilities(page_features(page_stack([image])))[0]
+    return bool(probability >= FRONT_PAGE_THRESHOLD)
+
+def front_page_ranges(front_pages: List[int], total_pages: int) -> List[Tuple[int, int]]:
+    """Turn sorted front-page indices into inclusive (start, end) page ranges, one per student."""
     ranges = []
     for i, start_idx in enumerate(front_pages):
-        end_idx = front_pages[i + 1] - 1 if i + 1 < len(front_pages) else len(images) - 1
+        end_idx = front_pages[i + 1] - 1 if i + 1 < len(front_pages) else total_pages - 1
         ranges.append((start_idx, end_idx))
     return ranges
 
+def detect_front_pages_opencv(images: List[Image.Image]) -> List[Tuple[int, int]]:
+    """Detect front pages across all images (scored as one stack)."""
+    return front_page_ranges(detect_front_pages(images), len(images))
+
 # ───────────────────────────────────────────────────────────────
 # OCR Text Extraction
 # ───────────────────────────────────────────────────────────────
+def header_ocr_policy(budget: Optional[CascadeBudget] = None) -> CascadePolicy:
+    """
+    Cascade policy for front-page headers: the test's policy restricted to the local
+    tiers (batched TrOCR, then Tesseract). The GPT vision / refine tiers are left to
+    body OCR, so reading names and IDs spends none of the external-call budget.
+    """
+    policy = budget.policy if budget is not None else get_policy()
+    return policy.replace(allow_vision=False, allow_refine=False)
+
+def _ocr_front_pages(pages: List[Tuple[int, Image.Image]],
+                     budget: Optional[CascadeBudget] = None) -> Dict[int, str]:
+    """Local-tier OCR of front-page headers (see header_ocr_policy); {page_index: text}."""
+    if not pages:
+        return {}
+    texts = extract_text_from_images(
+        [img for _, img in pages], policy=header_ocr_policy(budget), budget=budget,
+    )
+    return {idx: text for (idx, _), text in zip(pages, texts)}
+
+def _ocr_front_fields(
+    pages: List[Tuple[int, Dict[str, Image.Image]]],
+) -> Dict[int, Tuple[str, str, float]]:
+    """Name / ID crops of template-aligned pages → {page: (student_id, name, conf)}, one batch."""
+    if not pages:
+        return {}
+    read = extract_name_id_from_fields([crops for _, crops in pages])
+    return {
+        idx: (student_id or "unknown", name or "unknown", conf)
+        for (idx, _), (name, student_id, conf) in zip(pages, read)
+    }
+
 def extract_student_id_name(ocr_text: str) -> Tuple[str, str, float]:
     """Extract student ID and name from OCR text."""
     if not ocr_text:
@@ -179,64 +234,273 @@ def extract_student_id_name(ocr_text: str) -> Tuple[str, str, float]:
     conf = 0.5 * bool(name_match) + 0.5 * bool(id_match)
     return student_id, name, conf
 
+# ───────────────────────────────────────────────────────────────
+# Pipeline Steps (shared by the single-task and fanned-out paths)
+# ───────────────────────────────────────────────────────────────
+def _load_class_list(class_list_path: str) -> List[str]:
+    """Student IDs of the roster (parsed once per file version, see class_list_cache)."""
+    from smartscripts.ai.class_list_cache import get_class_list
+
+    return list(get_class_list(class_list_path).ids)
+
+def _ocr_front_pages_in_range(
+    test_id: int, pdf_path: str, front_indices: List[int],
+    start: int = 0, stop: Optional[int] = None,
+    progress: Optional[Callable[[int], None]] = None, budget: Optional[CascadeBudget] = None,
+) -> Tuple[Dict[int, str], Dict[int, Tuple[str, str, float]]]:
+    """
+    ({page: header text}, {page: (student_id, name, conf)}) for the front pages in [start, stop).
+    Cover sheets aligned to the test's template have only their name / ID boxes rendered
+    and OCR'd; others get the header rendered at OCR resolution and go through the OCR
+    cascade under `budget` (one per test).
+    """
+    from smartscripts.utils.page_pyramid import iter_page_pyramids, HEADER
+
+    template = get_cover_template(test_id)
+    wanted = set(front_indices)
+    front_texts: Dict[int, str] = {}
+    front_fields: Dict[int, Tuple[str, str, float]] = {}
+    if not wanted:
+        return front_texts, front_fields
+
+    pending: List[Tuple[int, Image.Image]] = []
+    pending_fields: List[Tuple[int, Dict[str, Image.Image]]] = []
+    for page in iter_page_pyramids(pdf_path, start=start, stop=stop):
+        if page.index not in wanted:
+            continue
+        crops = pyramid_field_crops(page, template) if template else None
+        if crops:
+            pending_fields.append((page.index, crops))
+        else:
+            pending.append((page.index, page.get(HEADER)))
+        if len(pending) >= TROCR_BATCH_SIZE or len(pending_fields) >= TROCR_BATCH_SIZE:
+            front_texts.update(_ocr_front_pages(pending, budget))
+            front_fields.update(_ocr_front_fields(pending_fields))
+            pending, pending_fields = [], []
+            if progress:
+                progress(len(front_texts) + len(front_fields))
+    front_texts.update(_ocr_front_pages(pending, budget))
+    front_fields.update(_ocr_front_fields(pending_fields))
+    return front_texts, front_fields
+
+def _match_front_pages(
+    pdf_path: str, total_pages: int, front_texts: Dict[int, str],
+    front_fields: Dict[int, Tuple[str, str, float]],
+    class_list: List[str], progress: Optional[Callable[[float], None]] = None,
+    budget: Optional[CascadeBudget] = None,
+) -> Dict[str, Any]:
+    """Page ranges per student from the OCR'd front pages, matched to the class list."""
+    from smartscripts.utils.page_pyramid import iter_page_pyramids, HEADER
+
+    front_pages = front_page_ranges(sorted(set(front_texts) | set(front_fields)), total_pages)
+    if not front_pages:
+        front_pages = [(0, total_pages - 1)]
+        first = next(iter_page_pyramids(pdf_path, stop=1), None)
+        if first is not None:
+            front_texts.update(_ocr_front_pages([(0, first.get(HEADER))], budget))
+
+    attendance = {"present": [], "absent": []}
+    results = []
+    for i, (start, end) in enumerate(front_pages):
+        if start in front_fields:
+            student_id, name, conf = front_fields[start]
+        else:
+            student_id, name, conf = extract_student_id_name(front_texts.get(start, ""))
+        matched_id, score = fuzzy_match_student_id(student_id, class_list)
+
+        entry = {"start_page": start, "end_page": end, "student_id": student_id, "name": name,
+                 "confidence": conf, "matched_id": matched_id if score > 0.8 else None,
+                 "match_score": round(score, 3)}
+        results.append(entry)
+
+        if score > 0.8:
+            attendance["present"].append({"name": name, "id": matched_id, "confidence": conf})
+        else:
+            attendance["absent"].append({"name": name, "id": student_id, "confidence": conf})
+        if progress:
+            progress((i + 1) / len(front_pages))
+
+    return {"status": "COMPLETED", "percent": 100, "attendance": attendance, "results": results}
+
+def _fail(task, e: Exception) -> None:
+    if has_app_context():
+        current_app.logger.error(f"[OCR] Task failed: {type(e).__name__}: {e}")
+    error_info = {"type": type(e).__name__, "message": str(e)}
+    task.update_state(state="FAILURE", meta={"percent": 0, "error": error_info})
+
 # ───────────────────────────────────────────────────────────────
 # Celery Task with Progress & Safe Exception Handling
 # ───────────────────────────────────────────────────────────────
 @celery.task(bind=True, name="smartscripts.tasks.ocr_tasks.run_student_script_ocr_pipeline")
 def run_student_script_ocr_pipeline(self, test_id: int, pdf_path: str, class_list_path: str) -> Dict[str, Any]:
-    """Full OCR pipeline with progress tracking, safe exception handling for Celery backend."""
+    """
+    Full OCR pipeline with progress tracking, safe exception handling for Celery backend.
+
+    PDFs longer than OCR_CHUNK_PAGES are fanned out: this task is replaced by a chord of
+    ocr_page_chunk tasks (one page range each, on any free worker) joined by
+    merge_ocr_chunks, which finishes under this task's id, so callers keep polling it.
+
+    The test's pages share one OCR cascade budget (chunks get their page share of it);
+    the result's "ocr_cascade" holds the tier statistics.
+    """
+    from smartscripts.utils.pdf_helpers import pdf_page_count
+
+    progress = ProgressReporter(self, test_id=test_id, stages=OCR_STAGES)
     try:
+        total_pages = pdf_page_count(pdf_path)
+        if OCR_CHUNK_PAGES and total_pages > OCR_CHUNK_PAGES and not self.request.is_eager:
+            ranges = [(s, min(s + OCR_CHUNK_PAGES, total_pages))
+                      for s in range(0, total_pages, OCR_CHUNK_PAGES)]
+            chunk_ids = [f"{self.request.id}-chunk{i}" for i in range(len(ranges))]
+            header = group(
+                ocr_page_chunk.s(
+                    test_id, pdf_path, start, stop, self.request.id, chunk_ids,
+                    budget_share=(stop - start) / total_pages,
+                ).set(task_id=chunk_id)
+                for (start, stop), chunk_id in zip(ranges, chunk_ids)
+            )
+            ProgressReporter(self, test_id=test_id, percent_range=CHUNK_PERCENT).stage(
+                "ocr_chunks", total=len(ranges), chunks=len(ranges)
+            )
+            if has_app_context():
+                current_app.logger.info(
+                    f"[OCR] {total_pages} pages fanned out as {len(ranges)} chunks"
+                )
+            merge = merge_ocr_chunks.s(test_id, pdf_path, class_list_path)
+            raise self.replace(chord(header, merge))
+
+        budget = CascadeBudget()
+
         # Step 1: Load class list
-        with open(class_list_path, newline="", encoding="utf-8") as f:
-            class_list = [row.get("id") for row in csv.DictReader(f)]
-        self.update_state(state="STARTED", meta={"percent": 10})
-
-        # Step 2: Convert PDF to images
-        images = convert_from_path(pdf_path, dpi=300)
-        total_pages = len(images)
-        self.update_state(state="STARTED", meta={"percent": 20})
-
-        # Step 3: Detect front pages
-        front_pages = detect_front_pages_opencv(images)
-        if not front_pages:
-            front_pages = [(0, total_pages - 1)]
-        self.update_state(state="STARTED", meta={"percent": 30})
-
-        # Step 4: OCR each front page
-        attendance = {"present": [], "absent": []}
-        results = []
-        for i, (start, end) in enumerate(front_pages):
-            page_img = images[start]
-
-            # ✅ TrOCR first, fallback to Tesseract
-            ocr_text = ocr_trocr(page_img)
-            if not ocr_text.strip():
-                ocr_text = ocr_tesseract(page_img)
-
-            student_id, name, conf = extract_student_id_name(ocr_text)
-            matched_id, score = fuzzy_match_student_id(student_id, class_list)
-
-            entry = {"start_page": start, "end_page": end, "student_id": student_id, "name": name, "confidence": conf}
-            results.append(entry)
-
-            if score > 0.8:
-                attendance["present"].append({"name": name, "id": matched_id, "confidence": conf})
-            else:
-                attendance["absent"].append({"name": name, "id": student_id, "confidence": conf})
-
-            # Update progress per front page
-            percent_complete = 30 + int(((i + 1) / len(front_pages)) * 70)
-            current_task.update_state(state="STARTED", meta={"percent": percent_complete})
-
-        # Step 5: Done
-        self.update_state(state="SUCCESS", meta={"percent": 100})
-        return {"status": "COMPLETED", "percent": 100, "attendance": attendance, "results": results}
+        progress.stage("load_class_list")
+        class_list = _load_class_list(class_list_path)
 
-    except Exception as e:
+        # Step 2: Detect front pages on stacked low-dpi grayscale pages
+        progress.stage("detect", total=total_pages)
+        front_indices, scores = detect_front_pages_in_pdf(pdf_path)
+
+        # Step 3: OCR the name / ID of every front page
+        progress.stage("ocr", total=len(front_indices))
+        front_texts, front_fields = _ocr_front_pages_in_range(
+            test_id, pdf_path, front_indices, progress=progress.update, budget=budget,
+        )
+
+        # Step 4: Match each front page's text to the class list
+        progress.stage("match", total=100)
+        result = _match_front_pages(
+            pdf_path, len(scores), front_texts, front_fields, class_list,
+            progress=lambda frac: progress.update(int(frac * 100)), budget=budget,
+        )
+        result["ocr_cascade"] = budget.report()
         if has_app_context():
-            current_app.logger.error(f"[OCR] Task failed: {type(e).__name__}: {e}")
+            current_app.logger.info(f"[OCR] Cascade for test {test_id}: {result['ocr_cascade']}")
+        return result
 
-        error_info = {"type": type(e).__name__, "message": str(e)}
-        self.update_state(state="FAILURE", meta={"percent": 0, "error": error_info})
+    except Ignore:
+        raise
+    except Exception as e:
+        _fail(self, e)
+        raise Ignore()
 
+# ───────────────────────────────────────────────────────────────
+# Fan-out: one task per page range, joined by a chord
+# ───────────────────────────────────────────────────────────────
+def _report_chunk_progress(task, parent_id: Optional[str], chunk_ids: List[str],
+                           fraction: float) -> None:
+    """
+    Record this chunk's progress and publish the mean over all chunks as the parent
+    task's percent (finished chunks count 1, queued ones 0).
+    """
+    task.update_state(state="PROGRESS", meta={"fraction": round(fraction, 3)})
+    if not parent_id or not chunk_ids:
+        return
+    total = 0.0
+    finished = 0
+    for chunk_id in chunk_ids:
+        if chunk_id == task.request.id:
+            total += fraction
+            continue
+        sibling = AsyncResult(chunk_id, app=celery)
+        if sibling.state == "SUCCESS":
+            total += 1.0
+            finished += 1
+        elif isinstance(sibling.info, dict):
+            total += float(sibling.info.get("fraction", 0.0))
+    low, high = CHUNK_PERCENT
+    percent = low + int(total / len(chunk_ids) * (high - low))
+    task.backend.store_result(parent_id, {
+        "status": "PROGRESS", "task_id": parent_id, "percent": percent, "stage": "ocr_chunks",
+        "current": finished, "total": len(chunk_ids), "chunks": len(chunk_ids),
+    }, "PROGRESS")
+
+@celery.task(bind=True, name="smartscripts.tasks.ocr_tasks.ocr_page_chunk")
+def ocr_page_chunk(self, test_id: int, pdf_path: str, start: int, stop: int,
+                   parent_id: Optional[str] = None, chunk_ids: Optional[List[str]] = None,
+                   budget_share: float = 1.0,
+                   front_indices: Optional[List[int]] = None) -> Dict[str, Any]:
+    """
+    Detect and OCR the front pages in [start, stop); keys are document page numbers (JSON
+    strings). The chunk's OCR cascade budget is `budget_share` of the test's. Given
+    `front_indices` (already detected by the stage pipeline), detection is skipped.
+    """
+    budget = CascadeBudget().share(budget_share)
+    # Coalesced: the parent's mean is recomputed (one backend read per chunk) only on writes
+    progress = ProgressReporter(
+        self, test_id=test_id, stages=CHUNK_STAGES,
+        publish=lambda meta: _report_chunk_progress(
+            self, parent_id, chunk_ids or [], meta["percent"] / 100,
+        ),
+    )
+    if front_indices is None:
+        progress.stage("detect", total=stop - start)
+        front_indices, _ = detect_front_pages_in_range(pdf_path, start, stop)
+
+    progress.stage("ocr", total=len(front_indices))
+    front_texts, front_fields = _ocr_front_pages_in_range(
+        test_id, pdf_path, front_indices, start, stop, progress=progress.update, budget=budget,
+    )
+    progress.update(len(front_indices), force=True)
+    return {
+        "start": start,
+        "stop": stop,
+        "front_texts": {str(k): v for k, v in front_texts.items()},
+        "front_fields": {str(k): list(v) for k, v in front_fields.items()},
+        "ocr_cascade": budget.report(),
+    }
+
+def merge_chunk_pages(chunk_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """The chunks' front pages (JSON keys, as stored) and their merged cascade report."""
+    front_texts: Dict[str, str] = {}
+    front_fields: Dict[str, list] = {}
+    for chunk in chunk_results:
+        front_texts.update(chunk["front_texts"])
+        front_fields.update(chunk["front_fields"])
+    return {
+        "front_texts": front_texts,
+        "front_fields": front_fields,
+        "ocr_cascade": merge_reports(chunk.get("ocr_cascade") for chunk in chunk_results),
+    }
+
+@celery.task(bind=True, name="smartscripts.tasks.ocr_tasks.merge_ocr_chunks")
+def merge_ocr_chunks(self, chunk_results: List[Dict[str, Any]], test_id: int, pdf_path: str,
+                     class_list_path: str) -> Dict[str, Any]:
+    """Chord body: merge per-chunk front pages into student ranges and attendance."""
+    try:
+        progress = ProgressReporter(self, test_id=test_id, percent_range=(CHUNK_PERCENT[1], 100))
+        progress.stage("match", total=100, chunks=len(chunk_results))
+        pages = merge_chunk_pages(chunk_results)
+        front_texts = {int(k): v for k, v in pages["front_texts"].items()}
+        front_fields = {int(k): tuple(v) for k, v in pages["front_fields"].items()}
+        total_pages = max((chunk["stop"] for chunk in chunk_results), default=0)
+
+        result = _match_front_pages(
+            pdf_path, total_pages, front_texts, front_fields, _load_class_list(class_list_path),
+            progress=lambda frac: progress.update(int(frac * 100)),
+        )
+        result["chunks"] = len(chunk_results)
+        result["ocr_cascade"] = pages["ocr_cascade"]
+        return result
+
+    except Exception as e:
+        _fail(self, e)
         raise Ignore()
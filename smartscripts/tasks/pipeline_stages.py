@@ -0,0 +1,514 @@
+"""
+Pipeline Stage Graph
+--------------------
+The OCR → grading pipeline as named stages with explicit inputs:
+
+    rasterize → detect → ocr → match → split → package → grade
+
+Each stage's output is stored as a JSON artifact under PIPELINE_ARTIFACT_DIR/<test_id>/,
+keyed by a hash of the stage version, the parameters it reads, the content of the
+files it reads, the database state it reads and the keys of its inputs. A relaunch
+skips every stage whose stored key still matches, so a failure at the ZIP step keeps
+rasterization, OCR and matching. Fixing a class list changes the match key, so match
+and everything after it re-run; `rerun_from="match"` forces that explicitly.
+
+A stage may hand its work to other tasks (the OCR of a long PDF is split into page
+chunks): the pipeline task is replaced by a chord whose body stores the merged stage
+output and carries on with the remaining stages under the same task id.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set
+
+from flask import current_app, has_app_context
+
+from celery import chord, current_task
+from celery.exceptions import Ignore
+
+from smartscripts.extensions import celery
+from smartscripts.tasks.control_channel import finish_task
+from smartscripts.tasks.progress import ProgressReporter
+
+logger = logging.getLogger(__name__)
+
+PIPELINE_ARTIFACT_DIR = Path(
+    os.getenv("PIPELINE_ARTIFACT_DIR",
+              Path(__file__).resolve().parents[2] / "instance" / "pipeline_artifacts")
+)
+
+# ───────────────────────────────────────────────────────────────
+# Content hashes
+# ───────────────────────────────────────────────────────────────
+_file_digests: Dict[tuple, str] = {}
+
+def file_digest(path: str) -> Optional[str]:
+    """sha256 of a file's content (memoised per path / mtime / size), None if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError):
+        return None
+    memo = (str(path), stat.st_mtime_ns, stat.st_size)
+    if memo not in _file_digests:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        _file_digests[memo] = digest.hexdigest()
+    return _file_digests[memo]
+
+# ───────────────────────────────────────────────────────────────
+# Artifacts
+# ───────────────────────────────────────────────────────────────
+class ArtifactStore:
+    """One JSON file per stage (plus the launch parameters) in a per-test directory."""
+
+    def __init__(self, test_id: int, root: Optional[Path] = None) -> None:
+        self.test_id = test_id
+        self.path = Path(root or PIPELINE_ARTIFACT_DIR) / str(test_id)
+
+    def _write(self, name: str, payload: Dict[str, Any]) -> None:
+        self.path.mkdir(parents=True, exist_ok=True)
+        tmp = self.path / f".{name}.json.tmp"
+        tmp.write_text(json.dumps(payload, ensure_ascii=False))
+        tmp.replace(self.path / f"{name}.json")
+
+    def _read(self, name: str) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads((self.path / f"{name}.json").read_text())
+        except (OSError, ValueError):
+            return None
+
+    def load(self, stage: str) -> Optional[Dict[str, Any]]:
+        return self._read(f"stage_{stage}")
+
+    def save(self, stage: str, key: str, output: Any, seconds: float) -> None:
+        self._write(f"stage_{stage}", {
+            "stage": stage, "key": key, "output": output, "seconds": round(seconds, 3),
+            "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        })
+
+    def save_params(self, params: Dict[str, Any], targets: Optional[List[str]] = None) -> None:
+        self._write("params", {"params": params, "targets": targets})
+
+    def load_params(self) -> Optional[Dict[str, Any]]:
+        return self._read("params")
+
+# ───────────────────────────────────────────────────────────────
+# Stages + graph runner
+# ───────────────────────────────────────────────────────────────
+StageFn = Callable[[Dict[str, Any], Dict[str, Any]], Any]
+
+class StageError(RuntimeError):
+    """A stage raised; `stage` names it. Artifacts of earlier stages are kept."""
+
+    def __init__(self, stage: str, error: Exception) -> None:
+        super().__init__(f"Stage {stage} failed: {error}")
+        self.stage = stage
+        self.error = error
+
+class StageDeferred(Exception):
+    """
+    Raised by a stage whose work runs as other Celery tasks: `header` (a group) computes
+    the parts and the stage's `merge(parts)` turns their results into its output. The
+    graph fills in `stage`, `key` and the stages brought up to date before it.
+    """
+
+    def __init__(self, header) -> None:
+        super().__init__("Stage deferred to a chord")
+        self.header = header
+        self.stage: Optional[str] = None
+        self.key: Optional[str] = None
+        self.completed: List[str] = []
+
+class Stage:
+    """
+    A named step: `run(params, inputs)` gets the launch parameters and the outputs of
+    the stages named in `inputs`, and returns a JSON-serialisable output. `params` and
+    `files` name the parameters it reads (file parameters are hashed by content);
+    `state(params)` fingerprints anything else it reads, such as database rows.
+    Bump `version` when the stage's logic changes to invalidate stored artifacts.
+    A stage that may raise StageDeferred gives the `merge` for its parts.
+    """
+
+    def __init__(self, name: str, run: StageFn, inputs: Sequence[str] = (),
+                 params: Sequence[str] = (), files: Sequence[str] = (), version: str = "1",
+                 state: Optional[Callable[[Dict[str, Any]], Any]] = None,
+                 merge: Optional[Callable[[List[Any]], Any]] = None) -> None:
+        self.name = name
+        self.run = run
+        self.inputs = list(inputs)
+        self.params = list(params)
+        self.files = list(files)
+        self.version = version
+        self.state = state
+        self.merge = merge
+
+    def key(self, params: Dict[str, Any], input_keys: Dict[str, str]) -> str:
+        spec = {
+            "stage": self.name,
+            "version": self.version,
+            "params": {p: params.get(p) for p in self.params},
+            "files": {f: file_digest(params.get(f)) for f in self.files},
+            "state": self.state(params) if self.state else None,
+            "inputs": {i: input_keys[i] for i in self.inputs},
+        }
+        return hashlib.sha256(json.dumps(spec, sort_keys=True, default=str).encode()).hexdigest()
+
+class StageGraph:
+    """Stages in dependency order; runs the ones a request needs and reuses matching artifacts."""
+
+    def __init__(self, stages: Iterable[Stage]) -> None:
+        self.stages: Dict[str, Stage] = {}
+        for stage in stages:
+            missing = [i for i in stage.inputs if i not in self.stages]
+            if missing:
+                raise ValueError(f"Stage {stage.name} depends on unknown or later stages {missing}")
+            self.stages[stage.name] = stage
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.stages)
+
+    def _check(self, names: Iterable[str]) -> None:
+        unknown = [n for n in names if n not in self.stages]
+        if unknown:
+            raise ValueError(f"Unknown pipeline stage(s): {', '.join(unknown)}")
+
+    def upstream(self, targets: Iterable[str]) -> Set[str]:
+        """Targets plus everything they depend on."""
+        needed: Set[str] = set()
+        pending = list(targets)
+        while pending:
+            name = pending.pop()
+            if name not in needed:
+                needed.add(name)
+                pending.extend(self.stages[name].inputs)
+        return needed
+
+    def downstream(self, name: str) -> Set[str]:
+        """`name` plus every stage that depends on it, directly or not."""
+        affected = {name}
+        for stage in self.stages.values():
+            if any(i in affected for i in stage.inputs):
+                affected.add(stage.name)
+        return affected
+
+    def run(
+        self,
+        params: Dict[str, Any],
+        store: ArtifactStore,
+        targets: Optional[Sequence[str]] = None,
+        rerun_from: Optional[str] = None,
+        progress: Optional[Callable[[str, int, int, bool], None]] = None,
+        completed: Sequence[str] = (),
+    ) -> Dict[str, Any]:
+        """
+        Bring `targets` (default: every stage) up to date. Returns {"outputs", "keys",
+        "ran", "skipped"}. A failing stage raises StageError; a stage that deferred its
+        work raises StageDeferred. `completed` names stages already brought up to date
+        earlier in this launch (when resuming after a deferred stage): their stored
+        artifacts are used even if `rerun_from` forces them.
+        """
+        targets = list(targets or self.names)
+        self._check(targets + ([rerun_from] if rerun_from else []))
+        needed = self.upstream(targets)
+        forced = (self.downstream(rerun_from) if rerun_from else set()) - set(completed)
+        plan = [name for name in self.names if name in needed]
+
+        outputs: Dict[str, Any] = {}
+        keys: Dict[str, str] = {}
+        ran: List[str] = []
+        skipped: List[str] = []
+        for step, name in enumerate(plan, start=1):
+            stage = self.stages[name]
+            key = stage.key(params, keys)
+            artifact = store.load(name)
+            if name not in forced and artifact and artifact.get("key") == key:
+                outputs[name] = artifact["output"]
+                skipped.append(name)
+            else:
+                started = time.perf_counter()
+                try:
+                    outputs[name] = stage.run(params, {i: outputs[i] for i in stage.inputs})
+                except StageDeferred as deferred:
+                    deferred.stage, deferred.key = name, key
+                    deferred.completed = list(completed) + ran + skipped
+                    raise
+                except Ignore:
+                    # The stage parked the task (paused); it resumes from this stage
+                    raise
+                except Exception as e:
+                    raise StageError(name, e) from e
+                seconds = time.perf_counter() - started
+                store.save(name, key, outputs[name], seconds)
+                ran.append(name)
+                logger.info("[Pipeline] test %s: stage %s done in %.1fs",
+                            store.test_id, name, seconds)
+            keys[name] = key
+            if progress:
+                progress(name, step, len(plan), name in skipped)
+
+        return {"outputs": outputs, "keys": keys, "ran": ran, "skipped": skipped}
+
+# ───────────────────────────────────────────────────────────────
+# OCR → grading stages
+# ───────────────────────────────────────────────────────────────
+def _rasterize(params: Dict[str, Any], inputs: Dict[str, Any]) -> Dict[str, Any]:
+    """Low-dpi grayscale render of every page, reduced to the front-page features."""
+    from smartscripts.ai.front_page_detector import pdf_page_features
+
+    features = pdf_page_features(params["pdf_path"])
+    return {"total_pages": int(features.shape[0]), "features": features.round(6).tolist()}
+
+def _detect(params: Dict[str, Any], inputs: Dict[str, Any]) -> Dict[str, Any]:
+    from smartscripts.ai.front_page_detector import detect_front_pages_from_features
+
+    front_pages, probabilities = detect_front_pages_from_features(
+        params["pdf_path"], inputs["rasterize"]["features"],
+    )
+    return {
+        "front_pages": front_pages,
+        "probabilities": [round(float(p), 4) for p in probabilities],
+    }
+
+def _ocr(params: Dict[str, Any], inputs: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    OCR of the detected front pages. PDFs longer than OCR_CHUNK_PAGES are deferred to one
+    ocr_page_chunk task per page range when running as a (non-eager) pipeline task.
+    """
+    from celery import group
+    from smartscripts.ai.ocr_cascade import CascadeBudget
+    from smartscripts.tasks import ocr_tasks
+
+    front_pages = inputs["detect"]["front_pages"]
+    total_pages = inputs["rasterize"]["total_pages"]
+    parent_id = params.get("task_id")
+    chunk = ocr_tasks.OCR_CHUNK_PAGES
+    if parent_id and chunk and total_pages > chunk:
+        ranges = [(s, min(s + chunk, total_pages)) for s in range(0, total_pages, chunk)]
+        chunk_ids = [f"{parent_id}-ocr{i}" for i in range(len(ranges))]
+        raise StageDeferred(group(
+            ocr_tasks.ocr_page_chunk.s(
+                params["test_id"], params["pdf_path"], start, stop, parent_id, chunk_ids,
+                budget_share=(stop - start) / total_pages,
+                front_indices=[p for p in front_pages if start <= p < stop],
+            ).set(task_id=chunk_id)
+            for (start, stop), chunk_id in zip(ranges, chunk_ids)
+        ))
+
+    budget = CascadeBudget()
+    front_texts, front_fields = ocr_tasks._ocr_front_pages_in_range(
+        params["test_id"], params["pdf_path"], front_pages, budget=budget,
+    )
+    return {
+        "front_texts": {str(k): v for k, v in front_texts.items()},
+        "front_fields": {str(k): list(v) for k, v in front_fields.items()},
+        "ocr_cascade": budget.report(),
+    }
+
+def _ocr_settings(params: Dict[str, Any]) -> Dict[str, Any]:
+    """What else OCR reads: the test's cover template files and the header cascade policy."""
+    from smartscripts.ai.cover_template import template_dir
+    from smartscripts.tasks.ocr_tasks import header_ocr_policy
+
+    directory = template_dir(params["test_id"])
+    return {
+        "template": {name: file_digest(directory / name)
+                     for name in ("template.png", "fields.json")},
+        "policy": header_ocr_policy().cache_params(),
+    }
+
+def _merge_ocr(parts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    from smartscripts.tasks.ocr_tasks import merge_chunk_pages
+
+    return merge_chunk_pages(parts)
+
+def _match(params: Dict[str, Any], inputs: Dict[str, Any]) -> Dict[str, Any]:
+    from smartscripts.tasks.ocr_tasks import _load_class_list, _match_front_pages
+
+    return _match_front_pages(
+        params["pdf_path"],
+        inputs["rasterize"]["total_pages"],
+        {int(k): v for k, v in inputs["ocr"]["front_texts"].items()},
+        {int(k): tuple(v) for k, v in inputs["ocr"]["front_fields"].items()},
+        _load_class_list(params["class_list_path"]),
+    )
+
+def _split(params: Dict[str, Any], inputs: Dict[str, Any]) -> Dict[str, Any]:
+    from werkzeug.utils import secure_filename
+    from smartscripts.utils.pdf_helpers import split_pdf_pages
+
+    output_dir = Path(params["output_dir"])
+    jobs = []
+    for i, entry in enumerate(inputs["match"]["results"], start=1):
+        student_id = entry.get("matched_id") or entry.get("student_id") or "unknown"
+        filename = secure_filename(f"{i:03d}_{student_id}-{entry.get('name') or 'unknown'}.pdf")
+        jobs.append({
+            "output_path": output_dir / filename,
+            "pages": list(range(entry["start_page"], entry["end_page"] + 1)),
+            "entry": entry,
+        })
+    files = []
+    for job in split_pdf_pages(params["pdf_path"], jobs):
+        output_path = str(job["output_path"]) if job["output_path"] else None
+        files.append(dict(job["entry"], output_path=output_path, bytes=job["bytes"]))
+    return {"files": files}
+
+def _package(params: Dict[str, Any], inputs: Dict[str, Any]) -> Dict[str, Any]:
+    from smartscripts.services.ocr_utils import generate_review_zip
+
+    files = inputs["split"]["files"]
+    presence_rows = [
+        {
+            "page_index": f["start_page"], "detected_id": f["student_id"],
+            "detected_name": f["name"], "confidence": f["confidence"],
+            "matched": bool(f.get("matched_id")), "matched_id": f.get("matched_id"),
+            "match_score": f.get("match_score"), "uncertain": not f.get("matched_id"),
+        }
+        for f in files
+    ]
+    zip_path = Path(params["output_dir"]).parent / f"review_test_{params['test_id']}.zip"
+    generate_review_zip([{"output_path": f["output_path"]} for f in files if f["output_path"]],
+                        presence_rows, str(zip_path))
+    return {"review_zip": str(zip_path), "students": len(files)}
+
+def _script_versions(params: Dict[str, Any]) -> List[list]:
+    """What grading reads from the database: the guide and each script's student and pages."""
+    from smartscripts.models import ExtractedStudentScript as Script, MarkingGuide
+
+    guides = (MarkingGuide.query.with_entities(MarkingGuide.id)
+              .filter_by(test_id=params["test_id"])
+              .all())
+    rows = (Script.query
+            .with_entities(Script.id, Script.student_id, Script.extracted_pdf_path,
+                           Script.page_ranges, Script.is_absent)
+            .filter_by(test_id=params["test_id"])
+            .order_by(Script.id)
+            .all())
+    return [[str(g.id) for g in guides]] + [[str(value) for value in row] for row in rows]
+
+def _grade(params: Dict[str, Any], inputs: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Grade the test's scripts with the checkpointed loop of async_grade_all_students, under
+    the pipeline task's TaskControl row: a pause parks the task and a resume re-enqueues it
+    (the graph skips to this stage, graded scripts are skipped). A cancel or a failed
+    script raises, so a partial grade is never stored as the stage's artifact.
+    """
+    from smartscripts.models import ExtractedStudentScript
+    from smartscripts.services.grading_service import grade_student_script
+    from smartscripts.tasks.control_channel import ControlChannel
+    from smartscripts.tasks.grade_tasks import grade_scripts
+
+    test_id = params["test_id"]
+    task = current_task
+    request = task.request
+    control = ControlChannel.attach(task, test_id, args=request.args or (), kwargs=request.kwargs)
+    scripts = (ExtractedStudentScript.query
+               .filter_by(test_id=test_id, is_absent=False)
+               .order_by(ExtractedStudentScript.id)
+               .all())
+    if not scripts:
+        raise ValueError(f"No student scripts for test {test_id}")
+
+    graded = grade_scripts(task, control, scripts, grade_student_script, test_id)
+    if graded["cancelled_at"] is not None:
+        raise RuntimeError(f"Grading cancelled at {graded['cancelled_at']}/{graded['total']}")
+    if graded["failed"]:
+        raise RuntimeError(f"{len(graded['failed'])} script(s) failed to grade: {graded['failed']}")
+    return {"scripts": [s.id for s in scripts], "graded": graded["graded"]}
+
+OCR_PIPELINE = StageGraph([
+    Stage("rasterize", _rasterize, files=["pdf_path"]),
+    Stage("detect", _detect, inputs=["rasterize"]),
+    Stage("ocr", _ocr, inputs=["rasterize", "detect"], params=["test_id"], state=_ocr_settings,
+          merge=_merge_ocr),
+    Stage("match", _match, inputs=["rasterize", "ocr"], files=["class_list_path"]),
+    Stage("split", _split, inputs=["match"], params=["output_dir"]),
+    Stage("package", _package, inputs=["split"], params=["test_id", "output_dir"]),
+    Stage("grade", _grade, inputs=["split"], params=["test_id"], state=_script_versions),
+])
+
+# ───────────────────────────────────────────────────────────────
+# Celery Tasks
+# ───────────────────────────────────────────────────────────────
+def _in_app_context(fn: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+    if not has_app_context():
+        from smartscripts.app import create_app
+        app = create_app("production")
+        with app.app_context():
+            return fn()
+    return fn()
+
+@celery.task(bind=True, name="smartscripts.tasks.pipeline_stages.run_stage_pipeline")
+def run_stage_pipeline(self, test_id: int, params: Dict[str, Any],
+                       targets: Optional[List[str]] = None,
+                       rerun_from: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Run OCR_PIPELINE for a test, reusing stored artifacts; progress meta names the current
+    stage. A failing stage leaves the task in FAILURE with the stage named in its meta.
+    """
+    return _in_app_context(lambda: _run_stage_pipeline(self, test_id, params, targets, rerun_from))
+
+@celery.task(bind=True, name="smartscripts.tasks.pipeline_stages.finish_deferred_stage")
+def finish_deferred_stage(self, parts: List[Any], test_id: int, params: Dict[str, Any],
+                          stage: str, key: str, started: float, targets: Optional[List[str]],
+                          rerun_from: Optional[str], done: Dict[str, List[str]]) -> Dict[str, Any]:
+    """Chord body: store the merged output of a deferred stage, then run the remaining stages."""
+    def finish() -> Dict[str, Any]:
+        output = OCR_PIPELINE.stages[stage].merge(parts)
+        ArtifactStore(test_id).save(stage, key, output, time.time() - started)
+        logger.info("[Pipeline] test %s: stage %s done from %d parts", test_id, stage, len(parts))
+        done["ran"].append(stage)
+        return _run_stage_pipeline(self, test_id, params, targets, rerun_from, done)
+
+    return _in_app_context(finish)
+
+def _run_stage_pipeline(self, test_id, params, targets, rerun_from,
+                        done: Optional[Dict[str, List[str]]] = None) -> Dict[str, Any]:
+    params = dict(params, test_id=test_id)
+    if not self.request.is_eager:
+        # Lets a stage hand work to chunk tasks that report progress under this task's id
+        params["task_id"] = self.request.id
+    store = ArtifactStore(test_id)
+    done = done or {"ran": [], "skipped": []}
+    completed = done["ran"] + done["skipped"]
+    reporter = ProgressReporter(self, test_id=test_id)
+
+    def progress(stage: str, step: int, total: int, skipped: bool) -> None:
+        if stage not in completed:
+            done["skipped" if skipped else "ran"].append(stage)
+        reporter.update(step, total=total, stage=stage, force=not skipped, **done)
+
+    try:
+        result = OCR_PIPELINE.run(params, store, targets=targets, rerun_from=rerun_from,
+                                  progress=progress, completed=completed)
+    except StageDeferred as deferred:
+        planned = OCR_PIPELINE.upstream(targets or OCR_PIPELINE.names)
+        reporter.update(len(deferred.completed), total=len(planned),
+                        stage=deferred.stage, force=True, **done)
+        logger.info("[Pipeline] test %s: stage %s fanned out as %d tasks",
+                    test_id, deferred.stage, len(deferred.header.tasks))
+        raise self.replace(chord(deferred.header, finish_deferred_stage.s(
+            test_id, params, deferred.stage, deferred.key, time.time(), targets, rerun_from, done,
+        )))
+    except StageError as e:
+        current_app.logger.exception(
+            f"[Pipeline] Test {test_id} failed at stage {e.stage}: {e.error}"
+        )
+        self.update_state(state="FAILURE", meta={
+            "exc_type": type(e.error).__name__, "exc_message": str(e.error),
+            "status": "FAILED", "test_id": test_id, "stage": e.stage, "error": str(e.error), **done,
+        })
+        finish_task(self.request.id, "FAILED")
+        raise Ignore()
+
+    finish_task(self.request.id, "COMPLETED")
+
+    last = result["outputs"][list(result["outputs"])[-1]] if result["outputs"] else None
+    return {"status": "COMPLETED", "test_id": test_id, "ran": done["ran"],
+            "skipped": done["skipped"], "output": last}
@@ -0,0 +1,160 @@
+"""
+smartscripts/tasks/progress.py
+------------------------------
+Coalesced progress reporting for Celery tasks.
+
+Loops call `update()` on every item; the reporter writes to the result backend only
+when at least PROGRESS_MIN_INTERVAL seconds have passed *and* the percent moved by at
+least PROGRESS_MIN_PERCENT (or when a stage starts / on `force=True`), so a task
+makes dozens of backend writes instead of one per item.
+
+Every write has the same PROGRESS meta schema:
+
+    {"status": "PROGRESS", "task_id", "test_id", "percent", "eta_seconds",
+     "elapsed_seconds", "stage", "stage_index", "stage_count", "current", "total",
+     "stage_percent", ...task-specific fields}
+
+`percent` covers the whole task (stages weighted as declared, mapped into
+`percent_range`); `current` / `total` / `stage_percent` are for the current stage.
+The ETA comes from an exponentially smoothed rate, so one slow item does not make
+it jump.
+"""
+
+import os
+import time
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+PROGRESS_MIN_INTERVAL = float(os.getenv("PROGRESS_MIN_INTERVAL", "1.0"))
+PROGRESS_MIN_PERCENT = float(os.getenv("PROGRESS_MIN_PERCENT", "1"))
+# Weight of the newest rate sample in the smoothed rate
+PROGRESS_ETA_SMOOTHING = 0.3
+
+
+class ProgressReporter:
+    """Rate-limited progress for one task (see module docstring for the meta schema)."""
+
+    def __init__(
+        self,
+        task,
+        test_id: Optional[int] = None,
+        stages: Optional[Sequence[Tuple[str, float]]] = None,
+        percent_range: Tuple[int, int] = (0, 100),
+        min_interval: float = PROGRESS_MIN_INTERVAL,
+        min_percent: float = PROGRESS_MIN_PERCENT,
+        publish: Optional[Callable[[Dict[str, Any]], None]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.task = task
+        self.test_id = test_id
+        self.stages = list(stages or [])
+        self.percent_range = percent_range
+        self.min_interval = min_interval
+        self.min_percent = min_percent
+        self.publish = publish or (lambda meta: task.update_state(state="PROGRESS", meta=meta))
+        self.clock = clock
+
+        self.stage_name: Optional[str] = None
+        self.current = 0
+        self.total = 0
+        self.extra: Dict[str, Any] = {}
+        self.writes = 0
+
+        self._started = clock()
+        self._last_write: Optional[float] = None
+        self._last_percent = -1.0
+        self._sample: Optional[Tuple[float, float]] = None  # (time, fraction) of the last rate sample
+        self._rate: Optional[float] = None  # smoothed fraction per second
+
+    # ---------------------------
+    # Progress arithmetic
+    # ---------------------------
+
+    def _stage_index(self) -> int:
+        names = [name for name, _ in self.stages]
+        return names.index(self.stage_name) if self.stage_name in names else 0
+
+    def fraction(self) -> float:
+        """Whole-task progress in [0, 1]."""
+        within = min(1.0, self.current / self.total) if self.total else 0.0
+        if not self.stages:
+            return within
+        weights = [weight for _, weight in self.stages]
+        index = self._stage_index()
+        done = sum(weights[:index]) + weights[index] * within
+        return min(1.0, done / (sum(weights) or 1))
+
+    def percent(self) -> int:
+        low, high = self.percent_range
+        return low + int(self.fraction() * (high - low))
+
+    def eta_seconds(self) -> Optional[int]:
+        fraction = self.fraction()
+        if fraction >= 1.0:
+            return 0
+        if self._rate:
+            return int(round((1.0 - fraction) / self._rate))
+        elapsed = self.clock() - self._started
+        return int(round(elapsed / fraction * (1.0 - fraction))) if fraction > 0 else None
+
+    def _sample_rate(self, now: float) -> None:
+        fraction = self.fraction()
+        if self._sample is not None:
+            then, before = self._sample
+            if now > then and fraction >= before:
+                rate = (fraction - before) / (now - then)
+                self._rate = rate if self._rate is None else (
+                    PROGRESS_ETA_SMOOTHING * rate + (1 - PROGRESS_ETA_SMOOTHING) * self._rate
+                )
+        self._sample = (now, fraction)
+
+    # ---------------------------
+    # Reporting
+    # ---------------------------
+
+    def meta(self) -> Dict[str, Any]:
+        return {
+            "status": "PROGRESS",
+            "task_id": getattr(getattr(self.task, "request", None), "id", None),
+            "test_id": self.test_id,
+            "percent": self.percent(),
+            "eta_seconds": self.eta_seconds(),
+            "elapsed_seconds": int(self.clock() - self._started),
+            "stage": self.stage_name,
+            "stage_index": self._stage_index() + 1 if self.stages else 1,
+            "stage_count": len(self.stages) or 1,
+            "current": self.current,
+            "total": self.total,
+            "stage_percent": int(min(1.0, self.current / self.total) * 100) if self.total else 0,
+            **self.extra,
+        }
+
+    def stage(self, name: str, total: int = 0, **extra) -> bool:
+        """Enter a stage (always written)."""
+        return self.update(0, total=total, stage=name, force=True, **extra)
+
+    def update(self, current: int, total: Optional[int] = None, stage: Optional[str] = None,
+               force: bool = False, **extra) -> bool:
+        """Record progress; returns True when it was written to the backend."""
+        if stage is not None:
+            self.stage_name = stage
+        if total is not None:
+            self.total = total
+        self.current = current
+        self.extra.update(extra)
+
+        now = self.clock()
+        percent = self.percent()
+        if not force and self._last_write is not None and (
+            now - self._last_write < self.min_interval or percent - self._last_percent < self.min_percent
+        ):
+            return False
+
+        self._sample_rate(now)
+        self.publish(self.meta())
+        self.writes += 1
+        self._last_write = now
+        self._last_percent = percent
+        return True
+
+    def advance(self, step: int = 1, **extra) -> bool:
+        return self.update(self.current + step, **extra)
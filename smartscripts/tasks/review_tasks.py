@@ -3,22 +3,26 @@ Review Tasks
 -------------
 - Generate review ZIP (PDFs + logs + presence table) using canonical generate_review_zip
 - Updates SubmissionManifest
-- Supports pause/resume/cancel via TaskControl
+- Supports pause/resume/cancel via TaskControl (see control_channel)
 """
 
 import logging
 import csv
-import time
 from pathlib import Path
+from celery.exceptions import Ignore
 from flask import current_app
 
 from smartscripts.extensions import db, celery
 from smartscripts.models.submission_manifest import SubmissionManifest
-from smartscripts.models.task_control import TaskControl
+from smartscripts.tasks.control_channel import ControlChannel
+from smartscripts.tasks.progress import ProgressReporter
 from smartscripts.services.analytics_service import generate_review_zip as canonical_generate_review_zip
 
 logger = logging.getLogger(__name__)
 
+# Progress weight of each step
+REVIEW_STAGES = [("load", 10), ("zip", 80), ("manifest", 10)]
+
 
 @celery.task(bind=True, name="smartscripts.tasks.review_tasks.generate_review_zip")
 def generate_review_zip_task(self, match_output: dict, test_id: int):
@@ -32,11 +36,8 @@ def generate_review_zip_task(self, match_output: dict, test_id: int):
     logger.info(f"[Review] Task {task_id} started for test {test_id}")
 
     # --- Create or get TaskControl ---
-    db_state = TaskControl.query.filter_by(task_id=task_id).first()
-    if not db_state:
-        db_state = TaskControl(task_id=task_id, test_id=test_id, status="RUNNING")
-        db.session.add(db_state)
-        db.session.commit()
+    control = ControlChannel.attach(self, test_id, args=[match_output, test_id])
+    resume_at = int(control.checkpoint.get("step", 0))
 
     try:
         Path("review_exports").mkdir(exist_ok=True)
@@ -46,54 +47,51 @@ def generate_review_zip_task(self, match_output: dict, test_id: int):
         presence_csv_path = match_output.get("presence_csv_path")
         extra_files = match_output.get("extra_files", [])
 
+        progress = ProgressReporter(self, test_id=test_id, stages=REVIEW_STAGES)
+
         # --- Load presence table if available ---
+        progress.stage("load")
         presence_rows = []
         if presence_csv_path and Path(presence_csv_path).exists():
             with open(presence_csv_path, newline='', encoding='utf-8') as f:
                 presence_rows = list(csv.DictReader(f))
 
-        # --- Simulate progress with pause/resume/cancel support ---
-        total_steps = 3
-        for step in range(1, total_steps + 1):
-            db.session.refresh(db_state)
+        # --- Checkpointed steps with pause/resume/cancel support ---
+        steps = ["zip", "manifest"]
+        for step, name in enumerate(steps[resume_at:], start=resume_at + 1):
+            status = control.status()
 
             # Handle cancel
-            if db_state.status == "CANCELLED":
+            if status == "CANCELLED":
                 logger.warning(f"[Review] Task {task_id} cancelled at step {step}")
-                db_state.status = "CANCELLED"
-                db.session.commit()
+                control.finish("CANCELLED")
                 self.update_state(state="REVOKED")
                 return {"status": "CANCELLED", "task_id": task_id, "test_id": test_id}
 
-            # Handle pause
-            while db_state.status == "PAUSED":
+            # Handle pause: release the worker, resume re-enqueues from this step
+            if status == "PAUSED":
                 logger.info(f"[Review] Task {task_id} paused at step {step}")
-                time.sleep(2)
-                db.session.refresh(db_state)
-
-            # Update progress
-            percent = int(step / total_steps * 100)
-            self.update_state(state="PROGRESS", meta={"percent": percent})
-            time.sleep(1)
-
-        # --- Generate the ZIP ---
-        canonical_generate_review_zip(
-            per_student_files=per_student_files,
-            presence_rows=presence_rows,
-            zip_path=str(zip_path),
-            extra_files=extra_files
-        )
-
-        # --- Update SubmissionManifest ---
-        manifest = SubmissionManifest.query.filter_by(test_id=test_id).first()
-        if manifest:
-            manifest.review_zip_path = str(zip_path)
-            manifest.review_ready = True
-            db.session.commit()
+                control.park({"step": step - 1}, test_id=test_id, percent=progress.percent())
+
+            progress.stage(name)
+            if name == "zip":
+                # --- Generate the ZIP ---
+                canonical_generate_review_zip(
+                    per_student_files=per_student_files,
+                    presence_rows=presence_rows,
+                    zip_path=str(zip_path),
+                    extra_files=extra_files
+                )
+            else:
+                # --- Update SubmissionManifest ---
+                manifest = SubmissionManifest.query.filter_by(test_id=test_id).first()
+                if manifest:
+                    manifest.review_zip_path = str(zip_path)
+                    manifest.review_ready = True
+                    db.session.commit()
 
         # --- Mark as completed ---
-        db_state.status = "COMPLETED"
-        db.session.commit()
+        control.finish("COMPLETED")
 
         logger.info(f"[Review] Task {task_id} COMPLETED for test {test_id}")
         return {
@@ -105,10 +103,11 @@ def generate_review_zip_task(self, match_output: dict, test_id: int):
             "message": "Review ZIP generated successfully.",
         }
 
+    except Ignore:
+        raise
     except Exception as e:
         db.session.rollback()
-        db_state.status = "FAILED"
-        db.session.commit()
+        control.finish("FAILED")
         logger.exception(f"[Review] Task {task_id} FAILED for test {test_id}: {e}")
         return {
             "status": "FAILED",
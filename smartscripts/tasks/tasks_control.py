@@ -2,14 +2,16 @@
 Task Control & Pipeline Orchestration
 -------------------------------------
 Centralized management for Celery pipelines:
- - OCR pipeline (detect, OCR, match, review ZIP)
+ - OCR pipeline (rasterize, detect, OCR, match, split, review ZIP) as a stage graph
+   with persisted artifacts (see pipeline_stages)
  - Grading pipeline (mark student scripts)
+ - Re-running a pipeline from a named stage onward
  - TaskControl integration for pause/resume/cancel
  - Flask blueprint for HTTP endpoints
 """
 
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 from flask import Blueprint, request, jsonify
 from sqlalchemy.exc import SQLAlchemyError
 from smartscripts.extensions import db
@@ -18,8 +20,8 @@ from smartscripts.models.submission_manifest import SubmissionManifest
 from celery.result import AsyncResult
 
 # Import tasks (ignore Pylance for dynamic Celery tasks)
-from smartscripts.tasks.ocr_tasks import run_student_script_ocr_pipeline  # type: ignore
 from smartscripts.tasks.grade_tasks import async_grade_all_students  # type: ignore
+from smartscripts.tasks.pipeline_stages import run_stage_pipeline, ArtifactStore, OCR_PIPELINE  # type: ignore
 
 # -------------------------------
 # Logging
@@ -30,6 +32,29 @@ logger.setLevel(logging.INFO)
 # -------------------------------
 # OCR & Grading Pipelines
 # -------------------------------
+def _pipeline_params(test_id: int, scripts_pdf_path: str, class_list_path: Optional[str] = None) -> Dict[str, Any]:
+    # Imported here: smartscripts.utils pulls in the app package, which imports the tasks
+    from smartscripts.utils.file_helpers import get_upload_root
+
+    return {
+        "pdf_path": scripts_pdf_path,
+        "class_list_path": class_list_path,
+        "output_dir": str(get_upload_root() / str(test_id) / "student_scripts"),
+    }
+
+
+def _launch_stages(test_id: int, params: Dict[str, Any], targets: List[str],
+                   rerun_from: Optional[str] = None) -> AsyncResult:
+    """Save the launch parameters (for later re-runs) and start the stage graph."""
+    ArtifactStore(test_id).save_params(params, targets)
+    return run_stage_pipeline.apply_async(args=[test_id, params], kwargs={"targets": targets, "rerun_from": rerun_from})
+
+
+def start_ocr_stages(test_id: int, scripts_pdf_path: str, class_list_path: str) -> AsyncResult:
+    """Start the stage graph up to the review ZIP; stages whose inputs are unchanged are skipped."""
+    return _launch_stages(test_id, _pipeline_params(test_id, scripts_pdf_path, class_list_path), ["package"])
+
+
 def launch_ocr_pipeline(test_id: int, scripts_pdf_path: str, class_list_path: str) -> Dict[str, Any]:
     """
     Launches the full OCR pipeline:
@@ -40,10 +65,7 @@ def launch_ocr_pipeline(test_id: int, scripts_pdf_path: str, class_list_path: st
     - Generate review ZIP
     """
     try:
-        # Run the full OCR pipeline as a single Celery task
-        workflow: AsyncResult = run_student_script_ocr_pipeline.apply_async(
-            args=[test_id, scripts_pdf_path, class_list_path]
-        )
+        workflow: AsyncResult = start_ocr_stages(test_id, scripts_pdf_path, class_list_path)
 
         # Create SubmissionManifest safely
         manifest: SubmissionManifest = SubmissionManifest()
@@ -79,9 +101,7 @@ def launch_student_ocr_only(test_id: int, scripts_pdf_path: str) -> Dict[str, An
     Launches only the OCR extraction (no matching or ZIP generation)
     """
     try:
-        result: AsyncResult = run_student_script_ocr_pipeline.apply_async(
-            args=[test_id, scripts_pdf_path]
-        )
+        result: AsyncResult = _launch_stages(test_id, _pipeline_params(test_id, scripts_pdf_path), ["ocr"])
 
         manifest: SubmissionManifest = SubmissionManifest()
         manifest.test_id = test_id
@@ -112,10 +132,15 @@ def launch_student_ocr_only(test_id: int, scripts_pdf_path: str) -> Dict[str, An
 
 def launch_grading_pipeline(test_id: int) -> Dict[str, Any]:
     """
-    Launches the grading pipeline asynchronously
+    Launches the grading pipeline asynchronously: as the graph's grade stage when the
+    test went through the stage pipeline (reusing its artifacts), else as one task.
     """
     try:
-        result: AsyncResult = async_grade_all_students.apply_async(args=[test_id])
+        saved = ArtifactStore(test_id).load_params()
+        if saved:
+            result: AsyncResult = _launch_stages(test_id, saved["params"], ["grade"])
+        else:
+            result = async_grade_all_students.apply_async(args=[test_id])
 
         tc: TaskControl = TaskControl(
             task_id=str(result.id),
@@ -138,6 +163,47 @@ def launch_grading_pipeline(test_id: int) -> Dict[str, Any]:
         return {"status": "FAILED", "error": str(e)}
 
 
+def rerun_pipeline(test_id: int, from_stage: str, targets: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Re-run `from_stage` and everything after it (e.g. "match" after fixing the class
+    list) with the parameters of the last launch; earlier stages come from artifacts.
+    """
+    store = ArtifactStore(test_id)
+    saved = store.load_params()
+    if not saved:
+        return {"status": "FAILED", "error": f"No pipeline has been launched for test {test_id}"}
+    if from_stage not in OCR_PIPELINE.names:
+        return {"status": "FAILED", "error": f"Unknown stage {from_stage!r}; one of {OCR_PIPELINE.names}"}
+
+    targets = targets or saved.get("targets") or ["package"]
+    try:
+        result = _launch_stages(test_id, saved["params"], targets, rerun_from=from_stage)
+        db.session.add(TaskControl(task_id=str(result.id), test_id=test_id, status="RUNNING"))
+        db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        logger.error(f"[Pipeline] DB error re-running test {test_id} from {from_stage}: {e}")
+        return {"status": "FAILED", "error": "DB error"}
+
+    logger.info(f"[Pipeline] Re-running test {test_id} from stage {from_stage}, task={result.id}")
+    return {"status": "STARTED", "task_id": result.id, "test_id": test_id, "from_stage": from_stage}
+
+
+def pipeline_status(test_id: int) -> Dict[str, Any]:
+    """Stored artifact (key prefix, duration, finish time) per stage of a test's pipeline."""
+    store = ArtifactStore(test_id)
+    stages = {}
+    for name in OCR_PIPELINE.names:
+        artifact = store.load(name)
+        stages[name] = {
+            "done": bool(artifact),
+            "key": artifact["key"][:12] if artifact else None,
+            "seconds": artifact.get("seconds") if artifact else None,
+            "finished_at": artifact.get("finished_at") if artifact else None,
+        }
+    return {"test_id": test_id, "stages": stages}
+
+
 # -------------------------------
 # Flask Blueprint for Task Control
 # -------------------------------
@@ -192,3 +258,21 @@ def start_grading():
 
     result = launch_grading_pipeline(test_id)
     return jsonify(result)
+
+
+@ocr_control_bp.route("/pipeline/rerun", methods=["POST"])
+def rerun_from_stage():
+    data: Dict[str, Any] = request.get_json() or {}
+
+    test_id_raw = data.get("test_id")
+    from_stage = data.get("from_stage")
+    if test_id_raw is None or not from_stage:
+        return jsonify({"status": "FAILED", "error": "Missing required parameters"}), 400
+
+    result = rerun_pipeline(int(test_id_raw), str(from_stage), data.get("targets"))
+    return jsonify(result), (200 if result["status"] == "STARTED" else 400)
+
+
+@ocr_control_bp.route("/pipeline/<int:test_id>", methods=["GET"])
+def get_pipeline_status(test_id: int):
+    return jsonify(pipeline_status(test_id))
@@ -1,9 +1,7 @@
 ﻿# smartscripts/utils/csv_helpers.py
 
-import csv
 from pathlib import Path
 from typing import List, Dict, Any, Optional
-from fuzzywuzzy import fuzz
 from flask import current_app
 
 
@@ -28,45 +26,18 @@ def read_class_list(file_path: Path) -> List[Dict[str, Any]]:
 
     file_ext = file_path.suffix.lower()
 
+    if file_ext not in (".csv", ".txt"):
+        current_app.logger.warning(f"Unsupported class list format: {file_ext}")
+        return students
+
     try:
-        if file_ext == ".csv":
-            with file_path.open(newline="", encoding="utf-8") as csvfile:
-                reader = csv.DictReader(csvfile)
-                for row in reader:
-                    name = (
-                        row.get("name")
-                        or row.get("Name")
-                        or row.get("student_name")
-                        or ""
-                    )
-                    student_id = (
-                        row.get("student_id")
-                        or row.get("Student ID")
-                        or row.get("id")
-                        or ""
-                    )
-                    if name.strip() or student_id.strip():
-                        students.append(
-                            {"name": name.strip(), "student_id": student_id.strip()}
-                        )
-
-        elif file_ext == ".txt":
-            with file_path.open(encoding="utf-8") as f:
-                for line in f:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    if "," in line:
-                        name, student_id = line.split(",", 1)
-                        students.append(
-                            {"name": name.strip(), "student_id": student_id.strip()}
-                        )
-                    else:
-                        students.append({"name": line.strip(), "student_id": ""})
-        else:
-            current_app.logger.warning(f"Unsupported class list format: {file_ext}")
-            return students
+        # Parsed once per file version and shared with the matching tasks
+        from smartscripts.ai.class_list_cache import get_class_list
 
+        students = [
+            {"name": s["student_name"], "student_id": s["student_id"]}
+            for s in get_class_list(file_path).students
+        ]
     except Exception as e:
         current_app.logger.error(f"Failed to read class list {file_path}: {e}")
 
@@ -77,7 +48,7 @@ def fuzzy_match_student(
     ocr_id: str, class_list: List[Dict[str, Any]], threshold: int = 80
 ) -> Optional[Dict[str, Any]]:
     """
-    Fuzzy match OCR ID against class list.
+    Fuzzy match OCR ID against class list (OCR-confusion aware, see ai/id_index).
 
     Args:
         ocr_id (str): Student ID extracted from OCR.
@@ -87,13 +58,11 @@ def fuzzy_match_student(
     Returns:
         Optional[Dict[str, Any]]: Best matching student dict or None if no match.
     """
-    best_match: Optional[Dict[str, Any]] = None
-    highest_score = 0
-
-    for student in class_list:
-        score = fuzz.ratio(ocr_id, student.get("student_id", ""))
-        if score > highest_score and score >= threshold:
-            highest_score = score
-            best_match = student
-
-    return best_match
+    from smartscripts.ai.id_index import get_id_index
+
+    if not ocr_id or not class_list:
+        return None
+    top = get_id_index([student.get("student_id", "") or "" for student in class_list]).query(ocr_id, 1)
+    if top and top[0][1] * 100 >= threshold:
+        return class_list[top[0][0]]
+    return None
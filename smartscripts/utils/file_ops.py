@@ -5,9 +5,10 @@ import csv
 import shutil
 from datetime import datetime
 from typing import List, Tuple
-from PyPDF2 import PdfReader, PdfWriter
 from flask import current_app
 
+from smartscripts.utils.pdf_helpers import split_pdf_pages
+
 
 # -------------------------------
 # PDF Utilities
@@ -28,22 +29,17 @@ def split_pdf_by_page_ranges(
         List[str]: Paths of the split PDF files.
     """
     os.makedirs(output_dir, exist_ok=True)
-    reader = PdfReader(pdf_path)
+    jobs = [
+        {"output_path": os.path.join(output_dir, f"part_{idx + 1}.pdf"), "pages": list(range(start, end + 1))}
+        for idx, (start, end) in enumerate(page_ranges)
+    ]
     output_paths = []
-
-    for idx, (start, end) in enumerate(page_ranges):
-        writer = PdfWriter()
-        for i in range(start, end + 1):
-            if i < len(reader.pages):
-                writer.add_page(reader.pages[i])
-            else:
-                current_app.logger.warning(f"Page {i} out of bounds for {pdf_path}")
-
-        out_path = os.path.join(output_dir, f"part_{idx + 1}.pdf")
-        with open(out_path, "wb") as f_out:
-            writer.write(f_out)
-        output_paths.append(out_path)
-        current_app.logger.info(f"Created split PDF: {out_path}")
+    for (start, end), job in zip(page_ranges, split_pdf_pages(pdf_path, jobs)):
+        if job["output_path"] is None:
+            current_app.logger.warning(f"Pages {start}-{end} out of bounds for {pdf_path}")
+            continue
+        output_paths.append(str(job["output_path"]))
+        current_app.logger.info(f"Created split PDF: {job['output_path']} ({job['bytes']} bytes, {job['seconds']}s)")
 
     return output_paths
 
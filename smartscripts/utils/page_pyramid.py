@@ -0,0 +1,162 @@
+# smartscripts/utils/page_pyramid.py
+"""
+Multi-resolution views of PDF pages.
+
+Each stage asks for the view it needs (a PageLevel): front-page detection and
+layout work on a small grayscale render, name/ID OCR on a high-dpi crop of the
+header, full-page OCR on a high-dpi render. A PagePyramid renders each level at
+most once and only when first requested; with PyMuPDF, crops are rendered
+directly from the PDF (clip) instead of cutting them out of a full-page render.
+"""
+
+import os
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+from smartscripts.utils.pdf_helpers import PDF_RENDERER, fitz, convert_from_path, pdf_page_count
+
+# (x0, y0, x1, y1) as fractions of the page width / height
+Region = Tuple[float, float, float, float]
+
+
+def _parse_region(value: str) -> Region:
+    try:
+        x0, y0, x1, y1 = (float(v) for v in value.split(","))
+        return x0, y0, x1, y1
+    except ValueError:
+        return 0.0, 0.0, 1.0, 0.5
+
+
+LAYOUT_DPI = int(os.getenv("PAGE_LAYOUT_DPI", "72"))
+OCR_DPI = int(os.getenv("PAGE_OCR_DPI", "300"))
+# Part of a cover sheet that holds the student's name / ID boxes
+HEADER_REGION = _parse_region(os.getenv("PAGE_HEADER_REGION", "0,0,1,0.5"))
+
+
+# -------------------------------
+# Levels
+# -------------------------------
+
+class PageLevel:
+    """One view of a page: resolution, colour mode and optional region."""
+
+    def __init__(self, dpi: int, grayscale: bool = False, region: Optional[Region] = None) -> None:
+        self.dpi = dpi
+        self.grayscale = grayscale
+        self.region = tuple(round(v, 4) for v in region) if region else None
+
+    @property
+    def key(self) -> Tuple:
+        return self.dpi, self.grayscale, self.region
+
+    def crop_of(self, region: Region) -> "PageLevel":
+        return PageLevel(self.dpi, self.grayscale, region)
+
+    def __repr__(self) -> str:
+        return f"PageLevel(dpi={self.dpi}, grayscale={self.grayscale}, region={self.region})"
+
+
+# Resolutions declared by the pipeline stages
+LAYOUT = PageLevel(LAYOUT_DPI, grayscale=True)   # front-page detection, layout scoring, classifiers
+HEADER = PageLevel(OCR_DPI, region=HEADER_REGION)  # name / student ID OCR on cover sheets
+FULL = PageLevel(OCR_DPI)                          # whole-page OCR
+
+
+# -------------------------------
+# Pyramid
+# -------------------------------
+
+class PagePyramid:
+    """Lazily rendered, cached levels of a single PDF page."""
+
+    def __init__(self, index: int, render: Callable[[PageLevel], Image.Image]) -> None:
+        self.index = index
+        self._render = render
+        self._levels: Dict[Tuple, Image.Image] = {}
+
+    def get(self, level: PageLevel) -> Image.Image:
+        if level.key not in self._levels:
+            self._levels[level.key] = self._from_cached(level) or self._render(level)
+        return self._levels[level.key]
+
+    def array(self, level: PageLevel) -> np.ndarray:
+        """Level as a numpy array (grayscale levels are 2-D uint8)."""
+        return np.asarray(self.get(level))
+
+    def _from_cached(self, level: PageLevel) -> Optional[Image.Image]:
+        """Cut a region out of an already-rendered full page at the same dpi/mode, if there is one."""
+        if level.region is None:
+            return None
+        full = self._levels.get(PageLevel(level.dpi, level.grayscale).key)
+        return _crop(full, level.region) if full is not None else None
+
+    def release(self) -> None:
+        self._levels.clear()
+
+
+def _crop(image: Image.Image, region: Region) -> Image.Image:
+    w, h = image.size
+    x0, y0, x1, y1 = region
+    return image.crop((int(x0 * w), int(y0 * h), int(x1 * w), int(y1 * h)))
+
+
+def region_from_box(box: Tuple[int, int, int, int], size: Tuple[int, int]) -> Region:
+    """Pixel box (x, y, w, h) on a level of the given size → page-relative region."""
+    x, y, w, h = box
+    width, height = size
+    return x / width, y / height, (x + w) / width, (y + h) / height
+
+
+# -------------------------------
+# Renderers
+# -------------------------------
+
+def _pymupdf_renderer(doc, index: int) -> Callable[[PageLevel], Image.Image]:
+    def render(level: PageLevel) -> Image.Image:
+        page = doc.load_page(index)
+        clip = None
+        if level.region:
+            x0, y0, x1, y1 = level.region
+            r = page.rect
+            clip = fitz.Rect(r.x0 + x0 * r.width, r.y0 + y0 * r.height, r.x0 + x1 * r.width, r.y0 + y1 * r.height)
+        colorspace = fitz.csGRAY if level.grayscale else fitz.csRGB
+        pix = page.get_pixmap(dpi=level.dpi, colorspace=colorspace, clip=clip, alpha=False)
+        return Image.frombytes("L" if level.grayscale else "RGB", (pix.width, pix.height), pix.samples)
+
+    return render
+
+
+def _pdf2image_renderer(pdf_path: Union[str, Path], index: int) -> Callable[[PageLevel], Image.Image]:
+    def render(level: PageLevel) -> Image.Image:
+        page = convert_from_path(
+            str(pdf_path), dpi=level.dpi, first_page=index + 1, last_page=index + 1, grayscale=level.grayscale
+        )[0]
+        page = page.convert("L" if level.grayscale else "RGB")
+        return _crop(page, level.region) if level.region else page
+
+    return render
+
+
+def iter_page_pyramids(
+    pdf_path: Union[str, Path], start: int = 0, stop: Optional[int] = None
+) -> Iterator[PagePyramid]:
+    """
+    One PagePyramid per page in [start, stop). Nothing is rendered until a level is
+    requested; drop each pyramid after use to keep memory flat.
+    """
+    total = pdf_page_count(pdf_path)
+    stop = total if stop is None else min(stop, total)
+
+    if PDF_RENDERER == "pymupdf" and fitz is not None:
+        # Opened once; every pyramid keeps a reference, so the document stays usable
+        # until the last page is dropped
+        doc = fitz.open(str(pdf_path))
+        for index in range(start, stop):
+            yield PagePyramid(index, _pymupdf_renderer(doc, index))
+        return
+
+    for index in range(start, stop):
+        yield PagePyramid(index, _pdf2image_renderer(pdf_path, index))
@@ -1,21 +1,104 @@
 ﻿# smartscripts/utils/pdf_helpers.py
 
+import io
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Union, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Union, Tuple
 from pdf2image import convert_from_path
 from PyPDF2 import PdfReader, PdfWriter
 import numpy as np
 from PIL import Image
 import cv2
 
+try:
+    import fitz  # PyMuPDF
+except ImportError:
+    fitz = None
+
+# "pymupdf" renders in-process, page by page; "pdf2image" shells out to poppler per chunk
+PDF_RENDERER = os.getenv("PDF_RENDERER", "pymupdf" if fitz is not None else "pdf2image").lower()
+# Pages rendered per pdf2image call / yielded per chunk; bounds peak memory on long uploads
+PDF_RENDER_CHUNK = int(os.getenv("PDF_RENDER_CHUNK", "8"))
+# Threads writing split per-student PDFs
+PDF_SPLIT_WORKERS = int(os.getenv("PDF_SPLIT_WORKERS", "4"))
+
+logger = logging.getLogger(__name__)
+
 # -------------------------------
 # PDF → Images
 # -------------------------------
 
 def convert_pdf_to_images(pdf_path: Union[str, Path], dpi: int = 200) -> List[np.ndarray]:
     pdf_path = Path(pdf_path)
-    pages = convert_from_path(str(pdf_path), dpi=dpi)
-    return [np.array(page.convert("RGB")) for page in pages]
+    return [np.array(page.convert("RGB")) for _, page in iter_pdf_pages(pdf_path, dpi=dpi)]
+
+# -------------------------------
+# Streaming PDF → Images
+# -------------------------------
+
+def pdf_page_count(pdf_path: Union[str, Path]) -> int:
+    if fitz is not None:
+        with fitz.open(str(pdf_path)) as doc:
+            return doc.page_count
+    return len(PdfReader(str(pdf_path)).pages)
+
+
+def iter_pdf_pages(
+    pdf_path: Union[str, Path],
+    dpi: int = 200,
+    start: int = 0,
+    stop: Optional[int] = None,
+    grayscale: bool = False,
+    chunk_size: Optional[int] = None,
+) -> Iterator[Tuple[int, Image.Image]]:
+    """
+    Lazily render pages [start, stop) (0-based) as (page_index, PIL image).
+
+    Only one page (PyMuPDF) or one chunk of `chunk_size` pages (pdf2image) is
+    held in memory at a time, so callers that drop each page after use keep a
+    flat memory profile regardless of document length.
+    """
+    total = pdf_page_count(pdf_path)
+    stop = total if stop is None else min(stop, total)
+    if start >= stop:
+        return
+
+    if PDF_RENDERER == "pymupdf" and fitz is not None:
+        colorspace = fitz.csGRAY if grayscale else fitz.csRGB
+        with fitz.open(str(pdf_path)) as doc:
+            for index in range(start, stop):
+                pix = doc.load_page(index).get_pixmap(dpi=dpi, colorspace=colorspace, alpha=False)
+                mode = "L" if grayscale else "RGB"
+                yield index, Image.frombytes(mode, (pix.width, pix.height), pix.samples)
+        return
+
+    chunk_size = max(1, chunk_size or PDF_RENDER_CHUNK)
+    for chunk_start in range(start, stop, chunk_size):
+        chunk_stop = min(chunk_start + chunk_size, stop)
+        pages = convert_from_path(
+            str(pdf_path), dpi=dpi, first_page=chunk_start + 1, last_page=chunk_stop, grayscale=grayscale
+        )
+        for offset, page in enumerate(pages):
+            yield chunk_start + offset, page
+
+
+def iter_pdf_page_chunks(
+    pdf_path: Union[str, Path], chunk_size: Optional[int] = None, **kwargs
+) -> Iterator[List[Tuple[int, Image.Image]]]:
+    """`iter_pdf_pages` grouped into lists of at most `chunk_size` pages, for batched consumers."""
+    chunk_size = max(1, chunk_size or PDF_RENDER_CHUNK)
+    chunk: List[Tuple[int, Image.Image]] = []
+    for item in iter_pdf_pages(pdf_path, chunk_size=chunk_size, **kwargs):
+        chunk.append(item)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
 
 # -------------------------------
 # Single Page → PNG/JPG
@@ -28,10 +111,10 @@ def save_pdf_page_as_image(
     dpi: int = 200,
     image_format: str = "PNG",
 ) -> Path:
-    pages = convert_from_path(str(pdf_path), dpi=dpi, first_page=page_number + 1, last_page=page_number + 1)
+    pages = list(iter_pdf_pages(pdf_path, dpi=dpi, start=page_number, stop=page_number + 1))
     if not pages:
         raise ValueError(f"Page {page_number} not found in {pdf_path}")
-    page_image: Image.Image = pages[0].convert("RGB")
+    page_image: Image.Image = pages[0][1].convert("RGB")
     output_path = Path(output_path)
     output_path.parent.mkdir(parents=True, exist_ok=True)
     page_image.save(output_path, format=image_format.upper())
@@ -42,37 +125,153 @@ def save_pdf_page_as_image(
 # -------------------------------
 
 def get_pdf_thumbnail(pdf_path: Union[str, Path], dpi: int = 100) -> np.ndarray:
-    pages = convert_from_path(str(pdf_path), dpi=dpi, first_page=1, last_page=1)
+    pages = list(iter_pdf_pages(pdf_path, dpi=dpi, stop=1))
     if not pages:
         raise ValueError(f"No pages found in {pdf_path}")
-    return np.array(pages[0].convert("RGB"))
+    return np.array(pages[0][1].convert("RGB"))
 
 # -------------------------------
-# Split PDF by Page Ranges
+# Split PDF into per-student files
 # -------------------------------
 
+def _page_runs(pages: List[int]) -> List[Tuple[int, int]]:
+    """Sorted unique pages → inclusive runs of consecutive pages."""
+    runs: List[Tuple[int, int]] = []
+    for page in sorted(set(pages)):
+        if runs and page == runs[-1][1] + 1:
+            runs[-1] = (runs[-1][0], page)
+        else:
+            runs.append((page, page))
+    return runs
+
+
+def _write_bytes(path: Path, data: bytes) -> float:
+    started = time.perf_counter()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return time.perf_counter() - started
+
+
+def _open_source(pdf_path: Union[str, Path]):
+    """(document, page count) with PyMuPDF, else a PyPDF2 reader."""
+    if fitz is not None:
+        source = fitz.open(str(pdf_path))
+        return source, source.page_count
+    source = PdfReader(str(pdf_path))
+    return source, len(source.pages)
+
+
+def _build_pdf(source, pages: List[int]) -> bytes:
+    """Serialised PDF of `pages` (sorted, in range) copied from an open source document."""
+    if fitz is not None:
+        out = fitz.open()
+        for first, last in _page_runs(pages):
+            out.insert_pdf(source, from_page=first, to_page=last)
+        data = out.tobytes()
+        out.close()
+        return data
+    writer = PdfWriter()
+    for page in pages:
+        writer.add_page(source.pages[page])
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def pdf_pages_bytes(pdf_path: Union[str, Path], pages: List[int]) -> bytes:
+    """
+    A PDF of the given 0-based pages of `pdf_path`, built in memory (pages copied as-is,
+    not re-rendered). Out-of-range pages are ignored; raises ValueError if none remain.
+    """
+    source, total = _open_source(pdf_path)
+    try:
+        wanted = sorted({p for p in pages if 0 <= p < total})
+        if not wanted:
+            raise ValueError(f"No pages of {pdf_path} in {pages}")
+        return _build_pdf(source, wanted)
+    finally:
+        if fitz is not None:
+            source.close()
+
+
+def split_pdf_pages(
+    pdf_path: Union[str, Path],
+    jobs: List[Dict[str, Any]],
+    max_workers: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Write one PDF per job from a single open of `pdf_path`.
+
+    Each job is {"output_path": path, "pages": [0-based page indices], ...}; extra keys
+    are passed through. Consecutive pages are copied as one run. Documents are built
+    one at a time on the calling thread (MuPDF/PyPDF2 objects are not thread-safe) and
+    their bytes are written by a bounded thread pool, so at most 2 × workers finished
+    documents wait in memory.
+
+    Returns the jobs in order with output_path (None when no page was in range),
+    pages, bytes and seconds (build + write) filled in.
+    """
+    workers = max(1, max_workers or PDF_SPLIT_WORKERS)
+    results: List[Dict[str, Any]] = []
+    started = time.perf_counter()
+    slots = threading.BoundedSemaphore(workers * 2)
+
+    def _release(_future) -> None:
+        slots.release()
+
+    source, total = _open_source(pdf_path)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = []
+            for job in jobs:
+                build_started = time.perf_counter()
+                pages = sorted({p for p in job.get("pages", []) if 0 <= p < total})
+                result = dict(job, pages=pages, bytes=0, seconds=0.0)
+                if not pages:
+                    result["output_path"] = None
+                    results.append(result)
+                    continue
+
+                data = _build_pdf(source, pages)
+                result.update(output_path=Path(job["output_path"]), bytes=len(data),
+                              seconds=time.perf_counter() - build_started)
+                slots.acquire()
+                future = pool.submit(_write_bytes, result["output_path"], data)
+                future.add_done_callback(_release)
+                pending.append((result, future))
+                results.append(result)
+
+            for result, future in pending:
+                result["seconds"] = round(result["seconds"] + future.result(), 4)
+                logger.debug("Wrote %s: %d pages, %d bytes, %.3fs", result["output_path"].name,
+                             len(result["pages"]), result["bytes"], result["seconds"])
+    finally:
+        if fitz is not None:
+            source.close()
+
+    logger.info(
+        "Split %s into %d files (%d bytes) in %.2fs",
+        Path(pdf_path).name, sum(1 for r in results if r["output_path"]),
+        sum(r["bytes"] for r in results), time.perf_counter() - started,
+    )
+    return results
+
+
 def split_pdf_by_page_ranges(
     pdf_path: Union[str, Path],
     output_dir: Union[str, Path],
     ranges: List[Tuple[int, int]]
 ) -> List[Path]:
+    """Split by 1-based inclusive (start, end) ranges into <stem>_part<i>.pdf files."""
     pdf_path = Path(pdf_path)
     output_dir = Path(output_dir)
     output_dir.mkdir(parents=True, exist_ok=True)
-    reader = PdfReader(str(pdf_path))
-    output_paths = []
-
-    for i, (start, end) in enumerate(ranges, start=1):
-        writer = PdfWriter()
-        for page_num in range(start - 1, end):
-            if page_num < len(reader.pages):
-                writer.add_page(reader.pages[page_num])
-        split_path = output_dir / f"{pdf_path.stem}_part{i}.pdf"
-        with open(split_path, "wb") as f:
-            writer.write(f)
-        output_paths.append(split_path)
-
-    return output_paths
+    jobs = [
+        {"output_path": output_dir / f"{pdf_path.stem}_part{i}.pdf", "pages": list(range(start - 1, end))}
+        for i, (start, end) in enumerate(ranges, start=1)
+    ]
+    return [r["output_path"] for r in split_pdf_pages(pdf_path, jobs) if r["output_path"]]
 
 # -------------------------------
 # Save numpy images as PDF
@@ -103,6 +302,4 @@ def is_front_page(pdf_path: Union[str, Path]) -> bool:
     """
     Return True if PDF has only one page.
     """
-    pdf_path = Path(pdf_path)
-    reader = PdfReader(str(pdf_path))
-    return len(reader.pages) == 1
+    return pdf_page_count(pdf_path) == 1
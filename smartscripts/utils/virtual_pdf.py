@@ -0,0 +1,162 @@
+# smartscripts/utils/virtual_pdf.py
+"""
+Per-student PDFs built on request from page ranges of the combined upload.
+
+With VIRTUAL_STUDENT_PDFS on, preprocessing stores only the combined PDF and a page
+range manifest on each ExtractedStudentScript (source_pdf_path + page_ranges) instead
+of writing one file per student. Routes build the student's PDF when it is asked for,
+keep recently built documents in a bounded LRU, and answer repeat requests with 304s
+from an ETag that changes with the source file and the page ranges, so re-assigning
+pages takes effect immediately without rewriting anything.
+"""
+
+import io
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Iterable, List, Optional, Sequence, Tuple, Union
+
+from flask import request, send_file, make_response
+
+from smartscripts.utils.pdf_helpers import pdf_pages_bytes
+
+logger = logging.getLogger(__name__)
+
+VIRTUAL_STUDENT_PDFS = os.getenv("VIRTUAL_STUDENT_PDFS", "False").lower() in ["true", "1", "yes"]
+# Built documents kept in memory, bounded by count and by total size
+VIRTUAL_PDF_CACHE_SIZE = int(os.getenv("VIRTUAL_PDF_CACHE_SIZE", "64"))
+VIRTUAL_PDF_CACHE_MB = int(os.getenv("VIRTUAL_PDF_CACHE_MB", "128"))
+
+def ranges_to_pages(ranges: Optional[Iterable[Sequence[int]]]) -> List[int]:
+    """[[first, last], ...] (0-based, inclusive) → page indices."""
+    pages: List[int] = []
+    for first, last in ranges or []:
+        pages.extend(range(int(first), int(last) + 1))
+    return pages
+
+
+def pdf_etag(pdf_path: Union[str, Path], pages: Sequence[int]) -> str:
+    """Strong ETag for `pages` of `pdf_path`; changes when the file is replaced or the pages change."""
+    stat = Path(pdf_path).stat()
+    key = f"{Path(pdf_path).resolve()}:{stat.st_mtime_ns}:{stat.st_size}:{','.join(map(str, pages))}"
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+# ---------------------------
+# LRU of built documents
+# ---------------------------
+
+class VirtualPdfCache:
+    """Thread-safe LRU of built PDFs keyed by ETag."""
+
+    def __init__(self, max_entries: int = VIRTUAL_PDF_CACHE_SIZE, max_bytes: int = VIRTUAL_PDF_CACHE_MB << 20) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._docs: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, pdf_path: Union[str, Path], pages: Sequence[int]) -> Tuple[bytes, str]:
+        """(PDF bytes, ETag) for `pages` of `pdf_path`, built at most once while cached."""
+        etag = pdf_etag(pdf_path, pages)
+        with self._lock:
+            data = self._docs.get(etag)
+            if data is not None:
+                self._docs.move_to_end(etag)
+                self.hits += 1
+                return data, etag
+            self.misses += 1
+
+        # Built outside the lock; two concurrent misses for one document just build it twice
+        data = pdf_pages_bytes(pdf_path, list(pages))
+        self._put(etag, data)
+        return data, etag
+
+    def _put(self, etag: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            if etag in self._docs:
+                return
+            self._docs[etag] = data
+            self._bytes += len(data)
+            while len(self._docs) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._docs.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._docs.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+
+_cache = VirtualPdfCache()
+
+
+def get_virtual_pdf_cache() -> VirtualPdfCache:
+    return _cache
+
+
+# ---------------------------
+# Scripts
+# ---------------------------
+
+def source_pdf_file(script: Any) -> Optional[Path]:
+    """Absolute path of a virtual script's combined PDF (stored relative to the uploads root)."""
+    from smartscripts.utils.file_helpers import get_upload_root
+
+    if not getattr(script, "source_pdf_path", None):
+        return None
+    path = get_upload_root() / script.source_pdf_path
+    return path if path.is_file() else None
+
+
+def student_pdf_bytes(script: Any) -> Optional[Tuple[bytes, str]]:
+    """(PDF bytes, ETag) for a virtual script, or None when its source or pages are missing."""
+    source = source_pdf_file(script)
+    pages = ranges_to_pages(getattr(script, "page_ranges", None))
+    if source is None or not pages:
+        return None
+    try:
+        return _cache.get(source, pages)
+    except ValueError as e:
+        logger.warning("Cannot build PDF for script %s: %s", getattr(script, "id", None), e)
+        return None
+
+
+def send_student_pdf(script: Any, download_name: str, as_attachment: bool = False):
+    """
+    Response serving a virtual script's PDF, or None when it cannot be built.
+    Conditional requests are answered from the ETag alone, before anything is built.
+    """
+    source = source_pdf_file(script)
+    pages = ranges_to_pages(getattr(script, "page_ranges", None))
+    if source is None or not pages:
+        return None
+
+    etag = pdf_etag(source, pages)
+    if request.if_none_match.contains(etag):
+        response = make_response("", 304)
+        response.set_etag(etag)
+        return response
+
+    built = student_pdf_bytes(script)
+    if built is None:
+        return None
+    data, etag = built
+    return send_file(
+        io.BytesIO(data),
+        mimetype="application/pdf",
+        as_attachment=as_attachment,
+        download_name=download_name,
+        etag=etag,
+        max_age=0,
+    )
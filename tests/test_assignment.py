@@ -0,0 +1,140 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+import numpy as np
+from flask import Flask
+from smartscripts.extensions import db
+from smartscripts.ai import class_list_cache, text_matching
+from smartscripts.ai.text_matching import assign_one_to_one, ingest_ocr_results, mark_uncertain_pages
+from smartscripts.tasks import control_channel, matching_tasks
+
+CLASS_LIST = [
+    {"student_id": "2023-001", "student_name": "Alice Namugga"},
+    {"student_id": "2023-002", "student_name": "Bob Okello"},
+    {"student_id": "2023-003", "student_name": "Carol Atim"},
+]
+
+class TestAssignment(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(text_matching, "_get_embed_model", return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_duplicate_claim_resolved_globally(self):
+        scores = np.array([[0.95, 0.90, 0.1],
+                           [0.97, 0.20, 0.1]])
+        rows = assign_one_to_one(scores)
+        self.assertEqual([r["index"] for r in rows], [1, 0])
+        # Page 0 lost its first choice: negative margin, sent to review
+        self.assertTrue(rows[0]["ambiguous"])
+        self.assertLess(rows[0]["margin"], 0)
+
+        with mock.patch.object(text_matching, "linear_sum_assignment", None):
+            # Greedy takes the single best pair first, which here is also optimal
+            self.assertEqual([r["index"] for r in assign_one_to_one(scores)], [1, 0])
+
+    def test_ineligible_pair_cannot_displace_a_match(self):
+        scores = np.array([[0.9, 0.85], [0.7, 0.0]])
+        for solver in (text_matching.linear_sum_assignment, None):
+            with mock.patch.object(text_matching, "linear_sum_assignment", solver):
+                rows = assign_one_to_one(scores, min_score=0.8)
+            self.assertEqual([r["index"] for r in rows], [0, None])
+            self.assertAlmostEqual(rows[0]["score"], 0.9)
+            self.assertAlmostEqual(rows[0]["margin"], 0.05)
+
+    def test_margins_and_thresholds(self):
+        scores = np.array([[0.99, 0.10], [0.10, 0.60], [0.30, 0.20]])
+        rows = assign_one_to_one(scores, min_score=0.5, min_margin=0.05)
+        self.assertEqual([r["index"] for r in rows], [0, 1, None])
+        # Alternatives below min_score do not count against the margin
+        self.assertAlmostEqual(rows[0]["margin"], 0.99)
+        self.assertFalse(rows[0]["ambiguous"])
+        self.assertEqual(assign_one_to_one(np.zeros((0, 3))), [])
+
+    def test_ingest_assigns_each_student_once(self):
+        ocr = [
+            {"page_index": 0, "id": "2023-002", "name": "Bob Okello", "confidence": 0.9},
+            {"page_index": 5, "id": "2023-002", "name": "Bob Okelo", "confidence": 0.9},
+            {"page_index": 9, "id": "2023-003", "name": "Atim Carol", "confidence": 0.9},
+        ]
+        presence, assignment = ingest_ocr_results(ocr, CLASS_LIST)
+        ids = [r["matched_id"] for r in presence]
+        self.assertEqual(ids[0], "2023-002")
+        self.assertEqual(ids[2], "2023-003")
+        self.assertNotEqual(ids[1], "2023-002")
+        self.assertTrue(mark_uncertain_pages(presence)[1]["uncertain"])
+        self.assertFalse(presence[2]["ambiguous"])
+
+class TestMatchingTask(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+        db.init_app(self.app)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.csv = os.path.join(self.tmp.name, "class.csv")
+        with open(self.csv, "w") as f:
+            f.write("student_id,name\n" + "".join(f"{s['student_id']},{s['student_name']}\n" for s in CLASS_LIST))
+        for target, value in ((control_channel, "_redis"), (text_matching, "_get_embed_model")):
+            patcher = mock.patch.object(target, value, return_value=None)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(class_list_cache, "CLASS_LIST_CACHE_DIR", Path(self.tmp.name) / "cache")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # No manifest row: the presence table is only returned, not written to disk
+        patcher = mock.patch("smartscripts.models.submission_manifest.SubmissionManifest")
+        patcher.start().query.filter_by.return_value.first.return_value = None
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+        self.tmp.cleanup()
+
+    def test_no_two_scripts_claim_one_student(self):
+        task = SimpleNamespace(name="match", request=SimpleNamespace(id="m1"), update_state=mock.Mock())
+        ocr_output = {"ocr_results": [
+            {"ocr_id": "2023-001", "ocr_name": "Alice Namugga"},
+            {"ocr_id": "2023-00l", "ocr_name": "Alice Namuga"},
+            {"ocr_id": "", "ocr_name": "Carol Atim"},
+        ]}
+        result = matching_tasks._run_matching_task(task, ocr_output, 1, self.csv)
+        rows = result["presence_table"]
+        self.assertEqual(rows[0]["matched_id"], "2023-001")
+        self.assertNotEqual(rows[1]["matched_id"], "2023-001")
+        self.assertEqual(rows[2]["matched_id"], "2023-003")
+
+    def test_submissions_updated_in_bulk(self):
+        from sqlalchemy import event
+        from smartscripts.models.ocr_submission import OCRSubmission
+        db.session.add_all([OCRSubmission(id=n, image_path=f"p{n}.png") for n in range(1, 7)])
+        db.session.commit()
+        rows = [{"submission_id": n, "ocr_id": f"2023-00{(n - 1) % 3 + 1}", "ocr_name": ""} for n in range(1, 7)]
+        rows.append({"submission_id": 99, "ocr_id": "2023-001", "ocr_name": ""})
+
+        statements = []
+        listener = lambda conn, cursor, sql, *args: statements.append(sql)
+        event.listen(db.engine, "before_cursor_execute", listener)
+        self.addCleanup(event.remove, db.engine, "before_cursor_execute", listener)
+        task = SimpleNamespace(name="match", request=SimpleNamespace(id="m2"), update_state=mock.Mock())
+        with mock.patch.object(matching_tasks, "MATCH_COMMIT_BATCH", 4):
+            result = matching_tasks._run_matching_task(task, {"ocr_results": rows}, 1, self.csv)
+
+        self.assertEqual(result["status"], "COMPLETED")
+        # One lookup for all submissions, then one executemany UPDATE per batch of 4
+        on_submissions = [sql.split()[0] for sql in statements if "ocr_submission" in sql]
+        self.assertEqual(on_submissions, ["SELECT", "UPDATE", "UPDATE"])
+        subs = {s.id: s for s in OCRSubmission.query.all()}
+        self.assertEqual([subs[n].corrected_id for n in (1, 2, 3)], ["2023-001", "2023-002", "2023-003"])
+        self.assertIsNone(subs[4].corrected_id)
+        self.assertTrue(subs[4].needs_human_review)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+from smartscripts.ai import class_list_cache, text_matching
+from smartscripts.ai.class_list_cache import get_class_list, parse_class_list
+
+ROSTER = "Reg No,Full_Name,Stream\n2023-001,Alice Namugga,A\n2023-002,Bob Okello,B\n,,\n"
+
+class TestClassListCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        self.csv = self.dir / "class.csv"
+        self.csv.write_text(ROSTER)
+        for name, value in (("CLASS_LIST_CACHE_DIR", self.dir / "cache"), ("_memory", type(class_list_cache._memory)()),
+                            ("_stat_digests", {})):
+            patcher = mock.patch.object(class_list_cache, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(text_matching, "_get_embed_model", return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_parse_headers_and_txt(self):
+        rows = parse_class_list(ROSTER.encode("utf-8-sig"))
+        self.assertEqual([(r["student_id"], r["student_name"], r["Stream"]) for r in rows],
+                         [("2023-001", "Alice Namugga", "A"), ("2023-002", "Bob Okello", "B")])
+        txt = parse_class_list(b"Alice Namugga, 2023-001\nCarol\n", ".txt")
+        self.assertEqual(txt[1], {"student_id": "", "student_name": "Carol"})
+
+    def test_parsed_once_per_content(self):
+        with mock.patch.object(class_list_cache, "parse_class_list", wraps=parse_class_list) as parse:
+            first = get_class_list(self.csv)
+            self.assertIs(get_class_list(str(self.csv)), first)
+            # A copy of the same roster elsewhere shares the entry
+            copy = self.dir / "copy.csv"
+            copy.write_text(ROSTER)
+            self.assertIs(get_class_list(copy), first)
+            self.assertEqual(parse.call_count, 1)
+
+            # Another process: memory is empty, the pickle is used
+            class_list_cache.clear_memory()
+            again = get_class_list(self.csv)
+            self.assertEqual(parse.call_count, 1)
+            self.assertEqual(again.ids, ["2023-001", "2023-002"])
+
+            self.csv.write_text(ROSTER + "2023-003,Carol Atim,A\n")
+            os.utime(self.csv, ns=(1, 1))
+            self.assertEqual(len(get_class_list(self.csv)), 3)
+            self.assertEqual(parse.call_count, 2)
+
+    def test_loaders_share_the_index(self):
+        roster = get_class_list(self.csv)
+        students = text_matching.load_class_list(str(self.csv))
+        self.assertEqual(students[1]["student_name"], "Bob Okello")
+        self.assertIs(text_matching.get_class_list_index(students), roster.index)
+        self.assertEqual(get_class_list(self.dir / "missing.csv").students, [])
+
+if __name__ == "__main__":
+    unittest.main()
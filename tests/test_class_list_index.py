@@ -0,0 +1,83 @@
+import unittest
+from unittest import mock
+import numpy as np
+from smartscripts.ai import text_matching
+from smartscripts.ai.text_matching import ClassListIndex, get_class_list_index, normalize_id, normalize_name
+
+CLASS_LIST = [
+    {"student_id": "2023-001", "student_name": "Alice Namugga"},
+    {"student_id": "2023-002", "student_name": "Bob Okello"},
+    {"student_id": "2023-003", "student_name": "Robert Okello"},
+    {"student_id": "2023-004", "student_name": "Carol Atim"},
+]
+
+class FakeEmbedder:
+    """'bob' and 'robert' share a direction; every other word has its own."""
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts, normalize_embeddings=True, convert_to_numpy=True):
+        self.encoded.append(list(texts))
+        words = ["alice", "bob", "okello", "carol", "atim", "namugga"]
+        rows = []
+        for text in texts:
+            v = np.zeros(len(words))
+            for w in normalize_name(text).replace("robert", "bob").split():
+                if w in words:
+                    v[words.index(w)] += 1
+            rows.append(v / (np.linalg.norm(v) or 1))
+        return np.array(rows)
+
+class TestClassListIndex(unittest.TestCase):
+    def setUp(self):
+        self.embedder = FakeEmbedder()
+        patcher = mock.patch.object(text_matching, "_get_embed_model", return_value=None)
+        self.get_model = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_normalization(self):
+        self.assertEqual(normalize_name("  O'Brien,  Seán "), "o brien sean")
+        self.assertEqual(normalize_id(" 2023-001 "), "2023001")
+        self.assertEqual(normalize_id("2023/001"), normalize_id("2023 001"))
+
+    def test_string_matching(self):
+        index = ClassListIndex(CLASS_LIST)
+        self.assertEqual(index.match_id("2023 004")[0], "2023-004")
+        self.assertEqual(index.match_id("9999999"), ("", 0.0))
+        self.assertEqual(index.match_name("alice namuga")[0], "Alice Namugga")
+        student, score = index.match_pair("2023-O02", "Bob Okelo")
+        self.assertEqual(student["student_id"], "2023-002")
+        self.assertGreater(score, 0.8)
+
+    def test_vectorized_scores_match_fallback(self):
+        index = ClassListIndex(CLASS_LIST)
+        pairs = [("2023-003", "Robert Okelo"), ("", "Carol"), ("2023001", "")]
+        fast = index.pair_scores(pairs)
+        self.assertEqual(fast.shape, (3, 4))
+        with mock.patch.object(text_matching, "_rf_process", None):
+            slow = index.pair_scores(pairs)
+        self.assertEqual(list(fast.argmax(axis=1)), list(slow.argmax(axis=1)))
+        self.assertTrue(np.allclose(fast[2], 0.7 * index.id_scores(["2023001"])[0]))
+
+    def test_embeddings_rerank_top_k_only(self):
+        self.get_model.return_value = self.embedder
+        index = ClassListIndex(CLASS_LIST, top_k=2)
+        scores = index.name_scores(["Bob Okello", "carol atim"])
+        self.assertEqual(len(self.embedder.encoded), 2)  # roster once, queries once
+        self.assertEqual(len(self.embedder.encoded[0]), 4)
+        # "Robert Okello" shares the embedding of "Bob Okello"
+        self.assertAlmostEqual(scores[0, 1], 1.0, places=5)
+        self.assertAlmostEqual(scores[0, 2], 1.0, places=5)
+        # Outside the top-2, scores stay at or below the reranked candidates
+        self.assertLessEqual(scores[0, [0, 3]].max(), scores[0, [1, 2]].min())
+
+        index.name_scores(["alice"])
+        self.assertEqual(len(self.embedder.encoded), 3)
+
+    def test_index_shared_per_class_list(self):
+        self.assertIs(get_class_list_index(CLASS_LIST), get_class_list_index([dict(s) for s in CLASS_LIST]))
+        self.assertIsNot(get_class_list_index(CLASS_LIST), get_class_list_index(CLASS_LIST[:2]))
+        self.assertEqual(text_matching.fuzzy_match_id("2023-002", CLASS_LIST)[0], "2023-002")
+
+if __name__ == "__main__":
+    unittest.main()
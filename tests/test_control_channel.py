@@ -0,0 +1,139 @@
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+from celery.exceptions import Ignore
+from flask import Flask
+from smartscripts.extensions import db
+from smartscripts.models import ExtractedStudentScript
+from smartscripts.models.task_control import TaskControl
+from smartscripts.tasks import control_channel, grade_tasks
+
+class FakeRedis:
+    def __init__(self):
+        self.keys = {}
+
+    def set(self, key, value, ex=None):
+        self.keys[key] = value.encode()
+
+    def get(self, key):
+        return self.keys.get(key)
+
+class TestControlChannel(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+        db.init_app(self.app)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        for i in range(1, 5):
+            db.session.add(ExtractedStudentScript(id=i, test_id=1, student_id=i, original_filename=f"{i}.pdf",
+                                                  extracted_pdf_path=f"{i}.pdf"))
+        db.session.commit()
+        self.redis = FakeRedis()
+        patcher = mock.patch.object(control_channel, "_redis", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.graded = []
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def task(self):
+        return SimpleNamespace(name="smartscripts.tasks.grading_tasks.async_grade_all_students",
+                               request=SimpleNamespace(id="t1", retries=0), max_retries=3, update_state=mock.Mock())
+
+    def run_task(self, grade=None):
+        return grade_tasks._run_grade_task(self.task(), 1, ExtractedStudentScript, grade or self.graded.append)
+
+    def test_pause_parks_and_resume_requeues(self):
+        def grade(script):
+            self.graded.append(script)
+            if script.id == 2:
+                control_channel.pause_task("t1")
+
+        task = self.task()
+        with self.assertRaises(Ignore):
+            grade_tasks._run_grade_task(task, 1, ExtractedStudentScript, grade)
+        # The result stays PAUSED instead of being overwritten with SUCCESS
+        state = task.update_state.call_args.kwargs
+        self.assertEqual((state["state"], state["meta"]["checkpoint"]), ("PAUSED", {"graded": 2, "next_script_id": 3}))
+        self.assertEqual([s.id for s in self.graded], [1, 2])
+        row = TaskControl.query.filter_by(task_id="t1").one()
+        self.assertEqual((row.status, row.checkpoint), ("PAUSED", {"graded": 2, "next_script_id": 3}))
+
+        with mock.patch.object(control_channel.celery, "send_task") as send:
+            self.assertTrue(control_channel.resume_task("t1")["requeued"])
+        send.assert_called_once_with(row.task_name, args=[1], kwargs={}, task_id="t1")
+
+        self.graded.clear()
+        result = self.run_task()
+        self.assertEqual([s.id for s in self.graded], [3, 4])
+        self.assertEqual(result["graded_scripts"], 4)
+        row = TaskControl.query.filter_by(task_id="t1").one()
+        self.assertEqual((row.status, row.checkpoint), ("COMPLETED", None))
+
+    def test_second_resume_does_not_requeue_running_task(self):
+        task = self.task()
+        control_channel.ControlChannel.attach(task, 1, args=[1])
+        control_channel.pause_task("t1")
+        with self.assertRaises(Ignore):
+            grade_tasks._run_grade_task(task, 1, ExtractedStudentScript, self.graded.append)
+        with mock.patch.object(control_channel.celery, "send_task") as send:
+            self.assertTrue(control_channel.resume_task("t1")["requeued"])
+            # The re-enqueued run takes the checkpoint; pausing and resuming it again
+            # before it parks only clears the pause
+            channel = control_channel.ControlChannel.attach(task, 1, args=[1])
+            self.assertEqual(channel.checkpoint, {"graded": 0, "next_script_id": 1})
+            control_channel.pause_task("t1")
+            self.assertFalse(control_channel.resume_task("t1")["requeued"])
+        send.assert_called_once()
+        self.assertIsNone(TaskControl.query.filter_by(task_id="t1").one().checkpoint)
+
+    def test_status_reads_broker_key_not_database(self):
+        channel = control_channel.ControlChannel.attach(self.task(), 1, args=[1])
+        with mock.patch.object(db.session, "refresh") as refresh:
+            for _ in range(50):
+                self.assertEqual(channel.status(), "RUNNING")
+            self.redis.keys[control_channel.CONTROL_KEY_PREFIX + "t1"] = b"CANCELLED"
+            self.assertEqual(channel.status(), "CANCELLED")
+        refresh.assert_not_called()
+
+    def test_database_fallback_is_throttled(self):
+        with mock.patch.object(control_channel, "_redis", return_value=None):
+            channel = control_channel.ControlChannel.attach(self.task(), 1, args=[1])
+            channel.poll_seconds = 3600
+            TaskControl.query.filter_by(task_id="t1").update({"status": "CANCELLED"})
+            with mock.patch.object(db.session, "refresh") as refresh:
+                channel.status()
+            refresh.assert_not_called()
+            channel.poll_seconds = 0
+            self.assertEqual(channel.status(), "CANCELLED")
+
+    def test_cancel(self):
+        with mock.patch.object(control_channel.celery.control, "revoke") as revoke:
+            control_channel.cancel_task("t1")
+        revoke.assert_called_once_with("t1")
+        result = self.run_task()
+        self.assertEqual(result["status"], "CANCELLED")
+        self.assertEqual(self.graded, [])
+
+class TestBrokerConnection(unittest.TestCase):
+    def test_failed_connect_is_retried_after_backoff(self):
+        client = mock.Mock()
+        fake_redis = SimpleNamespace(Redis=SimpleNamespace(from_url=mock.Mock(side_effect=[OSError("down"), client])))
+        broker = SimpleNamespace(conf=SimpleNamespace(broker_url="redis://broker:6379/0"))
+        with mock.patch.dict("sys.modules", {"redis": fake_redis}), \
+                mock.patch.object(control_channel, "celery", broker), \
+                mock.patch.object(control_channel, "_redis_client", None), \
+                mock.patch.object(control_channel, "_redis_retry_at", 0.0), \
+                mock.patch.object(control_channel.time, "monotonic", side_effect=[100.0, 100.0, 110.0, 131.0]):
+            self.assertIsNone(control_channel._redis())
+            self.assertIsNone(control_channel._redis())  # still backing off
+            self.assertIs(control_channel._redis(), client)
+            self.assertIs(control_channel._redis(), client)
+
+if __name__ == "__main__":
+    unittest.main()
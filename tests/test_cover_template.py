@@ -0,0 +1,96 @@
+import unittest
+import tempfile
+from pathlib import Path
+from unittest import mock
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from smartscripts.ai import cover_template, ocr_engine
+from smartscripts.ai.cover_template import (
+    CoverTemplate, field_regions, image_field_crops, clean_field_text, register_cover_template, get_cover_template,
+)
+
+FIELDS = {"name": (0.2, 0.14, 0.92, 0.18), "student_id": (0.3, 0.21, 0.92, 0.25)}
+
+def blank_cover(size=(1240, 1754)):
+    img = Image.new("L", size, 255)
+    draw = ImageDraw.Draw(img)
+    w, h = size
+    font = ImageFont.load_default(size=28)
+    draw.text((0.3 * w, 0.04 * h), "FINAL EXAMINATION 2025", fill=0, font=ImageFont.load_default(size=48))
+    draw.text((0.08 * w, 0.15 * h), "Name:", fill=0, font=font)
+    draw.rectangle([0.2 * w, 0.14 * h, 0.92 * w, 0.18 * h], outline=0, width=3)
+    draw.text((0.08 * w, 0.22 * h), "Student ID:", fill=0, font=font)
+    draw.rectangle([0.3 * w, 0.21 * h, 0.92 * w, 0.25 * h], outline=0, width=3)
+    for i in range(12):
+        draw.text((0.08 * w, (0.32 + 0.045 * i) * h), f"{i + 1}. Answer all questions in section {chr(65 + i % 4)}.",
+                  fill=0, font=font)
+    draw.rectangle([0.06 * w, 0.3 * h, 0.94 * w, 0.9 * h], outline=0, width=3)
+    return img
+
+def scanned(img, angle=2.0, scale=0.97, shift=(25, -15)):
+    """Filled-in cover sheet, slightly rotated / scaled / shifted as a scanner would."""
+    page = img.copy()
+    ImageDraw.Draw(page).text((300, 260), "Jane Doe", fill=0, font=ImageFont.load_default(size=36))
+    w, h = page.size
+    matrix = cv2.getRotationMatrix2D((w / 2, h / 2), angle, scale)
+    matrix[:, 2] += shift
+    return cv2.warpAffine(np.asarray(page), matrix, (w, h), borderValue=255), matrix
+
+class TestCoverTemplate(unittest.TestCase):
+    def setUp(self):
+        self.template = CoverTemplate(np.asarray(blank_cover()), FIELDS, test_id=7)
+
+    def test_fields_follow_a_skewed_scan(self):
+        page, matrix = scanned(blank_cover())
+        regions = field_regions(cv2.resize(page, (595, 842), interpolation=cv2.INTER_AREA), self.template)
+        self.assertIsNotNone(regions)
+        for field, (x0, y0, x1, y1) in FIELDS.items():
+            corners = np.array([[x0 * 1240, y0 * 1754, 1], [x1 * 1240, y1 * 1754, 1]]) @ matrix.T
+            expected = corners / (1240, 1754)
+            rx0, ry0, rx1, ry1 = regions[field]
+            self.assertLessEqual(rx0, expected[:, 0].min() + 0.005)
+            self.assertGreaterEqual(rx1, expected[:, 0].max() - 0.005)
+            self.assertLessEqual(ry0, expected[:, 1].min() + 0.005)
+            self.assertGreaterEqual(ry1, expected[:, 1].max() - 0.005)
+            self.assertLess(ry1 - ry0, 0.12)
+
+    def test_unrelated_page_does_not_align(self):
+        rng = np.random.default_rng(0)
+        noise = (rng.random((842, 595)) > 0.5).astype(np.uint8) * 255
+        self.assertIsNone(field_regions(noise, self.template))
+        self.assertIsNone(field_regions(np.full((842, 595), 255, np.uint8), self.template))
+
+    def test_crops_are_a_fraction_of_the_page(self):
+        page, _ = scanned(blank_cover())
+        crops = image_field_crops(Image.fromarray(page), self.template)
+        self.assertEqual(set(crops), {"name", "student_id"})
+        pixels = sum(c.size[0] * c.size[1] for c in crops.values())
+        self.assertLess(pixels, 0.2 * 1240 * 1754)
+
+    def test_register_and_reload(self):
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch.object(cover_template, "COVER_TEMPLATE_DIR", Path(tmp)):
+            register_cover_template(7, blank_cover(), FIELDS)
+            loaded = get_cover_template(7)
+            self.assertEqual(loaded.fields["name"], FIELDS["name"])
+            self.assertIs(get_cover_template(7), loaded)
+            self.assertIsNone(get_cover_template(8))
+
+    def test_clean_field_text(self):
+        self.assertEqual(clean_field_text("name", "Name: Jane  Doe."), "Jane Doe")
+        self.assertEqual(clean_field_text("name", "Nobody Smith"), "Nobody Smith")
+        self.assertEqual(clean_field_text("student_id", "ID: 2021 - 0042 "), "2021-0042")
+
+    def test_fields_read_in_one_batch(self):
+        crops = [{"name": Image.new("RGB", (80, 20)), "student_id": Image.new("RGB", (60, 20))}] * 2
+        scored = [("Name: Jane Doe", 0.9), ("ID 12345", 0.7), ("Ann Lee", 0.8), ("", 0.0)]
+        with mock.patch("smartscripts.ai.ocr_cache.get_ocr_cache", return_value=None), \
+                mock.patch.object(ocr_engine, "trocr_extract_batch_with_confidence", return_value=scored) as trocr:
+            results = ocr_engine.extract_name_id_from_fields(crops)
+        trocr.assert_called_once()
+        self.assertEqual(results[0], ("Jane Doe", "12345", 0.8))
+        self.assertEqual(results[1], ("Ann Lee", "", 0.8))
+
+if __name__ == "__main__":
+    unittest.main()
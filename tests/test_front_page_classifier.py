@@ -0,0 +1,91 @@
+import unittest
+import tempfile
+from pathlib import Path
+from unittest import mock
+import numpy as np
+from smartscripts.ai import front_page_classifier
+from smartscripts.ai.front_page_classifier import FrontPageClassifier, decide_front_pages, get_front_page_classifier
+from smartscripts.ai.front_page_detector import FEATURE_NAMES
+
+def synthetic_features(n_front, n_other, seed=0):
+    """Cover sheets: boxes, sparse ink at the top. Other pages: dense ink, no boxes."""
+    rng = np.random.default_rng(seed)
+    front = np.column_stack([
+        rng.uniform(0.01, 0.04, n_front), rng.uniform(0.7, 1.0, n_front), rng.uniform(0.01, 0.03, n_front),
+        rng.uniform(0.01, 0.03, n_front), rng.uniform(0.7, 1.0, n_front), rng.uniform(0.05, 0.2, n_front),
+        rng.uniform(0.1, 0.2, n_front),
+    ])
+    other = np.column_stack([
+        rng.uniform(0.08, 0.15, n_other), rng.uniform(0.25, 0.4, n_other), np.zeros(n_other),
+        np.zeros(n_other), np.zeros(n_other), rng.uniform(0.3, 0.5, n_other), rng.uniform(0.1, 0.2, n_other),
+    ])
+    return np.vstack([front, other]).astype(np.float32), np.array([True] * n_front + [False] * n_other)
+
+class TestFrontPageClassifier(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "front_page.joblib"
+        patcher = mock.patch.object(front_page_classifier, "FRONT_PAGE_MODEL_PATH", self.path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_fit_save_and_reload(self):
+        features, labels = synthetic_features(20, 80)
+        classifier = FrontPageClassifier().fit(features, labels)
+        self.assertEqual(classifier.meta["samples"], 100)
+        self.assertEqual(classifier.meta["feature_names"], FEATURE_NAMES)
+        self.assertGreater(classifier.meta["cv_accuracy"], 0.9)
+        classifier.save()
+
+        loaded = get_front_page_classifier()
+        probabilities = loaded.predict_proba(synthetic_features(3, 3, seed=1)[0])
+        self.assertTrue((probabilities[:3] > 0.5).all())
+        self.assertTrue((probabilities[3:] < 0.5).all())
+
+    def test_single_class_is_rejected(self):
+        features, labels = synthetic_features(0, 10)
+        with self.assertRaises(ValueError):
+            FrontPageClassifier().fit(features, labels)
+
+    def test_without_model_uses_rule_score(self):
+        self.assertIsNone(get_front_page_classifier())
+        features, _ = synthetic_features(2, 2)
+        decision = decide_front_pages(features)
+        self.assertEqual(decision["front_pages"], [0, 1])
+        self.assertEqual(decision["ocr_checked"], [])
+
+    def test_only_unsure_pages_go_to_ocr(self):
+        features, _ = synthetic_features(1, 1)
+        probabilities = np.array([0.95, 0.55, 0.05], dtype=np.float32)
+        rendered = []
+        with mock.patch.object(front_page_classifier, "front_page_probabilities", return_value=probabilities), \
+                mock.patch.object(front_page_classifier, "ocr_front_page_votes", return_value=[False]):
+            decision = decide_front_pages(features, render_page=lambda idx: rendered.extend(idx) or ["page"] * len(idx),
+                                          threshold=0.5, margin=0.1)
+        self.assertEqual(rendered, [1])
+        self.assertEqual(decision["ocr_checked"], [1])
+        self.assertEqual(decision["front_pages"], [0])
+
+    def test_unsure_pages_are_rendered_in_batches(self):
+        features, _ = synthetic_features(1, 1)
+        probabilities = np.array([0.45, 0.55, 0.5, 0.52, 0.48], dtype=np.float32)
+        batches = []
+
+        def votes(pages, batch_size=None):
+            return [None if page is None else True for page in pages]
+
+        def render(indices):
+            batches.append(list(indices))
+            return [None if i == 4 else "page" for i in indices]
+
+        with mock.patch.object(front_page_classifier, "front_page_probabilities", return_value=probabilities), \
+                mock.patch.object(front_page_classifier, "OCR_CHECK_BATCH_SIZE", 2), \
+                mock.patch.object(front_page_classifier, "ocr_front_page_votes", side_effect=votes):
+            decision = decide_front_pages(features, render_page=render, threshold=0.5, margin=0.1)
+        self.assertEqual(batches, [[0, 1], [2, 3], [4]])
+        # Page 4 could not be rendered: the model's decision stands
+        self.assertEqual(decision["front_pages"], [0, 1, 2, 3])
+
+if __name__ == "__main__":
+    unittest.main()
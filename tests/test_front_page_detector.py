@@ -0,0 +1,76 @@
+import time
+import unittest
+import tempfile
+from pathlib import Path
+import numpy as np
+from PIL import Image, ImageDraw
+from smartscripts.ai import front_page_detector
+from smartscripts.ai.front_page_detector import (
+    FEATURE_NAMES, page_stack, page_features, score_pages, detect_front_pages, detect_front_pages_in_pdf,
+)
+
+def cover_sheet(size=(595, 842)):
+    """Ruled name / ID boxes near the top, otherwise blank."""
+    img = Image.new("L", size, 255)
+    draw = ImageDraw.Draw(img)
+    w, h = size
+    for top in (0.07, 0.17):
+        draw.rectangle([0.07 * w, top * h, 0.93 * w, (top + 0.07) * h], outline=0, width=max(1, w // 200))
+    draw.text((0.09 * w, 0.08 * h), "Name:", fill=0)
+    draw.text((0.09 * w, 0.18 * h), "Student ID:", fill=0)
+    return img
+
+def answer_page(size=(595, 842), seed=0):
+    """Dense scribbles over the whole page, no boxes."""
+    rng = np.random.default_rng(seed)
+    img = Image.new("L", size, 255)
+    draw = ImageDraw.Draw(img)
+    w, h = size
+    for y in range(40, h - 40, 22):
+        x = 40
+        while x < w - 60:
+            step = int(rng.integers(8, 30))
+            draw.line([x, y + int(rng.integers(0, 8)), x + step, y + int(rng.integers(0, 8))], fill=30, width=3)
+            x += step + int(rng.integers(0, 10))
+    return img
+
+class TestFrontPageDetector(unittest.TestCase):
+    def test_features_cover_whole_stack(self):
+        stack = page_stack([cover_sheet(), answer_page(), Image.new("L", (300, 400), 255)])
+        self.assertEqual(stack.shape, (3, front_page_detector.STACK_SIZE[1], front_page_detector.STACK_SIZE[0]))
+        features = page_features(stack)
+        self.assertEqual(features.shape, (3, len(FEATURE_NAMES)))
+        ink = features[:, FEATURE_NAMES.index("ink_ratio")]
+        self.assertEqual(ink[2], 0.0)
+        self.assertGreater(ink[1], ink[0])
+
+    def test_detects_cover_sheets_among_answers(self):
+        pages = [cover_sheet(), answer_page(seed=1), answer_page(seed=2), cover_sheet(), answer_page(seed=3),
+                 Image.new("L", (595, 842), 255)]
+        self.assertEqual(detect_front_pages(pages, ocr_fallback=False), [0, 3])
+
+    def test_resolution_independent(self):
+        low = cover_sheet((149, 211))
+        high = cover_sheet((1190, 1684))
+        scores = score_pages([low, high])
+        self.assertGreaterEqual(scores.min(), front_page_detector.FRONT_PAGE_THRESHOLD)
+
+    def test_pdf_detection_matches_in_memory(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            pdf = Path(tmp) / "combined.pdf"
+            pages = [cover_sheet().convert("RGB"), answer_page().convert("RGB"), cover_sheet().convert("RGB")]
+            pages[0].save(pdf, save_all=True, append_images=pages[1:], resolution=72)
+            indices, scores = detect_front_pages_in_pdf(str(pdf), workers=1, ocr_fallback=False)
+        self.assertEqual(indices, [0, 2])
+        self.assertEqual(len(scores), 3)
+
+    def test_stack_of_500_pages_is_fast(self):
+        layout = np.asarray(answer_page((149, 211)))
+        pages = [layout] * 500
+        started = time.perf_counter()
+        scores = score_pages(pages)
+        self.assertEqual(len(scores), 500)
+        self.assertLess(time.perf_counter() - started, 5.0)
+
+if __name__ == "__main__":
+    unittest.main()
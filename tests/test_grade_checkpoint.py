@@ -0,0 +1,76 @@
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+from celery.exceptions import Retry
+from flask import Flask
+from smartscripts.extensions import db
+from smartscripts.models import ExtractedStudentScript
+from smartscripts.models.task_control import TaskControl
+from smartscripts.tasks import control_channel
+from smartscripts.tasks import grade_tasks
+
+class TestGradeCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+        db.init_app(self.app)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        for i in range(1, 6):
+            db.session.add(ExtractedStudentScript(id=i, test_id=1, student_id=i, original_filename=f"{i}.pdf",
+                                                  extracted_pdf_path=f"{i}.pdf"))
+        db.session.commit()
+        self.graded = []
+        self.flaky = {3}
+        patcher = mock.patch.object(control_channel, "_redis", return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def grade(self, script):
+        if script.id in self.flaky:
+            raise IOError("unreadable page")
+        self.graded.append(script.id)
+
+    def run_task(self, retries=0, regrade=False):
+        task = SimpleNamespace(name="grade", request=SimpleNamespace(id="t1", retries=retries), max_retries=3,
+                               update_state=mock.Mock(), retry=mock.Mock(return_value=Retry()))
+        return grade_tasks._run_grade_task(task, 1, ExtractedStudentScript, self.grade, regrade)
+
+    def test_retry_resumes_at_unfinished_script(self):
+        with self.assertRaises(Retry):
+            self.run_task()
+        self.assertEqual(self.graded, [1, 2, 4, 5])
+        failed = db.session.get(ExtractedStudentScript, 3)
+        self.assertEqual((failed.grading_status, failed.grading_attempts), ("FAILED", 1))
+        self.assertIn("unreadable page", failed.grading_error)
+
+        self.flaky.clear()
+        self.graded.clear()
+        result = self.run_task(retries=1)
+        self.assertEqual(self.graded, [3])
+        self.assertEqual((result["graded_scripts"], result["resumed_from"]), (5, 4))
+        self.assertEqual(TaskControl.query.count(), 1)
+        self.assertEqual(TaskControl.query.first().status, "COMPLETED")
+
+    def test_max_retries_records_failures(self):
+        result = self.run_task(retries=3)
+        self.assertEqual(result["failed_scripts"], [3])
+        self.assertEqual(result["graded_scripts"], 4)
+
+    def test_regrade_starts_over(self):
+        self.flaky.clear()
+        self.run_task()
+        self.graded.clear()
+        self.run_task()
+        self.assertEqual(self.graded, [])
+        self.run_task(regrade=True)
+        self.assertEqual(self.graded, [1, 2, 3, 4, 5])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import random
+import unittest
+from unittest import mock
+from flask import Flask
+from smartscripts.extensions import db
+from smartscripts.ai import id_index
+from smartscripts.ai.id_index import (ConfusionCosts, IdIndex, confusion_costs, learn_confusion_costs,
+                                      weighted_distance)
+
+class TestConfusionCosts(unittest.TestCase):
+    def test_confusions_are_cheap(self):
+        costs = ConfusionCosts.default()
+        self.assertLess(weighted_distance("2o23s1", "202351", costs), 1.0)
+        self.assertEqual(weighted_distance("202351", "202381", costs), 1.0)
+        self.assertEqual(weighted_distance("abc", "ab", costs), 1.0)
+
+    def test_learned_from_corrections(self):
+        corrections = [("2023-0a4", "2023-044"), ("A17", "417"), ("x", None)] * 3
+        costs = learn_confusion_costs(corrections)
+        self.assertLess(costs.substitution("a", "4"), 1.0)
+        self.assertLess(costs.substitution("4", "a"), 1.0)
+        self.assertEqual(costs.substitution("x", "y"), 1.0)
+        self.assertEqual(learn_confusion_costs([("a1", "41")]).substitution("a", "4"), 1.0)
+
+class TestIdIndex(unittest.TestCase):
+    def test_top_k_prefers_ocr_confusions(self):
+        index = IdIndex(["2023-051", "2023-081", "2023-510", "1999-999"])
+        top = index.query("2O23-0S1", k=2)
+        self.assertEqual(index.ids[top[0][0]], "2023-051")
+        self.assertGreater(top[0][1], 0.9)
+        self.assertEqual(index.best("7777-777"), (None, 0.0))
+
+    def test_lookup_scores_only_neighbours(self):
+        rng = random.Random(3)
+        ids = sorted({f"{rng.randrange(10**8):08d}" for _ in range(20000)})
+        index = IdIndex(ids)
+        target = ids[1234]
+        misread = target.replace("5", "S").replace("0", "O")
+        self.assertNotEqual(misread, target)
+        self.assertLess(len(index.candidates(misread)), len(ids) // 100)
+        self.assertEqual(index.best(misread)[0], target)
+
+    def test_roster_hashed_once_and_index_shared(self):
+        from smartscripts.ai.text_matching import ClassListIndex
+
+        roster = ClassListIndex([{"student_id": "2023-051"}, {"student_id": "2023-081"}])
+        costs = ConfusionCosts.default()
+        with mock.patch.object(id_index, "_index_cache", type(id_index._index_cache)()), \
+             mock.patch.object(id_index, "confusion_costs", return_value=costs), \
+             mock.patch.object(id_index, "roster_digest", wraps=id_index.roster_digest) as digest:
+            first = roster.id_index()
+            self.assertIs(roster.id_index(), first)
+            self.assertEqual(roster.match_id("2O23-0S1")[0], "2023-051")
+            self.assertEqual(digest.call_count, 1)
+            self.assertIs(id_index.get_id_index(["2023-051", "2023-081"]), first)
+
+class TestLearnedCostsFromLog(unittest.TestCase):
+    def test_reads_override_log(self):
+        from smartscripts.models.ocr_override import OcrOverrideLog
+        app = Flask(__name__)
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+            db.session.add_all([OcrOverrideLog(test_id=1, old_id="A17", new_id="417") for _ in range(4)])
+            db.session.commit()
+            with mock.patch.object(id_index, "_learned", None):
+                self.assertLess(confusion_costs().substitution("a", "4"), 1.0)
+            db.drop_all()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+import numpy as np
+import cv2
+from smartscripts.ai.line_segmentation import segment_lines, crop_text_lines
+
+def _page_with_lines(rows, width=800, height=600):
+    page = np.full((height, width), 255, dtype=np.uint8)
+    for y in rows:
+        cv2.putText(page, "Student answer text", (40, y), cv2.FONT_HERSHEY_SIMPLEX, 1.2, 0, 3)
+    return page
+
+class TestLineSegmentation(unittest.TestCase):
+    def test_blank_page_has_no_lines(self):
+        page = np.full((600, 800), 255, dtype=np.uint8)
+        self.assertEqual(segment_lines(page), [])
+
+    def test_detects_each_text_line(self):
+        page = _page_with_lines([100, 250, 400])
+        boxes = segment_lines(page)
+        self.assertEqual(len(boxes), 3)
+        ys = [y for _, y, _, _ in boxes]
+        self.assertEqual(ys, sorted(ys))
+        for x, y, w, h in boxes:
+            self.assertLess(h, 100)
+            self.assertLess(w, 800)
+
+    def test_ruled_form_lines_are_ignored(self):
+        page = _page_with_lines([100])
+        cv2.line(page, (0, 300), (799, 300), 0, 2)
+        self.assertEqual(len(segment_lines(page)), 1)
+
+    def test_crops_match_boxes(self):
+        page = _page_with_lines([100, 250])
+        crops = crop_text_lines(page)
+        self.assertEqual(len(crops), 2)
+        self.assertEqual(crops[0].mode, "RGB")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from types import ModuleType, SimpleNamespace
+from unittest import mock
+from smartscripts.ai import model_registry, onnx_backend
+from smartscripts.ai.model_registry import Loaded, ModelRegistry
+
+class TestModelRegistry(unittest.TestCase):
+    def test_loads_lazily_and_once(self):
+        calls = []
+        registry = ModelRegistry()
+        registry.register("dummy", lambda: calls.append(1) or object())
+
+        self.assertFalse(registry.is_loaded("dummy"))
+        self.assertEqual(calls, [])
+
+        first = registry.get("dummy")
+        second = registry.get("dummy")
+        self.assertIs(first, second)
+        self.assertEqual(len(calls), 1)
+
+    def test_memory_report_and_warm_up(self):
+        registry = ModelRegistry()
+        registry.register("dummy", lambda: "model")
+
+        report = registry.memory_report()
+        self.assertFalse(report["dummy"]["loaded"])
+
+        report = registry.warm_up()
+        self.assertTrue(report["dummy"]["loaded"])
+        self.assertEqual(report["dummy"]["param_bytes"], 0)
+
+    def test_unknown_model(self):
+        with self.assertRaises(KeyError):
+            ModelRegistry().get("missing")
+
+    def test_report_shape_and_backend_per_entry(self):
+        registry = ModelRegistry()
+        registry.register("ocr", lambda: Loaded("ocr model", "onnx"))
+        registry.register("embedder", lambda: Loaded("embedder", "torch"))
+        registry.register("plain", lambda: "model")
+
+        self.assertEqual(registry.get("ocr"), "ocr model")
+        report = registry.warm_up()
+        self.assertEqual({name: entry["backend"] for name, entry in report.items()},
+                         {"ocr": "onnx", "embedder": "torch", "plain": None})
+        for entry in report.values():
+            self.assertEqual(set(entry), {"loaded", "backend", "load_seconds", "param_bytes", "param_mb"})
+
+class TestTrOCRBackends(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def _stub_onnx_modules(self, session):
+        """onnxruntime / optimum stand-ins; the ORT model is `session`."""
+        ort = ModuleType("onnxruntime")
+        ort.SessionOptions = SimpleNamespace
+        ort.GraphOptimizationLevel = SimpleNamespace(ORT_ENABLE_ALL="all")
+        ort.ExecutionMode = SimpleNamespace(ORT_SEQUENTIAL="sequential")
+        optimum = ModuleType("optimum")
+        optimum_ort = ModuleType("optimum.onnxruntime")
+        optimum_ort.ORTModelForVision2Seq = SimpleNamespace(from_pretrained=mock.Mock(return_value=session))
+        optimum.onnxruntime = optimum_ort
+        modules = {"onnxruntime": ort, "optimum": optimum, "optimum.onnxruntime": optimum_ort}
+        patcher = mock.patch.dict(sys.modules, modules)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return optimum_ort.ORTModelForVision2Seq.from_pretrained
+
+    def test_onnx_load_uses_tuned_session(self):
+        model_dir = onnx_backend.trocr_onnx_dir(model_registry.TROCR_MODEL_NAME)
+        export = Path(self.tmp.name) / model_dir.name
+        export.mkdir()
+        (export / "encoder_model.onnx").write_bytes(b"x" * 2048)
+        session = SimpleNamespace(model_save_dir=str(export))
+        from_pretrained = self._stub_onnx_modules(session)
+
+        registry = ModelRegistry()
+        registry.register("trocr", lambda: model_registry._load_trocr("onnx"))
+        with mock.patch.object(onnx_backend, "ONNX_MODEL_DIR", Path(self.tmp.name)), \
+             mock.patch("transformers.TrOCRProcessor.from_pretrained", return_value="processor"):
+            processor, model, device = registry.get("trocr")
+
+        self.assertEqual((processor, model, str(device)), ("processor", session, "cpu"))
+        options = from_pretrained.call_args.kwargs["session_options"]
+        self.assertEqual(options.graph_optimization_level, "all")
+        self.assertEqual(from_pretrained.call_args.kwargs["provider"], "CPUExecutionProvider")
+        report = registry.memory_report()["trocr"]
+        self.assertEqual((report["backend"], report["param_bytes"]), ("onnx", 2048))
+
+    def test_onnx_failure_falls_back_to_torch(self):
+        model = mock.Mock(**{"parameters.return_value": [], "buffers.return_value": []})
+        registry = ModelRegistry()
+        registry.register("trocr", lambda: model_registry._load_trocr("onnx"))
+        with mock.patch.object(onnx_backend, "load_trocr_onnx", side_effect=RuntimeError("no optimum")), \
+             mock.patch("transformers.TrOCRProcessor.from_pretrained", return_value="processor"), \
+             mock.patch("transformers.VisionEncoderDecoderModel.from_pretrained", return_value=model):
+            processor, loaded, _ = registry.get("trocr")
+
+        self.assertIs(loaded, model)
+        model.eval.assert_called_once()
+        self.assertEqual(registry.memory_report()["trocr"]["backend"], "torch")
+
+if __name__ == "__main__":
+    unittest.main()
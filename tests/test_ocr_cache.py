@@ -0,0 +1,44 @@
+import unittest
+import tempfile
+from pathlib import Path
+from PIL import Image
+from smartscripts.ai.ocr_cache import OCRCache, image_fingerprint, make_key
+
+class TestOCRCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "ocr_cache.sqlite3"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_fingerprint_depends_on_pixels_not_file(self):
+        img = Image.new("RGB", (40, 20), "white")
+        png, png_copy = Path(self.tmp.name) / "a.png", Path(self.tmp.name) / "b.png"
+        img.save(png)
+        img.save(png_copy)
+        self.assertEqual(image_fingerprint(png), image_fingerprint(png_copy))
+        self.assertEqual(image_fingerprint(png), image_fingerprint(img))
+
+        other = Image.new("RGB", (40, 20), "black")
+        self.assertNotEqual(image_fingerprint(img), image_fingerprint(other))
+
+    def test_key_includes_engine_and_params(self):
+        fp = "abc"
+        self.assertNotEqual(make_key(fp, "trocr"), make_key(fp, "tesseract"))
+        self.assertNotEqual(make_key(fp, "trocr", {"a": 1}), make_key(fp, "trocr", {"a": 2}))
+
+    def test_roundtrip_and_eviction(self):
+        cache = OCRCache(self.path, max_bytes=200)
+        cache.set("k1", "trocr", "x" * 80)
+        self.assertEqual(cache.get("k1"), "x" * 80)
+
+        cache.set("k2", "trocr", "y" * 80)
+        cache.get("k1")  # k1 is now more recently used than k2
+        cache.set("k3", "trocr", "z" * 80)
+
+        self.assertIsNone(cache.get("k2"))
+        self.assertIsNotNone(cache.get("k3"))
+
+if __name__ == "__main__":
+    unittest.main()
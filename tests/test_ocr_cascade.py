@@ -0,0 +1,96 @@
+import unittest
+from unittest import mock
+from PIL import Image
+from smartscripts.ai import ocr_engine
+from smartscripts.ai.ocr_cascade import CascadePolicy, CascadeBudget, get_policy, merge_reports
+
+class TestCascadePolicy(unittest.TestCase):
+    def test_refine_only_below_threshold(self):
+        policy = get_policy("balanced", refine_below=0.8)
+        self.assertTrue(policy.wants_refine("some text", 0.5))
+        self.assertFalse(policy.wants_refine("some text", 0.9))
+        self.assertFalse(get_policy("fast").wants_refine("some text", 0.1))
+
+    def test_replace_keeps_other_settings(self):
+        policy = CascadePolicy(name="x", tesseract_below=0.6, page_max_external_calls=1)
+        copy = policy.replace(allow_refine=False)
+        self.assertEqual(copy.tesseract_below, 0.6)
+        self.assertEqual(copy.page_max_external_calls, 1)
+        self.assertFalse(copy.allow_refine)
+
+    def test_test_budget_caps_external_calls(self):
+        budget = CascadeBudget(CascadePolicy(test_max_external_calls=1))
+        self.assertTrue(budget.allows("refine", 0.0, 0))
+        budget.record("refine", 0.2)
+        self.assertFalse(budget.allows("refine", 0.0, 0))
+        self.assertTrue(budget.allows("tesseract", 0.0, 0))
+        self.assertEqual(budget.report()["tiers"]["refine"]["runs"], 1)
+
+    def test_share_scales_test_limits(self):
+        budget = CascadeBudget(CascadePolicy(test_max_seconds=100.0, test_max_external_calls=5))
+        part = budget.share(0.25)
+        self.assertEqual(part.policy.test_max_seconds, 25.0)
+        self.assertEqual(part.policy.test_max_external_calls, 2)
+        self.assertIsNone(CascadeBudget(CascadePolicy()).share(0.5).policy.test_max_seconds)
+
+    def test_merge_reports_sums_chunks(self):
+        first, second = CascadeBudget(), CascadeBudget()
+        first.record("trocr", 1.0)
+        first.page_done()
+        second.record("trocr", 3.0)
+        second.skip("refine")
+        second.page_done()
+        merged = merge_reports([first.report(), None, second.report()])
+        self.assertEqual(merged["pages"], 2)
+        self.assertEqual(merged["tiers"]["trocr"], {"runs": 2, "skipped_budget": 0, "seconds": 4.0,
+                                                    "mean_seconds": 2.0})
+        self.assertEqual(merged["tiers"]["refine"]["skipped_budget"], 1)
+        self.assertEqual(merge_reports([]), {})
+
+class TestResolveOCRText(unittest.TestCase):
+    def setUp(self):
+        self.image = Image.new("RGB", (50, 20), "white")
+        patches = [
+            mock.patch.object(ocr_engine, "_openai_available", return_value=True),
+            mock.patch.object(ocr_engine, "gpt4_chat_refine", side_effect=lambda t: t + " (refined)"),
+            mock.patch.object(ocr_engine, "gpt4_vision_extract", return_value="vision text"),
+            mock.patch.object(ocr_engine, "pytesseract", None),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_confident_page_skips_refine(self):
+        budget = CascadeBudget(CascadePolicy(refine_below=0.85))
+        result = ocr_engine._resolve_ocr_text(self.image, "Jane Doe 12345", 0.95, budget.policy, budget)
+        self.assertEqual(result["text"], "Jane Doe 12345")
+        self.assertEqual(result["tiers"], ["trocr"])
+        self.assertFalse(result["degraded"])
+
+    def test_exhausted_budget_marks_page_degraded(self):
+        budget = CascadeBudget(CascadePolicy(test_max_external_calls=0))
+        result = ocr_engine._resolve_ocr_text(self.image, "", 0.0, budget.policy, budget)
+        self.assertEqual(result["text"], "")
+        self.assertTrue(result["degraded"])
+        self.assertEqual(budget.report()["tiers"]["vision"]["skipped_budget"], 1)
+
+    def test_short_text_escalates_to_vision(self):
+        budget = CascadeBudget(CascadePolicy(refine_below=0.5))
+        result = ocr_engine._resolve_ocr_text(self.image, "", 0.0, budget.policy, budget)
+        self.assertEqual(result["text"], "vision text (refined)")
+        self.assertEqual(result["tiers"], ["trocr", "vision", "refine"])
+        self.assertEqual(budget.external_calls, 2)
+
+class TestBatchMarkingBudget(unittest.TestCase):
+    def test_submissions_share_one_budget(self):
+        from types import SimpleNamespace
+        from smartscripts.ai import marking_pipeline
+
+        submissions = [SimpleNamespace(id=i, file_path=f"s{i}.png", test_id=7, student_id=i) for i in range(3)]
+        budget = CascadeBudget()
+        with mock.patch.object(marking_pipeline, "mark_submission", return_value={}) as mark:
+            marking_pipeline.mark_batch_submissions(submissions, 7, budget=budget)
+        self.assertEqual([c.kwargs["budget"] for c in mark.call_args_list], [budget] * 3)
+
+if __name__ == "__main__":
+    unittest.main()
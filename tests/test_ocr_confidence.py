@@ -0,0 +1,44 @@
+import math
+import unittest
+from smartscripts.ai.ocr_confidence import (
+    calibrate, sequence_confidence, page_confidence, tesseract_page_confidence,
+    combine_confidences, choose_transcription
+)
+
+class TestOCRConfidence(unittest.TestCase):
+    def test_sequence_confidence_is_geometric_mean(self):
+        logprobs = [math.log(0.9), math.log(0.5)]
+        self.assertAlmostEqual(sequence_confidence(logprobs), math.sqrt(0.45))
+        self.assertEqual(sequence_confidence([]), 0.0)
+
+    def test_page_confidence_weights_by_length(self):
+        score = page_confidence(["a long clean line", "x"], [0.9, 0.1])
+        self.assertGreater(score, 0.8)
+        self.assertEqual(page_confidence(["", " "], [0.9, 0.9]), 0.0)
+
+    def test_calibration(self):
+        self.assertEqual(calibrate(0.8, (1.0, 0.0)), 0.8)
+        self.assertLess(calibrate(0.8, (1.0, -1.0)), 0.8)
+        self.assertAlmostEqual(calibrate(0.5, (2.0, 0.0)), 0.5)
+
+    def test_tesseract_ignores_non_words(self):
+        self.assertAlmostEqual(tesseract_page_confidence([-1, 80, 60]), 0.7)
+        self.assertEqual(tesseract_page_confidence([-1]), 0.0)
+
+    def test_agreement_raises_combined_score(self):
+        agree = combine_confidences(0.6, 0.5, 1.0)
+        disagree = combine_confidences(0.6, 0.5, 0.0)
+        self.assertEqual(disagree, 0.6)
+        self.assertGreater(agree, disagree)
+        self.assertLessEqual(agree, 1.0)
+
+    def test_choose_transcription(self):
+        self.assertEqual(choose_transcription("trocr", 0.4, "", 0.0), ("trocr", 0.4))
+        text, conf = choose_transcription("Jane Doe", 0.4, "Jane Doe", 0.9)
+        self.assertEqual(text, "Jane Doe")
+        self.assertGreater(conf, 0.9)
+        text, _ = choose_transcription("J4ne", 0.8, "Jane", 0.3)
+        self.assertEqual(text, "J4ne")
+
+if __name__ == "__main__":
+    unittest.main()
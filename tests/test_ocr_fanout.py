@@ -0,0 +1,100 @@
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+import numpy as np
+from celery.exceptions import Ignore
+from celery.result import AsyncResult
+from smartscripts.extensions import celery
+from smartscripts.tasks import ocr_tasks
+from smartscripts.utils import pdf_helpers
+
+celery.conf.update(result_backend="cache+memory://", task_store_eager_result=True)
+
+class TestOcrFanout(unittest.TestCase):
+    def test_long_pdf_replaced_by_chord(self):
+        task = ocr_tasks.run_student_script_ocr_pipeline
+        with mock.patch.object(pdf_helpers, "pdf_page_count", return_value=250), \
+             mock.patch.object(ocr_tasks, "OCR_CHUNK_PAGES", 100), \
+             mock.patch.object(task, "update_state"), \
+             mock.patch.object(task, "replace", side_effect=Ignore()) as replace:
+            with self.assertRaises(Ignore):
+                task.run(1, "combined.pdf", "class.csv")
+        workflow = replace.call_args.args[0]
+        ranges = [tuple(sig.args[2:4]) for sig in workflow.tasks]
+        self.assertEqual(ranges, [(0, 100), (100, 200), (200, 250)])
+        self.assertEqual(workflow.body.name, "smartscripts.tasks.ocr_tasks.merge_ocr_chunks")
+
+    def test_ocr_stage_defers_long_pdf_to_chunks(self):
+        from smartscripts.tasks.pipeline_stages import StageDeferred, _ocr
+
+        params = {"test_id": 1, "pdf_path": "combined.pdf", "task_id": "t1"}
+        inputs = {"rasterize": {"total_pages": 250}, "detect": {"front_pages": [0, 120, 230]}}
+        with mock.patch.object(ocr_tasks, "OCR_CHUNK_PAGES", 100):
+            with self.assertRaises(StageDeferred) as ctx:
+                _ocr(params, inputs)
+        chunks = [(sig.args[2:4], sig.kwargs["front_indices"]) for sig in ctx.exception.header.tasks]
+        self.assertEqual(chunks, [((0, 100), [0]), ((100, 200), [120]), ((200, 250), [230])])
+
+    def test_chunk_keys_are_document_pages(self):
+        with mock.patch.object(ocr_tasks, "detect_front_pages_in_range", return_value=([100, 150], np.zeros(100))), \
+             mock.patch.object(ocr_tasks, "_ocr_front_pages_in_range",
+                               return_value=({150: "Name: Bo ID: 22"}, {100: ("11", "Al", 0.9)})) as ocr:
+            result = ocr_tasks.ocr_page_chunk.apply(args=(1, "combined.pdf", 100, 200)).get()
+        self.assertEqual(ocr.call_args.args[2:5], ([100, 150], 100, 200))
+        self.assertEqual(result["front_texts"], {"150": "Name: Bo ID: 22"})
+        self.assertEqual(result["front_fields"], {"100": ["11", "Al", 0.9]})
+
+    def test_merge_spans_chunk_boundaries(self):
+        chunks = [
+            {"start": 0, "stop": 100, "front_texts": {}, "front_fields": {"0": ["11", "Al", 0.9], "95": ["22", "Bo", 0.8]}},
+            {"start": 100, "stop": 160, "front_texts": {"150": "Name: Cy ID: 99"}, "front_fields": {}},
+        ]
+        with mock.patch.object(ocr_tasks, "_load_class_list", return_value=["11", "22"]):
+            result = ocr_tasks.merge_ocr_chunks.apply(args=(chunks, 1, "combined.pdf", "class.csv")).get()
+        ranges = [(r["start_page"], r["end_page"], r["student_id"]) for r in result["results"]]
+        self.assertEqual(ranges, [(0, 94, "11"), (95, 149, "22"), (150, 159, "99")])
+        self.assertEqual([s["id"] for s in result["attendance"]["present"]], ["11", "22"])
+        self.assertEqual(result["chunks"], 2)
+
+    def test_header_ocr_uses_local_tiers_only(self):
+        from smartscripts.ai.ocr_cascade import CascadeBudget, get_policy
+
+        budget = CascadeBudget(get_policy("accurate"))
+        with mock.patch.object(ocr_tasks, "extract_text_from_images", return_value=["Name: Al ID: 11"]) as ocr:
+            texts = ocr_tasks._ocr_front_pages([(4, "page")], budget=budget)
+        self.assertEqual(texts, {4: "Name: Al ID: 11"})
+        policy = ocr.call_args.kwargs["policy"]
+        self.assertEqual((policy.allow_vision, policy.allow_refine), (False, False))
+        self.assertTrue(policy.allow_tesseract)
+        self.assertIs(ocr.call_args.kwargs["budget"], budget)
+        self.assertTrue(budget.policy.allow_refine)
+
+    def test_ocr_key_follows_cover_template_and_policy(self):
+        import os
+        import tempfile
+        from pathlib import Path
+        from smartscripts.ai import cover_template
+        from smartscripts.tasks.pipeline_stages import OCR_PIPELINE
+
+        stage = OCR_PIPELINE.stages["ocr"]
+        inputs = {"rasterize": "r", "detect": "d"}
+        with tempfile.TemporaryDirectory() as tmp, \
+             mock.patch.object(cover_template, "COVER_TEMPLATE_DIR", Path(tmp)), \
+             mock.patch.dict(os.environ, {"OCR_CASCADE_POLICY": "balanced"}):
+            before = stage.key({"test_id": 1}, inputs)
+            (Path(tmp) / "1").mkdir()
+            (Path(tmp) / "1" / "fields.json").write_text('{"fields": {}}')
+            with_template = stage.key({"test_id": 1}, inputs)
+            os.environ["OCR_CASCADE_POLICY"] = "fast"
+            fast = stage.key({"test_id": 1}, inputs)
+        self.assertEqual(len({before, with_template, fast}), 3)
+
+    def test_progress_is_mean_over_chunks(self):
+        celery.backend.store_result("c1", {"percent": 100}, "SUCCESS")
+        task = SimpleNamespace(request=SimpleNamespace(id="c0"), update_state=mock.Mock(), backend=celery.backend)
+        ocr_tasks._report_chunk_progress(task, "parent", ["c0", "c1", "c2"], 0.5)
+        low, high = ocr_tasks.CHUNK_PERCENT
+        self.assertEqual(AsyncResult("parent", app=celery).info["percent"], low + (high - low) // 2)
+
+if __name__ == "__main__":
+    unittest.main()
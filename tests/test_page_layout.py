@@ -0,0 +1,48 @@
+import unittest
+from unittest import mock
+from PIL import Image
+from smartscripts.ai import page_layout
+from smartscripts.ai.page_layout import PageLayout, get_page_layout
+
+DATA = {
+    "text": ["", "Student", "Name:", "Jane", "", "ID:", "12345"],
+    "conf": ["-1", "91", "88", "75", "-1", "90", "60"],
+    "left": [0, 10, 80, 150, 0, 10, 50],
+    "top": [0, 10, 10, 12, 0, 50, 50],
+    "width": [0, 60, 50, 40, 0, 30, 60],
+    "height": [0, 20, 20, 18, 0, 20, 20],
+    "page_num": [1, 1, 1, 1, 1, 1, 1],
+    "block_num": [0, 1, 1, 1, 1, 1, 1],
+    "par_num": [0, 1, 1, 1, 1, 1, 1],
+    "line_num": [0, 1, 1, 1, 2, 2, 2],
+}
+
+class TestPageLayout(unittest.TestCase):
+    def test_words_and_lines(self):
+        layout = PageLayout.from_tesseract_data(DATA)
+        self.assertEqual(len(layout.words), 5)
+        self.assertEqual(layout.line_texts, ["Student Name: Jane", "ID: 12345"])
+        self.assertEqual(layout.text, "Student Name: Jane\nID: 12345")
+        self.assertAlmostEqual(layout.mean_confidence, (91 + 88 + 75 + 90 + 60) / 500)
+
+    def test_find_multi_word_keyword(self):
+        layout = PageLayout.from_tesseract_data(DATA)
+        hit = layout.find("student name")[0]
+        self.assertEqual(hit["bbox"], {"x": 10, "y": 10, "w": 120, "h": 20})
+        self.assertEqual(layout.find_bbox("id"), {"x": 10, "y": 50, "w": 30, "h": 20})
+        self.assertIsNone(layout.find_bbox("signature"))
+
+    def test_tesseract_runs_once_per_page(self):
+        fake = mock.Mock()
+        fake.image_to_data.return_value = DATA
+        img = Image.new("RGB", (200, 100), "white")
+        with mock.patch.object(page_layout, "pytesseract", fake), \
+                mock.patch.object(page_layout, "cached_ocr", lambda engine, image, params, compute: compute()):
+            page_layout._memo.clear()
+            first = get_page_layout(img)
+            second = get_page_layout(img.copy())
+        self.assertIs(first, second)
+        self.assertEqual(fake.image_to_data.call_count, 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+import tempfile
+from pathlib import Path
+from unittest import mock
+from PIL import Image
+from smartscripts.utils import page_pyramid
+from smartscripts.utils.page_pyramid import PageLevel, PagePyramid, iter_page_pyramids, region_from_box
+
+class TestPagePyramid(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pdf = Path(self.tmp.name) / "combined.pdf"
+        pages = [Image.new("RGB", (144, 288), "white") for _ in range(3)]
+        pages[0].save(self.pdf, save_all=True, append_images=pages[1:], resolution=72)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_levels_rendered_on_demand(self):
+        layout = PageLevel(36, grayscale=True)
+        header = PageLevel(144, region=(0, 0, 1, 0.5))
+        pages = list(iter_page_pyramids(self.pdf))
+        self.assertEqual([p.index for p in pages], [0, 1, 2])
+
+        page = pages[1]
+        low = page.get(layout)
+        self.assertEqual(low.mode, "L")
+        self.assertEqual(low.size, (72, 144))
+        self.assertIs(page.get(layout), low)
+        self.assertEqual(page.get(header).size, (288, 288))
+
+    def test_region_cut_from_cached_full_render(self):
+        renders = []
+
+        def render(level):
+            renders.append(level.key)
+            return Image.new("L" if level.grayscale else "RGB", (100, 200))
+
+        page = PagePyramid(0, render)
+        page.get(PageLevel(300))
+        crop = page.get(PageLevel(300, region=(0.5, 0.5, 1, 1)))
+        self.assertEqual(crop.size, (50, 100))
+        self.assertEqual(len(renders), 1)
+
+    def test_region_from_box(self):
+        self.assertEqual(region_from_box((10, 20, 40, 80), (100, 200)), (0.1, 0.1, 0.5, 0.5))
+
+    def test_pdf2image_renderer_crops_region(self):
+        fake = mock.Mock(return_value=[Image.new("RGB", (100, 200))])
+        with mock.patch.object(page_pyramid, "PDF_RENDERER", "pdf2image"), \
+                mock.patch.object(page_pyramid, "convert_from_path", fake):
+            page = next(iter_page_pyramids(self.pdf, start=2))
+            crop = page.get(PageLevel(300, region=(0, 0, 1, 0.5)))
+        self.assertEqual(crop.size, (100, 100))
+        self.assertEqual(fake.call_args.kwargs["first_page"], 3)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+import tempfile
+from pathlib import Path
+from unittest import mock
+import fitz
+from smartscripts.utils import pdf_helpers
+from smartscripts.utils.pdf_helpers import split_pdf_pages, split_pdf_by_page_ranges, pdf_page_count
+
+def page_texts(path):
+    with fitz.open(str(path)) as doc:
+        return [page.get_text().strip() for page in doc]
+
+class TestPdfSplit(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.out = Path(self.tmp.name) / "students"
+        self.pdf = Path(self.tmp.name) / "combined.pdf"
+        doc = fitz.open()
+        for i in range(8):
+            doc.new_page().insert_text((72, 72), f"page {i}")
+        doc.save(str(self.pdf))
+        doc.close()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_one_open_many_students(self):
+        jobs = [
+            {"output_path": self.out / "a.pdf", "pages": [0, 1, 2], "student_id": "A"},
+            {"output_path": self.out / "b.pdf", "pages": [5, 3, 4, 7]},
+            {"output_path": self.out / "none.pdf", "pages": [40]},
+        ]
+        with mock.patch.object(pdf_helpers.fitz, "open", wraps=fitz.open) as opened:
+            results = split_pdf_pages(self.pdf, jobs, max_workers=2)
+        sources = [c for c in opened.call_args_list if c.args]
+        self.assertEqual(len(sources), 1)
+
+        self.assertEqual(page_texts(self.out / "a.pdf"), ["page 0", "page 1", "page 2"])
+        self.assertEqual(page_texts(self.out / "b.pdf"), ["page 3", "page 4", "page 5", "page 7"])
+        self.assertEqual(results[0]["student_id"], "A")
+        self.assertGreater(results[0]["bytes"], 0)
+        self.assertGreaterEqual(results[0]["seconds"], 0.0)
+        self.assertIsNone(results[2]["output_path"])
+        self.assertFalse((self.out / "none.pdf").exists())
+
+    def test_pypdf2_fallback(self):
+        with mock.patch.object(pdf_helpers, "fitz", None):
+            results = split_pdf_pages(self.pdf, [{"output_path": self.out / "c.pdf", "pages": [6, 7]}])
+        self.assertEqual(page_texts(results[0]["output_path"]), ["page 6", "page 7"])
+
+    def test_page_ranges_are_one_based(self):
+        paths = split_pdf_by_page_ranges(self.pdf, self.out, [(1, 2), (3, 8)])
+        self.assertEqual([pdf_page_count(p) for p in paths], [2, 6])
+        self.assertEqual(page_texts(paths[1])[0], "page 2")
+
+if __name__ == "__main__":
+    unittest.main()
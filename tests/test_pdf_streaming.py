@@ -0,0 +1,47 @@
+import unittest
+import tempfile
+from pathlib import Path
+from unittest import mock
+from PIL import Image
+from smartscripts.utils import pdf_helpers
+from smartscripts.utils.pdf_helpers import iter_pdf_pages, iter_pdf_page_chunks, pdf_page_count
+
+class TestPdfStreaming(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pdf = Path(self.tmp.name) / "combined.pdf"
+        pages = [Image.new("RGB", (200, 280), (i * 40, 255, 255)) for i in range(5)]
+        pages[0].save(self.pdf, save_all=True, append_images=pages[1:], resolution=72)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_yields_requested_range_lazily(self):
+        pages = iter_pdf_pages(self.pdf, dpi=36, start=1, stop=3)
+        index, image = next(pages)
+        self.assertEqual(index, 1)
+        self.assertIsInstance(image, Image.Image)
+        self.assertEqual([i for i, _ in pages], [2])
+        self.assertEqual(pdf_page_count(self.pdf), 5)
+
+    def test_grayscale_and_chunks(self):
+        _, image = next(iter_pdf_pages(self.pdf, dpi=36, grayscale=True))
+        self.assertEqual(image.mode, "L")
+        chunks = list(iter_pdf_page_chunks(self.pdf, chunk_size=2, dpi=36))
+        self.assertEqual([[i for i, _ in c] for c in chunks], [[0, 1], [2, 3], [4]])
+
+    def test_pdf2image_renderer_renders_in_chunks(self):
+        calls = []
+
+        def fake_convert(path, dpi, first_page, last_page, grayscale):
+            calls.append((first_page, last_page))
+            return [Image.new("RGB", (10, 10)) for _ in range(first_page, last_page + 1)]
+
+        with mock.patch.object(pdf_helpers, "PDF_RENDERER", "pdf2image"), \
+                mock.patch.object(pdf_helpers, "convert_from_path", fake_convert):
+            indices = [i for i, _ in iter_pdf_pages(self.pdf, chunk_size=2)]
+        self.assertEqual(indices, [0, 1, 2, 3, 4])
+        self.assertEqual(calls, [(1, 2), (3, 4), (5, 5)])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,219 @@
+import sys
+import unittest
+import tempfile
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+from celery.exceptions import Ignore
+from flask import Flask
+from smartscripts.extensions import db
+from smartscripts.models import ExtractedStudentScript
+from smartscripts.models.task_control import TaskControl
+from smartscripts.tasks import control_channel
+from smartscripts.tasks import pipeline_stages
+from smartscripts.tasks.pipeline_stages import ArtifactStore, Stage, StageDeferred, StageError, StageGraph
+
+class TestPipelineStages(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        self.pdf = root / "combined.pdf"
+        self.pdf.write_bytes(b"pages")
+        self.class_list = root / "class.csv"
+        self.class_list.write_text("id\n11\n")
+        self.store = ArtifactStore(1, root=root / "artifacts")
+        self.params = {"pdf_path": str(self.pdf), "class_list_path": str(self.class_list)}
+        self.calls = []
+        self.fail = set()
+
+        def step(name, value):
+            def run(params, inputs):
+                self.calls.append(name)
+                if name in self.fail:
+                    raise RuntimeError("boom")
+                return {"value": value, "inputs": sorted(inputs)}
+            return run
+
+        self.graph = StageGraph([
+            Stage("rasterize", step("rasterize", 1), files=["pdf_path"]),
+            Stage("ocr", step("ocr", 2), inputs=["rasterize"]),
+            Stage("match", step("match", 3), inputs=["rasterize", "ocr"], files=["class_list_path"]),
+            Stage("package", step("package", 4), inputs=["match"]),
+        ])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_relaunch_skips_everything(self):
+        first = self.graph.run(self.params, self.store)
+        self.assertEqual(first["ran"], ["rasterize", "ocr", "match", "package"])
+        self.assertEqual(first["outputs"]["match"]["inputs"], ["ocr", "rasterize"])
+        self.calls.clear()
+        second = self.graph.run(self.params, self.store)
+        self.assertEqual(self.calls, [])
+        self.assertEqual(second["skipped"], self.graph.names)
+        self.assertEqual(second["outputs"], first["outputs"])
+
+    def test_changed_file_reruns_stage_and_downstream(self):
+        self.graph.run(self.params, self.store)
+        self.calls.clear()
+        self.class_list.write_text("id\n11\n22\n")
+        result = self.graph.run(self.params, self.store)
+        self.assertEqual(result["ran"], ["match", "package"])
+        self.assertEqual(result["skipped"], ["rasterize", "ocr"])
+
+    def test_rerun_from_and_targets(self):
+        self.graph.run(self.params, self.store, targets=["ocr"])
+        self.assertEqual(self.calls, ["rasterize", "ocr"])
+        self.calls.clear()
+        self.graph.run(self.params, self.store, rerun_from="ocr")
+        self.assertEqual(self.calls, ["ocr", "match", "package"])
+        with self.assertRaises(ValueError):
+            self.graph.run(self.params, self.store, rerun_from="zip")
+
+    def test_failure_keeps_earlier_artifacts(self):
+        self.fail.add("package")
+        with self.assertRaises(StageError) as ctx:
+            self.graph.run(self.params, self.store)
+        self.assertEqual(ctx.exception.stage, "package")
+        self.assertIsNone(self.store.load("package"))
+
+        self.fail.clear()
+        self.calls.clear()
+        result = self.graph.run(self.params, self.store)
+        self.assertEqual(self.calls, ["package"])
+        self.assertEqual(result["skipped"], ["rasterize", "ocr", "match"])
+
+    def test_params_round_trip(self):
+        self.assertIsNone(self.store.load_params())
+        self.store.save_params(self.params, ["package"])
+        self.assertEqual(self.store.load_params(), {"params": self.params, "targets": ["package"]})
+
+    def test_state_change_reruns_stage(self):
+        version = {"rows": 1}
+        graph = StageGraph([
+            Stage("split", lambda p, i: {"files": 2}),
+            Stage("grade", lambda p, i: dict(version), inputs=["split"], state=lambda p: version["rows"]),
+        ])
+        graph.run(self.params, self.store)
+        self.assertEqual(graph.run(self.params, self.store)["ran"], [])
+        version["rows"] = 2
+        result = graph.run(self.params, self.store)
+        self.assertEqual(result["ran"], ["grade"])
+        self.assertEqual(result["outputs"]["grade"], {"rows": 2})
+
+    def test_deferred_stage_resumes_after_merge(self):
+        header = object()
+
+        def ocr(params, inputs):
+            self.calls.append("ocr")
+            raise StageDeferred(header)
+
+        graph = StageGraph([
+            Stage("rasterize", lambda p, i: self.calls.append("rasterize") or 1),
+            Stage("ocr", ocr, inputs=["rasterize"], merge=lambda parts: sum(parts)),
+            Stage("match", lambda p, i: self.calls.append("match") or i["ocr"] * 10, inputs=["ocr"]),
+        ])
+        with self.assertRaises(StageDeferred) as ctx:
+            graph.run(self.params, self.store, rerun_from="rasterize")
+        deferred = ctx.exception
+        self.assertEqual((deferred.header, deferred.stage, deferred.completed), (header, "ocr", ["rasterize"]))
+
+        # What the chord body does: store the merged parts, then carry on
+        self.store.save("ocr", deferred.key, graph.stages["ocr"].merge([2, 3]), 0.0)
+        self.calls.clear()
+        result = graph.run(self.params, self.store, rerun_from="rasterize",
+                           completed=deferred.completed + ["ocr"])
+        self.assertEqual(self.calls, ["match"])
+        self.assertEqual(result["outputs"]["match"], 50)
+
+    def test_failed_stage_marks_task_failure(self):
+        self.fail.add("match")
+        task = SimpleNamespace(request=SimpleNamespace(id="t1", is_eager=True), update_state=mock.Mock())
+        with mock.patch.object(pipeline_stages, "OCR_PIPELINE", self.graph), \
+             mock.patch.object(pipeline_stages, "PIPELINE_ARTIFACT_DIR", Path(self.tmp.name) / "artifacts"), \
+             mock.patch.object(pipeline_stages, "finish_task") as finish_task, \
+             Flask(__name__).app_context():
+            with self.assertRaises(Ignore):
+                pipeline_stages._run_stage_pipeline(task, 1, self.params, None, None)
+        state = task.update_state.call_args_list[-1].kwargs
+        self.assertEqual(state["state"], "FAILURE")
+        self.assertEqual((state["meta"]["stage"], state["meta"]["ran"]), ("match", ["rasterize", "ocr"]))
+        finish_task.assert_called_once_with("t1", "FAILED")
+
+class TestGradeStage(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.app = Flask(__name__)
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+        db.init_app(self.app)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        for i in range(1, 4):
+            db.session.add(ExtractedStudentScript(
+                id=i, test_id=1, student_id=i,
+                original_filename=f"{i}.pdf", extracted_pdf_path=f"{i}.pdf",
+            ))
+        db.session.commit()
+        self.graded = []
+        self.flaky = {2}
+        request = SimpleNamespace(id="p1", is_eager=True, args=[1, {}], kwargs={})
+        self.task = SimpleNamespace(name="smartscripts.tasks.pipeline_stages.run_stage_pipeline",
+                                    request=request, update_state=mock.Mock())
+        grading = SimpleNamespace(grade_student_script=self.grade)
+        graph = StageGraph([Stage("grade", pipeline_stages._grade)])
+        for patcher in (mock.patch.object(control_channel, "_redis", return_value=None),
+                        mock.patch.object(pipeline_stages, "current_task", self.task),
+                        mock.patch.object(pipeline_stages, "PIPELINE_ARTIFACT_DIR",
+                                          Path(self.tmp.name)),
+                        mock.patch.object(pipeline_stages, "OCR_PIPELINE", graph),
+                        mock.patch.dict(sys.modules, {
+                            "smartscripts.services.grading_service": grading})):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+        self.tmp.cleanup()
+
+    def grade(self, script):
+        if script.id in self.flaky:
+            raise IOError("unreadable page")
+        self.graded.append(script.id)
+
+    def run_pipeline(self):
+        return pipeline_stages._run_stage_pipeline(self.task, 1, {}, None, None)
+
+    def test_failed_script_fails_stage_and_relaunch_resumes(self):
+        db.session.add(TaskControl(task_id="p1", test_id=1, status="RUNNING"))
+        db.session.commit()
+        with self.assertRaises(Ignore):
+            self.run_pipeline()
+        self.assertEqual(self.graded, [1, 3])
+        self.assertIsNone(ArtifactStore(1).load("grade"))
+        self.assertEqual(db.session.get(ExtractedStudentScript, 2).grading_status, "FAILED")
+        self.assertEqual(TaskControl.query.one().status, "FAILED")
+
+        self.flaky.clear()
+        self.graded.clear()
+        result = self.run_pipeline()
+        self.assertEqual(self.graded, [2])
+        self.assertEqual(result["output"], {"scripts": [1, 2, 3], "graded": 3})
+        self.assertEqual(TaskControl.query.one().status, "COMPLETED")
+
+    def test_pause_parks_pipeline_task(self):
+        db.session.add(TaskControl(task_id="p1", test_id=1, status="PAUSED"))
+        db.session.commit()
+        with self.assertRaises(Ignore):
+            self.run_pipeline()
+        self.assertEqual(self.graded, [])
+        row = TaskControl.query.one()
+        self.assertEqual((row.status, row.task_name), ("PAUSED", self.task.name))
+        self.assertEqual(row.task_args, {"args": [1, {}], "kwargs": {}})
+        self.assertEqual(self.task.update_state.call_args.kwargs["state"], "PAUSED")
+
+if __name__ == "__main__":
+    unittest.main()
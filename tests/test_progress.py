@@ -0,0 +1,61 @@
+import unittest
+from types import SimpleNamespace
+from smartscripts.tasks.progress import ProgressReporter
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestProgressReporter(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.writes = []
+        self.task = SimpleNamespace(request=SimpleNamespace(id="t1"))
+
+    def reporter(self, **kwargs):
+        return ProgressReporter(self.task, test_id=7, publish=self.writes.append, clock=self.clock, **kwargs)
+
+    def test_coalesces_per_item_updates(self):
+        progress = self.reporter(min_interval=1.0, min_percent=1)
+        progress.stage("grade", total=3000)
+        for i in range(1, 3001):
+            self.clock.now += 0.05
+            progress.update(i)
+        self.assertLessEqual(progress.writes, 160)
+        self.assertGreater(progress.writes, 50)
+        self.assertEqual(len(self.writes), progress.writes)
+
+    def test_schema_and_stage_weights(self):
+        progress = self.reporter(stages=[("detect", 25), ("ocr", 75)], percent_range=(10, 90))
+        progress.stage("detect", total=10)
+        self.assertEqual(self.writes[-1]["percent"], 10)
+        progress.stage("ocr", total=4, chunks=2)
+        progress.update(2, force=True)
+        meta = self.writes[-1]
+        self.assertEqual(set(meta) >= {"status", "task_id", "test_id", "percent", "eta_seconds", "elapsed_seconds",
+                                       "stage", "stage_index", "stage_count", "current", "total", "stage_percent"},
+                         True)
+        self.assertEqual((meta["stage"], meta["stage_index"], meta["stage_count"]), ("ocr", 2, 2))
+        self.assertEqual((meta["current"], meta["total"], meta["stage_percent"]), (2, 4, 50))
+        self.assertEqual(meta["percent"], 10 + int((25 + 75 * 0.5) / 100 * 80))
+        self.assertEqual((meta["task_id"], meta["test_id"], meta["chunks"]), ("t1", 7, 2))
+
+    def test_smoothed_eta(self):
+        progress = self.reporter(min_interval=0, min_percent=0)
+        progress.stage("grade", total=100)
+        for i in range(1, 51):
+            self.clock.now += 2.0
+            progress.update(i)
+        self.assertEqual(self.writes[-1]["eta_seconds"], 100)
+
+        # One slow item moves the ETA only part of the way
+        self.clock.now += 40.0
+        progress.update(51)
+        self.assertLess(self.writes[-1]["eta_seconds"], 200)
+        self.assertGreater(self.writes[-1]["eta_seconds"], 98)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+import torch
+from PIL import Image
+from smartscripts.ai import ocr_engine
+
+START, PAD = 0, 99
+
+class StubProcessor:
+    """Encodes each image as its red channel value (the image's id)."""
+    tokenizer = SimpleNamespace(pad_token_id=PAD)
+
+    def __call__(self, images, return_tensors="pt"):
+        return SimpleNamespace(pixel_values=torch.tensor([[float(img.getpixel((0, 0))[0])] for img in images]))
+
+    def batch_decode(self, sequences, skip_special_tokens=True):
+        return [" ".join(f"t{tok}" for tok in seq if tok not in (START, PAD)) for seq in sequences.tolist()]
+
+class StubModel:
+    """
+    Image k decodes to token k repeated (k % 3 + 1) times, each with probability
+    1 - k / 100; shorter sequences in a batch are padded, as generate does.
+    """
+    def __init__(self):
+        self.batch_sizes = []
+
+    def generate(self, pixel_values, output_scores=True, return_dict_in_generate=True):
+        ids = [int(v) for v in pixel_values[:, 0].tolist()]
+        self.batch_sizes.append(len(ids))
+        lengths = [k % 3 + 1 for k in ids]
+        width = max(lengths)
+        sequences = torch.tensor([[START] + [k] * n + [PAD] * (width - n) for k, n in zip(ids, lengths)])
+        return SimpleNamespace(sequences=sequences, scores=[None] * width)
+
+    def compute_transition_scores(self, sequences, scores, beam_indices=None, normalize_logits=True):
+        generated = sequences[:, 1:]
+        probs = torch.where(generated == PAD, torch.tensor(0.5, dtype=torch.float64), 1.0 - generated.double() / 100)
+        return torch.log(probs)
+
+class TestTrOCRBatch(unittest.TestCase):
+    def setUp(self):
+        self.model = StubModel()
+        patcher = mock.patch.object(ocr_engine, "get_trocr",
+                                    return_value=(StubProcessor(), self.model, torch.device("cpu")))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.images = [Image.new("RGB", (4, 4), (k, 0, 0)) for k in (5, 1, 12, 7, 3)]
+
+    def test_batch_matches_single_image_calls(self):
+        single = [ocr_engine.run_tr_ocr_batch_scored([img], batch_size=1)[0] for img in self.images]
+        self.model.batch_sizes.clear()
+        batched = ocr_engine.run_tr_ocr_batch_scored(self.images, batch_size=2)
+
+        self.assertEqual(self.model.batch_sizes, [2, 2, 1])
+        self.assertEqual([text for text, _ in batched], [text for text, _ in single])
+        for (_, got), (_, want) in zip(batched, single):
+            self.assertAlmostEqual(got, want)
+        # Padding does not count towards confidence
+        self.assertEqual(batched[2][0], "t12")
+        self.assertAlmostEqual(batched[2][1], 0.88)
+        self.assertEqual(batched[0][0], "t5 t5 t5")
+        self.assertAlmostEqual(batched[0][1], 0.95)
+
+    def test_empty_and_odd_sized_batches(self):
+        self.assertEqual(ocr_engine.run_tr_ocr_batch_scored([]), [])
+        self.assertEqual(self.model.batch_sizes, [])
+
+        texts = ocr_engine.run_tr_ocr_batch(self.images[:3], batch_size=8)
+        self.assertEqual(self.model.batch_sizes, [3])
+        self.assertEqual(texts, ["t5 t5 t5", "t1 t1", "t12"])
+        self.assertEqual(ocr_engine.run_tr_ocr(self.images[3]), "t7 t7")
+        self.assertAlmostEqual(ocr_engine.run_tr_ocr_batch_scored([self.images[4]])[0][1], 0.97, places=5)
+
+if __name__ == "__main__":
+    unittest.main()
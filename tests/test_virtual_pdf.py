@@ -0,0 +1,112 @@
+import os
+import unittest
+import tempfile
+import zipfile
+from pathlib import Path
+from unittest import mock
+import fitz
+from flask import Flask
+from smartscripts.utils import virtual_pdf
+from smartscripts.utils.virtual_pdf import VirtualPdfCache, pdf_etag, ranges_to_pages, send_student_pdf
+
+def page_texts(data):
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        return [page.get_text().strip() for page in doc]
+
+class Script:
+    def __init__(self, ranges):
+        self.id = 1
+        self.source_pdf_path = "combined.pdf"
+        self.page_ranges = ranges
+
+class TestVirtualPdf(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pdf = Path(self.tmp.name) / "combined.pdf"
+        doc = fitz.open()
+        for i in range(6):
+            doc.new_page().insert_text((72, 72), f"page {i}")
+        doc.save(str(self.pdf))
+        doc.close()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_built_once_then_cached(self):
+        cache = VirtualPdfCache(max_entries=2)
+        data, etag = cache.get(self.pdf, [2, 3])
+        self.assertEqual(page_texts(data), ["page 2", "page 3"])
+        with mock.patch.object(virtual_pdf, "pdf_pages_bytes") as build:
+            again, same = cache.get(self.pdf, [2, 3])
+        build.assert_not_called()
+        self.assertEqual((again, same), (data, etag))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_lru_bounds(self):
+        cache = VirtualPdfCache(max_entries=2)
+        for pages in ([0], [1], [2]):
+            cache.get(self.pdf, pages)
+        self.assertEqual(len(cache), 2)
+        cache.get(self.pdf, [0])
+        self.assertEqual(cache.misses, 4)
+
+        small = VirtualPdfCache(max_entries=10, max_bytes=1)
+        small.get(self.pdf, [0])
+        self.assertEqual(len(small), 0)
+
+    def test_etag_follows_ranges_and_source(self):
+        etag = pdf_etag(self.pdf, ranges_to_pages([[0, 1]]))
+        self.assertNotEqual(etag, pdf_etag(self.pdf, ranges_to_pages([[0, 2]])))
+        stat = self.pdf.stat()
+        os.utime(self.pdf, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.assertNotEqual(etag, pdf_etag(self.pdf, [0, 1]))
+        self.assertEqual(ranges_to_pages([[4, 5], [0, 0]]), [4, 5, 0])
+
+    def test_send_student_pdf_conditional(self):
+        app = Flask(__name__)
+        script = Script([[1, 2]])
+        with mock.patch.object(virtual_pdf, "source_pdf_file", return_value=self.pdf):
+            with app.test_request_context("/"):
+                response = send_student_pdf(script, download_name="s.pdf")
+                response.direct_passthrough = False
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(page_texts(response.get_data()), ["page 1", "page 2"])
+                etag = response.get_etag()[0]
+
+            with app.test_request_context("/", headers={"If-None-Match": f'"{etag}"'}):
+                with mock.patch.object(virtual_pdf, "pdf_pages_bytes") as build:
+                    response = send_student_pdf(script, download_name="s.pdf")
+                build.assert_not_called()
+                self.assertEqual(response.status_code, 304)
+
+            script.page_ranges = [[3, 3]]
+            with app.test_request_context("/", headers={"If-None-Match": f'"{etag}"'}):
+                response = send_student_pdf(script, download_name="s.pdf")
+                response.direct_passthrough = False
+                self.assertEqual(page_texts(response.get_data()), ["page 3"])
+
+    def test_review_zip_includes_built_pdfs(self):
+        from smartscripts.services.ocr_utils import generate_review_zip
+
+        with mock.patch.object(virtual_pdf, "source_pdf_file", return_value=self.pdf):
+            data, _ = virtual_pdf.student_pdf_bytes(Script([[4, 5]]))
+        zip_path = generate_review_zip([{"arcname": "11_Al.pdf", "data": data}], [],
+                                       str(Path(self.tmp.name) / "review.zip"))
+        with zipfile.ZipFile(zip_path) as zf:
+            self.assertIn("11_Al.pdf", zf.namelist())
+            self.assertEqual(page_texts(zf.read("11_Al.pdf")), ["page 4", "page 5"])
+
+    def test_set_page_ranges_validates(self):
+        from smartscripts.models.extracted_student_script import ExtractedStudentScript
+
+        script = ExtractedStudentScript(source_pdf_path="combined.pdf")
+        script.set_page_ranges([[2, 3], [5, 5]], source_page_count=6, taken=[0, 1])
+        self.assertEqual((script.page_ranges, script.page_count), ([[2, 3], [5, 5]], 3))
+        for ranges, taken in (([[3, 2]], ()), ([[-1, 0]], ()), ([[4, 6]], ()), ([], ()),
+                              ([[2, 3], [3, 4]], ()), ([[1, 2]], [0, 1])):
+            with self.assertRaises(ValueError):
+                script.set_page_ranges(ranges, source_page_count=6, taken=taken)
+        self.assertEqual(script.page_ranges, [[2, 3], [5, 5]])
+
+if __name__ == "__main__":
+    unittest.main()